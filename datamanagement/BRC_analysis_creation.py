@@ -25,6 +25,7 @@ from datamanagement.fixups.add_fastq_metadata import add_fastq_metadata_yaml
 
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
+from dbclients.jira_client import get_jira_client
 
 from workflows.utils.jira_utils import create_jira_ticket_from_library
 from workflows.utils.colossus_utils import create_colossus_analysis
@@ -66,8 +67,7 @@ def create_analysis_jira_ticket(library_id, sample, library_ticket):
     '''
 
     JIRA_USER = os.environ['JIRA_USERNAME']
-    JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-    jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+    jira_api = get_jira_client()
 
     issue = jira_api.issue(library_ticket)
 
@@ -4,19 +4,23 @@ import sys
 import gzip
 import click
 import logging
+import time
 import pprint
 import datetime
 from collections import defaultdict
-from jira import JIRA
+from concurrent.futures import ThreadPoolExecutor
 from jira.exceptions import JIRAError
+from dbclients.jira_client import get_jira_client
 
 from dbclients.tantalus import TantalusApi
 from dbclients.colossus import ColossusApi
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 
 from datamanagement.add_generic_dataset import add_generic_dataset
 from datamanagement.utils.utils import get_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import import_ledger
+from datamanagement.utils.import_ledger import ImportLedger, default_ledger_filename
 
 from workflows.utils.tantalus_utils import create_tenx_analysis_from_library
 
@@ -28,18 +32,24 @@ import settings
 
 logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
 
-tantalus_api = TantalusApi()
-colossus_api = ColossusApi()
+tantalus_api = LazyClient(TantalusApi)
+colossus_api = LazyClient(ColossusApi)
 
 TAXONOMY_MAP = {
     '9606': 'HG38',
     '10090': 'MM10',
 }
 
+# name of this importer in the import ledger
+LEDGER_IMPORTER = 'brc_tenx'
+
+# block transfers in flight across all concurrent uploads, each holds a
+# block of up to 64 MiB in memory
+UPLOAD_CONCURRENCY = 8
+
 # Move this to update_jira.py
-JIRA_USERNAME = os.environ['JIRA_USERNAME']
-JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USERNAME, JIRA_PASSWORD))
+JIRA_USERNAME = os.environ.get('JIRA_USERNAME')
+jira_api = get_jira_client()
 
 JIRA_MESSAGE = """Successfully imported FASTQs to Azure storage, Tantalus and Colossus. 
 Files can be found at:
@@ -48,22 +58,14 @@ Files can be found at:
 {{noformat}}
 """
 
-def upload_to_azure(storage_client, blobname, filepath, update=False):
-    if(storage_client.exists(blobname)):
-        if(storage_client.get_size(blobname) == os.path.getsize(filepath)):
-            logging.info(f"{blobname} already exists and is the same size. Skipping...")
-
-            return
-        else:
-            if not(update):
-                message = f"{blobname} has different size from {filepath}. Please specify --update option to overwrite."
-                logging.error(message)
-                raise ValueError(message)
-
+def upload_to_azure(storage_client, blobname, filepath, update=False, max_concurrency=UPLOAD_CONCURRENCY):
+    # create skips a blob of the same size and raises for a different size
+    # unless update is set, with a single properties request
     storage_client.create(
         blobname,
         filepath,
         update=update,
+        max_concurrency=max_concurrency,
     )
 
 def create_analysis_jira_ticket(library_id, sample, library_ticket, reference_genome):
@@ -78,8 +80,7 @@ def create_analysis_jira_ticket(library_id, sample, library_ticket, reference_ge
     '''
 
     JIRA_USER = os.environ['JIRA_USERNAME']
-    JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-    jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+    jira_api = get_jira_client()
 
     issue = jira_api.issue(library_ticket)
 
@@ -133,7 +134,7 @@ def update_jira(blob_paths, jira_ticket):
         filepaths=out_files
     )
     try:
-        issue = jira_api.issue(jira_ticket)
+        issue = jira_api.issue(jira_ticket, fields=['summary'])
     except JIRAError:
         logging.error("The jira ticket {} does not exist. Skipping ticket update".format(jira_ticket))
         return
@@ -141,6 +142,339 @@ def update_jira(blob_paths, jira_ticket):
     comment = jira_api.add_comment(jira_ticket, msg)
 
 
+def prepare_library(
+        library_name, pool, flowcell, bcl_directory, storage_prefix, ledger, sequencing_id,
+        update=False, ignore_ledger=False):
+    """
+    Check a library directory against Colossus and the ledger and list its fastqs.
+
+    Returns:
+        dict with the colossus library, sample, lanes and fastqs to upload,
+        or None if the library is skipped
+    """
+    try:
+        library = colossus_api.get("tenxlibrary", name=library_name)
+    except NotFoundError:
+        logging.error(
+            "Cannot find library {} in Colossus".format(library_name))
+        return None
+
+    if(library['id'] not in pool['libraries']):
+        logging.error(
+            f"Library {library_name} is not part of pool {pool['id']}")
+        return None
+
+    sample = library["sample"]["sample_id"]
+
+    fastqs = []
+    for fastq in sorted(os.listdir(os.path.join(bcl_directory, library_name))):
+        fastq_parsed = fastq.split("_")
+        new_filename = "_".join(
+            [library_name, sample, "_".join(fastq_parsed[-4:])])
+        lane_match = re.match(
+            r".+_L00(\d+)",
+            fastq,
+        )
+        if lane_match is None:
+            logging.warning("Skipping {} in {}, no lane in filename".format(fastq, library_name))
+            continue
+        lane_number = lane_match.groups()[0]
+        flowcell_lane = "{}_{}".format(flowcell, lane_number)
+        blobname = os.path.join(library_name, flowcell_lane, new_filename)
+
+        fastqs.append({
+            "lane_number": lane_number,
+            "blobname": blobname,
+            "local_path": os.path.join(bcl_directory, library_name, fastq),
+            "filepath": os.path.join(storage_prefix, blobname),
+        })
+
+    library_lanes = sorted(set(
+        (library_name, "{}_{}".format(flowcell, fastq["lane_number"])) for fastq in fastqs))
+
+    # skip libraries already imported by a previous run
+    if library_lanes and not update and not ignore_ledger and all(
+            ledger.lane_state(LEDGER_IMPORTER, *lane) == import_ledger.COMPLETE for lane in library_lanes):
+        logging.info("Lanes of {} already imported, skipping".format(library_name))
+        return None
+
+    ledger.record_lanes(LEDGER_IMPORTER, sequencing_id, library_lanes, import_ledger.PENDING)
+
+    return {
+        "library_name": library_name,
+        "library": library,
+        "sample": sample,
+        "lanes": library_lanes,
+        "fastqs": fastqs,
+    }
+
+
+def upload_library(library_import, storage_client, upload_executor, update=False, max_concurrency=UPLOAD_CONCURRENCY):
+    """
+    Upload the fastqs of a library through the shared upload pool, each
+    with up to max_concurrency block transfers.
+
+    Returns:
+        dict of fastq filepaths keyed by lane number, files, bytes and
+        upload seconds of the library
+    """
+    logging.info("Importing fastqs for {}".format(library_import["library_name"]))
+
+    start = time.time()
+
+    futures = [
+        upload_executor.submit(
+            upload_to_azure,
+            storage_client=storage_client,
+            blobname=fastq["blobname"],
+            filepath=fastq["local_path"],
+            update=update,
+            max_concurrency=max_concurrency,
+        )
+        for fastq in library_import["fastqs"]]
+
+    for future in futures:
+        future.result()
+
+    filenames = dict()
+    for fastq in library_import["fastqs"]:
+        filenames.setdefault(fastq["lane_number"], []).append(fastq["filepath"])
+
+    return {
+        "filenames": filenames,
+        "files": len(library_import["fastqs"]),
+        "bytes": sum(os.path.getsize(fastq["local_path"]) for fastq in library_import["fastqs"]),
+        "seconds": time.time() - start,
+    }
+
+
+def register_library(
+        library_import,
+        uploaded,
+        flowcell,
+        sequencing_id,
+        taxonomy_id='9606',
+        skip_jira=False,
+        no_comments=False,
+    ):
+    """
+    Add the uploaded fastqs of a library to Tantalus and Colossus and create its analysis.
+    """
+    library_name = library_import["library_name"]
+    library = library_import["library"]
+    sample = library_import["sample"]
+    jira_ticket = library["jira_ticket"]
+    filenames = uploaded["filenames"]
+
+    dna_library = tantalus_api.get_or_create(
+        "dna_library",
+        library_id=library_name,
+        library_type="SC_RNASEQ",
+        index_format="TENX"
+    )
+
+    for lane_number in filenames:
+        dataset_ids = []
+
+        lanes = list()
+        lane_pks = list()
+        lane = dict()
+        lane["flowcell_id"] = flowcell
+        lane["lane_number"] = lane_number
+        lanes.append(lane)
+
+        lane_object = tantalus_api.get_or_create(
+            "sequencing_lane",
+            flowcell_id=flowcell,
+            lane_number=lane_number,
+            sequencing_centre="BRC",
+            sequencing_instrument="NextSeq500",
+            read_type="TENX",
+            dna_library=dna_library["id"]
+        )
+
+        lane_pks.append(lane_object["id"])
+
+        dataset_name = TENX_SCRNA_DATASET_TEMPLATE.format(
+            dataset_type="FQ",
+            sample_id=sample,
+            library_type="SC_RNASEQ",
+            library_id=library_name,
+            lanes_hash=get_lanes_hash(list(lanes)),
+        )
+
+        dataset_id = add_generic_dataset(
+            filepaths=filenames[lane_number],
+            sample_id=sample,
+            library_id=library_name,
+            storage_name="scrna_fastq",
+            dataset_name=dataset_name,
+            dataset_type="FQ",
+            sequence_lane_pks=lane_pks,
+            reference_genome="HG38",
+            update=True
+        )
+
+        dataset_ids.append(dataset_id)
+
+        colossus_lane = colossus_api.get_or_create(
+            "tenxlane",
+            flow_cell_id="{}_{}".format(flowcell, lane_number),
+            sequencing=sequencing_id,
+        )
+
+        logging.info("Adding datasets {} to colossus lane {}".format(dataset_ids, flowcell))
+        if colossus_lane["tantalus_datasets"] is not None:
+            dataset_ids = list(set(dataset_ids))
+
+        colossus_api.update(
+            "tenxlane",
+            id=colossus_lane["id"],
+            tantalus_datasets=dataset_ids
+        )
+
+    # create jira ticket
+    if not(skip_jira):
+        analysis_ticket = create_analysis_jira_ticket(
+            library_id=library_name,
+            sample=sample,
+            library_ticket=jira_ticket,
+            reference_genome=TAXONOMY_MAP[taxonomy_id],
+        )
+        # create colossus analysis
+        analysis, _ = colossus_api.create(
+            "tenxanalysis",
+            fields={
+                "version": "vm",
+                "jira_ticket": analysis_ticket,
+                "run_status": "idle",
+                "tenx_library": library["id"],
+                "submission_date": str(datetime.date.today()),
+                "tenxsequencing_set": [],
+            },
+            keys=["jira_ticket"],
+        )
+        # create tantalus analysis
+        create_tenx_analysis_from_library(
+            jira=analysis_ticket,
+            library=library_name,
+            taxonomy_id=taxonomy_id)
+
+        logging.info("Succesfully imported {}".format(library_name))
+
+    if not no_comments:
+        update_jira(filenames[lane_number], jira_ticket)
+
+
+def import_libraries(
+        library_dir_names,
+        pool,
+        flowcell,
+        bcl_directory,
+        storage_client,
+        ledger,
+        sequencing_id,
+        taxonomy_id='9606',
+        skip_jira=False,
+        update=False,
+        ignore_ledger=False,
+        no_comments=False,
+        num_libraries=4,
+        num_uploads=2,
+    ):
+    """
+    Import libraries concurrently.
+
+    Up to num_libraries libraries are imported at once, their fastqs share
+    a pool of num_uploads uploads, which split UPLOAD_CONCURRENCY block
+    transfers between them.  Registration in Tantalus, Colossus and
+    JIRA runs one library at a time on its own thread, so it does not hold
+    up uploads of the next libraries.  A failed library does not stop the
+    others, its lanes are recorded as failed in the ledger once known.
+
+    Returns:
+        list of dicts with library, state, error, files, bytes, upload
+        seconds and registration seconds of each library attempted
+    """
+    def fail(library_import, summary, error):
+        logging.exception("Import of {} failed".format(library_import["library_name"]))
+        summary["error"] = str(error)
+        ledger.record_lanes(
+            LEDGER_IMPORTER, sequencing_id, library_import["lanes"], import_ledger.FAILED, error=str(error))
+
+    def register(library_import, uploaded, summary):
+        start = time.time()
+        try:
+            register_library(
+                library_import,
+                uploaded,
+                flowcell,
+                sequencing_id,
+                taxonomy_id=taxonomy_id,
+                skip_jira=skip_jira,
+                no_comments=no_comments,
+            )
+            ledger.record_lanes(LEDGER_IMPORTER, sequencing_id, library_import["lanes"], import_ledger.COMPLETE)
+            summary["state"] = import_ledger.COMPLETE
+        except Exception as e:
+            fail(library_import, summary, e)
+        summary["register_seconds"] = time.time() - start
+
+    max_concurrency = max(1, UPLOAD_CONCURRENCY // num_uploads)
+
+    def import_library(library_name):
+        summary = {"library": library_name, "state": import_ledger.FAILED, "error": None,
+                   "files": 0, "bytes": 0, "seconds": 0., "register_seconds": 0.}
+
+        # lanes are not known yet, nothing to record in the ledger
+        try:
+            library_import = prepare_library(
+                library_name, pool, flowcell, bcl_directory, storage_client.prefix, ledger, sequencing_id,
+                update=update, ignore_ledger=ignore_ledger)
+        except Exception as e:
+            logging.exception("Preparing import of {} failed".format(library_name))
+            summary["error"] = str(e)
+            return summary
+
+        if library_import is None:
+            return None
+
+        try:
+            uploaded = upload_library(
+                library_import, storage_client, upload_executor, update=update, max_concurrency=max_concurrency)
+        except Exception as e:
+            fail(library_import, summary, e)
+            return summary
+
+        summary.update(files=uploaded["files"], bytes=uploaded["bytes"], seconds=uploaded["seconds"])
+
+        # Registration is queued and the next library starts uploading
+        register_executor.submit(register, library_import, uploaded, summary)
+
+        return summary
+
+    # Executors shut down in reverse order, registrations queued by the
+    # last libraries finish before the summaries are returned
+    with ThreadPoolExecutor(max_workers=num_uploads) as upload_executor, \
+            ThreadPoolExecutor(max_workers=1) as register_executor, \
+            ThreadPoolExecutor(max_workers=num_libraries) as library_executor:
+        summaries = list(library_executor.map(import_library, library_dir_names))
+
+    return [a for a in summaries if a is not None]
+
+
+def log_import_summary(summaries, elapsed):
+    for summary in summaries:
+        throughput = "{:.1f} MB/s".format(summary["bytes"] / 1e6 / summary["seconds"]) if summary["seconds"] else "-"
+        error = ": {}".format(summary["error"]) if summary["error"] else ""
+        logging.info("{library} {state}: {files} files, {mb:.1f} MB, uploaded in {seconds:.1f}s, {throughput}, registered in {register_seconds:.1f}s{message}".format(
+            mb=summary["bytes"] / 1e6, throughput=throughput, message=error, **summary))
+
+    total_bytes = sum(a["bytes"] for a in summaries)
+    throughput = "{:.1f} MB/s".format(total_bytes / 1e6 / elapsed) if elapsed else "-"
+    logging.info("{} libraries, {:.1f} MB in {:.1f}s, {}".format(len(summaries), total_bytes / 1e6, elapsed, throughput))
+
+
 @click.command()
 @click.argument("pool_name")
 @click.argument("flowcell")
@@ -149,6 +483,10 @@ def update_jira(blob_paths, jira_ticket):
 @click.option("--update", is_flag=True)
 @click.option('--skip_jira', is_flag=True)
 @click.option("--no_comments", is_flag=True)
+@click.option('--ledger', 'ledger_filename', default=default_ledger_filename, help='Import ledger file')
+@click.option('--ignore_ledger', is_flag=True, help='Import libraries whose lanes the ledger records as complete')
+@click.option('--num_libraries', type=int, default=4, help='Libraries imported concurrently')
+@click.option('--num_uploads', type=int, default=2, help='Concurrent fastq uploads shared by all libraries')
 def main(
     pool_name,
     flowcell,
@@ -156,7 +494,11 @@ def main(
     taxonomy_id='9606',
     skip_jira=False,
     update=False,
-    no_comments=False
+    no_comments=False,
+    ledger_filename=None,
+    ignore_ledger=False,
+    num_libraries=4,
+    num_uploads=2,
     ):
     # make sure it is a valid taxonomy ID
     if taxonomy_id is not None:
@@ -178,157 +520,34 @@ def main(
     storage_client = tantalus_api.get_storage_client(storage_account)
     library_dir_names = os.listdir(bcl_directory)
 
-    logging.info("Importing {}".format(pool_name))
-    for library_name in library_dir_names:
-
-        logging.info("Importing fastqs for {}".format(library_name))
-        filenames = dict()
-
-        try:
-            library = colossus_api.get("tenxlibrary", name=library_name)
-        except NotFoundError:
-            logging.error(
-                "Cannot find library {} in Colossus".format(library_name))
-            continue
-
-        if(library['id'] not in pool['libraries']):
-            logging.error(
-                f"Library {library_name} is not part of {pool_name}")
-            continue
+    ledger = ImportLedger(ledger_filename or default_ledger_filename())
 
-        jira_ticket = library["jira_ticket"]
-        sample = library["sample"]["sample_id"]
-
-        fastqs = os.listdir(os.path.join(bcl_directory, library_name))
-
-        dna_library = tantalus_api.get_or_create(
-            "dna_library",
-            library_id=library_name,
-            library_type="SC_RNASEQ",
-            index_format="TENX"
-        )
-
-        for fastq in fastqs:
-            fastq_parsed = fastq.split("_")
-            new_filename = "_".join(
-                [library_name, sample, "_".join(fastq_parsed[-4:])])
-            lane_match = re.match(
-                r".+_L00(\d+)",
-                fastq,
-            )
-            lane_number = lane_match.groups()[0]
-            flowcell_lane = "{}_{}".format(flowcell, lane_number)
-            blobname = os.path.join(library_name, flowcell_lane, new_filename)
-            local_fastq_path = os.path.join(bcl_directory, library_name, fastq)
-
-            upload_to_azure(
-                storage_client=storage_client,
-                blobname=blobname,
-                filepath=local_fastq_path,
-                update=update,
-            )
-
-            if lane_number not in filenames:
-                filenames[lane_number] = []
-
-            filenames[lane_number].append(
-                os.path.join(storage_client.prefix, blobname)
-            )
-
-        for lane_number in filenames:
-            dataset_ids = []
-
-            lanes = list()
-            lane_pks = list()
-            lane = dict()
-            lane["flowcell_id"] = flowcell
-            lane["lane_number"] = lane_number
-            lanes.append(lane)
-
-            lane_object = tantalus_api.get_or_create(
-                "sequencing_lane",
-                flowcell_id=flowcell,
-                lane_number=lane_number,
-                sequencing_centre="BRC",
-                sequencing_instrument="NextSeq500",
-                read_type="TENX",
-                dna_library=dna_library["id"]
-            )
-
-            lane_pks.append(lane_object["id"])
-
-            dataset_name = TENX_SCRNA_DATASET_TEMPLATE.format(
-                dataset_type="FQ",
-                sample_id=sample,
-                library_type="SC_RNASEQ",
-                library_id=library_name,
-                lanes_hash=get_lanes_hash(list(lanes)),
-            )
-
-            dataset_id = add_generic_dataset(
-                filepaths=filenames[lane_number],
-                sample_id=sample,
-                library_id=library_name,
-                storage_name="scrna_fastq",
-                dataset_name=dataset_name,
-                dataset_type="FQ",
-                sequence_lane_pks=lane_pks,
-                reference_genome="HG38",
-                update=True
-            )
-
-            dataset_ids.append(dataset_id)
-
-            colossus_lane = colossus_api.get_or_create(
-                "tenxlane", 
-                flow_cell_id="{}_{}".format(flowcell, lane_number),
-                sequencing=sequencing_id,
-            )
-            
-            logging.info("Adding datasets {} to colossus lane {}".format(dataset_ids, flowcell))
-            if colossus_lane["tantalus_datasets"] is not None:
-                dataset_ids = list(set(dataset_ids))
-                
-            colossus_api.update(
-                "tenxlane", 
-                id=colossus_lane["id"], 
-                tantalus_datasets=dataset_ids
-            )
-
-        # create jira ticket
-        if not(skip_jira):
-            analysis_ticket = create_analysis_jira_ticket(
-                library_id=library_name,
-                sample=sample,
-                library_ticket=jira_ticket,
-                reference_genome=TAXONOMY_MAP[taxonomy_id],
-            )
-            # create colossus analysis
-            analysis, _ = colossus_api.create(
-                "tenxanalysis",
-                fields={
-                    "version": "vm",
-                    "jira_ticket": analysis_ticket,
-                    "run_status": "idle",
-                    "tenx_library": library["id"],
-                    "submission_date": str(datetime.date.today()),
-                    "tenxsequencing_set": [],
-                },
-                keys=["jira_ticket"],
-            )
-            # create tantalus analysis
-            create_tenx_analysis_from_library(
-                jira=analysis_ticket,
-                library=library_name,
-                taxonomy_id=taxonomy_id)
+    logging.info("Importing {}".format(pool_name))
+    start = time.time()
+
+    summaries = import_libraries(
+        library_dir_names,
+        pool,
+        flowcell,
+        bcl_directory,
+        storage_client,
+        ledger,
+        sequencing_id,
+        taxonomy_id=taxonomy_id,
+        skip_jira=skip_jira,
+        update=update,
+        ignore_ledger=ignore_ledger,
+        no_comments=no_comments,
+        num_libraries=num_libraries,
+        num_uploads=num_uploads,
+    )
 
-            logging.info("Succesfully imported {}".format(pool_name))
+    log_import_summary(summaries, time.time() - start)
 
-        if not no_comments:
-            update_jira(filenames[lane_number], jira_ticket)
+    failed = [a["library"] for a in summaries if a["state"] != import_ledger.COMPLETE]
+    if failed:
+        raise Exception("Import failed for libraries {}".format(", ".join(failed)))
 
 
 if __name__ == "__main__":
     main()
-
-
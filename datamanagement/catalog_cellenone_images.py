@@ -11,12 +11,15 @@ import pandas as pd
 import PIL.Image
 import tempfile
 import codecs
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from dbclients.basicclient import NotFoundError
 from dbclients.tantalus import TantalusApi
 from dbclients.colossus import ColossusApi
 from datamanagement.add_generic_results import add_generic_results
-from utils.constants import LOGGING_FORMAT
+from datamanagement.utils.constants import LOGGING_FORMAT
 
 
 def clean_filename(filename):
@@ -34,17 +37,6 @@ def clean_filename(filename):
 cell_filename_template = '{library_id}_R{row:02d}_C{column:02d}.png'
 background_filename_template = 'background_{idx}{extension}'
 
-def generate_new_filename(row):
-    library_id = row['library_id']
-    chip_row = row['chip_row']
-    chip_column = row['chip_column']
-
-    new_filename = cell_filename_template.format(
-        library_id=library_id, row=chip_row, column=chip_column)
-
-    return new_filename
-
-
 def read_log_filename(log_filename):
     for line in codecs.open(log_filename, 'r', encoding='utf-8', errors='ignore'):
         pattern = 'Ejection zone bondary:\s+(\d+)\s+Sedimentation zone bondary:\s+(\d+)'
@@ -171,29 +163,112 @@ def read_cellenone_isolated_files(source_dir):
     return catalog
 
 
-def _check_file_same_local(source_filepath, destination_filepath):
-    source_filesize = os.path.getsize(source_filepath)
-    destination_filesize = os.path.getsize(destination_filepath)
-    if source_filesize != destination_filesize:
-        return False
-    return True
+def _file_md5(filepath, block_size=1024 * 1024):
+    md5 = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            md5.update(block)
+    return md5.hexdigest()
 
 
-def _copy_if_different(source_filepath, destination_filepath):
-    if not os.path.exists(destination_filepath) or not _check_file_same_local(source_filepath, destination_filepath):
-        shutil.copyfile(source_filepath, destination_filepath)
+manifest_filename = '.catalog_manifest.json'
+
+
+class CatalogManifest(object):
+    """ Record of catalogued files keyed by destination filename.
+
+    Each entry stores the source path, size, mtime and md5 of the file
+    that was copied, so that a re-run can skip unchanged files using a
+    stat alone.
+    """
+    def __init__(self, destination_dir):
+        self.filepath = os.path.join(destination_dir, manifest_filename)
+        self.entries = {}
+
+        if os.path.exists(self.filepath):
+            try:
+                with open(self.filepath) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logging.warning(f'ignoring corrupt manifest {self.filepath}')
+
+    def save(self):
+        temp_filepath = self.filepath + '.tmp'
+        with open(temp_filepath, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(temp_filepath, self.filepath)
+
+
+def _stat_entry(filepath):
+    stat = os.stat(filepath)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _sync_file(source_filepath, destination_filepath, entry):
+    """ Copy a file unless the destination is known to be up to date.
+
+    Args:
+        source_filepath (str): file to copy
+        destination_filepath (str): copy destination
+        entry (dict): previous manifest entry for the destination, or None
+
+    Returns:
+        dict: new manifest entry for the destination
+    """
+    source_stat = _stat_entry(source_filepath)
+
+    destination_exists = os.path.exists(destination_filepath)
+    destination_size = os.path.getsize(destination_filepath) if destination_exists else None
+
+    if (
+            entry is not None and destination_size == source_stat['size'] and
+            entry.get('path') == source_filepath and
+            entry.get('size') == source_stat['size'] and
+            entry.get('mtime') == source_stat['mtime']):
+        return entry
+
+    md5 = _file_md5(source_filepath)
+
+    if destination_size == source_stat['size'] and (entry is None or entry.get('md5') == md5):
+        logging.info(f'skipping copy of {source_filepath} to {destination_filepath} with same content')
+
     else:
-        logging.info(f'skipping copy of {source_filepath} to {destination_filepath} with same size')
+        shutil.copyfile(source_filepath, destination_filepath)
 
+    return dict(path=source_filepath, md5=md5, **source_stat)
 
-def catalog_images(library_id, source_dir, destination_dir, temp_dir):
+
+def _convert_image(source_filepath, destination_filepath):
+    PIL.Image.open(source_filepath).save(destination_filepath)
+    return destination_filepath
+
+
+def _generate_new_filenames(catalog):
+    """ Filenames of cell images following cell_filename_template.
+    """
+    return (
+        catalog['library_id'] +
+        '_R' + catalog['chip_row'].astype(int).astype(str).str.zfill(2) +
+        '_C' + catalog['chip_column'].astype(int).astype(str).str.zfill(2) +
+        '.png')
+
+
+def catalog_images(library_id, source_dir, destination_dir, temp_dir, num_threads=8, num_processes=4):
     """ Catalog cellenone images and organize into a new directory
-    
+
+    Images are hashed and copied in a thread pool and backgrounds are
+    converted in a process pool. A manifest in the destination directory
+    records what was copied so that re-runs skip unchanged files.
+
     Args:
         library_id (str): DLP Library ID
         source_dir (str): Source Cellenone directory
         destination_dir (str): Destination catalogued images directory
         temp_dir (str): Temporary directory
+
+    KwArgs:
+        num_threads (int): number of concurrent copies
+        num_processes (int): number of concurrent image conversions
     """
 
     catalog = read_cellenone_isolated_files(source_dir)
@@ -205,7 +280,7 @@ def catalog_images(library_id, source_dir, destination_dir, temp_dir):
     catalog['library_id'] = library_id
 
     # Generate a pretty filename
-    catalog['filename'] = catalog.apply(generate_new_filename, axis=1)
+    catalog['filename'] = _generate_new_filenames(catalog)
 
     # Report duplicate chip wells
     cols = ['chip_row', 'chip_column']
@@ -216,53 +291,83 @@ def catalog_images(library_id, source_dir, destination_dir, temp_dir):
         logging.error(f'removing {len(dup_values)} duplicate wells')
 
     # Remove duplicate chip wells
-    catalog = catalog[~catalog[['chip_row', 'chip_column']].duplicated(keep=False)]
+    catalog = catalog[~catalog[['chip_row', 'chip_column']].duplicated(keep=False)].copy()
 
     # Fail on any other duplicate columns
     assert not catalog[['original_filename']].duplicated().any()
     assert not catalog[['filename']].duplicated().any()
 
-    # List of filepaths of newly created files
-    filepaths = []
+    manifest = CatalogManifest(destination_dir)
 
-    # Move the image files into the source directory
-    for idx in catalog.index:
-        new_filename = catalog.loc[idx, 'filename']
-        new_filepath = os.path.join(destination_dir, new_filename)
+    # Source and destination of each file to sync, in output order
+    copies = [
+        (os.path.join(source_dir, original_filename), new_filename)
+        for original_filename, new_filename in zip(catalog['original_filename'], catalog['filename'])]
 
-        original_filename = catalog.loc[idx, 'original_filename']
+    # Assign background indices and filenames
+    orig_bg_filenames = catalog[['original_background_filename', 'original_background_extension']].drop_duplicates()
+    orig_bg_filenames = orig_bg_filenames[orig_bg_filenames['original_background_filename'].notnull()]
+    orig_bg_filenames['background_idx'] = range(len(orig_bg_filenames.index))
+    orig_bg_filenames['background_filename'] = [
+        background_filename_template.format(idx=idx, extension='.png')
+        for idx in orig_bg_filenames['background_idx']]
+
+    catalog = catalog.merge(
+        orig_bg_filenames[['original_background_filename', 'background_idx', 'background_filename']],
+        on='original_background_filename', how='left')
+
+    # Convert non png backgrounds, skipping those whose source is unchanged
+    conversions = []
+    for original_filename, original_extension, new_filename in orig_bg_filenames[
+            ['original_background_filename', 'original_background_extension', 'background_filename']].values:
         original_filepath = os.path.join(source_dir, original_filename)
 
-        _copy_if_different(original_filepath, new_filepath)
-
-        filepaths.append(new_filepath)
+        if original_extension == '.png':
+            copies.append((original_filepath, new_filename))
+            continue
 
-    # Move the background images into the source directory
-    catalog['background_filename'] = None
-    catalog['background_idx'] = None
-    orig_bg_filenames = catalog[['original_background_filename', 'original_background_extension']].drop_duplicates()
-    for idx, (original_filename, original_extension) in enumerate(orig_bg_filenames.values):
-        if original_filename is None:
+        entry = manifest.entries.get(new_filename)
+        new_filepath = os.path.join(destination_dir, new_filename)
+        if (
+                entry is not None and os.path.exists(new_filepath) and
+                entry.get('original_path') == original_filepath and
+                entry.get('original_mtime') == os.path.getmtime(original_filepath)):
+            logging.info(f'skipping conversion of unchanged {original_filepath}')
             continue
 
-        original_filepath = os.path.join(source_dir, original_filename)
+        conversions.append((original_filepath, os.path.join(temp_dir, new_filename), new_filename))
 
-        new_filename = background_filename_template.format(idx=idx, extension='.png')
-        new_filepath = os.path.join(destination_dir, new_filename)
+    with ProcessPoolExecutor(max_workers=num_processes) as executor:
+        futures = [
+            executor.submit(_convert_image, original_filepath, converted_filepath)
+            for original_filepath, converted_filepath, _ in conversions]
+        for future in futures:
+            future.result()
+
+    converted = {}
+    for original_filepath, converted_filepath, new_filename in conversions:
+        copies.append((converted_filepath, new_filename))
+        converted[new_filename] = original_filepath
 
-        if original_extension != '.png':
-            copy_from_filepath = os.path.join(temp_dir, new_filename)
-            PIL.Image.open(original_filepath).save(copy_from_filepath)
+    def sync(copy):
+        source_filepath, new_filename = copy
+        new_filepath = os.path.join(destination_dir, new_filename)
+        return _sync_file(source_filepath, new_filepath, manifest.entries.get(new_filename))
 
-        else:
-            copy_from_filepath = original_filepath
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        entries = list(executor.map(sync, copies))
 
-        catalog.loc[catalog['original_background_filename'] == original_filename, 'background_idx'] = idx
-        catalog.loc[catalog['original_background_filename'] == original_filename, 'background_filename'] = new_filename
+    for (source_filepath, new_filename), entry in zip(copies, entries):
+        if new_filename in converted:
+            original_filepath = converted[new_filename]
+            entry = dict(entry, original_path=original_filepath, original_mtime=os.path.getmtime(original_filepath))
+        manifest.entries[new_filename] = entry
 
-        _copy_if_different(copy_from_filepath, new_filepath)
+    manifest.save()
 
-        filepaths.append(new_filepath)
+    # List of filepaths of newly created files
+    filepaths = [os.path.join(destination_dir, a) for a in catalog['filename']]
+    filepaths.extend([os.path.join(destination_dir, a) for a in orig_bg_filenames['background_filename']])
 
     # Save the catalog
     catalog_filepath = os.path.join(destination_dir, 'catalog.csv')
@@ -283,22 +388,16 @@ def catalog_images(library_id, source_dir, destination_dir, temp_dir):
 
     metadata['meta']['cell_images'] = {}
     metadata['meta']['cell_images']['template'] = cell_filename_template
-    metadata['meta']['cell_images']['instances'] = []
-    for idx, row in catalog.iterrows():
-        metadata['meta']['cell_images']['instances'].append({
-            'row': row['chip_row'],
-            'column': row['chip_column'],
-            'library_id': row['library_id'],
-        })
+    metadata['meta']['cell_images']['instances'] = [
+        {'row': row, 'column': column, 'library_id': library_id}
+        for row, column in zip(
+            catalog['chip_row'].astype(int).tolist(),
+            catalog['chip_column'].astype(int).tolist())]
 
     metadata['meta']['background'] = {}
     metadata['meta']['background']['template'] = background_filename_template
-    metadata['meta']['background']['instances'] = []
-    for idx, row in catalog[['background_idx']].dropna().drop_duplicates().iterrows():
-        background_idx = int(row['background_idx'])
-        metadata['meta']['background']['instances'].append({
-            'idx': background_idx,
-        })
+    metadata['meta']['background']['instances'] = [
+        {'idx': idx} for idx in orig_bg_filenames['background_idx'].tolist()]
 
     metadata_filepath = os.path.join(destination_dir, 'metadata.yaml')
     with open(metadata_filepath, 'w') as meta_yaml:
@@ -504,12 +603,19 @@ def add_cellenone_data(
 @click.argument('library_id')
 @click.argument('source_dir')
 @click.argument('destination_dir')
+@click.option('--num_threads', type=int, default=8)
+@click.option('--num_processes', type=int, default=4)
 def catalog_cellenone_data(
         library_id,
         source_dir,
-        destination_dir):
+        destination_dir,
+        num_threads=8,
+        num_processes=4):
 
-    catalog_images(library_id, source_dir, destination_dir)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        catalog_images(
+            library_id, source_dir, destination_dir, temp_dir,
+            num_threads=num_threads, num_processes=num_processes)
 
 
 @cli.command()
@@ -21,7 +21,7 @@ def check_indices(library_id=None):
     for library_id in library_ids:
 
         # Get colossus sublibrary indices
-        sublibraries = colossus_api.list('sublibraries', library__pool_id=library_id)
+        sublibraries = colossus_api.get_sublibrary_index(library_id).sublibraries
         colossus_indices = set([a['primer_i7'] + '-' + a['primer_i5'] for a in sublibraries])
 
         datasets = tantalus_api.list(
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import logging
+import socket
+import sys
+import click
+import pandas as pd
+
+from datamanagement.utils import decompression
+from datamanagement.utils.remote_transfer import RemoteFiles
+from datamanagement.utils.constants import LOGGING_FORMAT
+from dbclients.tantalus import TantalusApi
+from dbclients import basicclient
+
+# Set up the root logger
+logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
+
+
+@click.command()
+@click.argument("sources_filename")
+@click.argument("to_storage_name")
+@click.option("--from_gsc", is_flag=True)
+@click.option("--executor", type=click.Choice(decompression.EXECUTORS), default="local")
+@click.option("--num_fetch", type=int, default=2, help="Concurrent source transfers")
+@click.option("--num_decompress", type=int, default=2, help="Concurrent decompressions")
+@click.option("--threads", type=int, help="Threads per decompression, defaults to the cores split between decompressions")
+@click.option("--skip_register", is_flag=True, help="Do not add the bams to Tantalus")
+def main(**kwargs):
+    """
+    Decompresses a batch of crams or specs to bams, creates bam indexes and
+    adds the bams and indexes to Tantalus
+
+    Args:
+        sources_filename:   (string) csv with columns source_path, output_bam_path,
+                            library_id and reference_genome
+        to_storage_name:    (string) name of the destination storage for the bams
+        from_gsc:           (flag) the sources are on the GSC
+    """
+    tantalus_api = TantalusApi()
+
+    sources = pd.read_csv(kwargs["sources_filename"], dtype=str).to_dict("records")
+
+    if kwargs["from_gsc"] and socket.gethostname() != "txshah":
+        remote_files = RemoteFiles("10.9.208.161", pool_size=kwargs["num_fetch"], rsync_host="thost:")
+    else:
+        remote_files = RemoteFiles()
+
+    remote_files.prefetch([a["source_path"] for a in sources])
+    missing = [a["source_path"] for a in sources if not remote_files.exists(a["source_path"])]
+    if missing:
+        raise Exception("sources do not exist: {}".format(", ".join(missing)))
+
+    try:
+        storage = tantalus_api.get_storage(kwargs["to_storage_name"])
+    except basicclient.NotFoundError:
+        raise Exception("Storage name {} not found on Tantalus. Please use a valid storage".format(kwargs["to_storage_name"]))
+
+    decompression.batch_create_bams(
+        tantalus_api,
+        sources,
+        storage,
+        remote_files=remote_files if remote_files.is_remote else None,
+        executor=kwargs["executor"],
+        num_fetch=kwargs["num_fetch"],
+        num_decompress=kwargs["num_decompress"],
+        threads=kwargs["threads"],
+        register=not kwargs["skip_register"],
+    )
+
+    remote_files.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ from datamanagement.fixups.add_fastq_metadata import add_fastq_metadata_yaml
 from datamanagement.utils.runtime_args import parse_runtime_args
 from datamanagement.utils.filecopy import rsync_file
 from datamanagement.utils.utils import make_dirs
+from datamanagement.utils.fastq_index import FastqIndex, generate_bcl2fastq_filename
 from datamanagement.utils.qsub_job_submission import submit_qsub_job
 from datamanagement.utils.qsub_jobs import Bcl2FastqJob
 from datamanagement.utils.comment_jira import comment_jira
@@ -147,34 +148,29 @@ def _update_info(info, key, value):
         info[key] = value
 
 
-def check_fastqs(library_id, fastq_file_info, threshold):
-    logging.info("Checking if BCL2FASTQ generated complete set of fastqs.")
-
-    # Get indices from colossus
-    colossus_samples = query_colossus_dlp_cell_info(library_id)
-    colossus_index_sequences = set(sample["index_sequence"] for sample in colossus_samples.values())
-
-    # Get indices from given fastqs
-    fastq_index_sequences = set([fastq["index_sequence"] for fastq in fastq_file_info])
-    index_sequences = fastq_index_sequences
+def check_fastqs(library_id, fastq_index, cell_info, threshold):
+    """ Find lanes bcl2fastq skipped for each cell of a library.
 
-    if len(colossus_index_sequences - fastq_index_sequences) != 0:
-        logging.info("BCL2FASTQ skipped indices {}".format(colossus_index_sequences - fastq_index_sequences))
-        index_sequences = colossus_index_sequences
+    Args:
+        library_id (str): dlp library id
+        fastq_index (FastqIndex): index of the bcl2fastq output
+        cell_info (dict): colossus cell info keyed by (row, column)
+        threshold (int): maximum number of empty fastqs allowed
 
-    fastqs_to_be_generated = dict()
+    Returns:
+        dict: missing lane numbers keyed by (row, column)
+    """
+    logging.info("Checking if BCL2FASTQ generated complete set of fastqs.")
 
-    for index in index_sequences:
-        fastqs_containing_index = [fastq for fastq in fastq_file_info if fastq["index_sequence"] == index]
-        fastq_lane_numbers_to_be_generated = set(range(1, 3))
-        for fastq in fastqs_containing_index:
-            sequence_lane = fastq["sequence_lanes"][0]
-            lane_number = sequence_lane["lane_number"]
-            fastq_lane_numbers_to_be_generated = fastq_lane_numbers_to_be_generated - set([lane_number])
+    fastqs_to_be_generated = fastq_index.get_missing_lanes(library_id, cell_info.keys())
 
-        fastqs_to_be_generated[index] = list(fastq_lane_numbers_to_be_generated)
+    skipped_index_sequences = [
+        cell_info[cell]["index_sequence"] for cell in cell_info
+        if len(fastq_index.get_cell_lanes(library_id, *cell)) == 0]
+    if len(skipped_index_sequences) != 0:
+        logging.info("BCL2FASTQ skipped indices {}".format(set(skipped_index_sequences)))
 
-    number_of_fastqs_to_generate = sum(len(fastqs_to_be_generated[index]) for index in fastqs_to_be_generated)
+    number_of_fastqs_to_generate = sum(len(lanes) for lanes in fastqs_to_be_generated.values())
     if number_of_fastqs_to_generate > threshold:
         raise Exception("Number of empty fastqs to be generated ({}) exceeded threshold ({})".format(
             number_of_fastqs_to_generate, threshold))
@@ -182,33 +178,16 @@ def check_fastqs(library_id, fastq_file_info, threshold):
     return fastqs_to_be_generated
 
 
-def generate_empty_fastqs(output_dir, library_id, fastqs_to_be_generated):
-    sublibraries = get_colossus_sublibraries_from_library_id(library_id)
-
-    index_sequence_map = {}
-    file_names = []
+def generate_empty_fastqs(output_dir, library_id, fastqs_to_be_generated, cell_info):
     reads = [1, 2]
+    file_names = []
 
-    for sublibrary in sublibraries:
-        index_sequence = sublibrary["primer_i7"] + "-" + sublibrary["primer_i5"]
-        sample_id = sublibrary["sample_id"]["sample_id"]
-        index_sequence_map[index_sequence] = {
-            "sample_id": sample_id,
-            "row": sublibrary["row"],
-            "column": sublibrary["column"]
-        }
-
-    for fastq_index in fastqs_to_be_generated.keys():
-        row = index_sequence_map[fastq_index]["row"]
-        column = index_sequence_map[fastq_index]["column"]
-        sample_id = index_sequence_map[fastq_index]["sample_id"]
+    for (row, column), lane_numbers in fastqs_to_be_generated.items():
+        sample_id = cell_info[row, column]["sample_id"]
 
-        samplename = "-".join([sample_id, library_id, "R{}".format(row), "C{}".format(column)])
-        for lane_num in fastqs_to_be_generated[fastq_index]:
+        for lane_num in lane_numbers:
             for read in reads:
-                # Fastq name example: SA992-A90632-R54-C54_S317_L004_R1_001.fastq.gz
-                filename = "_".join([samplename, "S0", "L00{}".format(lane_num), "R{}".format(read), "001.fastq.gz"])
-                file_names.append(filename)
+                file_names.append(generate_bcl2fastq_filename(sample_id, library_id, row, column, lane_num, read))
 
     for filename in file_names:
         filepath = os.path.join(output_dir, filename)
@@ -223,129 +202,97 @@ def generate_empty_fastqs(output_dir, library_id, fastqs_to_be_generated):
 def get_fastq_info(output_dir, flowcell_id, storage, storage_client, threshold):
     """ Retrieve fastq filenames and metadata from output directory.
     """
-    filenames = os.listdir(output_dir)
-
-    # Filter for gzipped fastq files
-    extension = ".gz"
-    filenames = filter(lambda x: ".fastq{}".format(extension) in x, filenames)
-
-    # Remove undetermined fastqs
-    filenames = filter(lambda x: "Undetermined" not in x, filenames)
-
-    # Check that the path actually has fastq files
-    if not filenames:
-        raise Exception("no fastq files in output directory {}".format(output_dir))
+    fastq_index = FastqIndex.from_directory(output_dir)
 
     # Cell info keyed by dlp library id
     cell_info = {}
+    for library_id in fastq_index.library_ids:
+        cell_info[library_id] = query_colossus_dlp_cell_info(library_id)
 
-    # Fastq filenames and info keyed by fastq id, read end
-    fastq_file_info = []
+    # Run through index of fastqs and check if bcl2fastqs skipped over indices or skipped lanes/reads
+    for library_id in fastq_index.library_ids:
+        fastqs_to_be_generated = check_fastqs(library_id, fastq_index, cell_info[library_id], threshold)
+        number_of_fastqs_to_generate = sum(len(lanes) for lanes in fastqs_to_be_generated.values())
 
-    fastq_file_info = transfer_fastq_files(
-        cell_info,
-        flowcell_id,
-        fastq_file_info,
-        filenames,
-        output_dir,
-        storage,
-        storage_client,
-    )
-    library_id = fastq_file_info[0]["library_id"] # TODO: Maybe make library_id an argument
+        if number_of_fastqs_to_generate != 0:
+            logging.info("BCL2FASTQ failed to generate complete set of fastqs. Generating missing fastqs.")
+            new_filenames = generate_empty_fastqs(output_dir, library_id, fastqs_to_be_generated, cell_info[library_id])
 
-    # Run through list of fastqs and check if bcl2fastqs skipped over indices or skipped lanes/reads
-    fastqs_to_be_generated = check_fastqs(library_id, fastq_file_info, threshold)
-    number_of_fastqs_to_generate = sum(len(fastqs_to_be_generated[index]) for index in fastqs_to_be_generated)
+            for filename in new_filenames:
+                fastq_index.add(filename)
 
-    if number_of_fastqs_to_generate != 0:
-        logging.info("BCL2FASTQ failed to generate complete set of fastqs. Generating missing fastqs.")
-        new_filenames = generate_empty_fastqs(output_dir, library_id, fastqs_to_be_generated)
+    transfers = plan_fastq_transfers(fastq_index, cell_info, flowcell_id, output_dir, storage)
 
-        new_fastq_file_info = transfer_fastq_files(
-            cell_info,
-            flowcell_id,
-            fastq_file_info,
-            new_filenames,
-            output_dir,
-            storage,
-            storage_client,
-        )
-        return new_fastq_file_info
+    return transfer_fastq_files(transfers, storage, storage_client)
 
-    return fastq_file_info
 
+def plan_fastq_transfers(fastq_index, cell_info, flowcell_id, output_dir, storage, extension=".gz"):
+    """ Map each indexed fastq to its tantalus destination and file info.
 
-def transfer_fastq_files(cell_info, flowcell_id, fastq_file_info, filenames, output_dir, storage, storage_client):
-    extension = ".gz"
-    logging.info("Transferrings fastq to {}.".format(storage["name"]))
-    for filename in filenames:
-        match = re.match(
-            r"^(\w+)-(\w+)-R(\d+)-C(\d+)_S(\d+)(_L(\d+))?_R([12])_001.fastq.gz$",
-            filename,
-        )
-
-        if match is None:
-            raise Exception("unrecognized fastq filename structure for {}".format(filename))
-
-        filename_fields = match.groups()
-
-        primary_sample_id = filename_fields[0]
-        library_id = filename_fields[1]
-        row = int(filename_fields[2])
-        column = int(filename_fields[3])
-        lane_number = filename_fields[6]
-        if lane_number is not None:
-            lane_number = int(lane_number)
-        read_end = int(filename_fields[7])
-
-        if library_id not in cell_info:
-            cell_info[library_id] = query_colossus_dlp_cell_info(library_id)
+    Returns:
+        list of (fastq_path, tantalus_filename, fastq_info)
+    """
+    transfers = []
 
-        index_sequence = cell_info[library_id][row, column]["index_sequence"]
-        cell_sample_id = cell_info[library_id][row, column]["sample_id"]
+    for entry in fastq_index:
+        cell = cell_info[entry.library_id][entry.row, entry.column]
+        index_sequence = cell["index_sequence"]
+        cell_sample_id = cell["sample_id"]
 
-        fastq_path = os.path.join(output_dir, filename)
+        fastq_path = os.path.join(output_dir, entry.filename)
 
         tantalus_filename = templates.SC_WGS_FQ_TEMPLATE.format(
-            dlp_library_id=library_id,
+            dlp_library_id=entry.library_id,
             flowcell_id=flowcell_id,
-            lane_number=lane_number,
+            lane_number=entry.lane_number,
             cell_sample_id=cell_sample_id,
             index_sequence=index_sequence,
-            read_end=read_end,
+            read_end=entry.read_end,
             extension=extension,
         )
 
         tantalus_path = os.path.join(storage["prefix"], tantalus_filename)
 
+        fastq_info = dict(
+            dataset_type="FQ",
+            sample_id=cell_sample_id,
+            library_id=entry.library_id,
+            library_type=BRC_LIBRARY_TYPE,
+            index_format=BRC_INDEX_FORMAT,
+            sequence_lanes=[
+                dict(
+                    flowcell_id=flowcell_id,
+                    lane_number=entry.lane_number,
+                    sequencing_centre=BRC_SEQ_CENTRE,
+                    sequencing_instrument=BRC_INSTRUMENT,
+                    read_type=BRC_READ_TYPE,
+                )
+            ],
+            file_type="FQ",
+            read_end=entry.read_end,
+            index_sequence=index_sequence,
+            compression="GZIP",
+            filepath=tantalus_path,
+        )
+
+        transfers.append((fastq_path, tantalus_filename, fastq_info))
+
+    return transfers
+
+
+def transfer_fastq_files(transfers, storage, storage_client):
+    logging.info("Transferrings fastq to {}.".format(storage["name"]))
+
+    fastq_file_info = []
+
+    for fastq_path, tantalus_filename, fastq_info in transfers:
         if storage['storage_type'] == 'server':
-            rsync_file(fastq_path, tantalus_path)
+            rsync_file(fastq_path, fastq_info["filepath"])
 
         elif storage['storage_type'] == 'blob':
             storage_client.create(tantalus_filename, fastq_path)
 
-        fastq_file_info.append(
-            dict(
-                dataset_type="FQ",
-                sample_id=cell_sample_id,
-                library_id=library_id,
-                library_type=BRC_LIBRARY_TYPE,
-                index_format=BRC_INDEX_FORMAT,
-                sequence_lanes=[
-                    dict(
-                        flowcell_id=flowcell_id,
-                        lane_number=lane_number,
-                        sequencing_centre=BRC_SEQ_CENTRE,
-                        sequencing_instrument=BRC_INSTRUMENT,
-                        read_type=BRC_READ_TYPE,
-                    )
-                ],
-                file_type="FQ",
-                read_end=read_end,
-                index_sequence=index_sequence,
-                compression="GZIP",
-                filepath=tantalus_path,
-            ))
+        fastq_file_info.append(fastq_info)
 
     return fastq_file_info
 
@@ -1,4 +1,3 @@
-import yaml
 import os
 import json
 import click
@@ -11,6 +10,7 @@ from dbclients.colossus import ColossusApi
 from workflows import generate_inputs
 import dbclients.tantalus
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import pandas as pd 
 
 DATASET_TYPE = 'dlpfastqs'
@@ -151,7 +151,7 @@ def add_fastq_metadata_yaml(dataset_id, storage_name, dry_run=False):
     metadata_filepath = tantalus_api.get_filepath(storage_name, metadata_filename)
 
     metadata_io = io.BytesIO()
-    metadata_io.write(yaml.dump(metadata, default_flow_style=False).encode())
+    metadata_io.write(yaml_utils.safe_dump(metadata).encode())
 
     logging.info(f'writing metadata to file {metadata_filepath}')
     client.write_data(metadata_filename, metadata_io)
@@ -1,12 +1,15 @@
+import os
 import sys
-import yaml
 import io
 import logging
+import threading
 import click
+from concurrent.futures import ThreadPoolExecutor
 
 import dbclients.tantalus
 import dbclients.basicclient
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 
 
 analysis_dir_templates = {
@@ -55,7 +58,7 @@ analysis_dir_templates = {
 }
 
 
-def get_pseudobulk_info(tantalus_api, results, analysis):
+def get_pseudobulk_info(tantalus_api, results, analysis, datasets=None):
     info = {}
     info['normal_sample'] = {}
     info['normal_sample']['sample_id'] = analysis['args']['matched_normal_sample']
@@ -64,7 +67,10 @@ def get_pseudobulk_info(tantalus_api, results, analysis):
     results_samples = [s['sample_id'] for s in results['samples']]
     results_libraries = [s['library_id'] for s in results['libraries']]
     for dataset_id in analysis['input_datasets']:
-        dataset = tantalus_api.get('sequencedataset', id=dataset_id)
+        if datasets is not None:
+            dataset = datasets[dataset_id]
+        else:
+            dataset = tantalus_api.get('sequencedataset', id=dataset_id)
         if dataset['sample']['sample_id'] not in results_samples:
             continue
         if dataset['library']['library_id'] not in results_libraries:
@@ -80,11 +86,193 @@ def get_pseudobulk_info(tantalus_api, results, analysis):
     return info
 
 
+def get_analysis_dir(results, analysis, filenames):
+    """ Find the analysis directory template that all results files are under.
+    """
+    for template in analysis_dir_templates[results['results_type'], results['results_version']]:
+        analysis_dir = template.format(ticket_id=analysis['jira_ticket'])
+
+        startswith_check = True
+        for filename in filenames:
+            if not filename.startswith(analysis_dir):
+                logging.info((results['results_type'], results['results_version'], analysis_dir))
+                logging.warning(f'filename {filename} doesnt start with {analysis_dir}')
+                startswith_check = False
+
+        if startswith_check:
+            return analysis_dir
+
+    raise ValueError(f'no suitable analysis dir templates')
+
+
+def create_manifest(tantalus_api, results, analysis, rel_filenames, datasets=None):
+    manifest = {}
+    if results['results_type'] in ('align', 'hmmcopy', 'annotation'):
+        assert len(results['samples']) >= 1
+        assert len(results['libraries']) == 1
+        manifest['meta'] = {}
+        manifest['meta']['type'] = results['results_type']
+        manifest['meta']['version'] = results['results_version']
+        manifest['meta']['sample_ids'] = [a['sample_id'] for a in results['samples']]
+        manifest['meta']['library_id'] = results['libraries'][0]['library_id']
+        manifest['filenames'] = rel_filenames
+
+    elif results['results_type'] == 'pseudobulk':
+        assert len(results['samples']) >= 1
+        assert len(results['libraries']) >= 1
+        manifest['meta'] = {}
+        manifest['meta']['type'] = results['results_type']
+        manifest['meta']['version'] = results['results_version']
+        manifest['meta'].update(get_pseudobulk_info(tantalus_api, results, analysis, datasets=datasets))
+        manifest['filenames'] = rel_filenames
+
+    return manifest
+
+
+class Checkpoint(object):
+    """ Ids of completed results, appended to a file as they complete.
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.completed = set()
+        self._lock = threading.Lock()
+
+        if filename is not None and os.path.exists(filename):
+            with open(filename) as f:
+                self.completed = set(int(line) for line in f if line.strip())
+
+    def add(self, results_id):
+        with self._lock:
+            self.completed.add(results_id)
+            if self.filename is not None:
+                with open(self.filename, 'a') as f:
+                    f.write(f'{results_id}\n')
+
+
+def add_results_manifest(tantalus_api, client, results, analysis, file_resources, existing_manifests, datasets=None, update=False):
+    """ Write and register the manifest for one results dataset.
+
+    Returns:
+        True if a manifest was written, False if it already existed
+    """
+    filenames = [f['filename'] for f in file_resources]
+
+    analysis_dir = get_analysis_dir(results, analysis, filenames)
+
+    rel_filenames = []
+    for filename in filenames:
+        assert filename.startswith(analysis_dir)
+        rel_filenames.append(filename[len(analysis_dir):])
+
+    manifest_filename = analysis_dir + 'metadata.yaml'
+    manifest_filepath = tantalus_api.get_filepath('singlecellresults', manifest_filename)
+
+    if manifest_filename in existing_manifests and not update:
+        logging.info(f'manifest {manifest_filename} exists')
+        return False
+
+    manifest = create_manifest(tantalus_api, results, analysis, rel_filenames, datasets=datasets)
+
+    manifest_io = io.BytesIO()
+    manifest_io.write(yaml_utils.safe_dump(manifest).encode())
+
+    client.write_data(manifest_filename, manifest_io)
+
+    file_resource, file_instance = tantalus_api.add_file('singlecellresults', manifest_filepath, update=True)
+
+    new_file_resources = set(results['file_resources'])
+    new_file_resources.add(file_resource['id'])
+
+    tantalus_api.update('results', id=results['id'], file_resources=list(new_file_resources))
+
+    return True
+
+
+def backfill_manifests(
+        tantalus_api, client, results_list, existing_manifests,
+        update=False, num_workers=8, chunk_size=500, checkpoint=None):
+    """ Add manifests for many results.
+
+    Analyses, file resources and pseudobulk input datasets are fetched in
+    bulk a chunk of results at a time, then manifests are written and
+    registered by a pool of workers.
+
+    Args:
+        tantalus_api (TantalusApi)
+        client: storage client for singlecellresults
+        results_list (list): results records
+        existing_manifests (set): manifest blob names already on the storage
+
+    KwArgs:
+        update (bool): rewrite existing manifests
+        num_workers (int): concurrent manifest uploads
+        chunk_size (int): results fetched and processed together
+        checkpoint (Checkpoint): completed results, skipped and extended
+
+    Returns:
+        list of (results, exception) for results whose manifest failed,
+        a failure is logged and does not stop the backfill
+    """
+    if checkpoint is None:
+        checkpoint = Checkpoint()
+
+    results_list = [a for a in results_list if a['id'] not in checkpoint.completed]
+
+    failures = []
+    failures_lock = threading.Lock()
+
+    def process(results, analyses, file_resources, datasets):
+        try:
+            add_results_manifest(
+                tantalus_api, client, results,
+                analyses[results['analysis']],
+                [file_resources[a] for a in results['file_resources']],
+                existing_manifests,
+                datasets=datasets,
+                update=update,
+            )
+            checkpoint.add(results['id'])
+
+        except KeyboardInterrupt:
+            raise
+
+        except Exception as e:
+            logging.exception(f'failed for {results["id"]}, {results["results_type"]}, {results["results_version"]}')
+            with failures_lock:
+                failures.append((results, e))
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for start in range(0, len(results_list), chunk_size):
+            chunk = results_list[start:start + chunk_size]
+
+            analyses = tantalus_api.list_by_ids('analysis', [a['analysis'] for a in chunk])
+            file_resources = tantalus_api.list_by_ids('file_resource', [b for a in chunk for b in a['file_resources']])
+
+            dataset_ids = set()
+            for results in chunk:
+                if results['results_type'] == 'pseudobulk' and results['analysis'] in analyses:
+                    dataset_ids.update(analyses[results['analysis']]['input_datasets'])
+            datasets = tantalus_api.list_by_ids('sequencedataset', dataset_ids)
+
+            list(executor.map(lambda results: process(results, analyses, file_resources, datasets), chunk))
+
+            logging.info(f'processed {start + len(chunk)} of {len(results_list)} results')
+
+    if failures:
+        logging.error(f'failed for {len(failures)} of {len(results_list)} results:')
+        for results, error in failures:
+            logging.error(f'  {results["id"]} {results["name"]}: {error!r}')
+
+    return failures
+
+
 @click.command()
 @click.option('--jira_ticket')
 @click.option('--results_type')
 @click.option('--update', is_flag=True)
-def add_manifest(jira_ticket=None, results_type=None, update=False):
+@click.option('--num_workers', type=int, default=8)
+@click.option('--checkpoint_file', help='File of completed results ids, resumed from if it exists')
+def add_manifest(jira_ticket=None, results_type=None, update=False, num_workers=8, checkpoint_file=None):
     logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
 
     logger = logging.getLogger("azure.storage")
@@ -96,91 +284,40 @@ def add_manifest(jira_ticket=None, results_type=None, update=False):
 
     if jira_ticket is not None:
         results_iter = tantalus_api.list('results', analysis__jira_ticket=jira_ticket)
+        manifest_prefix = jira_ticket + '/'
 
     else:
         results_iter = tantalus_api.list('results')
+        manifest_prefix = ''
 
+    results_list = []
     for results in results_iter:
         if results_type is not None and results['results_type'] != results_type:
             logging.warning(f'skipping results of type {results["results_type"]}')
+            continue
 
-        try:
-            if (results['results_type'], results['results_version']) not in analysis_dir_templates:
-                logging.warning(f'unsupported {results["results_type"]}, {results["results_version"]}')
-                continue
-
-            if results['analysis'] is None:
-                logging.warning(f'no analysis {results["results_type"]}, {results["results_version"]}')
-                continue
-
-            analysis = tantalus_api.get('analysis', id=results['analysis'])
-
-            file_resources = tantalus_api.get_dataset_file_resources(
-                results['id'], 'resultsdataset')
-            filenames = [f['filename'] for f in file_resources]
-
-            for template in analysis_dir_templates[results['results_type'], results['results_version']]:
-                analysis_dir = template.format(ticket_id=analysis['jira_ticket'])
-
-                startswith_check = True
-                for filename in filenames:
-                    if not filename.startswith(analysis_dir):
-                        logging.info((results['results_type'], results['results_version'], analysis_dir))
-                        logging.warning(f'filename {filename} doesnt start with {analysis_dir}')
-                        startswith_check = False
-
-                if startswith_check:
-                    break
-
-            if not startswith_check:
-                raise ValueError(f'no suitable analysis dir templates')
-
-            rel_filenames = []
-            for filename in filenames:
-                assert filename.startswith(analysis_dir)
-                rel_filenames.append(filename[len(analysis_dir):])
-
-            manifest_filename = analysis_dir + 'metadata.yaml'
-            manifest_filepath = tantalus_api.get_filepath('singlecellresults', manifest_filename)
-
-            if client.exists(manifest_filename) and not update:
-                logging.info(f'manifest {manifest_filename} exists')
-                continue
-
-            manifest = {}
-            if results['results_type'] in ('align', 'hmmcopy', 'annotation'):
-                assert len(results['samples']) >= 1
-                assert len(results['libraries']) == 1
-                manifest['meta'] = {}
-                manifest['meta']['type'] = results['results_type']
-                manifest['meta']['version'] = results['results_version']
-                manifest['meta']['sample_ids'] = [a['sample_id'] for a in results['samples']]
-                manifest['meta']['library_id'] = results['libraries'][0]['library_id']
-                manifest['filenames'] = rel_filenames
-
-            elif results['results_type'] == 'pseudobulk':
-                assert len(results['samples']) >= 1
-                assert len(results['libraries']) >= 1
-                manifest['meta'] = {}
-                manifest['meta']['type'] = results['results_type']
-                manifest['meta']['version'] = results['results_version']
-                manifest['meta'].update(get_pseudobulk_info(tantalus_api, results, analysis))
-                manifest['filenames'] = rel_filenames
-
-            manifest_io = io.BytesIO()
-            manifest_io.write(yaml.dump(manifest, default_flow_style=False).encode())
+        if (results['results_type'], results['results_version']) not in analysis_dir_templates:
+            logging.warning(f'unsupported {results["results_type"]}, {results["results_version"]}')
+            continue
 
-            client.write_data(manifest_filename, manifest_io)
+        if results['analysis'] is None:
+            logging.warning(f'no analysis {results["results_type"]}, {results["results_version"]}')
+            continue
 
-            file_resource, file_instance = tantalus_api.add_file('singlecellresults', manifest_filepath, update=True)
+        results_list.append(results)
 
-            new_file_resources = set(results['file_resources'])
-            new_file_resources.add(file_resource['id'])
+    # One listing of the storage in place of an exists check per results
+    existing_manifests = set(a for a in client.list(manifest_prefix) if a.endswith('metadata.yaml'))
 
-            tantalus_api.update('results', id=results['id'], file_resources=list(new_file_resources))
+    failures = backfill_manifests(
+        tantalus_api, client, results_list, existing_manifests,
+        update=update,
+        num_workers=num_workers,
+        checkpoint=Checkpoint(checkpoint_file),
+    )
 
-        except (ValueError, AssertionError, KeyError, dbclients.basicclient.FieldMismatchError):
-            logging.exception(f'failed for {results["id"]}, {results["results_type"]}, {results["results_version"]}')
+    if failures:
+        sys.exit(1)
 
 
 if __name__ == '__main__':
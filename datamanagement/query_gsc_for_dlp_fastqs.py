@@ -25,7 +25,10 @@ from datamanagement.utils.dlp import create_sequence_dataset_models, fastq_paire
 from datamanagement.utils.comment_jira import comment_jira
 import datamanagement.templates as templates
 from datamanagement.utils.filecopy import rsync_file, try_gzip
-from datamanagement.utils.gsc import get_sequencing_instrument, GSCAPI
+from datamanagement.utils.gsc import get_sequencing_instrument, get_gsc_api
+from datamanagement.utils import import_ledger
+from datamanagement.utils.import_ledger import ImportLedger, default_ledger_filename
+from datamanagement.utils.import_ledger import DEFAULT_CHECK_INTERVAL, DEFAULT_MAX_INTERVAL
 from datamanagement.utils.runtime_args import parse_runtime_args
 from datamanagement.fixups.add_fastq_metadata import add_fastq_metadata_yaml
 
@@ -59,6 +62,9 @@ import requests
 import json
 url = "https://monitors.molonc.ca/api/1/flags/"
 
+# name of this importer in the import ledger
+LEDGER_IMPORTER = 'gsc_dlp'
+
 
 COLOSSUS_BASE_URL = get_colossus_base_url()
 
@@ -185,6 +191,12 @@ def map_flowcell_to_fastq_info(gsc_api, gsc_library_id, gsc_fastq_infos, externa
 
     #controls = ['SA1015', 'SA039']
 
+    # Prefetch flowcell info concurrently, queries in the loop below are
+    # then served from the response cache
+    gsc_api.batch_query(sorted(set(
+        "flowcell?id={}".format(fastq_info['libcore']['run']['flowcell_id'])
+        for fastq_info in gsc_fastq_infos)))
+
     for fastq_info in gsc_fastq_infos:
         print(len(data_path))
         # check if cell condition start with GSC as we do not have permission to these
@@ -292,7 +304,7 @@ def get_data_from_GSC(gsc_library_id, dlp_library_id, external_identifier, colos
     validate_mode(mode)
 
     if(mode == 'production'):
-        gsc_api = GSCAPI()
+        gsc_api = get_gsc_api()
         gsc_fastq_infos = gsc_api.query(f"concat_fastq?parent_library={gsc_library_id}")
         gsc_library_infos = gsc_api.query(f"library?external_identifier={external_identifier}")
         if not gsc_library_infos:
@@ -532,7 +544,7 @@ def import_gsc_dlp_paired_fastqs(
     '''
 
     # Get Jira ticket and GSC sequencing id associated with the library in order to comment about import status
-    gsc_api = GSCAPI()
+    gsc_api = get_gsc_api()
     dlp_library_id = sequencing["library"]
     gsc_library_id = sequencing["gsc_library_id"]
     library_info = colossus_api.query_libraries_by_library_id(dlp_library_id)
@@ -1009,6 +1021,12 @@ def create_tickets_and_analyses(import_info):
 @click.option('--update', is_flag=True)
 #@click.option('--check_colossus_gsc_library_id', is_flag=True)
 @click.option('--dry_run', is_flag=True)
+@click.option('--ledger', 'ledger_filename', default=default_ledger_filename, help='Import ledger file')
+@click.option('--ignore_ledger', is_flag=True, help='Check all sequencings expecting lanes, not only those due')
+@click.option('--check_interval', type=float, default=DEFAULT_CHECK_INTERVAL / 3600,
+              help='Hours before rechecking a sequencing that had new data')
+@click.option('--max_interval', type=float, default=DEFAULT_MAX_INTERVAL / 3600,
+              help='Longest backoff in hours between checks of a sequencing')
 def main(storage_name,
          dlp_library_id=None,
          internal_id=None,
@@ -1016,7 +1034,11 @@ def main(storage_name,
          all=False,
          update=False,
          check_library=False,
-         dry_run=False):
+         dry_run=False,
+         ledger_filename=None,
+         ignore_ledger=False,
+         check_interval=DEFAULT_CHECK_INTERVAL / 3600,
+         max_interval=DEFAULT_MAX_INTERVAL / 3600):
 
     # Set up the root logger
     logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
@@ -1032,6 +1054,14 @@ def main(storage_name,
     storage = tantalus_api.get("storage", name=storage_name)
     sequencing_list = list()
 
+    # checks of dry runs are not recorded
+    ledger = ImportLedger(
+        ledger_filename or default_ledger_filename(),
+        check_interval=check_interval * 3600,
+        max_interval=max_interval * 3600,
+    )
+    record = not dry_run and not check_library
+
     if dry_run:
         logging.info("This is a dry run. No lanes will be imported.")
 
@@ -1046,6 +1076,10 @@ def main(storage_name,
         sequencing_list = list(
             filter(lambda s: s['number_of_lanes_requested'] != len(s['dlplane_set']), sequencing_list))
 
+        # only check sequencings changed since or due after their last check
+        if not ignore_ledger:
+            sequencing_list = ledger.due(LEDGER_IMPORTER, sequencing_list)
+
         payload = json.dumps({
             "sFlagName": "list_sequencings_colossus_new_lanes",
             "sProcess": "list_finish",
@@ -1075,6 +1109,10 @@ def main(storage_name,
 
             # check if no import information exists, if so, library does not exist on GSC
             if import_info is None:
+                if record:
+                    ledger.record_check(
+                        LEDGER_IMPORTER, sequencing, import_ledger.NO_DATA,
+                        name=sequencing["library"], error="Doesn't exist on GSC")
                 lane_requested_date = sequencing["lane_requested_date"]
                 failed_libs.append(
                     dict(
@@ -1087,6 +1125,10 @@ def main(storage_name,
 
             # check if library excluded from import
             elif import_info is False:
+                if record:
+                    ledger.record_check(
+                        LEDGER_IMPORTER, sequencing, import_ledger.NO_DATA,
+                        name=sequencing["library"], error="Excluded from import")
                 continue
 
             # update lanes in sequencing
@@ -1110,7 +1152,19 @@ def main(storage_name,
             # create jira ticket and analyses with new lanes and datasets
             create_tickets_and_analyses(import_info)
 
+            if record:
+                new_lanes = [
+                    (sequencing["library"], "{}_{}".format(lane["flowcell_id"], lane["lane_number"]))
+                    for lane in import_info["lanes"] if lane["new"]]
+                ledger.record_lanes(LEDGER_IMPORTER, sequencing["id"], new_lanes, import_ledger.COMPLETE)
+                state = import_ledger.IMPORTED if new_lanes else import_ledger.NO_DATA
+                ledger.record_check(LEDGER_IMPORTER, sequencing, state, name=sequencing["library"])
+
         except Exception as e:
+            if record:
+                ledger.record_check(
+                    LEDGER_IMPORTER, sequencing, import_ledger.FAILED, name=sequencing["library"], error=str(e))
+
             # add lane_requested_date to import info for import status report
             lane_requested_date = sequencing["lane_requested_date"]
             updated_sequencing = colossus_api.get("sequencing", id=sequencing["id"])
@@ -12,20 +12,24 @@ import logging
 import datetime
 import subprocess
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-from jira import JIRA
 from jira.exceptions import JIRAError
+from dbclients.jira_client import get_jira_client
 
 from datamanagement.templates import (TENX_FASTQ_BLOB_TEMPLATE, TENX_SCRNA_DATASET_TEMPLATE)
 
 from datamanagement.utils.constants import LOGGING_FORMAT
 from datamanagement.utils.utils import get_lanes_hash
 from datamanagement.add_generic_dataset import add_generic_dataset
-from datamanagement.utils.gsc import get_sequencing_instrument, GSCAPI
+from datamanagement.utils.gsc import get_sequencing_instrument, get_gsc_api
+from datamanagement.utils import import_ledger
+from datamanagement.utils.import_ledger import ImportLedger, default_ledger_filename
+from datamanagement.utils.import_ledger import DEFAULT_CHECK_INTERVAL, DEFAULT_MAX_INTERVAL
 
 from dbclients.tantalus import TantalusApi
 from dbclients.colossus import ColossusApi
-from dbclients.basicclient import FieldMismatchError, NotFoundError
+from dbclients.basicclient import FieldMismatchError, NotFoundError, LazyClient
 
 from datamanagement.utils.comment_jira import comment_jira
 
@@ -45,14 +49,13 @@ validate_mode(settings.mode)
 
 COLOSSUS_BASE_URL = get_colossus_base_url()
 
-gsc_api = GSCAPI()
-tantalus_api = TantalusApi()
-colossus_api = ColossusApi()
+gsc_api = LazyClient(get_gsc_api)
+tantalus_api = LazyClient(TantalusApi)
+colossus_api = LazyClient(ColossusApi)
 logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
 
-JIRA_USER = os.environ['JIRA_USERNAME']
-JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+JIRA_USER = os.environ.get('JIRA_USERNAME')
+jira_api = get_jira_client()
 
 filename_pattern_map = {
     "*_1_*.raw.fastq.gz": (1, True),
@@ -66,25 +69,17 @@ sequencing_instrument_map = {
     'HiSeq2500': 'H2500',
     'NextSeq550': 'NextSeq550',
 }
-storage_client = tantalus_api.get_storage_client("scrna_fastq")
-
 TAXONOMY_MAP = {
     '9606': 'HG38',
     '10090': 'MM10',
 }
 
-def upload_to_azure(storage_client, blobname, filepath, update=False):
-    if(storage_client.exists(blobname)):
-        if(storage_client.get_size(blobname) == os.path.getsize(filepath)):
-            logging.info(f"{blobname} already exists and is the same size. Skipping...")
-
-            return
-        else:
-            if not(update):
-                message = f"{blobname} has different size from {filepath}. Please specify --update option to overwrite."
-                logging.error(message)
-                raise ValueError(message)
+# name of this importer in the import ledger
+LEDGER_IMPORTER = 'gsc_tenx'
 
+def upload_to_azure(storage_client, blobname, filepath, update=False):
+    # create skips a blob of the same size and raises for a different size
+    # unless update is set, with a single properties request
     storage_client.create(
         blobname,
         filepath,
@@ -123,8 +118,7 @@ def create_analysis_jira_ticket(library_id, sample, library_ticket, reference_ge
     '''
 
     JIRA_USER = os.environ['JIRA_USERNAME']
-    JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-    jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+    jira_api = get_jira_client()
 
     issue = jira_api.issue(library_ticket)
 
@@ -162,170 +156,187 @@ def create_analysis_jira_ticket(library_id, sample, library_ticket, reference_ge
     return analysis_jira_ticket
 
 
-def import_tenx_fastqs(
-    storage_name,
-    sequencing,
-    taxonomy_id=None,
-    ignore_existing=False,
-    skip_jira=False,
-    no_comments=False,
-    update=False,
-    ):
-    storage_client = tantalus_api.get_storage_client(storage_name)
-
-    # get colossus sequencing id
-    sequencing_id = sequencing["id"]
-    # get pool id from sequencing
-    pool_id = sequencing["tenx_pool"]
-    # get colossus tenx pool object
-    pool = colossus_api.get("tenxpool", id=pool_id)
-    # get pool name
-    pool_name = pool['pool_name']
-
-    # get gsc id (this may not have been filled out)
-    gsc_pool_id = sequencing["gsc_library_id"]
-    # query gsc by gsc pool id
-    gsc_pool_infos = gsc_api.query(f"library?name={gsc_pool_id}")
-
-    # check if not results returned
-    if not gsc_pool_id:
-        # query gsc by our indentifier instead i.e. colossus pool name
-        gsc_pool_infos = gsc_api.query(f"library?external_identifier={pool_name}")
-        if gsc_pool_infos:
-            # get name used internally at gsc
-            gsc_pool_id = gsc_pool_infos[0]["name"]
-
-    # try to fetch for gsc pool info again
-    gsc_pool = gsc_api.query(f"library?name={gsc_pool_id}")
-
-    # if no results found for a second time, exit
-    if not gsc_pool:
-        logging.info(f"cannot find data for {pool_name}, {gsc_pool_id}")
-        return None
-
-    # get id of gsc pool
-    pool_id = gsc_pool[0]["id"]
+def plan_pool_import(run_info, index_lib, storage_prefix, ignore_existing=False, num_workers=8):
+    '''
+    Plan the import of all sequencing runs of a pool.
 
-    # get information about sequecing run
-    run_info = gsc_api.query(f"run?library_id={pool_id}")
+    Libcores of all runs, their flowcells and their fastqs are fetched
+    concurrently, each flowcell once, and lanes are compared against one
+    snapshot of the existing lanes of each library.
 
-    logging.info(f"Importing {pool_name} ")
+    Args:
+        run_info (list): gsc runs of the pool
+        index_lib (dict): library info keyed by index
+        storage_prefix (str): prefix of the destination storage
 
-    # init dictionary to be used for collecting library index pairs
-    index_lib = dict()
+    KwArgs:
+        ignore_existing (bool): plan lanes already in tantalus
+        num_workers (int): concurrent tantalus lane snapshots
 
-    pool_libraries = []
+    Returns:
+        plan: list of runs, each with the lanes to import and the fastqs of each lane
+    '''
 
-    # for each library in the pool, collect the sample and index of the library
-    for library in pool["libraries"]:
-        # get colossus tenx library
-        tenxlib = colossus_api.get("tenxlibrary", id=library)
-        library = tenxlib['name']
+    run_ids = [run["id"] for run in run_info]
+    libraries = sorted(set(info["library"] for info in index_lib.values()))
 
-        pool_libraries.append(library)
-        # get sample name
-        sample = tenxlib["sample"]["sample_id"]
-        # get index name
-        index_used = tenxlib["tenxlibraryconstructioninformation"]["index_used"]
-        # index always ends with comma, so remove comma from name
-        index = index_used.split(",")[0]
-        print(f"{tenxlib['name']} {tenxlib['sample']['sample_id']} {index}")
-        # add info keyed by index
-        index_lib[index] = dict(tenxlib=tenxlib, library=tenxlib['name'], sample=tenxlib['sample']['sample_id'])
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # snapshot existing lanes while querying the gsc
+        if ignore_existing:
+            existing_futures = {}
+        else:
+            existing_futures = {
+                library: executor.submit(get_existing_fastq_data, tantalus_api, library)
+                for library in libraries}
 
-    # iterate through all sequencing runs of this pool
-    for run in run_info:
-        run_id = run["id"]
-        # get all libcores of run
         # in the case of tenx, a libcore represents a colossus tenxlibrary
-        libcore = gsc_api.query(f"libcore?run_id={run_id}&relations=primer%2Crun%2Clibrary&primer_columns=name")
+        run_libcores = gsc_api.batch_query([
+            f"libcore?run_id={run_id}&relations=primer%2Crun%2Clibrary&primer_columns=name"
+            for run_id in run_ids])
 
-        gsc_sublibraries = []
-        dataset_ids = []
+        # duplicate flowcell queries are only requested once
+        flowcell_ids = [lib["run"]["flowcell_id"] for libcore in run_libcores for lib in libcore]
+        flowcells = dict(zip(flowcell_ids, gsc_api.batch_query([f"flowcell?id={a}" for a in flowcell_ids])))
+
+        existing_data = {library: set() for library in libraries}
+        for library, future in existing_futures.items():
+            existing_data[library] = future.result()
 
+    plan = []
+    for run_id, libcore in zip(run_ids, run_libcores):
         # skip run if no libcores found
         if not libcore:
-            logging.info(f"no libcore")
+            logging.info(f"no libcore for run {run_id}")
             continue
 
+        lanes = []
         for lib in libcore:
-            lanes = []
-            lane_pks = []
-
-            filenames = []
-
             index = lib["primer"]["name"]
-            flowcell_id = lib["run"]["flowcell_id"]
-            flowcell = gsc_api.query(f"flowcell?id={flowcell_id}")
 
             # check if the libcore is associated with a library in the pool
-            try:
-                tenxlib = index_lib[index]["tenxlib"]
-                library = index_lib[index]["library"]
-                sample = index_lib[index]["sample"]
-            except Exception as e:
-                logging.error(f"Index not found: {e}")
-                raise Exception(f"Index not found: {e}")
+            if index not in index_lib:
+                logging.error(f"Index not found: {index}")
+                raise Exception(f"Index not found: {index}")
+
+            library = index_lib[index]["library"]
 
             # collect sequencing info
-            flowcell_id = str(flowcell[0]['lims_flowcell_code'])
+            flowcell_id = str(flowcells[lib["run"]["flowcell_id"]][0]['lims_flowcell_code'])
             lane_number = str(lib['run']['lane_number'])
-            sequencing_date = str(lib["run"]["run_datetime"])
-            # format sequencing date to be compatible with Colossus?
-            #sequencing_date = sequencing_date.split('T')[0]
+            flowcell_lane = f"{flowcell_id}_{lane_number}"
+
+            if flowcell_lane in existing_data[library]:
+                logging.info(f"skipping {flowcell_lane} of {library} since already imported")
+                continue
+            existing_data[library].add(flowcell_lane)
+
             sequencing_instrument = get_sequencing_instrument(lib["run"]["machine"])
-            sequencing_instrument = sequencing_instrument_map[sequencing_instrument]
 
-            flowcell_lane = f"{flowcell_id}_{lane_number}"
-            # get existing data
-            if not (ignore_existing):
-                existing_data = get_existing_fastq_data(tantalus_api, library)
-                if flowcell_lane in existing_data:
-                    logging.info(f"skipping {flowcell_lane} since already imported")
-                    continue
+            lanes.append(dict(
+                libcore_id=lib["id"],
+                tenxlib=index_lib[index]["tenxlib"],
+                library=library,
+                sample=index_lib[index]["sample"],
+                gsc_library_id=lib["library"]["name"],
+                flowcell_id=flowcell_id,
+                lane_number=lane_number,
+                flowcell_lane=flowcell_lane,
+                sequencing_date=str(lib["run"]["run_datetime"]),
+                sequencing_instrument=sequencing_instrument_map[sequencing_instrument],
+            ))
+
+        if lanes:
+            plan.append(dict(run_id=run_id, lanes=lanes))
+
+    planned_lanes = [lane for run in plan for lane in run["lanes"]]
+    lane_fastqs = gsc_api.batch_query([f"concat_fastq?libcore_id={lane['libcore_id']}" for lane in planned_lanes])
+
+    for lane, fastqs in zip(planned_lanes, lane_fastqs):
+        lane["fastqs"] = []
+
+        for fastq in fastqs:
+            filename_pattern = fastq["file_type"]["filename_pattern"]
+
+            read_end, passed = filename_pattern_map.get(filename_pattern, (None, None))
+
+            if read_end is None:
+                logging.info("Unrecognized file type: {}".format(filename_pattern))
+                continue
+
+            # construct fastq name
+            new_filename = "_".join([
+                lane["library"], lane["sample"], "S1", f"L00{lane['lane_number']}", f"R{read_end}", "001.fastq.gz"])
+            blobname = os.path.join(lane["library"], lane["flowcell_lane"], new_filename)
+
+            lane["fastqs"].append(dict(
+                data_path=fastq["data_path"],
+                blobname=blobname,
+                filepath=os.path.join(storage_prefix, blobname),
+            ))
+
+    return plan
+
+
+def log_import_plan(pool_name, plan):
+    num_lanes = sum(len(run["lanes"]) for run in plan)
+    logging.info(f"Import plan for {pool_name}: {num_lanes} lanes in {len(plan)} runs")
+
+    for run in plan:
+        for lane in run["lanes"]:
+            logging.info(f"run {run['run_id']}: {lane['library']} {lane['flowcell_lane']}, {len(lane['fastqs'])} fastqs")
+
+
+def execute_import_plan(plan, storage_client, sequencing_id, taxonomy_id=None, skip_jira=False, update=False, ledger=None):
+    '''
+    Upload and register the lanes of an import plan.
+
+    Args:
+        plan (list): runs from plan_pool_import
+        storage_client: client of the destination storage
+        sequencing_id (int): colossus tenxsequencing id
+
+    KwArgs:
+        ledger (ImportLedger): records each lane as complete once imported
+    '''
+
+    for run in plan:
+        gsc_sublibraries = []
+        dataset_ids = []
+
+        for planned_lane in run["lanes"]:
+            tenxlib = planned_lane["tenxlib"]
+            library = planned_lane["library"]
+            sample = planned_lane["sample"]
+            flowcell_id = planned_lane["flowcell_id"]
+            lane_number = planned_lane["lane_number"]
+            flowcell_lane = planned_lane["flowcell_lane"]
 
             # get internal gsc library name
-            gsc_library_id = lib["library"]["name"]
+            gsc_library_id = planned_lane["gsc_library_id"]
             print(f"internal GSC id is {gsc_library_id}")
             # update library's gsc name
             colossus_api.update("tenxlibrary", id=tenxlib["id"], gsc_library_id=gsc_library_id)
 
             gsc_sublibraries.append(gsc_library_id)
 
-            # query for fastqs of the library
-            fastqs = gsc_api.query(f"concat_fastq?libcore_id={lib['id']}")
-            #print(fastqs)
-
-            for fastq in fastqs:
-                filename_pattern = fastq["file_type"]["filename_pattern"]
-
-                read_end, passed = filename_pattern_map.get(filename_pattern, (None, None))
-
-                if read_end is None:
-                    logging.info("Unrecognized file type: {}".format(filename_pattern))
-                    continue
-
-                # construct fastq name
-                new_filename = "_".join([library, sample, "S1", f"L00{lane_number}", f"R{read_end}", "001.fastq.gz"])
-                fullpath = os.path.join(storage_client.prefix, library, flowcell_lane, new_filename)
-                filenames.append(fullpath)
+            # if no files were found move onto next library
+            if not planned_lane["fastqs"]:
+                print(f"no data for run_id: {run['run_id']}; lane {flowcell_lane}")
+                continue
 
+            filenames = []
+            for fastq in planned_lane["fastqs"]:
                 # add fastq to cloud storage
                 upload_to_azure(
                     storage_client=storage_client,
-                    blobname=os.path.join(library, flowcell_lane, new_filename),
+                    blobname=fastq["blobname"],
                     filepath=fastq["data_path"],
                     update=update,
                 )
-
-            # if no files were found move onto next library
-            if not filenames:
-                print(f"no data for run_id: {run_id}; lane {flowcell_id}_{lane_number}")
-                continue
+                filenames.append(fastq["filepath"])
 
             # collect and add lane info
-            lane = dict(flowcell_id=flowcell_id, lane_number=str(lane_number))
-            lanes.append(lane)
+            lanes = [dict(flowcell_id=flowcell_id, lane_number=lane_number)]
 
             # create tantalus library
             dna_library = tantalus_api.get_or_create(
@@ -339,7 +350,7 @@ def import_tenx_fastqs(
                 lane_object = tantalus_api.get(
                     "sequencing_lane",
                     flowcell_id=flowcell_id,
-                    lane_number=str(lane_number),
+                    lane_number=lane_number,
                     dna_library=dna_library["id"],
                 )
 
@@ -347,7 +358,7 @@ def import_tenx_fastqs(
                     "sequencing_lane",
                     id=lane_object["id"],
                     sequencing_centre="GSC",
-                    sequencing_instrument=sequencing_instrument,
+                    sequencing_instrument=planned_lane["sequencing_instrument"],
                     read_type="TENX",
                 )
 
@@ -356,9 +367,9 @@ def import_tenx_fastqs(
                     "sequencing_lane",
                     fields=dict(
                         flowcell_id=flowcell_id,
-                        lane_number=str(lane_number),
+                        lane_number=lane_number,
                         sequencing_centre="GSC",
-                        sequencing_instrument=sequencing_instrument,
+                        sequencing_instrument=planned_lane["sequencing_instrument"],
                         read_type="TENX",
                         dna_library=dna_library["id"],
                     ),
@@ -371,8 +382,6 @@ def import_tenx_fastqs(
                     get_existing=True,
                 )
 
-            lane_pks.append(lane_object["id"])
-
             dataset_name = TENX_SCRNA_DATASET_TEMPLATE.format(
                 dataset_type="FQ",
                 sample_id=sample,
@@ -387,7 +396,7 @@ def import_tenx_fastqs(
                 storage_name="scrna_fastq",
                 dataset_name=dataset_name,
                 dataset_type="FQ",
-                sequence_lane_pks=lane_pks,
+                sequence_lane_pks=[lane_object["id"]],
                 reference_genome='HG38',
                 update=True,
             )
@@ -435,12 +444,16 @@ def import_tenx_fastqs(
                     taxonomy_id=taxonomy_id,
                 )
 
+            if ledger is not None:
+                ledger.record_lanes(LEDGER_IMPORTER, sequencing_id, [(library, flowcell_lane)], import_ledger.COMPLETE)
+
         # check if data has been imported
-        if filenames:
+        if dataset_ids:
+            last_lane = run["lanes"][-1]
             # add lanes to colossus
             colossus_lane = colossus_api.get_or_create(
                 "tenxlane",
-                flow_cell_id=flowcell_lane,
+                flow_cell_id=last_lane["flowcell_lane"],
                 sequencing=sequencing_id,
             )
             # update lane with gsc id and date
@@ -449,21 +462,125 @@ def import_tenx_fastqs(
                 id=colossus_lane["id"],
                 tantalus_datasets=list(set(dataset_ids)),
                 gsc_sublibrary_names=gsc_sublibraries,
-                sequencing_date=sequencing_date,
+                sequencing_date=last_lane["sequencing_date"],
             )
 
-    # check if gsc id hasn't been added correctly
-    if sequencing["gsc_library_id"] != gsc_pool_id:
-        logging.info("Updating gsc library id of sequencing {} from {} to {}".format(
-            sequencing["id"], sequencing["gsc_library_id"], gsc_pool_id))
-        colossus_api.update("tenxsequencing", sequencing["id"], gsc_library_id=gsc_pool_id)
 
-    logging.info("Succesfully imported {} {}".format(pool_name, gsc_pool_id))
+def import_tenx_fastqs(
+    storage_name,
+    sequencing,
+    taxonomy_id=None,
+    ignore_existing=False,
+    skip_jira=False,
+    no_comments=False,
+    update=False,
+    num_workers=8,
+    plan_only=False,
+    ledger=None,
+    ):
+    storage_client = tantalus_api.get_storage_client(storage_name)
+
+    # get colossus sequencing id
+    sequencing_id = sequencing["id"]
+    # get pool id from sequencing
+    pool_id = sequencing["tenx_pool"]
+    # get colossus tenx pool object
+    pool = colossus_api.get("tenxpool", id=pool_id)
+    # get pool name
+    pool_name = pool['pool_name']
+
+    # get gsc id (this may not have been filled out)
+    gsc_pool_id = sequencing["gsc_library_id"]
+    # query gsc by gsc pool id
+    gsc_pool_infos = gsc_api.query(f"library?name={gsc_pool_id}")
+
+    # check if not results returned
+    if not gsc_pool_id:
+        # query gsc by our indentifier instead i.e. colossus pool name
+        gsc_pool_infos = gsc_api.query(f"library?external_identifier={pool_name}")
+        if gsc_pool_infos:
+            # get name used internally at gsc
+            gsc_pool_id = gsc_pool_infos[0]["name"]
+
+    # try to fetch for gsc pool info again
+    gsc_pool = gsc_api.query(f"library?name={gsc_pool_id}")
+
+    # if no results found for a second time, exit
+    if not gsc_pool:
+        logging.info(f"cannot find data for {pool_name}, {gsc_pool_id}")
+        return None
+
+    # get id of gsc pool
+    pool_id = gsc_pool[0]["id"]
+
+    # get information about sequecing run
+    run_info = gsc_api.query(f"run?library_id={pool_id}")
+
+    logging.info(f"Importing {pool_name} ")
+
+    # init dictionary to be used for collecting library index pairs
+    index_lib = dict()
+
+    pool_libraries = []
+
+    # for each library in the pool, collect the sample and index of the library
+    for library in pool["libraries"]:
+        # get colossus tenx library
+        tenxlib = colossus_api.get("tenxlibrary", id=library)
+        library = tenxlib['name']
+
+        pool_libraries.append(library)
+        # get sample name
+        sample = tenxlib["sample"]["sample_id"]
+        # get index name
+        index_used = tenxlib["tenxlibraryconstructioninformation"]["index_used"]
+        # index always ends with comma, so remove comma from name
+        index = index_used.split(",")[0]
+        print(f"{tenxlib['name']} {tenxlib['sample']['sample_id']} {index}")
+        # add info keyed by index
+        index_lib[index] = dict(tenxlib=tenxlib, library=tenxlib['name'], sample=tenxlib['sample']['sample_id'])
+
+    plan = plan_pool_import(
+        run_info,
+        index_lib,
+        storage_client.prefix,
+        ignore_existing=ignore_existing,
+        num_workers=num_workers,
+    )
+    log_import_plan(pool_name, plan)
+
+    planned_lanes = [(lane["library"], lane["flowcell_lane"]) for run in plan for lane in run["lanes"] if lane["fastqs"]]
+
+    if plan_only:
+        logging.info("Planned import of {} {}".format(pool_name, gsc_pool_id))
+
+    else:
+        if ledger is not None:
+            ledger.record_lanes(LEDGER_IMPORTER, sequencing_id, planned_lanes, import_ledger.PENDING)
+
+        execute_import_plan(
+            plan,
+            storage_client,
+            sequencing_id,
+            taxonomy_id=taxonomy_id,
+            skip_jira=skip_jira,
+            update=update,
+            ledger=ledger,
+        )
+
+        # check if gsc id hasn't been added correctly
+        if sequencing["gsc_library_id"] != gsc_pool_id:
+            logging.info("Updating gsc library id of sequencing {} from {} to {}".format(
+                sequencing["id"], sequencing["gsc_library_id"], gsc_pool_id))
+            colossus_api.update("tenxsequencing", sequencing["id"], gsc_library_id=gsc_pool_id)
+
+        logging.info("Succesfully imported {} {}".format(pool_name, gsc_pool_id))
 
     import_info = dict(
         pool_name=pool_name,
         libraries=pool_libraries,
         gsc_library_id=gsc_pool_id,
+        lanes=planned_lanes,
     )
 
     return import_info
@@ -514,6 +631,14 @@ def write_import_log(successful_pools, failed_pools):
 @click.option('--all', is_flag=True)
 @click.option('--no_comments', is_flag=True)
 @click.option('--update', is_flag=True)
+@click.option('--num_workers', type=int, default=8, help='Concurrent GSC and Tantalus queries while planning')
+@click.option('--plan_only', is_flag=True, help='Log the import plan without importing')
+@click.option('--ledger', 'ledger_filename', default=default_ledger_filename, help='Import ledger file')
+@click.option('--ignore_ledger', is_flag=True, help='Check all sequencings expecting lanes, not only those due')
+@click.option('--check_interval', type=float, default=DEFAULT_CHECK_INTERVAL / 3600,
+              help='Hours before rechecking a sequencing that had new data')
+@click.option('--max_interval', type=float, default=DEFAULT_MAX_INTERVAL / 3600,
+              help='Longest backoff in hours between checks of a sequencing')
 def main(
     storage_name,
     pool_id=None,
@@ -523,10 +648,22 @@ def main(
     all=False,
     no_comments=False,
     update=False,
+    num_workers=8,
+    plan_only=False,
+    ledger_filename=None,
+    ignore_ledger=False,
+    check_interval=DEFAULT_CHECK_INTERVAL / 3600,
+    max_interval=DEFAULT_MAX_INTERVAL / 3600,
     ):
     successful_pools = []
     failed_pools = []
 
+    ledger = ImportLedger(
+        ledger_filename or default_ledger_filename(),
+        check_interval=check_interval * 3600,
+        max_interval=max_interval * 3600,
+    )
+
     # make sure it is a valid taxonomy ID
     if taxonomy_id is not None:
         # As of 2021, only two reference genomes for TenX libraries
@@ -551,11 +688,17 @@ def main(
         sequencing_list = list(
             filter(lambda s: s['number_of_lanes_requested'] > len(s['tenxlane_set']), sequencing_list))
 
+        # only check sequencings changed since or due after their last check
+        if not ignore_ledger:
+            sequencing_list = ledger.due(LEDGER_IMPORTER, sequencing_list)
+
     for sequencing in sequencing_list:
         # skip sequencing is no pool attached
         if sequencing["tenx_pool"] is None:
             continue
 
+        pool_name = "TENXPOOL{}".format(str(sequencing["tenx_pool"]).zfill(4))
+
         try:
             import_info = import_tenx_fastqs(
                 storage_name,
@@ -565,35 +708,49 @@ def main(
                 skip_jira=skip_jira,
                 no_comments=no_comments,
                 update=update,
+                num_workers=num_workers,
+                plan_only=plan_only,
+                ledger=None if plan_only else ledger,
             )
 
             # check if information does not exists on gsc
             if import_info is None:
+                if not plan_only:
+                    ledger.record_check(
+                        LEDGER_IMPORTER, sequencing, import_ledger.NO_DATA, name=pool_name, error="Doesn't exist on GSC")
                 lane_requested_date = sequencing["lane_requested_date"]
                 failed_pools.append(
                     dict(
-                        pool_name="TENXPOOL{}".format(str(sequencing["tenx_pool"]).zfill(4)),
+                        pool_name=pool_name,
                         lane_requested_date=sequencing["lane_requested_date"],
                         error="Doesn't exist on GSC",
                     ))
                 continue
 
+            if not plan_only:
+                state = import_ledger.IMPORTED if import_info["lanes"] else import_ledger.NO_DATA
+                ledger.record_check(LEDGER_IMPORTER, sequencing, state, name=pool_name)
+
             # add pool to successful import
             import_info["lane_requested_date"] = sequencing["lane_requested_date"]
             successful_pools.append(import_info)
 
         except Exception as e:
+            if not plan_only:
+                ledger.record_check(LEDGER_IMPORTER, sequencing, import_ledger.FAILED, name=pool_name, error=str(e))
+                ledger.fail_pending_lanes(LEDGER_IMPORTER, sequencing["id"], str(e))
             raise Exception(e)
             logging.error("Failed to import {}: {}".format(sequencing["tenx_pool"], str(e)))
             failed_pools.append(
                 dict(
-                    pool_name="TENXPOOL{}".format(str(sequencing["tenx_pool"]).zfill(4)),
+                    pool_name=pool_name,
                     lane_requested_date=sequencing["lane_requested_date"],
                     error=str(e),
                 ))
             continue
 
-    write_import_log(successful_pools, failed_pools)
+    if not plan_only:
+        write_import_log(successful_pools, failed_pools)
 
 
 if __name__ == "__main__":
@@ -10,19 +10,21 @@ import socket
 import logging
 import subprocess
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from datamanagement.utils.gsc import get_sequencing_instrument, GSCAPI
+from datamanagement.utils.gsc import get_sequencing_instrument, get_gsc_api
 from dbclients.tantalus import TantalusApi
+from dbclients.basicclient import LazyClient
 from datamanagement.utils.utils import (
         get_lanes_hash, make_dirs, 
         convert_time, 
         valid_date, 
         add_compression_suffix,
-        connect_to_client
     )
 from datamanagement.spec_to_bam import create_bam
 from datamanagement.cram_to_bam import create_bam as HelperCram
 from datamanagement.bam_import import import_bam
+from datamanagement.utils.remote_transfer import RemoteFiles
 
 from datamanagement.templates import (
         WGS_BAM_PATH_TEMPLATE,
@@ -37,74 +39,18 @@ from datamanagement.utils.constants import (
 )
 
 logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
-gsc_api = GSCAPI()
+gsc_api = LazyClient(get_gsc_api)
 
-def rsync_file(from_path, to_path, sftp=None, remote_host=None):
+def rsync_file(from_path, to_path, remote_files):
     """
     Rsyncs file and performs checks to ensure rsync was successful
 
     Args:
         from_path:      (string) source path of the file
         to_path:        (string) destination path of the file
-        sftp:           (sftp object) sftp client if rsync is performed remotely
-        remote_host:    (string) name of the remote host if rsync is remote
+        remote_files:   (RemoteFiles) source files, local or on the remote host
     """
-    # Prepend remote host shortcut to the source path
-    if remote_host:
-        transfer_from_path = remote_host + from_path
-    else:
-        transfer_from_path = from_path
-
-    # Create the rsync command
-    subprocess_cmd = [
-        "rsync",
-        "-avPL",
-        "--chmod=D555",
-        "--chmod=F444",
-        transfer_from_path,
-        to_path,
-    ]
-
-    # Copy the file if it doesn't exist
-    if not os.path.isfile(to_path):
-        make_dirs(os.path.dirname(to_path))
-        logging.info("Copying file from {} to {}".format(from_path, to_path))
-        subprocess.check_call(subprocess_cmd)
-    
-    # If the file exists and we are using sftp, check size
-    elif os.path.isfile(to_path) and sftp:
-        remote_file = sftp.stat(from_path)
-        if remote_file.st_size != os.path.getsize(to_path):
-            logging.info("The size of {} on the GSC does not match {} -- copying new file".format(
-                from_path, 
-                to_path,
-            ))
-            subprocess.check_call(subprocess_cmd)
-        else:
-            logging.info("The file already exists at {} -- skipping import".format(to_path))
-    
-    # If the file exists and we are not using sftp, check size
-    elif os.path.isfile(to_path) and not sftp:
-        if os.path.getsize(from_path) != os.path.getsize(to_path):
-            logging.info("The size of {} on the GSC does not match {} -- copying new file".format(
-                from_path,
-                to_path,
-            ))
-            subprocess.check_call(subprocess_cmd)
-        else:
-            logging.info("The file already exists at {} -- skipping import".format(to_path))
-
-    # Check the rsync was successful
-    if sftp:
-        try:
-            remote_file = sftp.stat(from_path)
-            if remote_file.st_size != os.path.getsize(to_path):
-                raise Exception("copy failed for {} to {}".format(from_path, to_path))
-        except IOError:
-            raise Exception("missing source file {}".format(from_path))
-    else:
-        if os.path.getsize(to_path) != os.path.getsize(from_path):
-            raise Exception("copy failed for {} to {}".format(from_path, to_path))
+    remote_files.rsync(from_path, to_path, extra_args=["--chmod=D555", "--chmod=F444"])
 
 
 def get_merge_bam_path(library_type, data_path, library_name, num_lanes, compression=None):
@@ -198,7 +144,7 @@ def get_tantalus_bam_filename(sample, library, lane_infos):
     return bam_path
 
 
-def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
+def transfer_gsc_bams(bam_detail, bam_paths, storage, remote_files):
     """
     Transfers the bams and bais from GSC to destination storage. If the source
     bam is a spec, performs spec to bam conversion and creates a bam index
@@ -210,14 +156,8 @@ def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
                     destination paths for the bam
         storage:    (string) the name of destination storage to which the 
                     bam and bai will be transferred
-        sftp:       (sftp object) the sftp client connected to remote host 
-                    if the script is not run on thost
+        remote_files: (RemoteFiles) source files, local or on the remote host
     """
-    if sftp:
-        remote_host = "thost:"
-    else:
-        remote_host = None
-
     # If the input is a spec, run spec2bam
     if bam_paths["source_bam_path"].endswith(".spec"):
         create_bam(
@@ -226,16 +166,16 @@ def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
             output_bam_path=bam_paths["tantalus_bam_path"],
             to_storage=storage,
             library_id=bam_detail["library"]["library_id"],
-            sftp_client=sftp
+            remote_files=remote_files if remote_files.is_remote else None,
         )
     elif bam_paths["source_bam_path"].endswith(".cram"):
-        HelperCram.create_bam(
+        HelperCram(
             cram_path=bam_paths["source_bam_path"],
             raw_reference_genome=bam_detail["reference_genome"],
             output_bam_path=bam_paths["tantalus_bam_path"],
             to_storage=storage,
             library_id=bam_detail["library"]["library_id"],
-            sftp_client=sftp
+            remote_files=remote_files if remote_files.is_remote else None,
         )
     # Otherwise, rsync to destination server
     else:
@@ -243,8 +183,7 @@ def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
         rsync_file(
             from_path=bam_paths["source_bam_path"],
             to_path=bam_paths["tantalus_bam_path"],
-            sftp=sftp,
-            remote_host=remote_host
+            remote_files=remote_files,
         )
         # Transfer the bam index if it exists
         if bam_paths["source_bai_path"]:
@@ -252,8 +191,7 @@ def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
             rsync_file(
                 from_path=bam_paths["source_bai_path"],
                 to_path=bam_paths["tantalus_bai_path"],
-                sftp=sftp,
-                remote_host=remote_host
+                remote_files=remote_files,
             )
         # Create a new bai if the source bai does not exist
         else:
@@ -267,52 +205,38 @@ def transfer_gsc_bams(bam_detail, bam_paths, storage, sftp=None):
             logging.info("Successfully created bam index at {}".format(bam_paths["tantalus_bai_path"]))
 
 
-def check_sftp_bam(bam_path, spec_path, sftp=None):
+def check_source_bam(bam_path, spec_path, remote_files):
     """
-    Checks if the bam exists over SFTP. If not, checks for a spec
+    Checks if the bam exists. If not, checks for a spec
     If neither exists, returns None
 
     Args:
         bam_path:   (string) filepath to where the source bam should be
         spec_path:  (string) filepath to where the source spec should be
-        sftp:       (sftp object) sftp client connected to the remote host
+        remote_files: (RemoteFiles) source files, local or on the remote host
 
     Returns:
         returns the filepath to either the source bam or the source spec
-    '"""
-    try:
-        sftp.stat(bam_path)
+    """
+    if remote_files.exists(bam_path):
         return bam_path
-    except IOError:
-        logging.error("The bam does not exist at {} -- checking for spec instead".format(bam_path))
-        
-    try:
-        sftp.stat(spec_path)
+    logging.error("The bam does not exist at {} -- checking for spec instead".format(bam_path))
+
+    if remote_files.exists(spec_path):
         return spec_path
-    except IOError:
-        logging.error("The spec does not exist at {} -- skipping import".format(spec_path))
-        return None
+    logging.error("The spec does not exist at {} -- skipping import".format(spec_path))
+    return None
 
 
-def rename_bam_paths(bam_detail, storage, sftp=None):
+def get_source_bam_paths(bam_detail):
     """
-    Creates full path for the source bam, source bai, destination bam, 
-    and destination bai
+    Candidate source bam and spec paths for the bam detail
 
     Args:
         bam_detail: (dict) metadata required to create the bam name and path
-        storage:    (dict) the destination storage for the bam and bai
-        sftp:       (sftp object) sftp client connected to the remote server
     Returns:
-        bam_paths:  (dict) contains the source and destination paths
+        bam_path, spec_path
     """
-    # Determine whether the path is to bam or spec
-    if bam_detail["data_path"].endswith(".spec"):
-        compression = "spec"
-    else:
-        compression = None
-
-    
     # Get merge bam path
     if bam_detail["info_type"] == "merge":
         bam_path = get_merge_bam_path(
@@ -347,29 +271,32 @@ def rename_bam_paths(bam_detail, storage, sftp=None):
                 compression="spec"
         )
 
+    return bam_path, spec_path
+
+
+def rename_bam_paths(bam_detail, storage, remote_files):
+    """
+    Creates full path for the source bam, source bai, destination bam, 
+    and destination bai
+
+    Args:
+        bam_detail: (dict) metadata required to create the bam name and path
+        storage:    (dict) the destination storage for the bam and bai
+        remote_files: (RemoteFiles) source files, local or on the remote host
+    Returns:
+        bam_paths:  (dict) contains the source and destination paths
+    """
+    bam_path, spec_path = get_source_bam_paths(bam_detail)
+
     # Create bai path 
     source_bai_path = bam_path + ".bai"
 
     # Check the source bam exists, and then transfer
-    if sftp:
-        source_bam_path = check_sftp_bam(bam_path, spec_path, sftp)
-    else:
-        if not os.path.exists(bam_path):
-            logging.error("The bam does not exist at {} -- checking for spec instead".format(bam_path))
-            if os.path.exists(spec_path):
-                source_bam_path = spec_path
-            else:
-                source_bam_path = None
+    source_bam_path = check_source_bam(bam_path, spec_path, remote_files)
 
     # Check if the source bai exists, if not then reindex
-    if sftp:
-        try:
-            sftp.stat(source_bai_path)
-        except IOError:
-            source_bai_path = None
-    else:
-        if not os.path.exists(source_bai_path):
-            source_bai_path = None
+    if not remote_files.exists(source_bai_path):
+        source_bai_path = None
 
     logging.info("Bam file exists at {}".format(source_bam_path))
 
@@ -420,6 +347,17 @@ def get_merge_info(details_list, gsc_api, library, sample, skip_older_than):
     """
     merge_infos = gsc_api.query("merge?library={}".format(library["library_id"]))
     merged_lanes = set()
+
+    # Prefetch the per lane queries concurrently, the loop below is then
+    # served from the response cache
+    lane_queries = []
+    for merge_info in merge_infos:
+        for merge_xref in merge_info["merge_xrefs"]:
+            if merge_xref["object_type"] == "metadata.aligned_libcore":
+                lane_queries.append("aligned_libcore/{}/info".format(merge_xref["object_id"]))
+            lane_queries.append("library?id={}".format(merge_xref["library_id"]))
+    gsc_api.batch_query(lane_queries)
+
     for merge_info in merge_infos:
         data_path = merge_info["data_path"]
         num_lanes = len(merge_info["merge_xrefs"])
@@ -668,6 +606,8 @@ def get_gsc_details(library_infos, skip_older_than):
 @click.option('--update', is_flag=True)
 @click.option('--skip_file_import', is_flag=True)
 @click.option('--query_only', is_flag=True)
+@click.option('--num_sessions', type=int, default=4, help='Persistent ssh sessions to the GSC')
+@click.option('--num_transfers', type=int, default=4, help='Concurrent bam transfers')
 def main(**kwargs):
     """
     Queries the GSC for WGS bams. Transfers bams to specified storage if 
@@ -688,10 +628,9 @@ def main(**kwargs):
     # Check if this script is being run on thost
     # If not, connect to an ssh client to access /projects/files
     if socket.gethostname() != "txshah":
-        ssh_client = connect_to_client("10.9.208.161")
-        sftp = ssh_client.open_sftp()
+        remote_files = RemoteFiles("10.9.208.161", pool_size=kwargs["num_sessions"], rsync_host="thost:")
     else:
-        sftp = None
+        remote_files = RemoteFiles()
 
     # Connect to the Tantalus API
     tantalus_api = TantalusApi()
@@ -721,62 +660,101 @@ def main(**kwargs):
                 skip_older_than=kwargs["skip_older_than"],
         )
 
-        # Import and transfer each file
+        # List the source directories of all candidate bams, bais and specs
+        # up front, existence checks are then answered from the listings
+        source_paths = []
         for detail in details:
-            # Rename the bams according to internal templates
-            bam_paths = rename_bam_paths(detail, storage, sftp)
+            bam_path, spec_path = get_source_bam_paths(detail)
+            source_paths.extend([bam_path, bam_path + ".bai", spec_path])
+        remote_files.prefetch(source_paths)
+
+        # Rename the bams according to internal templates, stopping at
+        # the first bam that does not exist at the source
+        details_bam_paths = []
+        for detail in details:
+            bam_paths = rename_bam_paths(detail, storage, remote_files)
 
             # If the bam path does not exist at the source, skip
             # the transfer and import
             if not bam_paths["source_bam_path"]:
                 break
 
-            # Skip import if we only wanted to query for paths
-            if kwargs["query_only"]:
-                continue
+            details_bam_paths.append((detail, bam_paths))
 
+        # Skip import if we only wanted to query for paths
+        if kwargs["query_only"]:
+            continue
+
+        # Transfer the bams to the specified storage concurrently, importing
+        # each into tantalus in order as its transfer completes
+        with ThreadPoolExecutor(max_workers=kwargs["num_transfers"]) as executor:
             if not kwargs["skip_file_import"]:
-                # Transfer the bam to the specified storage
-                transfer_gsc_bams(detail, bam_paths, storage, sftp)
-
-                # Add the files to Tantalus
-                logging.info("Importing {} to Tantalus".format(bam_paths["tantalus_bam_path"]))
-
-                dataset = import_bam(
-                    storage_name=storage["name"],
-                    bam_file_path=bam_paths["tantalus_bam_path"],
-                    sample=detail["sample"],
-                    library=detail["library"],
-                    lane_infos=detail["lane_info"],
-                    read_type=detail["read_type"],
-                    tag_name=kwargs["tag_name"],
-                    update=kwargs["update"]
-                )
-
-                logging.info("Successfully added sequence dataset with ID {}".format(dataset["id"]))
+                transfers = [
+                    executor.submit(transfer_gsc_bams, detail, bam_paths, storage, remote_files)
+                    for detail, bam_paths in details_bam_paths]
+
+                # A failed transfer cancels those not yet started
+                def cancel_remaining(transfer):
+                    if not transfer.cancelled() and transfer.exception() is not None:
+                        for a in transfers:
+                            a.cancel()
+
+                for transfer in transfers:
+                    transfer.add_done_callback(cancel_remaining)
             else:
-                logging.info("Importing library {} to tantalus".format(detail["library"]["library_id"]))
-                library_pk = tantalus_api.get_or_create(
-                    "dna_library",
-                    library_id=detail["library"]["library_id"],
-                    library_type=detail["library"]["library_type"],
-                    index_format=detail["library"]["index_format"]
-                )["id"]
-                
-                #Only add lanes, libraries, and samples to tantalus
-                logging.info("Importing lanes for library {} to tantalus".format(detail["library"]["library_id"]))
-                for lane in detail["lane_info"]:
-                    lane = tantalus_api.get_or_create(
-                        "sequencing_lane",
-                        flowcell_id=lane["flowcell_id"],
-                        dna_library=library_pk,
-                        read_type=lane["read_type"],
-                        lane_number=str(lane["lane_number"]),
-                        sequencing_centre="GSC",
-                        sequencing_instrument=lane["sequencing_instrument"]
-                    )
-                    logging.info("Successfully created lane {} in tantalus".format(lane["id"]))
-
+                transfers = [None for _ in details_bam_paths]
+
+            # On a failed import, cancel transfers not yet started rather
+            # than waiting for all of them when leaving the executor
+            try:
+                for (detail, bam_paths), transfer in zip(details_bam_paths, transfers):
+                    if not kwargs["skip_file_import"]:
+                        transfer.result()
+
+                        # Add the files to Tantalus
+                        logging.info("Importing {} to Tantalus".format(bam_paths["tantalus_bam_path"]))
+
+                        dataset = import_bam(
+                            storage_name=storage["name"],
+                            bam_file_path=bam_paths["tantalus_bam_path"],
+                            sample=detail["sample"],
+                            library=detail["library"],
+                            lane_infos=detail["lane_info"],
+                            read_type=detail["read_type"],
+                            tag_name=kwargs["tag_name"],
+                            update=kwargs["update"]
+                        )
+
+                        logging.info("Successfully added sequence dataset with ID {}".format(dataset["id"]))
+                    else:
+                        logging.info("Importing library {} to tantalus".format(detail["library"]["library_id"]))
+                        library_pk = tantalus_api.get_or_create(
+                            "dna_library",
+                            library_id=detail["library"]["library_id"],
+                            library_type=detail["library"]["library_type"],
+                            index_format=detail["library"]["index_format"]
+                        )["id"]
+                    
+                        #Only add lanes, libraries, and samples to tantalus
+                        logging.info("Importing lanes for library {} to tantalus".format(detail["library"]["library_id"]))
+                        for lane in detail["lane_info"]:
+                            lane = tantalus_api.get_or_create(
+                                "sequencing_lane",
+                                flowcell_id=lane["flowcell_id"],
+                                dna_library=library_pk,
+                                read_type=lane["read_type"],
+                                lane_number=str(lane["lane_number"]),
+                                sequencing_centre="GSC",
+                                sequencing_instrument=lane["sequencing_instrument"]
+                            )
+                            logging.info("Successfully created lane {} in tantalus".format(lane["id"]))
+            except BaseException:
+                for transfer in transfers:
+                    if transfer is not None:
+                        transfer.cancel()
+                raise
+
+    remote_files.close()
 
 
 if __name__=='__main__':
@@ -15,11 +15,12 @@ import socket
 import logging
 import paramiko
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 from Bio import SeqIO
-from jira import JIRA
 from jira.exceptions import JIRAError
+from dbclients.jira_client import get_jira_client
 
 from datamanagement.templates import (
     GSC_SCRNA_FASTQ_PATH_TEMPLATE,
@@ -27,17 +28,17 @@ from datamanagement.templates import (
     TENX_FASTQ_BLOB_TEMPLATE,
     TENX_SCRNA_DATASET_TEMPLATE
 )
-from datamanagement.utils.gsc import GSCAPI
+from datamanagement.utils.gsc import get_gsc_api
 from datamanagement.utils.constants import LOGGING_FORMAT
 from datamanagement.utils.utils import get_lanes_hash, connect_to_client
+from datamanagement.utils.remote_transfer import SFTPChannels, run_transfer_pipeline
 from dbclients.tantalus import TantalusApi
 from dbclients.colossus import ColossusApi
 from dbclients.basicclient import FieldMismatchError, NotFoundError
 
 
-JIRA_USERNAME = os.environ['JIRA_USERNAME']
-JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USERNAME, JIRA_PASSWORD))
+JIRA_USERNAME = os.environ.get('JIRA_USERNAME')
+jira_api = get_jira_client()
 tantalus_api = TantalusApi()
 colossus_api = ColossusApi()
 logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
@@ -270,7 +271,7 @@ def update_jira(blob_paths, jira_ticket):
         filepaths=output
     )
     try:
-        issue = jira_api.issue(jira_ticket)
+        issue = jira_api.issue(jira_ticket, fields=['summary'])
     except JIRAError:
         logging.error("The jira ticket {} does not exist. Skipping ticket update".format(jira_ticket))
         return
@@ -298,12 +299,35 @@ def upload_to_blob(blob_name, source_path, storage, storage_client):
     return blob_path
 
 
-def transfer_fastq(fastq_path_info, output_dir, storage, sequencing_centre, sftp_client=None):
+def fastq_source_size(source_path, sftp_client=None):
+    """
+    Size in bytes of a source FASTQ, local or on the remote server
+    """
+    if sftp_client:
+        return sftp_client.stat(source_path).st_size
+    return os.path.getsize(source_path)
+
+
+def transfer_fastq(
+        fastq_path_info,
+        output_dir,
+        storage,
+        sequencing_centre,
+        sftp_client=None,
+        num_fetch=4,
+        num_upload=4,
+        stream=False,
+        remove_tmp=False,
+    ):
     """
     Transfers FASTQ files from remote server to Azure storage. If the files are on a different
     machine than the local machine, the FASTQs are first transferred to the local and then 
     uploaded to Azure from the tmp directory
 
+    Fetches and uploads are pipelined, keeping num_fetch remote copies and num_upload
+    blob uploads in flight at once. FASTQs already on blob with the same size are skipped,
+    and rsync keeps partial files, so an interrupted transfer resumes where it stopped.
+
     Args:
         fastq_path_info:    (dataframe) holds source path, destination path, and fastq name
                             for each fastq for the library
@@ -311,6 +335,12 @@ def transfer_fastq(fastq_path_info, output_dir, storage, sequencing_centre, sftp
         storage_name:       (str) name of the azure storage in tantalus
         sftp_client:        (object) sftp client if the file is 
                             on a remote server
+        num_fetch:          (int) number of concurrent remote copies
+        num_upload:         (int) number of concurrent blob uploads
+        stream:             (bool) stream remote files directly into blob storage
+                            over sftp without a local copy
+        remove_tmp:         (bool) remove each tmp fastq once uploaded, bounding
+                            local scratch to num_fetch + num_upload files
 
     Returns:
         blob_paths: (list) list of all the blob names added to azure
@@ -322,28 +352,66 @@ def transfer_fastq(fastq_path_info, output_dir, storage, sequencing_centre, sftp
 
     storage_client = tantalus_api.get_storage_client(storage["name"])
 
-    blob_paths = []
-    for index, row in fastq_path_info.iterrows():
+    rows = [row for _, row in fastq_path_info.iterrows()]
+
+    def is_uploaded(row):
+        blob_name = row["fastq_dest_path"]
+        if not storage_client.exists(blob_name):
+            return False
+        return storage_client.get_size(blob_name) == fastq_source_size(row["fastq_source_path"], sftp_client)
+
+    if stream and sftp_client:
+        sftp_channels = SFTPChannels(sftp_client)
+
+        def stream_fastq(row):
+            blob_path = os.path.join(storage["prefix"], row["fastq_dest_path"])
+            if is_uploaded(row):
+                logging.info("{} already uploaded, skipping".format(row["fastq_name"]))
+                return blob_path
+
+            logging.info("Streaming {} to Azure storage {}".format(row["fastq_name"], storage["name"]))
+            with sftp_channels.get().open(row["fastq_source_path"], "rb") as source:
+                source.prefetch()
+                storage_client.write_data(row["fastq_dest_path"], source)
+            return blob_path
+
+        try:
+            with ThreadPoolExecutor(max_workers=num_upload) as executor:
+                return list(executor.map(stream_fastq, rows))
+        finally:
+            sftp_channels.close()
+
+    def fetch(row):
+        if is_uploaded(row):
+            logging.info("{} already uploaded, skipping".format(row["fastq_name"]))
+            return None
+
         # Transfer to tmp dir if the files are not on the local machine
-        if sftp_client:
-            if sequencing_centre == "BCCAGSC":
-                source_path = "thost:" + row["fastq_source_path"]
-            elif sequencing_centre == "UBCBRC":
-                source_path = "bigwigs:" + row["fastq_source_path"]
-
-            tmp_dest_path = os.path.join(output_dir, row["fastq_name"])
-
-            # Transfer to temp directory
-            cmd = [
-                "rsync",
-                "-avPL",
-                source_path,
-                tmp_dest_path
-            ]
-            logging.info("Copying tmp file to {}".format(tmp_dest_path))
-            subprocess.check_call(cmd)
-        else:
-            tmp_dest_path = row["fastq_source_path"]
+        if not sftp_client:
+            return row["fastq_source_path"]
+
+        if sequencing_centre == "BCCAGSC":
+            source_path = "thost:" + row["fastq_source_path"]
+        elif sequencing_centre == "UBCBRC":
+            source_path = "bigwigs:" + row["fastq_source_path"]
+
+        tmp_dest_path = os.path.join(output_dir, row["fastq_name"])
+
+        # Transfer to temp directory, keeping partial files to resume
+        cmd = [
+            "rsync",
+            "-avPL",
+            source_path,
+            tmp_dest_path
+        ]
+        logging.info("Copying tmp file to {}".format(tmp_dest_path))
+        subprocess.check_call(cmd)
+
+        return tmp_dest_path
+
+    def upload(row, tmp_dest_path):
+        if tmp_dest_path is None:
+            return os.path.join(storage["prefix"], row["fastq_dest_path"])
 
         logging.info("Uploading {} to Azure storage {}".format(row["fastq_name"], storage["name"]))
         blob_path = upload_to_blob(
@@ -352,9 +420,13 @@ def transfer_fastq(fastq_path_info, output_dir, storage, sequencing_centre, sftp
             storage, 
             storage_client
         )
-        blob_paths.append(blob_path)
 
-    return blob_paths
+        if remove_tmp and sftp_client:
+            os.remove(tmp_dest_path)
+
+        return blob_path
+
+    return run_transfer_pipeline(rows, fetch, upload, num_fetch=num_fetch, num_upload=num_upload)
 
 
 def get_brc_fastq_info(results_path, library_id, sample_id, sftp_client):
@@ -640,6 +712,9 @@ def get_gsc_fastq_info(base_dir, library_id, sample_id, library_index, lane_info
 
 @sequencing_centre.command()
 @click.argument('pool_name', nargs=1)
+@click.option('--num_fetch', type=int, default=4, help='Concurrent remote copies')
+@click.option('--num_upload', type=int, default=4, help='Concurrent blob uploads')
+@click.option('--stream', is_flag=True, help='Stream from sftp to blob without a local copy')
 def gsc(**kwargs):
     """
     Uploads FASTQ files from the GSC to Azure and imports metadata into
@@ -664,7 +739,7 @@ def gsc(**kwargs):
         "tenxpool",
         id=pool_id
     )
-    gsc_api = GSCAPI()
+    gsc_api = get_gsc_api()
 
     # Query the GSC API for sequencing info based on the pool ID
     logging.info("Querying the GSC for pool with ID {}".format(kwargs["pool_id"]))
@@ -722,7 +797,17 @@ def gsc(**kwargs):
 
         # Transfer FASTQs to Azure
         tmp_output_dir = os.path.join(TENX_FASTQ_TMP_DIR, "_".join([sample_id, library["name"]]))
-        blob_paths = transfer_fastq(fastq_path_info_tmp, tmp_output_dir, storage, "BCCAGSC", sftp_client) 
+        blob_paths = transfer_fastq(
+            fastq_path_info_tmp,
+            tmp_output_dir,
+            storage,
+            "BCCAGSC",
+            sftp_client,
+            num_fetch=kwargs["num_fetch"],
+            num_upload=kwargs["num_upload"],
+            stream=kwargs["stream"],
+            remove_tmp=True,
+        )
         
         # Upload to tantalus
         tantalus_dataset_id = tantalus_import(
@@ -7,7 +7,13 @@ from collections import defaultdict
 import logging
 import os
 import yaml
+import gzip
+import zlib
+import shutil
 import subprocess
+import multiprocessing
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 import dbclients.colossus
 import dbclients.tantalus
 import datamanagement.transfer_files
@@ -15,10 +21,11 @@ import datamanagement.templates as templates
 from datamanagement.utils.filecopy import rsync_file
 from datamanagement.utils.constants import LOGGING_FORMAT
 from datamanagement.utils.utils import get_lane_str
+from dbclients.basicclient import LazyClient
 import argparse
 import pickle
 
-tantalus_api = dbclients.tantalus.TantalusApi()
+tantalus_api = LazyClient(dbclients.tantalus.TantalusApi)
 
 
 regions = [
@@ -91,20 +98,8 @@ TUMOUR_DATASET_NAME = 'BAM-SA1090-SC_WGS-A96213A-lanes_6300f0e4-BWA_MEM_0_7_6A-H
 NORMAL_DATASET_NAME = 'BAM-DAH370N-WGS-A41086-lanes_52f27595-BWA_MEM_0_7_10-HG19'
 NORMAL_LANES_STR = 'lanes_52f27595'
 REMOTE_STORAGE_NAME = 'singlecellblob'
-LOCAL_CACHE_DIRECTORY = os.environ['TANTALUS_CACHE_DIR']
-
-
-def gzip_file(uncompressed, compressed):
-    cmd = [
-        'gzip',
-        uncompressed,
-        '-c',
-    ]
-
-    logging.info('command -> ' + ' '.join(cmd))
-
-    with open(compressed, 'wb') as f:
-        subprocess.check_call(cmd, stdout=f)
+FASTQ_TEMPLATE = '{cell_id}_{read_end}.fastq.gz'
+LOCAL_CACHE_DIRECTORY = os.environ.get('TANTALUS_CACHE_DIR')
 
 
 def run_filter_cmd(filtered_bam, source_bam):
@@ -140,36 +135,102 @@ def run_filter_cmd(filtered_bam, source_bam):
     subprocess.check_call(cmd)
 
 
-def run_bam_fastq(end_1_fastq, end_2_fastq, source_bam):
-    if os.path.exists(end_1_fastq) and os.path.exists(end_2_fastq):
+def stream_cell_fastqs(end_1_fastq_gz, end_2_fastq_gz, source_bam, temp_dir, threads=1):
+    """ Filter a cell bam to the test regions and write compressed paired fastqs.
+
+    samtools view | samtools sort -n | samtools fastq, with no intermediate
+    bam or uncompressed fastq on disk.  samtools fastq compresses the .gz
+    outputs itself using the given number of threads.  Outputs are written
+    to temp_dir and moved into place once complete.
+    """
+    if os.path.exists(end_1_fastq_gz) and os.path.exists(end_2_fastq_gz):
         logging.info(f'fastqs for {source_bam} exist, skipping')
         return
 
-    cmd = [
-        'samtools',
-        'sort',
-        '-n',
-        source_bam,
-        '-o',
-        source_bam + '.sorted.bam',
+    temp_prefix = os.path.join(temp_dir, os.path.basename(end_1_fastq_gz)[:-len('_1.fastq.gz')])
+    temp_fastqs = [temp_prefix + '_1.fastq.gz', temp_prefix + '_2.fastq.gz']
+
+    cmds = [
+        ['samtools', 'view', '-u', source_bam] + regions,
+        ['samtools', 'sort', '-n', '-u', '-O', 'bam', '-T', temp_prefix + '.sort', '-@', str(threads), '-'],
+        ['samtools', 'fastq', '-t', '-c', '6', '-@', str(threads), '-1', temp_fastqs[0], '-2', temp_fastqs[1], '-'],
     ]
 
-    logging.info('command -> ' + ' '.join(cmd))
-    subprocess.check_call(cmd)
+    logging.info('command -> ' + ' | '.join(' '.join(cmd) for cmd in cmds))
 
-    cmd = [
-        'samtools',
-        'fastq',
-        '-t',
-        '-1',
-        end_1_fastq,
-        '-2',
-        end_2_fastq,
-        source_bam + '.sorted.bam',
-    ]
+    procs = []
+    stdin = None
+    for cmd in cmds:
+        stdout = subprocess.PIPE if cmd is not cmds[-1] else None
+        proc = subprocess.Popen(cmd, stdin=stdin, stdout=stdout)
+        if stdin is not None:
+            stdin.close()
+        stdin = proc.stdout
+        procs.append(proc)
 
-    logging.info('command -> ' + ' '.join(cmd))
-    subprocess.check_call(cmd)
+    for cmd, proc in zip(cmds, procs):
+        if proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+    for temp_fastq, fastq_gz in zip(temp_fastqs, (end_1_fastq_gz, end_2_fastq_gz)):
+        shutil.move(temp_fastq, fastq_gz)
+
+
+def write_synthetic_fastqs(end_1_fastq_gz, end_2_fastq_gz, cell_id, num_reads, read_length=150, seed=0, chunk_size=10000):
+    """ Write random paired end reads for load testing.
+    """
+    rng = np.random.default_rng([seed, zlib.crc32(cell_id.encode())])
+    bases = np.frombuffer(b'ACGT', dtype=np.uint8)
+    quality = b'I' * read_length
+
+    fastqs = [gzip.open(a, 'wb', compresslevel=6) for a in (end_1_fastq_gz, end_2_fastq_gz)]
+    try:
+        for chunk_start in range(0, num_reads, chunk_size):
+            chunk_reads = min(chunk_size, num_reads - chunk_start)
+            for read_end, fastq in enumerate(fastqs, 1):
+                sequences = bases[rng.integers(0, 4, size=(chunk_reads, read_length))]
+                records = []
+                for idx, sequence in enumerate(sequences, chunk_start):
+                    records.append(b'@%s:%d/%d\n%s\n+\n%s\n' % (
+                        cell_id.encode(), idx, read_end, sequence.tobytes(), quality))
+                fastq.write(b''.join(records))
+    finally:
+        for fastq in fastqs:
+            fastq.close()
+
+
+def synthetic_index(value, length=8):
+    """ Index sequence encoding value in base 4.
+    """
+    return ''.join('ACGT'[(value >> (2 * k)) & 3] for k in reversed(range(length)))
+
+
+def synthetic_cells(num_cells):
+    """ Cell ids and sublibrary info for a synthetic library.
+
+    As on a chip, the i5 primer is given by the row and the i7 primer by the
+    column, so each cell has a distinct index sequence.
+    """
+    cells = {}
+    for idx in range(num_cells):
+        row = 1 + idx // 72
+        column = 1 + idx % 72
+        cell_id = f'SA1090-{LIBRARY_ID}-R{row:02d}-C{column:02d}'
+        cells[cell_id] = {
+            'sublib': {
+                'condition': 'A',
+                'img_col': column,
+                'index_i5': f'i5-{row}',
+                'index_i7': f'i7-{column}',
+                'pick_met': 'C1',
+                'primer_i5': synthetic_index(row),
+                'primer_i7': synthetic_index(column),
+                'row': row,
+                'column': column,
+            },
+        }
+
+    return cells
 
 
 def get_tumour_bams():
@@ -224,17 +285,34 @@ def get_normal_bam():
     return bam_info
 
 
-def create_tumour_fastqs(fastq_dir, temp_dir):
+def create_tumour_fastqs(fastq_dir, temp_dir, num_workers=None, threads_per_cell=2, num_cells=None, num_reads=None):
     """ Create a filterd fastq dataset
+
+    Cells are processed concurrently by num_workers, each running a
+    streaming filter and fastq conversion with threads_per_cell threads.
+
+    If num_cells and num_reads are given, a synthetic library of that many
+    cells and read pairs per cell is generated instead, for load testing.
     """
-    tumour_bam_info = get_tumour_bams()
+    if num_workers is None:
+        num_workers = max(1, multiprocessing.cpu_count() // threads_per_cell)
+
+    synthetic = num_cells is not None and num_reads is not None
 
-    dataset = tumour_bam_info['dataset']
-    lane_ids = [get_lane_str(l) for l in dataset['sequence_lanes']]
-    sample_id = dataset['sample']['sample_id']
-    library_id = dataset['library']['library_id']
+    if synthetic:
+        cells = synthetic_cells(num_cells)
+        lane_ids = [f'{TEST_LANE_FLOWCELL}_{TEST_LANE_NUMBER}']
+        sample_id = 'SA1090'
+        library_id = LIBRARY_ID
+
+    else:
+        tumour_bam_info = get_tumour_bams()
+        cells = tumour_bam_info['cells']
 
-    FASTQ_TEMPLATE = '{cell_id}_{read_end}.fastq.gz'
+        dataset = tumour_bam_info['dataset']
+        lane_ids = [get_lane_str(l) for l in dataset['sequence_lanes']]
+        sample_id = dataset['sample']['sample_id']
+        library_id = dataset['library']['library_id']
 
     tumour_fastq_metadata = {
         'filenames': [],
@@ -252,31 +330,26 @@ def create_tumour_fastqs(fastq_dir, temp_dir):
         }
     }
 
-    for cell_id in tumour_bam_info['cells']:
-        bam_path = tumour_bam_info['cells'][cell_id]['bam']
-        sublib = tumour_bam_info['cells'][cell_id]['sublib']
+    def create_cell_fastqs(cell_id):
+        cell_end_1_fastq_gz = os.path.join(fastq_dir, FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='1'))
+        cell_end_2_fastq_gz = os.path.join(fastq_dir, FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='2'))
 
-        logging.info('creating paired end fastqs for bam {}'.format(bam_path))
+        if synthetic:
+            write_synthetic_fastqs(cell_end_1_fastq_gz, cell_end_2_fastq_gz, cell_id, num_reads)
 
-        # Filter bams
-        cell_filtered_bam = os.path.join(fastq_dir, f'{cell_id}.bam')
-        run_filter_cmd(cell_filtered_bam, bam_path)
+        else:
+            bam_path = cells[cell_id]['bam']
+            logging.info('creating paired end fastqs for bam {}'.format(bam_path))
+            stream_cell_fastqs(cell_end_1_fastq_gz, cell_end_2_fastq_gz, bam_path, temp_dir, threads=threads_per_cell)
 
-        # Convert bams to fastq, uncompressed
-        cell_end_1_fastq = os.path.join(fastq_dir, f'{cell_id}_1.fastq')
-        cell_end_2_fastq = os.path.join(fastq_dir, f'{cell_id}_2.fastq')
-        run_bam_fastq(cell_end_1_fastq, cell_end_2_fastq, cell_filtered_bam)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(create_cell_fastqs, cells))
 
-        # Gzip final fastq
-        cell_end_1_fastq_filename = FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='1')
-        cell_end_2_fastq_filename = FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='2')
-        cell_end_1_fastq_gz = os.path.join(fastq_dir, cell_end_1_fastq_filename)
-        cell_end_2_fastq_gz = os.path.join(fastq_dir, cell_end_2_fastq_filename)
-        gzip_file(cell_end_1_fastq, cell_end_1_fastq_gz)
-        gzip_file(cell_end_2_fastq, cell_end_2_fastq_gz)
+    for cell_id in cells:
+        sublib = cells[cell_id]['sublib']
 
-        tumour_fastq_metadata['filenames'].append(cell_end_1_fastq_filename)
-        tumour_fastq_metadata['filenames'].append(cell_end_2_fastq_filename)
+        tumour_fastq_metadata['filenames'].append(FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='1'))
+        tumour_fastq_metadata['filenames'].append(FASTQ_TEMPLATE.format(cell_id=cell_id, read_end='2'))
 
         tumour_fastq_metadata['meta']['cell_ids'].append(cell_id)
 
@@ -513,8 +586,14 @@ def create_breakpoint_calling_input_yaml(normal_bam_dir, tumour_bams_dir, input_
 @click.command()
 @click.argument('data_dir')
 @click.option('--skip_download', is_flag=True)
-def create_dlp_test_data(data_dir, skip_download):
-    if not skip_download:
+@click.option('--num_workers', type=int, help='Cells processed concurrently')
+@click.option('--threads_per_cell', type=int, default=2, help='samtools threads per cell')
+@click.option('--num_cells', type=int, help='Generate a synthetic library with this many cells')
+@click.option('--num_reads', type=int, help='Read pairs per synthetic cell')
+def create_dlp_test_data(data_dir, skip_download, num_workers, threads_per_cell, num_cells, num_reads):
+    synthetic = num_cells is not None and num_reads is not None
+
+    if not skip_download and not synthetic:
         pull_source_datasets()
 
     tumour_fastq_dir = os.path.join(data_dir, 'tumour_fastqs')
@@ -529,11 +608,19 @@ def create_dlp_test_data(data_dir, skip_download):
     if os.path.exists(tumour_metadata):
         logging.info(f'skipping create_tumour_fastqs, found {tumour_metadata}')
     else:
-        create_tumour_fastqs(tumour_fastq_dir, temp_dir)
+        create_tumour_fastqs(
+            tumour_fastq_dir, temp_dir,
+            num_workers=num_workers,
+            threads_per_cell=threads_per_cell,
+            num_cells=num_cells,
+            num_reads=num_reads,
+        )
 
     normal_metadata = os.path.join(normal_bam_dir, 'metadata.yaml')
     if os.path.exists(normal_metadata):
         logging.info(f'skipping create_normal_bam, found {normal_metadata}')
+    elif synthetic:
+        logging.info('skipping create_normal_bam for synthetic library')
     else:
         create_normal_bam(normal_bam_dir)
 
@@ -236,6 +236,7 @@ class AzureBlobServerUpload(object):
             self.storage_client.create(
                 cloud_blobname,
                 local_filepath,
+                update=overwrite,
                 max_concurrency=16,
                 timeout=10 * 60 * 64,
             )
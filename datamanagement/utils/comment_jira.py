@@ -1,15 +1,15 @@
 import os
 import sys
 import logging
-from jira import JIRA, JIRAError
+from jira import JIRAError
+from dbclients.jira_client import get_jira_client
 from datamanagement.utils.constants import LOGGING_FORMAT
 
 # Set up the root logger
 logging.basicConfig(format=LOGGING_FORMAT, stream=sys.stderr, level=logging.INFO)
 
-JIRA_USER = os.environ['JIRA_USERNAME']
-JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+JIRA_USER = os.environ.get('JIRA_USERNAME')
+jira_api = get_jira_client()
 
 def comment_jira(jira_id, comment):
 	logging.info("Commenting \n{} on ticket {}".format(
@@ -0,0 +1,304 @@
+"""
+Decompression of CRAM and SpEC files to indexed bams, singly or in batches.
+"""
+import os
+import time
+import logging
+import threading
+import subprocess
+import contextlib
+import multiprocessing
+
+from dbclients.basicclient import NotFoundError
+from datamanagement.utils.qsub_jobs import CramToBamJob, SpecToBamJob
+from datamanagement.utils.remote_transfer import run_transfer_pipeline
+from datamanagement.utils.utils import parse_ref_genome, make_dirs
+from datamanagement.utils.constants import (
+    HUMAN_REFERENCE_GENOMES_MAP,
+    SHAHLAB_SPEC_TO_BAM_BINARY_PATH,
+    DEFAULT_NATIVECRAM,
+    DEFAULT_NATIVESPEC,
+)
+
+
+EXECUTORS = ("local", "qsub")
+
+
+class StageStats(object):
+    """
+    Busy time, bytes and file counts per stage, summed over all files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    @contextlib.contextmanager
+    def timed(self, stage):
+        """
+        Time a block, the block sets the bytes it processed on the yielded dict.
+        """
+        record = {"bytes": 0}
+        start = time.time()
+        yield record
+        seconds = time.time() - start
+
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"files": 0, "bytes": 0, "seconds": 0.})
+            stats["files"] += 1
+            stats["bytes"] += record["bytes"]
+            stats["seconds"] += seconds
+
+    def summary(self):
+        """
+        Per stage totals and throughput in MB per busy second.
+        """
+        summary = []
+        with self._lock:
+            for stage, stats in self._stages.items():
+                mb_per_second = stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else None
+                summary.append(dict(stage=stage, mb_per_second=mb_per_second, **stats))
+        return summary
+
+    def log_summary(self, elapsed):
+        for stats in self.summary():
+            throughput = "{:.1f} MB/s".format(stats["mb_per_second"]) if stats["mb_per_second"] is not None else "-"
+            logging.info("{stage}: {files} files, {mb:.1f} MB, {seconds:.1f}s busy, {throughput}".format(
+                mb=stats["bytes"] / 1e6, throughput=throughput, **stats))
+        logging.info("batch finished in {:.1f}s".format(elapsed))
+
+
+def default_threads(num_decompress):
+    """
+    Split the local cores between the concurrent decompressions.
+    """
+    return max(1, multiprocessing.cpu_count() // num_decompress)
+
+
+def fetch_source(source_path, output_bam_path, remote_files=None):
+    """
+    Copy a remote source next to the output bam, returning the local source path.
+
+    Args:
+        source_path:        (string) path to the cram or spec
+        output_bam_path:    (string) destination path for the decompressed bam
+        remote_files:       (RemoteFiles) source files on the remote host, None if local
+    """
+    if remote_files is None or not remote_files.is_remote:
+        return source_path
+
+    extension = os.path.splitext(source_path)[1]
+    local_source_path = output_bam_path + extension
+    remote_files.rsync(source_path, local_source_path)
+    return local_source_path
+
+
+def decompress(source_path, reference_genome, output_bam_path, library_id, executor="qsub", threads=10):
+    """
+    Decompress a cram or spec to a bam, locally or as a cluster job.
+
+    Args:
+        source_path:        (string) local path to the cram or spec
+        reference_genome:   (string) parsed reference genome, one of HUMAN_REFERENCE_GENOMES_MAP
+        output_bam_path:    (string) destination path for the decompressed bam
+        library_id:         (string) library the bam belongs to, used as the job title
+
+    Kwargs:
+        executor:           (string) "local" to run in this process, "qsub" to submit to the cluster
+        threads:            (int) decompression threads
+    """
+    if executor not in EXECUTORS:
+        raise ValueError("unknown executor {}".format(executor))
+
+    reference = HUMAN_REFERENCE_GENOMES_MAP[reference_genome]
+
+    if source_path.endswith(".spec"):
+        job = SpecToBamJob(threads, source_path, reference, output_bam_path, SHAHLAB_SPEC_TO_BAM_BINARY_PATH)
+        native_spec = DEFAULT_NATIVESPEC
+    else:
+        job = CramToBamJob(threads, source_path, reference, output_bam_path)
+        native_spec = DEFAULT_NATIVECRAM
+
+    logging.info("Converting {} to {}".format(source_path, output_bam_path))
+
+    if executor == "local":
+        job()
+    else:
+        # pypeliner is only needed to submit to the cluster
+        from datamanagement.utils.qsub_job_submission import submit_qsub_job
+        submit_qsub_job(job, native_spec, title=library_id)
+
+    logging.info("Successfully created bam at {}".format(output_bam_path))
+
+
+def index_bam(bam_path, threads=1):
+    """
+    Create the bam index next to the bam.
+    """
+    logging.info("Creating bam index at {}".format(bam_path + ".bai"))
+    cmd = [
+        "samtools",
+        "index",
+        "-@",
+        str(threads),
+        bam_path,
+    ]
+    subprocess.check_call(cmd)
+
+    logging.info("Successfully created bam index at {}".format(bam_path + ".bai"))
+
+
+def bam_exists(tantalus_api, output_bam_path, to_storage):
+    """
+    Check whether the bam exists on the storage with the size recorded in Tantalus.
+    """
+    output_bam_filename = output_bam_path[len(to_storage["prefix"]) + 1:]
+
+    try:
+        file_size = tantalus_api.get("file_resource", filename=output_bam_filename)["size"]
+    except NotFoundError:
+        return False
+
+    return os.path.isfile(output_bam_path) and os.path.getsize(output_bam_path) == file_size
+
+
+def create_bam(
+    tantalus_api,
+    source_path,
+    raw_reference_genome,
+    output_bam_path,
+    to_storage,
+    library_id,
+    remote_files=None,
+    executor="qsub",
+    threads=10,
+):
+    """
+    Creates decompressed bam and bam index from the given cram or spec
+
+    Args:
+        tantalus_api:           (TantalusApi) used to check for an existing bam
+        source_path:            (string) full path to the cram or spec
+        raw_reference_genome:   (string) reference genome used
+        output_bam_path:        (string) destination path for the decompressed bam
+        to_storage:             (dict) destination storage for the bam
+        library_id:             (string) internal library ID the bam is associated with
+        remote_files:           (RemoteFiles) source files on the remote host, None if local
+        executor:               (string) "local" or "qsub"
+        threads:                (int) decompression threads
+
+    Returns:
+        False if the bam already exists, True otherwise
+    """
+    if bam_exists(tantalus_api, output_bam_path, to_storage):
+        logging.warning("An uncompressed BAM file already exists at {} Skipping decompression of {}".format(
+            output_bam_path, source_path))
+        return False
+
+    # Find out what reference genome to use. Currently there are no
+    # standardized strings that we can expect, and for reference genomes
+    # there are multiple naming standards, so we need to be clever here.
+    logging.info("Parsing reference genome %s", raw_reference_genome)
+    reference_genome = parse_ref_genome(raw_reference_genome)
+
+    make_dirs(os.path.dirname(output_bam_path))
+
+    local_source_path = fetch_source(source_path, output_bam_path, remote_files=remote_files)
+    decompress(local_source_path, reference_genome, output_bam_path, library_id, executor=executor, threads=threads)
+    index_bam(output_bam_path, threads=threads)
+
+    return True
+
+
+def batch_create_bams(
+    tantalus_api,
+    sources,
+    to_storage,
+    remote_files=None,
+    executor="local",
+    num_fetch=2,
+    num_decompress=2,
+    threads=None,
+    register=True,
+):
+    """
+    Decompress, index and register many crams or specs, with fetches of later
+    sources overlapping decompression and indexing of earlier ones.
+
+    Args:
+        tantalus_api:   (TantalusApi)
+        sources:        (list) dicts with source_path, reference_genome,
+                        output_bam_path and library_id
+        to_storage:     (dict) destination storage for the bams
+
+    Kwargs:
+        remote_files:   (RemoteFiles) source files on the remote host, None if local
+        executor:       (string) "local" or "qsub"
+        num_fetch:      (int) concurrent source transfers
+        num_decompress: (int) concurrent decompressions
+        threads:        (int) threads per decompression, defaults to the local
+                        cores split between concurrent decompressions
+        register:       (bool) add the bams and bais to Tantalus
+
+    Returns:
+        list of output bam paths that were created, None for skipped sources,
+        and the StageStats of the batch
+    """
+    if threads is None:
+        threads = default_threads(num_decompress)
+
+    stats = StageStats()
+
+    def fetch(source):
+        if bam_exists(tantalus_api, source["output_bam_path"], to_storage):
+            logging.warning("An uncompressed BAM file already exists at {} Skipping decompression of {}".format(
+                source["output_bam_path"], source["source_path"]))
+            return None
+
+        make_dirs(os.path.dirname(source["output_bam_path"]))
+
+        with stats.timed("fetch") as record:
+            local_source_path = fetch_source(source["source_path"], source["output_bam_path"], remote_files=remote_files)
+            record["bytes"] = os.path.getsize(local_source_path)
+
+        return local_source_path
+
+    def convert(source, local_source_path):
+        if local_source_path is None:
+            return None
+
+        output_bam_path = source["output_bam_path"]
+        reference_genome = parse_ref_genome(source["reference_genome"])
+
+        with stats.timed("decompress") as record:
+            decompress(
+                local_source_path, reference_genome, output_bam_path, source["library_id"],
+                executor=executor, threads=threads)
+            record["bytes"] = os.path.getsize(output_bam_path)
+
+        with stats.timed("index") as record:
+            index_bam(output_bam_path, threads=threads)
+            record["bytes"] = os.path.getsize(output_bam_path)
+
+        if register:
+            with stats.timed("register"):
+                for filepath in (output_bam_path, output_bam_path + ".bai"):
+                    file_resource, file_instance = tantalus_api.add_file(to_storage["name"], filepath, update=True)
+                    logging.info("File resource with ID {} created for {}".format(file_resource["id"], filepath))
+
+        # Remove fetched copies of remote sources
+        if local_source_path != source["source_path"]:
+            os.remove(local_source_path)
+
+        return output_bam_path
+
+    start = time.time()
+    results = run_transfer_pipeline(
+        sources, fetch, convert,
+        num_fetch=num_fetch,
+        num_upload=num_decompress,
+        max_staged=num_fetch + num_decompress,
+    )
+    stats.log_summary(time.time() - start)
+
+    return results, stats
@@ -0,0 +1,152 @@
+""" Single pass index of bcl2fastq output filenames.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import collections
+import os
+import re
+
+
+# Fastq name example: SA992-A90632-R54-C54_S317_L004_R1_001.fastq.gz
+BCL2FASTQ_FILENAME_RE = re.compile(
+    r"^(\w+)-(\w+)-R(\d+)-C(\d+)_S(\d+)(_L(\d+))?_R([12])_001.fastq.gz$")
+
+FastqKey = collections.namedtuple(
+    'FastqKey',
+    ['library_id', 'row', 'column', 'lane_number', 'read_end'],
+)
+
+FastqEntry = collections.namedtuple(
+    'FastqEntry',
+    ['filename', 'primary_sample_id', 'library_id', 'row', 'column', 'sample_number', 'lane_number', 'read_end'],
+)
+
+
+def parse_bcl2fastq_filename(filename):
+    """ Parse a bcl2fastq output filename.
+
+    Args:
+        filename (str): basename of the fastq
+
+    Returns:
+        FastqEntry
+    """
+    match = BCL2FASTQ_FILENAME_RE.match(filename)
+
+    if match is None:
+        raise Exception("unrecognized fastq filename structure for {}".format(filename))
+
+    fields = match.groups()
+
+    lane_number = fields[6]
+    if lane_number is not None:
+        lane_number = int(lane_number)
+
+    return FastqEntry(
+        filename=filename,
+        primary_sample_id=fields[0],
+        library_id=fields[1],
+        row=int(fields[2]),
+        column=int(fields[3]),
+        sample_number=int(fields[4]),
+        lane_number=lane_number,
+        read_end=int(fields[7]),
+    )
+
+
+def generate_bcl2fastq_filename(sample_id, library_id, row, column, lane_number, read_end, sample_number=0):
+    """ Inverse of parse_bcl2fastq_filename.
+    """
+    samplename = "-".join([sample_id, library_id, "R{}".format(row), "C{}".format(column)])
+    return "_".join([samplename, "S{}".format(sample_number), "L00{}".format(lane_number), "R{}".format(read_end), "001.fastq.gz"])
+
+
+class FastqIndex(object):
+    """ Fastq filenames parsed once and keyed by (library, row, column, lane, read end).
+    """
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+
+        # Lanes present for each (library, row, column)
+        self._cell_lanes = collections.defaultdict(set)
+
+    @classmethod
+    def from_filenames(cls, filenames):
+        index = cls()
+        for filename in filenames:
+            index.add(filename)
+        return index
+
+    @classmethod
+    def from_directory(cls, output_dir, extension=".gz"):
+        """ Index gzipped fastqs in a bcl2fastq output directory, ignoring undetermined reads.
+        """
+        filenames = [
+            filename for filename in sorted(os.listdir(output_dir))
+            if ".fastq{}".format(extension) in filename and "Undetermined" not in filename]
+
+        if len(filenames) == 0:
+            raise Exception("no fastq files in output directory {}".format(output_dir))
+
+        return cls.from_filenames(filenames)
+
+    def add(self, filename):
+        entry = parse_bcl2fastq_filename(filename)
+
+        key = FastqKey(entry.library_id, entry.row, entry.column, entry.lane_number, entry.read_end)
+        if key in self.entries:
+            raise Exception("duplicate fastq {} and {} for {}".format(
+                self.entries[key].filename, filename, key))
+
+        self.entries[key] = entry
+        self._cell_lanes[entry.library_id, entry.row, entry.column].add(entry.lane_number)
+
+        return entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @property
+    def library_ids(self):
+        return sorted(set(key.library_id for key in self.entries))
+
+    def get_cell_lanes(self, library_id, row, column):
+        """ Lane numbers with at least one fastq for a cell.
+        """
+        return self._cell_lanes.get((library_id, row, column), set())
+
+    def get_missing_lanes(self, library_id, expected_cells, lane_numbers=(1, 2)):
+        """ Reconcile expected cells against indexed fastqs.
+
+        Cells with fastqs but not in expected_cells are only checked when no
+        expected cell is missing entirely, matching the bcl2fastq import logic.
+
+        Args:
+            library_id (str): dlp library id
+            expected_cells (iterable): (row, column) of expected cells
+            lane_numbers (iterable): lanes each cell should have
+
+        Returns:
+            dict: sorted list of missing lane numbers keyed by (row, column)
+        """
+        expected_cells = set(expected_cells)
+        present_cells = set(
+            (row, column) for (lib, row, column) in self._cell_lanes if lib == library_id)
+
+        cells = present_cells
+        if len(expected_cells - present_cells) != 0:
+            cells = expected_cells
+
+        missing = {}
+        for cell in cells:
+            missing[cell] = sorted(set(lane_numbers) - self.get_cell_lanes(library_id, *cell))
+
+        return missing
@@ -2,23 +2,139 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 import os
+import json
 import time
 import random
 import logging
+import sqlite3
+import threading
+import contextlib
 import requests
 import traceback
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 log = logging.getLogger('sisyphus')
 
 
+class ResponseCache(object):
+    """
+    TTL cache of GSC API responses keyed by query, held in memory and
+    optionally persisted to an SQLite file shared between runs.
+
+    Responses are stored as JSON so that callers always receive a fresh
+    copy they can modify.  Empty responses are not cached, so data newly
+    available at the GSC is seen by the next query.
+    """
+
+    def __init__(self, ttl, filename=None):
+        self.ttl = ttl
+        self.filename = filename
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if self.filename is not None:
+            with self._connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS response (query TEXT PRIMARY KEY, created REAL, data TEXT)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        with contextlib.closing(sqlite3.connect(self.filename, timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def get(self, query):
+        """
+        Return the cached response for a query, or None if missing or expired.
+        """
+        if not self.ttl:
+            return None
+
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(query)
+
+        if entry is None and self.filename is not None:
+            with self._connect() as conn:
+                entry = conn.execute("SELECT created, data FROM response WHERE query = ?", (query,)).fetchone()
+            if entry is not None:
+                with self._lock:
+                    self._entries[query] = entry
+
+        if entry is None or now - entry[0] > self.ttl:
+            return None
+
+        return json.loads(entry[1])
+
+    def set(self, query, result):
+        if not self.ttl or not result:
+            return
+
+        entry = (time.time(), json.dumps(result))
+
+        with self._lock:
+            self._entries[query] = entry
+
+        if self.filename is not None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO response VALUES (?, ?, ?)", (query,) + entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+        if self.filename is not None:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM response")
+
+
+def normalize_query(query_string):
+    """
+    Canonical form of a query string so that the same endpoint and
+    parameters in a different order share a cache entry.
+    """
+    endpoint, _, params = query_string.partition("?")
+    if not params:
+        return endpoint
+    params = sorted(urllib.parse.parse_qsl(params, keep_blank_values=True))
+    return endpoint + "?" + urllib.parse.urlencode(params, safe="*,/")
+
+
 class GSCAPI(object):
-    def __init__(self):
+    def __init__(self, max_workers=8, retries=5, backoff=10, max_backoff=300, cache_ttl=None, cache_filename=None):
         """
         Create a session object, authenticating based on the tantalus user.
+
+        Kwargs:
+            max_workers: maximum number of concurrent requests, also the connection pool size
+            retries: number of attempts for each query
+            backoff: initial wait in seconds between attempts, doubled after each failure
+            max_backoff: maximum wait in seconds between attempts
+            cache_ttl: seconds to cache responses, 0 to disable, defaults to GSC_API_CACHE_TTL or disabled,
+                       cached responses hide data that arrives at the GSC until they expire
+            cache_filename: SQLite file for a persistent cache, defaults to GSC_API_CACHE
         """
 
         self.request_handle = requests.Session()
 
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.request_handle.mount("http://", adapter)
+        self.request_handle.mount("https://", adapter)
+
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._request_slots = threading.BoundedSemaphore(max_workers)
+
+        if cache_ttl is None:
+            cache_ttl = float(os.environ.get("GSC_API_CACHE_TTL", 0))
+        if cache_filename is None:
+            cache_filename = os.environ.get("GSC_API_CACHE")
+        self.cache = ResponseCache(cache_ttl, filename=cache_filename)
+
         self.headers = {
             "Content-Type":
             "application/json",
@@ -46,44 +162,96 @@ class GSCAPI(object):
         else:
             raise Exception("unable to authenticate GSC API")
 
-    def query(self, query_string):
+    def _get(self, query_url):
         """
-        Query the gsc api.
+        Get a url, retrying with exponential backoff.
         """
-
-        query_url = self.gsc_api_url + query_string
-        retries = 5
-        for retry in range(retries):
+        for retry in range(self.retries):
             try:
                 if retry != 0:
-                    wait_time = random.randint(10, 60)
-                    log.info("Waiting {} seconds before connecting to GSC".format(wait_time))
+                    wait_time = min(self.max_backoff, self.backoff * 2 ** (retry - 1))
+                    wait_time *= random.uniform(0.5, 1.)
+                    log.info("Waiting {:.0f} seconds before connecting to GSC".format(wait_time))
                     time.sleep(wait_time)
 
-                result = self.request_handle.get(query_url, headers=self.headers).json()
-                break
+                with self._request_slots:
+                    return self.request_handle.get(query_url, headers=self.headers).json()
+
             except Exception:
                 log.error("Connecting to GSC failed. Retrying.")
 
-                if retry < retries - 1:
+                if retry < self.retries - 1:
                     traceback.print_exc()
                 else:
                     log.error("Failed all retry attempts")
                     raise
 
+    def query(self, query_string, use_cache=True):
+        """
+        Query the gsc api.
+
+        Args:
+            query_string: endpoint and parameters, for example "library?name=PX1234"
+
+        Kwargs:
+            use_cache: return a cached response if available
+        """
+
+        cache_key = normalize_query(query_string)
+
+        if use_cache:
+            result = self.cache.get(cache_key)
+            if result is not None:
+                return result
+
+        result = self._get(self.gsc_api_url + query_string)
+
         if "status" in result and result["status"] == "error":
             raise Exception(result["errors"])
 
+        self.cache.set(cache_key, result)
+
         return result
 
+    def batch_query(self, query_strings, use_cache=True):
+        """
+        Query the gsc api for several queries concurrently.
 
-<<<<<<< HEAD
-raw_instrument_map = {"HiSeq": "HiSeq2500", "HiSeqX": "HiSeqX", "NextSeq": "NextSeq550","NovaSeq":"NovaSeq", "NovaXPlus":"NovaXPlus", "NovaSeq6000":"NovaSeq6000"}
-=======
+        Duplicate queries are only requested once.
+
+        Args:
+            query_strings: list of query strings
+
+        Returns:
+            list of results in the order of query_strings
+        """
+
+        unique_queries = list(dict.fromkeys(query_strings))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda a: self.query(a, use_cache=use_cache), unique_queries)
+            results = dict(zip(unique_queries, results))
+
+        return [results[a] for a in query_strings]
 
-raw_instrument_map = {"HiSeq": "HiSeq2500", "HiSeqX": "HiSeqX", "NextSeq": "NextSeq550","NovaSeq":"NovaSeq",  "NovaSeq6000":"NovaSeq6000", "NovaXPlus":"NovaXPlus"}
 
->>>>>>> f66e6a728ef56936fe578ef942270c2fc863f630
+_shared_gsc_api = None
+_shared_gsc_api_lock = threading.Lock()
+
+
+def get_gsc_api():
+    """
+    Get a GSCAPI shared within the process, so that the session and
+    response cache are reused across importer calls.
+    """
+    global _shared_gsc_api
+    with _shared_gsc_api_lock:
+        if _shared_gsc_api is None:
+            _shared_gsc_api = GSCAPI()
+    return _shared_gsc_api
+
+
+raw_instrument_map = {"HiSeq": "HiSeq2500", "HiSeqX": "HiSeqX", "NextSeq": "NextSeq550","NovaSeq":"NovaSeq",  "NovaSeq6000":"NovaSeq6000", "NovaXPlus":"NovaXPlus"}
 
 
 def get_sequencing_instrument(machine):
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+SQLite ledger of import sweeps, so recurring sweeps only check sequencings
+that changed in Colossus or are due for another check.
+
+Each checked sequencing records a fingerprint of the Colossus fields that
+signal new work, the outcome of the last check and when it is next due.
+Checks that find nothing new or fail are backed off exponentially up to a
+day, so data that arrives at the GSC without a change in Colossus is still
+picked up the next day, and a change in the fingerprint makes a sequencing
+due immediately.  Lanes are
+recorded as pending when planned and completed or failed afterwards.
+"""
+import os
+import json
+import time
+import click
+import hashlib
+import sqlite3
+import logging
+import threading
+import contextlib
+
+log = logging.getLogger('sisyphus')
+
+# Outcomes of checking a sequencing
+IMPORTED = 'imported'
+NO_DATA = 'no_data'
+FAILED = 'failed'
+
+# Lane states
+PENDING = 'pending'
+COMPLETE = 'complete'
+
+LANE_STATES = (PENDING, FAILED, COMPLETE)
+
+# Colossus sequencing fields that change when more lanes are expected
+FINGERPRINT_FIELDS = ('number_of_lanes_requested', 'gsc_library_id', 'lane_requested_date')
+
+# Seconds between checks
+DEFAULT_CHECK_INTERVAL = 6 * 3600
+DEFAULT_MAX_INTERVAL = 24 * 3600
+
+
+def default_ledger_filename():
+    """
+    Absolute path of the ledger, SISYPHUS_IMPORT_LEDGER if set, otherwise in
+    DATAMANAGEMENT_DIR or the datamanagement package directory, so runs from
+    different working directories share the ledger.
+    """
+    filename = os.environ.get('SISYPHUS_IMPORT_LEDGER')
+    if filename is None:
+        datamanagement_dir = os.environ.get(
+            'DATAMANAGEMENT_DIR', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        filename = os.path.join(datamanagement_dir, 'import_ledger.sqlite')
+    return os.path.abspath(os.path.expanduser(filename))
+
+
+def fingerprint(sequencing, fields=FINGERPRINT_FIELDS):
+    values = [sequencing.get(field) for field in fields]
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+
+class ImportLedger(object):
+    """
+    Per importer state of sequencings and lanes.
+
+    Args:
+        filename (str): SQLite file, created if missing
+
+    KwArgs:
+        check_interval (float): seconds before rechecking a sequencing that had new data
+        max_interval (float): longest backoff in seconds between checks
+    """
+
+    def __init__(self, filename, check_interval=DEFAULT_CHECK_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+        self.filename = filename
+        self.check_interval = check_interval
+        self.max_interval = max_interval
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sequencing ("
+                "importer TEXT, sequencing_id INTEGER, name TEXT, fingerprint TEXT, state TEXT, "
+                "attempts INTEGER, last_checked REAL, next_check REAL, error TEXT, "
+                "PRIMARY KEY (importer, sequencing_id))")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS lane ("
+                "importer TEXT, sequencing_id INTEGER, library TEXT, flowcell_lane TEXT, state TEXT, "
+                "updated REAL, error TEXT, "
+                "PRIMARY KEY (importer, library, flowcell_lane))")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        with contextlib.closing(sqlite3.connect(self.filename, timeout=60)) as conn:
+            with conn:
+                yield conn
+
+    def due(self, importer, sequencings, now=None):
+        """
+        Filter sequencings to those never checked, changed since the last
+        check or due for another check.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._connect() as conn:
+            checked = {
+                sequencing_id: (sequencing_fingerprint, next_check)
+                for sequencing_id, sequencing_fingerprint, next_check in conn.execute(
+                    "SELECT sequencing_id, fingerprint, next_check FROM sequencing WHERE importer = ?", (importer,))
+            }
+
+        due_sequencings = []
+        for sequencing in sequencings:
+            if sequencing["id"] in checked:
+                sequencing_fingerprint, next_check = checked[sequencing["id"]]
+                if sequencing_fingerprint == fingerprint(sequencing) and next_check > now:
+                    continue
+            due_sequencings.append(sequencing)
+
+        log.info("{} of {} sequencings due for {}".format(len(due_sequencings), len(sequencings), importer))
+
+        return due_sequencings
+
+    def record_check(self, importer, sequencing, state, name=None, error=None, now=None):
+        """
+        Record the outcome of checking a sequencing and schedule its next check.
+
+        Checks that imported data are repeated after check_interval, other
+        outcomes back off exponentially up to max_interval.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM sequencing WHERE importer = ? AND sequencing_id = ?",
+                (importer, sequencing["id"])).fetchone()
+
+            if state == IMPORTED:
+                attempts = 0
+            else:
+                attempts = (row[0] if row is not None else 0) + 1
+
+            interval = min(self.check_interval * 2 ** attempts, self.max_interval)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO sequencing VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (importer, sequencing["id"], name, fingerprint(sequencing), state, attempts, now, now + interval, error))
+
+    def record_lanes(self, importer, sequencing_id, lanes, state, error=None, now=None):
+        """
+        Record the state of lanes given as (library, flowcell_lane) pairs.
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO lane VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(importer, sequencing_id, library, flowcell_lane, state, now, error) for library, flowcell_lane in lanes])
+
+    def fail_pending_lanes(self, importer, sequencing_id, error, now=None):
+        if now is None:
+            now = time.time()
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE lane SET state = ?, updated = ?, error = ? WHERE importer = ? AND sequencing_id = ? AND state = ?",
+                (FAILED, now, error, importer, sequencing_id, PENDING))
+
+    def lane_state(self, importer, library, flowcell_lane):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT state FROM lane WHERE importer = ? AND library = ? AND flowcell_lane = ?",
+                (importer, library, flowcell_lane)).fetchone()
+        return row[0] if row is not None else None
+
+    def report(self, importer=None):
+        """
+        Lanes by state, and sequencings whose last check failed.
+
+        Returns:
+            dict with a list of lane dicts for each of LANE_STATES and a list
+            of failed sequencing dicts under 'failed_sequencings'
+        """
+        where, params = ("WHERE importer = ?", (importer,)) if importer is not None else ("", ())
+
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            lanes = conn.execute(f"SELECT * FROM lane {where} ORDER BY updated DESC", params).fetchall()
+            sequencings = conn.execute(
+                f"SELECT * FROM sequencing {where} {'AND' if where else 'WHERE'} state = ? ORDER BY last_checked DESC",
+                params + (FAILED,)).fetchall()
+
+        report = {state: [] for state in LANE_STATES}
+        for lane in lanes:
+            report[lane["state"]].append(dict(lane))
+        report['failed_sequencings'] = [dict(a) for a in sequencings]
+
+        return report
+
+
+@click.command()
+@click.option('--ledger', default=default_ledger_filename, help='Import ledger file')
+@click.option('--importer', help='Only report this importer')
+@click.option('--show_complete', is_flag=True, help='List completed lanes as well as counting them')
+def report(ledger, importer=None, show_complete=False):
+    """
+    Print pending, failed and completed lanes of the import ledger.
+    """
+    lane_report = ImportLedger(ledger).report(importer=importer)
+
+    for state in LANE_STATES:
+        print(f"{state} lanes: {len(lane_report[state])}")
+        if state != COMPLETE or show_complete:
+            for lane in lane_report[state]:
+                error = f": {lane['error']}" if lane['error'] else ""
+                print(f"  {lane['importer']} {lane['library']} {lane['flowcell_lane']}{error}")
+
+    print(f"failed sequencings: {len(lane_report['failed_sequencings'])}")
+    for sequencing in lane_report['failed_sequencings']:
+        print(f"  {sequencing['importer']} {sequencing['name'] or sequencing['sequencing_id']}: {sequencing['error']}")
+
+
+if __name__ == '__main__':
+    report()
@@ -0,0 +1,269 @@
+"""
+Helpers for moving files from remote servers into blob storage.
+"""
+import os
+import stat
+import queue
+import logging
+import threading
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from datamanagement.utils.utils import connect_to_client, make_dirs
+
+
+class SFTPChannels(object):
+    """
+    One SFTP channel per thread, opened over the ssh transport of an
+    existing sftp client.
+
+    A single paramiko SFTPClient serializes requests from all threads,
+    separate channels let concurrent reads proceed independently.
+    """
+
+    def __init__(self, sftp_client):
+        self.transport = sftp_client.get_channel().get_transport()
+        self._local = threading.local()
+        self._clients = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = paramiko.SFTPClient.from_transport(self.transport)
+            self._local.client = client
+            with self._lock:
+                self._clients.append(client)
+        return client
+
+    def close(self):
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+
+class RemoteFiles(object):
+    """
+    Access to files on a remote server through a pool of persistent ssh
+    sessions, or to local files if no hostname is given.
+
+    Existence and size checks are answered from one listdir_attr per
+    directory, cached until the directory is invalidated, rather than an
+    sftp stat round trip per file.  Only symlinks are stat'ed, for the size
+    of their targets.
+
+    Args:
+        hostname: remote host, None for local files
+
+    Kwargs:
+        username: ssh username, defaults to the current user
+        pool_size: number of ssh sessions
+        rsync_host: rsync prefix for the remote host, for example "thost:"
+    """
+
+    def __init__(self, hostname=None, username=None, pool_size=4, rsync_host=None):
+        self.hostname = hostname
+        self.username = username
+        self.pool_size = pool_size
+        self.rsync_host = rsync_host
+
+        self._sessions = queue.Queue()
+        self._clients = []
+        self._num_sessions = 0
+        self._lock = threading.Lock()
+        self._listings = {}
+
+    @property
+    def is_remote(self):
+        return self.hostname is not None
+
+    def _connect(self):
+        ssh_client = connect_to_client(self.hostname, self.username)
+        sftp = ssh_client.open_sftp()
+        with self._lock:
+            self._clients.append(ssh_client)
+        return sftp
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+        Borrow an sftp client from the pool, connecting a new session if
+        fewer than pool_size are open.
+        """
+        with self._lock:
+            connect = self._sessions.empty() and self._num_sessions < self.pool_size
+            if connect:
+                self._num_sessions += 1
+
+        sftp = self._connect() if connect else self._sessions.get()
+        try:
+            yield sftp
+        finally:
+            self._sessions.put(sftp)
+
+    def close(self):
+        with self._lock:
+            for ssh_client in self._clients:
+                ssh_client.close()
+            self._clients = []
+            self._num_sessions = 0
+            self._sessions = queue.Queue()
+
+    def _list_directory(self, dirname):
+        if not self.is_remote:
+            if not os.path.isdir(dirname):
+                return {}
+            return {a.name: a.stat().st_size for a in os.scandir(dirname) if a.is_file()}
+
+        with self.session() as sftp:
+            try:
+                attrs = sftp.listdir_attr(dirname)
+            except IOError:
+                return {}
+
+            # listdir_attr gives the attributes of links, rsync copies their targets
+            listing = {}
+            for attr in attrs:
+                if stat.S_ISLNK(attr.st_mode):
+                    try:
+                        listing[attr.filename] = sftp.stat(os.path.join(dirname, attr.filename)).st_size
+                    except IOError:
+                        continue
+                else:
+                    listing[attr.filename] = attr.st_size
+            return listing
+
+    def listing(self, dirname):
+        """
+        Sizes of files in a directory keyed by filename, listed once and cached.
+        """
+        dirname = os.path.normpath(dirname)
+        with self._lock:
+            if dirname in self._listings:
+                return self._listings[dirname]
+
+        listing = self._list_directory(dirname)
+
+        with self._lock:
+            self._listings[dirname] = listing
+        return listing
+
+    def prefetch(self, paths):
+        """
+        List the directories of the given paths concurrently.
+        """
+        dirnames = set(os.path.dirname(a) for a in paths)
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            list(executor.map(self.listing, dirnames))
+
+    def invalidate(self, path):
+        """
+        Forget the cached listing of the directory containing path.
+        """
+        with self._lock:
+            self._listings.pop(os.path.normpath(os.path.dirname(path)), None)
+
+    def get_size(self, path):
+        """
+        Size of a file, None if it does not exist.
+        """
+        return self.listing(os.path.dirname(path)).get(os.path.basename(path))
+
+    def exists(self, path):
+        return self.get_size(path) is not None
+
+    def rsync(self, from_path, to_path, extra_args=()):
+        """
+        Copy a file to a local path unless it already exists with the same size.
+
+        Partial transfers are kept in a separate directory and resumed by
+        the next attempt.
+        """
+        from_size = self.get_size(from_path)
+        if from_size is None:
+            raise Exception("missing source file {}".format(from_path))
+
+        if os.path.isfile(to_path) and os.path.getsize(to_path) == from_size:
+            logging.info("The file already exists at {} -- skipping import".format(to_path))
+            return
+
+        transfer_from_path = (self.rsync_host or "") + from_path if self.is_remote else from_path
+
+        cmd = [
+            "rsync",
+            "-avPL",
+            "--partial-dir=.rsync-partial",
+        ]
+        cmd.extend(extra_args)
+        cmd.extend([transfer_from_path, to_path])
+
+        make_dirs(os.path.dirname(to_path))
+        logging.info("Copying file from {} to {}".format(from_path, to_path))
+        subprocess.check_call(cmd)
+
+        if os.path.getsize(to_path) != from_size:
+            raise Exception("copy failed for {} to {}".format(from_path, to_path))
+
+
+def run_transfer_pipeline(items, fetch, upload, num_fetch=4, num_upload=4, max_staged=None):
+    """
+    Run a two stage transfer, keeping fetches and uploads in flight at once.
+
+    Each item is fetched by one of num_fetch workers and the staged result is
+    handed to one of num_upload workers, so downloads of later files overlap
+    uploads of earlier ones.
+
+    Args:
+        items: list of items to transfer
+        fetch: callable(item) returning a staged object, for example a local path
+        upload: callable(item, staged) returning the transfer result
+
+    Kwargs:
+        num_fetch: number of concurrent fetches
+        num_upload: number of concurrent uploads
+        max_staged: maximum number of fetched items waiting for or in upload,
+                    bounds local scratch usage, defaults to num_fetch + num_upload
+
+    Returns:
+        list of upload results in the order of items
+    """
+    if max_staged is None:
+        max_staged = num_fetch + num_upload
+
+    staged_slots = threading.BoundedSemaphore(max_staged)
+
+    with ThreadPoolExecutor(max_workers=num_fetch) as fetch_executor, \
+            ThreadPoolExecutor(max_workers=num_upload) as upload_executor:
+
+        def _upload(item, staged):
+            try:
+                return upload(item, staged)
+            finally:
+                staged_slots.release()
+
+        def _fetch(item):
+            staged_slots.acquire()
+            try:
+                staged = fetch(item)
+            except Exception:
+                staged_slots.release()
+                raise
+            return upload_executor.submit(_upload, item, staged)
+
+        fetch_futures = [fetch_executor.submit(_fetch, item) for item in items]
+
+        upload_futures = []
+        try:
+            for fetch_future in fetch_futures:
+                upload_futures.append(fetch_future.result())
+            return [upload_future.result() for upload_future in upload_futures]
+
+        except Exception:
+            logging.error('transfer failed, cancelling pending transfers')
+            for future in fetch_futures + upload_futures:
+                future.cancel()
+            raise
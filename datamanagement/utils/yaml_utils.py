@@ -0,0 +1,54 @@
+"""
+YAML loading and dumping with the libyaml C bindings when available.
+
+PyYAML's pure python loader and emitter are several times slower than the
+libyaml based CSafeLoader and CSafeDumper, which matters for inputs and
+metadata yaml with an entry per cell.  Falls back to the pure python
+classes when PyYAML was built without libyaml.
+"""
+import hashlib
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper, Dumper
+
+
+def safe_load(stream):
+    """
+    Load a yaml document from a string or file object.
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_dump(data, stream=None, **kwargs):
+    """
+    Dump data as block style yaml to stream, or return it as a string if stream is None.
+    """
+    kwargs.setdefault('default_flow_style', False)
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
+
+
+def load_file(filename):
+    with open(filename) as f:
+        return safe_load(f)
+
+
+def dump_file(data, filename, **kwargs):
+    with open(filename, 'w') as f:
+        safe_dump(data, f, **kwargs)
+
+
+def hash_args(*args, **kwargs):
+    """
+    Hash of function arguments for naming sentinels.
+
+    Arguments are serialized as yaml with sorted keys and the full
+    representer, so any picklable python object can be hashed.  The C and
+    pure python dumpers produce the same text, so hashes, and therefore
+    sentinel names, do not depend on whether libyaml is available.
+    """
+    serialized = yaml.dump(args, Dumper=Dumper) + yaml.dump(kwargs, Dumper=Dumper)
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
@@ -14,6 +14,7 @@ import time
 import logging
 import traceback
 import random
+import threading
 from common_utils.utils import build_url
 
 log = logging.getLogger('sisyphus')
@@ -31,6 +32,41 @@ class FieldMismatchError(Exception):
     pass
 
 
+class LazyClient(object):
+    """ Proxy that constructs a client on first attribute access.
+
+    Module level clients built at import time fetch the api schema before
+    any argument parsing.  Wrapping the constructor defers that until the
+    client is actually used.
+
+    Args:
+        factory: callable returning the client
+        *args, **kwargs: passed to factory
+    """
+
+    def __init__(self, factory, *args, **kwargs):
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        """ Return the underlying client, constructing it if necessary.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory(*self._args, **self._kwargs)
+        return self._client
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the proxy itself
+        if name.startswith('__') or name in ('_factory', '_args', '_kwargs', '_client', '_lock'):
+            raise AttributeError(name)
+        return getattr(self.get_client(), name)
+
+
 class BasicAPIClient(object):
     """ Basic API class. """
 
@@ -277,6 +313,106 @@ class BasicAPIClient(object):
             # Set up for the next page
             self.get_list_pagination_next_page_params(get_params)
 
+    def has_filter(self, table_name, filter_name):
+        """ Whether the list endpoint of a table accepts a filter field.
+        """
+        return any(field.name == filter_name for field in self.coreapi_schema[table_name]["list"].fields)
+
+    def list_batched(self, table_name, filter_name, values, batch_size=100, **fields):
+        """ List resources matching any of values with batched __in queries.
+
+        Servers whose schema lacks the __in filter are queried once per value
+        with the filter it is based on, for example id for id__in.
+
+        Args:
+            table_name (str): the name of the table to query
+            filter_name (str): an __in filter such as id__in
+            values (list): values of the filter
+            batch_size (int): values per query
+            **fields: additional filter fields
+
+        Yields:
+            each matching resource once
+        """
+        values = sorted(set(values))
+
+        if filter_name.endswith("__in") and not self.has_filter(table_name, filter_name):
+            log.debug("{} does not accept {}, querying each value".format(table_name, filter_name))
+            queries = [{filter_name[:-len("__in")]: a} for a in values]
+        else:
+            queries = [
+                {filter_name: ",".join(str(a) for a in values[start:start + batch_size])}
+                for start in range(0, len(values), batch_size)]
+
+        seen = set()
+        for query in queries:
+            for record in self.list(table_name, **query, **fields):
+                if record["id"] not in seen:
+                    seen.add(record["id"])
+                    yield record
+
+    def list_by_ids(self, table_name, ids, batch_size=100):
+        """ Fetch resources by primary key with batched id__in queries.
+
+        Returns:
+            dict of resources keyed by id, missing ids are omitted
+        """
+        return {
+            record["id"]: record
+            for record in self.list_batched(table_name, "id__in", ids, batch_size=batch_size)
+        }
+
+    def list_pages(self, table_name, cached_pages=None, **filters):
+        """ List resources page by page, revalidating cached pages by ETag.
+
+        Cached pages are requested with If-None-Match and reused when the
+        server responds not modified, saving transfer and parsing of
+        unchanged pages.
+
+        Args:
+            table_name (str): the name of the table to query
+            cached_pages (list): pages from a previous call
+            **filters: filter fields passed in the query string
+
+        Returns:
+            list of dicts with etag, results and has_next for each page
+        """
+        endpoint_url = build_url(self.base_url, self.join_urls('api', table_name))
+
+        params = dict(filters)
+        self.get_list_pagination_initial_params(params)
+
+        pages = []
+        while True:
+            cached = None
+            if cached_pages is not None and len(cached_pages) > len(pages):
+                cached = cached_pages[len(pages)]
+
+            headers = {}
+            if cached is not None and cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+
+            r = self.session.get(endpoint_url, params=params, headers=headers)
+
+            if r.status_code == 304:
+                pages.append(cached)
+            elif r.ok:
+                data = r.json()
+                pages.append({
+                    'etag': r.headers.get('ETag'),
+                    'results': data['results'],
+                    'has_next': data.get('next') is not None,
+                })
+            else:
+                raise Exception('failed with error: "{}", reason: "{}"'.format(r.reason, r.text))
+
+            if not pages[-1]['has_next']:
+                break
+
+            self.get_list_pagination_next_page_params(params)
+
+        return pages
+
     def create(self, table_name, fields, keys, get_existing=False, do_update=False):
         """ Create the resource and return it.
         
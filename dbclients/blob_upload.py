@@ -0,0 +1,193 @@
+"""
+Resumable uploads of local files to Azure blob storage.
+
+Files larger than one block are uploaded as blocks staged in parallel.  The
+ids of staged blocks are recorded in a journal on local disk, so an
+interrupted upload resumes with the blocks that were not yet staged.  The
+blocks are committed conditionally, failing if the blob was created or
+changed by someone else since it was checked.
+"""
+import os
+import json
+import uuid
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobBlock
+
+log = logging.getLogger('sisyphus')
+
+DEFAULT_BLOCK_SIZE = 64 * 1024 * 1024
+
+DEFAULT_JOURNAL_DIR = os.environ.get(
+    'SISYPHUS_UPLOAD_JOURNAL_DIR',
+    os.path.join(os.path.expanduser('~'), '.sisyphus', 'upload_journal'),
+)
+
+
+class UploadJournal(object):
+    """
+    Blocks staged for the upload of a local file to a blob.
+
+    A journal is only resumed for the same local file, size, modification
+    time and block size, otherwise the upload starts over with new block ids.
+    """
+
+    def __init__(self, filename, key):
+        self.filename = filename
+        self.key = key
+        self.token = uuid.uuid4().hex
+        self.blocks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, journal_dir, blob_url, filepath, block_size):
+        stat = os.stat(filepath)
+        key = {
+            'blob': blob_url,
+            'filepath': os.path.abspath(filepath),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'block_size': block_size,
+        }
+        filename = os.path.join(journal_dir, hashlib.sha1(blob_url.encode()).hexdigest() + '.json')
+
+        journal = cls(filename, key)
+
+        if os.path.exists(filename):
+            with open(filename) as f:
+                data = json.load(f)
+            if data['key'] == key:
+                journal.token = data['token']
+                journal.blocks = {int(index): block_id for index, block_id in data['blocks'].items()}
+
+        return journal
+
+    def block_id(self, index):
+        # Block ids of a blob must all have the same length
+        return base64.b64encode('{}-{:08d}'.format(self.token, index).encode()).decode()
+
+    def retain(self, staged_block_ids):
+        """
+        Forget journaled blocks that are no longer staged, for example after expiry.
+        """
+        self.blocks = {index: block_id for index, block_id in self.blocks.items() if block_id in staged_block_ids}
+
+    def add(self, index):
+        with self._lock:
+            self.blocks[index] = self.block_id(index)
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump({'key': self.key, 'token': self.token, 'blocks': self.blocks}, f)
+        os.replace(temp_filename, self.filename)
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def upload_file(
+        blob_client,
+        filepath,
+        update=False,
+        block_size=DEFAULT_BLOCK_SIZE,
+        max_concurrency=8,
+        timeout=None,
+        journal_dir=None,
+):
+    """
+    Upload a local file to a blob, skipping blobs of the same size.
+
+    Existence and size are checked with a single properties request.
+
+    Args:
+        blob_client (BlobClient): destination blob
+        filepath (str): local file
+
+    KwArgs:
+        update (bool): overwrite a blob with a different size
+        block_size (int): bytes per staged block
+        max_concurrency (int): blocks staged in parallel
+        timeout (int): seconds per request
+        journal_dir (str): directory of upload journals, defaults to DEFAULT_JOURNAL_DIR
+
+    Returns:
+        False if the blob already exists with the same size, True otherwise
+    """
+    if journal_dir is None:
+        journal_dir = DEFAULT_JOURNAL_DIR
+
+    request_kwargs = {}
+    if timeout:
+        request_kwargs['timeout'] = timeout
+
+    filesize = os.path.getsize(filepath)
+
+    try:
+        properties = blob_client.get_blob_properties(**request_kwargs)
+    except ResourceNotFoundError:
+        properties = None
+
+    if properties is None:
+        # Fail rather than overwrite a blob created since the check
+        conditions = {'match_condition': MatchConditions.IfMissing}
+
+    elif properties.size == filesize:
+        log.info("{} already exists with the same size as {}".format(blob_client.blob_name, filepath))
+        return False
+
+    elif update:
+        log.info("{} updating from {}".format(blob_client.blob_name, filepath))
+        conditions = {'etag': properties.etag, 'match_condition': MatchConditions.IfNotModified}
+
+    else:
+        raise ValueError("blob {} size is {} but local file {} size is {}, use update to overwrite".format(
+            blob_client.blob_name, properties.size, filepath, filesize))
+
+    log.info("Creating blob {} from path {}".format(blob_client.blob_name, filepath))
+
+    if filesize <= block_size:
+        with open(filepath, 'rb') as stream:
+            blob_client.upload_blob(stream, overwrite=True, **conditions, **request_kwargs)
+        return True
+
+    num_blocks = (filesize + block_size - 1) // block_size
+
+    journal = UploadJournal.open(journal_dir, blob_client.url, filepath, block_size)
+
+    if journal.blocks:
+        try:
+            _, uncommitted = blob_client.get_block_list('uncommitted', **request_kwargs)
+            journal.retain(set(block.id for block in uncommitted))
+        except ResourceNotFoundError:
+            journal.retain(set())
+        log.info("Resuming upload of {} with {} of {} blocks staged".format(
+            blob_client.blob_name, len(journal.blocks), num_blocks))
+
+    def stage(index):
+        with open(filepath, 'rb') as f:
+            f.seek(index * block_size)
+            data = f.read(block_size)
+        blob_client.stage_block(journal.block_id(index), data, length=len(data), **request_kwargs)
+        journal.add(index)
+
+    missing = [index for index in range(num_blocks) if index not in journal.blocks]
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        list(executor.map(stage, missing))
+
+    block_list = [BlobBlock(block_id=journal.block_id(index)) for index in range(num_blocks)]
+    blob_client.commit_block_list(block_list, **conditions, **request_kwargs)
+
+    journal.remove()
+
+    return True
@@ -2,9 +2,178 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 import os
-from dbclients.basicclient import BasicAPIClient
+import copy
+import json
+import time
+import hashlib
+import threading
+import pandas as pd
+from dbclients.basicclient import BasicAPIClient, LazyClient, NotFoundError
 from dbclients.utils.dbclients_utils import get_colossus_base_url
 
+
+class SublibraryIndex(object):
+    """ Sublibraries of a library with lookups by cell_id, index_sequence and (row, column).
+
+    Indices are shared between callers, treat the sublibraries as read only.
+
+    Args:
+        library_id (str): library pool_id
+        sublibraries (list): sublibrary records from colossus
+    """
+
+    def __init__(self, library_id, sublibraries):
+        self.library_id = library_id
+        self.sublibraries = sublibraries
+        self.fetched = time.time()
+
+        for sublibrary in sublibraries:
+            if 'index_sequence' not in sublibrary and 'primer_i7' in sublibrary and 'primer_i5' in sublibrary:
+                sublibrary["index_sequence"] = f"{sublibrary['primer_i7']}-{sublibrary['primer_i5']}"
+
+        self._lookups = {}
+        self._table = None
+
+    @property
+    def table(self):
+        """ DataFrame of scalar sublibrary fields, with the nested sample flattened to its sample_id.
+        """
+        if self._table is None:
+            rows = []
+            for sublibrary in self.sublibraries:
+                row = {k: v for k, v in sublibrary.items() if not isinstance(v, (dict, list))}
+                if isinstance(sublibrary.get('sample_id'), dict):
+                    row['sample_id'] = sublibrary['sample_id'].get('sample_id')
+                rows.append(row)
+
+            table = pd.DataFrame(rows)
+            table = table.astype({a: int for a in ('row', 'column') if a in table})
+            self._table = table
+
+        return self._table
+
+    def get_by_field(self, field_name):
+        """ Sublibraries in a dictionary keyed by a unique field.
+        """
+        if field_name not in self._lookups:
+            lookup = dict()
+            for sublibrary in self.sublibraries:
+                field_value = sublibrary[field_name]
+
+                if field_value in lookup:
+                    raise Exception(f"multiple sublibraries for {field_name} {field_value}")
+
+                lookup[field_value] = sublibrary
+
+            self._lookups[field_name] = lookup
+
+        return dict(self._lookups[field_name])
+
+    def by_cell_id(self):
+        return self.get_by_field('cell_id')
+
+    def by_index_sequence(self):
+        return self.get_by_field('index_sequence')
+
+    def by_row_column(self):
+        """ Sublibraries in a dictionary keyed by (row, column).
+        """
+        if ('row', 'column') not in self._lookups:
+            lookup = dict()
+            for sublibrary in self.sublibraries:
+                key = (int(sublibrary['row']), int(sublibrary['column']))
+
+                if key in lookup:
+                    raise Exception(f"multiple sublibraries for row {key[0]} column {key[1]}")
+
+                lookup[key] = sublibrary
+
+            self._lookups[('row', 'column')] = lookup
+
+        return dict(self._lookups[('row', 'column')])
+
+
+# (colossus url, library id) -> SublibraryIndex, shared by clients in the process
+_sublibrary_indices = {}
+_sublibrary_locks = {}
+_sublibrary_indices_lock = threading.Lock()
+
+# Seconds before a cached index is fetched again, for long running processes
+SUBLIBRARY_CACHE_TTL = float(os.environ.get('SISYPHUS_SUBLIBRARY_CACHE_TTL', 3600))
+
+
+def clear_sublibrary_cache(library_id=None):
+    """ Forget sublibrary indices cached in memory, of one library or all libraries.
+    """
+    with _sublibrary_indices_lock:
+        if library_id is None:
+            _sublibrary_indices.clear()
+            _sublibrary_locks.clear()
+        else:
+            _sublibrary_indices.pop((get_colossus_base_url(), library_id), None)
+
+
+def _fetch_sublibraries(colossus_api, library_id, cache_dir):
+    """ Fetch sublibraries, revalidating pages cached in cache_dir by ETag.
+    """
+    if not cache_dir:
+        return list(colossus_api.list('sublibraries', library__pool_id=library_id))
+
+    url_hash = hashlib.md5(get_colossus_base_url().encode()).hexdigest()[:8]
+    cache_filename = os.path.join(cache_dir, f'sublibraries_{url_hash}_{library_id}.json')
+
+    cached_pages = None
+    if os.path.exists(cache_filename):
+        with open(cache_filename) as f:
+            cached_pages = json.load(f)
+
+    pages = colossus_api.list_pages('sublibraries', cached_pages=cached_pages, library__pool_id=library_id)
+
+    if pages != cached_pages:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_filename = cache_filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(pages, f)
+        os.replace(temp_filename, cache_filename)
+
+    return [sublibrary for page in pages for sublibrary in page['results']]
+
+
+def get_sublibrary_index(library_id, colossus_api=None, refresh=False, max_age=None):
+    """ Get the sublibrary index of a library, cached in memory for max_age seconds.
+
+    If SISYPHUS_SUBLIBRARY_CACHE_DIR is set, sublibraries are also cached on
+    disk between processes and revalidated by ETag on first use.
+
+    Args:
+        library_id (str): library pool_id
+
+    KwArgs:
+        colossus_api (ColossusApi): client used to fetch, defaults to a shared client
+        refresh (bool): fetch again even if cached in memory
+        max_age (float): seconds before fetching again, defaults to SUBLIBRARY_CACHE_TTL
+    """
+    if colossus_api is None:
+        colossus_api = _default_client
+
+    if max_age is None:
+        max_age = SUBLIBRARY_CACHE_TTL
+
+    key = (get_colossus_base_url(), library_id)
+
+    with _sublibrary_indices_lock:
+        lock = _sublibrary_locks.setdefault(key, threading.Lock())
+
+    # Concurrent callers for the same library wait for a single fetch
+    with lock:
+        index = _sublibrary_indices.get(key)
+        if refresh or index is None or time.time() - index.fetched > max_age:
+            sublibraries = _fetch_sublibraries(colossus_api, library_id, os.environ.get('SISYPHUS_SUBLIBRARY_CACHE_DIR'))
+            _sublibrary_indices[key] = SublibraryIndex(library_id, sublibraries)
+
+        return _sublibrary_indices[key]
+
+
 class ColossusApi(BasicAPIClient):
     """ Colossus API class. """
 
@@ -29,11 +198,15 @@ class ColossusApi(BasicAPIClient):
     def get_colossus_sublibraries_from_library_id(self, library_id, brief=False):
         """ Gets the sublibrary information from a library id.
         """
-        endpoint = "sublibraries"
-        if brief:
-            endpoint += "_brief"
+        if not brief:
+            return copy.deepcopy(self.get_sublibrary_index(library_id).sublibraries)
 
-        return list(self.list(endpoint, library__pool_id=library_id))
+        return list(self.list("sublibraries_brief", library__pool_id=library_id))
+
+    def get_sublibrary_index(self, library_id, refresh=False):
+        """ Gets the shared sublibrary index of a library.
+        """
+        return get_sublibrary_index(library_id, colossus_api=self, refresh=refresh)
 
     def query_libraries_by_library_id(self, library_id):
         """ Gets a library by its library_id. I DONT THINK THIS IS USING LIBRARY ID I THINK THIS IS USING CHIP ID
@@ -44,21 +217,7 @@ class ColossusApi(BasicAPIClient):
     def get_sublibraries_by_field(self, library_id, field_name):
         """ Get sublibraries in a dictionary keyed by a given field.
         """
-        sublibrary_list = self.list("sublibraries", library__pool_id=library_id)
-
-        sublibrary_dict = dict()
-        for sublibrary in sublibrary_list:
-            if 'index_sequence' not in sublibrary:
-                sublibrary["index_sequence"] = f"{sublibrary['primer_i7']}-{sublibrary['primer_i5']}"
-
-            field_value = sublibrary[field_name]
-
-            if field_value in sublibrary_dict:
-                raise Exception(f"multiple sublibraries for {field_name} {field_value}")
-
-            sublibrary_dict[field_value] = sublibrary
-
-        return sublibrary_dict
+        return self.get_sublibrary_index(library_id).get_by_field(field_name)
 
     def get_sublibraries_by_cell_id(self, library_id):
         """ Get sublibraries in a dictionary keyed by cell_id.
@@ -70,8 +229,31 @@ class ColossusApi(BasicAPIClient):
         """
         return self.get_sublibraries_by_field(library_id, 'index_sequence')
 
-_default_client = ColossusApi()
-get_colossus_sublibraries_from_library_id = (
-    _default_client.get_colossus_sublibraries_from_library_id
-)
-query_libraries_by_library_id = _default_client.query_libraries_by_library_id
+    def get_sequencings(self, sequencing_ids):
+        """ Get sequencings in a dictionary keyed by id.
+        """
+        return self.list_by_ids("sequencing", sequencing_ids)
+
+    def get_lanes_by_sequencing(self, sequencing_ids):
+        """ Get lane ids in a dictionary keyed by sequencing id.
+        """
+        sequencings = self.get_sequencings(sequencing_ids)
+
+        missing = set(sequencing_ids) - set(sequencings)
+        if missing:
+            raise NotFoundError(f"no sequencing for ids {sorted(missing)}")
+
+        return {
+            sequencing_id: [lane["id"] for lane in sequencing["dlplane_set"]]
+            for sequencing_id, sequencing in sequencings.items()
+        }
+
+_default_client = LazyClient(ColossusApi)
+
+
+def get_colossus_sublibraries_from_library_id(*args, **kwargs):
+    return _default_client.get_colossus_sublibraries_from_library_id(*args, **kwargs)
+
+
+def query_libraries_by_library_id(*args, **kwargs):
+    return _default_client.query_libraries_by_library_id(*args, **kwargs)
@@ -0,0 +1,292 @@
+import os
+import time
+import atexit
+import random
+import logging
+import itertools
+import threading
+import collections
+
+from jira import JIRA
+from jira.exceptions import JIRAError
+
+
+JIRA_SERVER = 'https://www.bcgsc.ca/jira/'
+
+log = logging.getLogger('sisyphus')
+
+
+class JiraWriteError(Exception):
+    """ Queued writes failed after all retries.
+    """
+    def __init__(self, failed_writes):
+        self.failed_writes = failed_writes
+        super(JiraWriteError, self).__init__('{} jira writes failed: {}'.format(
+            len(failed_writes), ', '.join(f'{key[0]} on {key[1]}' for key, value in failed_writes)))
+
+
+class JiraClient(object):
+    """ JIRA facade with a lazy connection, an issue cache and background writes.
+
+    The connection is made on first use.  Issues are cached for the life of
+    the client, fetched with only the requested fields, and can be fetched
+    in bulk with a `key in (...)` search.  Comments and attachments are
+    queued and sent by a background thread, pending comments on the same
+    issue are sent as one and failed writes are retried.  Writes that still
+    fail are raised by the next flush, and logged at exit.
+
+    Attributes not defined here are passed through to the JIRA client.
+
+    KwArgs:
+        server (str): JIRA url
+        username (str): defaults to JIRA_USERNAME
+        password (str): defaults to JIRA_PASSWORD
+        retries (int): attempts for each queued write
+        backoff (float): initial wait in seconds between attempts, doubled after each failure
+        search_batch_size (int): keys per bulk search
+    """
+    def __init__(self, server=JIRA_SERVER, username=None, password=None, retries=5, backoff=5, search_batch_size=50):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.retries = retries
+        self.backoff = backoff
+        self.search_batch_size = search_batch_size
+
+        self._jira = None
+        self._lock = threading.Lock()
+
+        # jira_id -> (fields, issue), fields is None for a full issue
+        self._issues = {}
+
+        # (kind, jira_id, name) -> write, in the order first queued
+        self._pending = collections.OrderedDict()
+        self._sending = {}
+        self._writes = threading.Condition()
+        self._writer = None
+        self._attachment_ids = itertools.count()
+        self.failed_writes = []
+
+    @property
+    def jira(self):
+        if self._jira is None:
+            with self._lock:
+                if self._jira is None:
+                    username = self.username or os.environ['JIRA_USERNAME']
+                    password = self.password or os.environ['JIRA_PASSWORD']
+                    self._jira = JIRA(self.server, basic_auth=(username, password))
+        return self._jira
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the facade itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.jira, name)
+
+    # Reads
+
+    def _cached(self, jira_id, fields):
+        cached = self._issues.get(jira_id)
+        if cached is None:
+            return None
+        cached_fields, issue = cached
+        if cached_fields is None or (fields is not None and set(fields) <= cached_fields):
+            return issue
+        return None
+
+    def _merged_fields(self, jira_id, fields):
+        if fields is None:
+            return None
+        cached = self._issues.get(jira_id)
+        if cached is not None and cached[0] is not None:
+            return set(fields) | cached[0]
+        return set(fields)
+
+    def issue(self, jira_id, fields=None, refresh=False):
+        """ Get an issue, from the cache unless refresh is set.
+
+        Args:
+            jira_id (str): issue key, for example SC-1234
+
+        KwArgs:
+            fields (list): fields needed, None for all fields
+            refresh (bool): fetch even if cached
+        """
+        if not refresh:
+            issue = self._cached(jira_id, fields)
+            if issue is not None:
+                return issue
+
+        fields = self._merged_fields(jira_id, fields)
+        issue = self.jira.issue(jira_id, fields=','.join(sorted(fields)) if fields is not None else None)
+        self._issues[jira_id] = (fields, issue)
+        self._issues[issue.key] = (fields, issue)
+
+        return issue
+
+    def issues(self, jira_ids, fields=None):
+        """ Get many issues, searching for those not cached in batches.
+
+        Returns:
+            dict of issues keyed by jira id, missing issues are omitted
+        """
+        missing = sorted(set(a for a in jira_ids if self._cached(a, fields) is None))
+
+        for start in range(0, len(missing), self.search_batch_size):
+            batch = missing[start:start + self.search_batch_size]
+            batch_fields = set()
+            for jira_id in batch:
+                merged = self._merged_fields(jira_id, fields)
+                batch_fields = None if merged is None or batch_fields is None else batch_fields | merged
+
+            fields_param = ','.join(sorted(batch_fields)) if batch_fields is not None else None
+
+            # The search fails as a whole if any key is missing or deleted,
+            # fall back to fetching the batch one issue at a time
+            jql = 'key in ({})'.format(','.join(batch))
+            try:
+                found = self.jira.search_issues(jql, fields=fields_param, maxResults=len(batch))
+            except JIRAError as e:
+                log.warning(f'search for {len(batch)} issues failed with {e.status_code}, fetching individually')
+                found = []
+                for jira_id in batch:
+                    try:
+                        found.append(self.jira.issue(jira_id, fields=fields_param))
+                    except JIRAError as e:
+                        if e.status_code != 404:
+                            raise
+                        log.warning(f'issue {jira_id} not found')
+
+            for issue in found:
+                self._issues[issue.key] = (batch_fields, issue)
+
+        return {a: self._cached(a, fields) for a in jira_ids if self._cached(a, fields) is not None}
+
+    def invalidate(self, jira_id):
+        self._issues.pop(jira_id, None)
+
+    # Queued writes
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _queue(self, key, value):
+        with self._writes:
+            if key[0] == 'comment' and key in self._pending:
+                self._pending[key].append(value)
+            elif key[0] == 'comment':
+                self._pending[key] = [value]
+            else:
+                self._pending[key] = value
+            self._start_writer()
+            self._writes.notify_all()
+
+    def _send(self, key, value):
+        kind, jira_id, name = key
+        if kind == 'comment':
+            self.jira.add_comment(jira_id, '\n\n'.join(value))
+        elif kind == 'attachment':
+            attachment, filename = value
+            kwargs = {'filename': filename} if filename else {}
+            self.jira.add_attachment(issue=jira_id, attachment=attachment, **kwargs)
+        self.invalidate(jira_id)
+
+    def _write_loop(self):
+        while True:
+            with self._writes:
+                while not self._pending:
+                    self._writes.wait()
+                key, value = self._pending.popitem(last=False)
+                self._sending[key] = value
+
+            try:
+                for attempt in range(self.retries):
+                    try:
+                        self._send(key, value)
+                        break
+                    except Exception:
+                        if attempt == self.retries - 1:
+                            raise
+                        wait_time = self.backoff * 2 ** attempt * random.uniform(0.5, 1.)
+                        log.warning(f'failed to {key[0]} on {key[1]}, retrying in {wait_time:.0f}s')
+                        time.sleep(wait_time)
+            except Exception:
+                log.exception(f'failed to {key[0]} on {key[1]}')
+                with self._writes:
+                    self.failed_writes.append((key, value))
+            finally:
+                with self._writes:
+                    del self._sending[key]
+                    self._writes.notify_all()
+
+    def add_comment(self, jira_id, comment, wait=False):
+        """ Queue a comment, comments on the same issue queued together are sent as one.
+        """
+        self._queue(('comment', jira_id, None), comment)
+        if wait:
+            self.flush()
+
+    def add_attachment(self, issue, attachment, filename=None, wait=False):
+        """ Queue an attachment, the file must exist until it is sent.
+        """
+        jira_id = getattr(issue, 'key', issue)
+        self._queue(('attachment', jira_id, next(self._attachment_ids)), (attachment, filename))
+        if wait:
+            self.flush()
+
+    def pending_attachments(self, jira_id):
+        """ Filenames of attachments to an issue queued or being sent.
+        """
+        with self._writes:
+            queued = list(self._pending.items()) + list(self._sending.items())
+
+        filenames = []
+        for (kind, key, _), value in queued:
+            if kind == 'attachment' and key == jira_id:
+                attachment, filename = value
+                filenames.append(filename or os.path.basename(str(attachment)))
+
+        return filenames
+
+    def flush(self, timeout=None):
+        """ Wait for queued writes to be sent.
+
+        Returns:
+            True if the queue drained within the timeout
+
+        Raises:
+            JiraWriteError for writes that failed since the last flush
+        """
+        with self._writes:
+            drained = self._writes.wait_for(lambda: not self._pending and not self._sending, timeout=timeout)
+            failed_writes, self.failed_writes = self.failed_writes, []
+
+        if failed_writes:
+            raise JiraWriteError(failed_writes)
+
+        return drained
+
+    def close(self, timeout=None):
+        """ Flush queued writes, logging rather than raising failed writes.
+        """
+        try:
+            return self.flush(timeout=timeout)
+        except JiraWriteError as e:
+            log.error(str(e))
+            return False
+
+_shared_jira_client = None
+_shared_jira_client_lock = threading.Lock()
+
+
+def get_jira_client():
+    """ Get a JiraClient shared within the process.
+    """
+    global _shared_jira_client
+    with _shared_jira_client_lock:
+        if _shared_jira_client is None:
+            _shared_jira_client = JiraClient()
+    return _shared_jira_client
@@ -35,6 +35,7 @@ from azure.identity.aio import ClientSecretCredential as AsyncClientSecretCreden
 from datamanagement.utils.django_json_encoder import DjangoJSONEncoder
 from datamanagement.utils.utils import make_dirs
 from dbclients.basicclient import BasicAPIClient, FieldMismatchError, NotFoundError
+from dbclients.blob_upload import upload_file
 
 from dbclients.utils.dbclients_utils import get_tantalus_base_url
 
@@ -226,6 +227,11 @@ class BlobStorageClient(object):
         created_time = blob.last_modified.isoformat()
         return created_time
 
+    def get_etag(self, blobname):
+        blob_client = self.blob_service.get_blob_client(self.storage_container, blobname)
+        blob = blob_client.get_blob_properties()
+        return blob.etag
+
     def get_url(self, blobname, write_permission=False):
 
         if write_permission:
@@ -307,33 +313,25 @@ class BlobStorageClient(object):
         blob_client = self.blob_service.get_blob_client(self.storage_container, blobname)
         return blob_client.upload_blob(data, overwrite=True)
 
-    def create(self, blobname, filepath, update=False, max_concurrency=200, timeout=345600):
-        kwargs = {}
-        if max_concurrency:
-            kwargs['max_concurrency'] = max_concurrency
-        if timeout:
-            kwargs['timeout'] = timeout
-
-        if self.exists(blobname):
-            log.info("{} already exists on {}".format(blobname, self.prefix))
+    def create(self, blobname, filepath, update=False, max_concurrency=8, timeout=345600):
+        """ Upload a file, resuming an interrupted upload of the same file.
 
-            blobsize = self.get_size(blobname)
-            filesize = os.path.getsize(filepath)
-
-            if blobsize == filesize:
-                log.info("{} has the same size as {}".format(blobname, filepath))
-                return
-            elif update:
-                log.info("{} updating from {}".format(blobname, filepath))
-            else:
-                raise Exception("blob size is {} but local file size is {}".format(blobsize, filesize))
-
-        log.info("Creating blob {} from path {}".format(blobname, filepath))
+        Skips blobs with the same size as the file, and raises for blobs
+        with a different size unless update is set.
 
+        Returns:
+            False if the blob already exists with the same size, True otherwise
+        """
         blob_client = self.blob_service.get_blob_client(self.storage_container, blobname)
 
-        with open(filepath, "rb") as stream:
-            blob_client.upload_blob(stream, overwrite=True)
+        return upload_file(
+            blob_client,
+            filepath,
+            update=update,
+            block_size=self.blob_service.MAX_BLOCK_SIZE,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+        )
 
     def copy(self, blobname, new_blobname, wait=False):
         url = self.get_url(blobname)
@@ -392,6 +390,11 @@ class ServerStorageClient(object):
         # TODO: this is currently fixed at pacific time
         return pd.Timestamp(time.ctime(os.path.getmtime(filepath)), tz="Canada/Pacific").isoformat()
 
+    def get_etag(self, filename):
+        # Changes when the file is rewritten, as for a web server
+        stat = os.stat(os.path.join(self.storage_directory, filename))
+        return '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+
     def get_url(self, filename):
         filepath = os.path.join(self.storage_directory, filename)
         return filepath
@@ -1,3 +1,4 @@
+import os
 import settings
 from constants.url_constants import (
 	DEFAULT_TANTALUS_BASE_URL,
@@ -23,6 +24,10 @@ def get_tantalus_base_url():
 	Get Tantalus base URL based on the mode.
 	Mode can be one of 'development', 'testing', 'staging', and 'production'
 	"""
+	# explicit override, for example a local stand-in server
+	if os.environ.get("TANTALUS_BASE_URL"):
+		return os.environ["TANTALUS_BASE_URL"]
+
 	# by default, use production server
 	mode = settings.mode.lower()
 	if(mode not in ["production", "staging", "development", "testing"]):
@@ -71,6 +76,10 @@ def get_colossus_base_url():
 	Get Colossus base URL based on the mode.
 	Mode can be one of 'development', 'testing', 'staging', and 'production'
 	"""
+	# explicit override, for example a local stand-in server
+	if os.environ.get("COLOSSUS_BASE_URL"):
+		return os.environ["COLOSSUS_BASE_URL"]
+
 	# by default, use production server
 	mode = settings.mode.lower()
 	if(mode not in ["production", "staging", "development", "testing"]):
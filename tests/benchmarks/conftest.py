@@ -0,0 +1,197 @@
+"""
+Fixtures for the pytest-benchmark suite.
+
+Tantalus and Colossus are replaced by in-process FakeApiServer instances
+and blob storage by a local directory. Benchmarks are not collected by a
+plain pytest run, run them explicitly:
+
+	pytest tests/benchmarks/*_benchmark.py
+
+Environment variables:
+	SISYPHUS_BENCHMARK_SCALE: 'full' (default) or 'small' for a quick smoke run
+	SISYPHUS_BENCHMARK_LATENCY: seconds of latency added to each api request
+"""
+import io
+import os
+import pytest
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES, COLOSSUS_TABLES
+from tests.fakes.storage import FakeBlobStorageClient
+
+SCALES = {
+	'small': {
+		'cells': 100,
+		'files': 1000,
+		'analyses': 50,
+	},
+	'full': {
+		'cells': 10000,
+		'files': 100000,
+		'analyses': 2000,
+	},
+}
+
+BLOB_STORAGE_NAME = 'fake_blob'
+SERVER_STORAGE_NAME = 'fake_server'
+
+
+@pytest.fixture(scope='session')
+def scale():
+	return SCALES[os.environ.get('SISYPHUS_BENCHMARK_SCALE', 'full')]
+
+
+@pytest.fixture(scope='session')
+def api_latency():
+	return float(os.environ.get('SISYPHUS_BENCHMARK_LATENCY', 0.))
+
+
+@pytest.fixture(scope='session')
+def fake_tantalus(api_latency):
+	with FakeApiServer(TANTALUS_TABLES, page_size=1000, latency=api_latency) as server:
+		yield server
+
+
+@pytest.fixture(scope='session')
+def fake_colossus(api_latency):
+	with FakeApiServer(COLOSSUS_TABLES, page_size=100, latency=api_latency) as server:
+		yield server
+
+
+@pytest.fixture(scope='session')
+def fake_apis(fake_tantalus, fake_colossus):
+	""" Point the api clients at the fake servers for the whole session.
+
+	Set before importing any module that builds clients at import time.
+	"""
+	previous = {name: os.environ.get(name) for name in ('TANTALUS_BASE_URL', 'COLOSSUS_BASE_URL')}
+	os.environ['TANTALUS_BASE_URL'] = fake_tantalus.base_url
+	os.environ['COLOSSUS_BASE_URL'] = fake_colossus.base_url
+
+	yield fake_tantalus, fake_colossus
+
+	for name, value in previous.items():
+		if value is None:
+			os.environ.pop(name, None)
+		else:
+			os.environ[name] = value
+
+
+@pytest.fixture(scope='session')
+def storage_dirs(tmp_path_factory):
+	return {
+		BLOB_STORAGE_NAME: str(tmp_path_factory.mktemp('blob')),
+		SERVER_STORAGE_NAME: str(tmp_path_factory.mktemp('server')),
+	}
+
+
+@pytest.fixture(scope='session')
+def storages(fake_apis, storage_dirs):
+	fake_tantalus, _ = fake_apis
+	fake_tantalus.add_records('storage', [
+		{
+			'name': BLOB_STORAGE_NAME,
+			'storage_type': 'blob',
+			'prefix': 'singlecelldata/data',
+			'storage_account': 'fakeaccount',
+			'storage_container': 'fake',
+		},
+		{
+			'name': SERVER_STORAGE_NAME,
+			'storage_type': 'server',
+			'prefix': storage_dirs[SERVER_STORAGE_NAME],
+			'storage_directory': storage_dirs[SERVER_STORAGE_NAME],
+			'server_ip': '127.0.0.1',
+		},
+	])
+	return {
+		'working_inputs': BLOB_STORAGE_NAME,
+		'working_results': BLOB_STORAGE_NAME,
+		'remote_results': BLOB_STORAGE_NAME,
+		'local': SERVER_STORAGE_NAME,
+	}
+
+
+@pytest.fixture
+def blob_storage_client(storage_dirs, api_latency):
+	return FakeBlobStorageClient(
+		storage_dirs[BLOB_STORAGE_NAME], 'singlecelldata/data', latency=api_latency)
+
+
+@pytest.fixture
+def tantalus_api(storages, blob_storage_client):
+	from dbclients.tantalus import TantalusApi
+
+	tantalus_api = TantalusApi()
+	tantalus_api.cached_storage_clients[BLOB_STORAGE_NAME] = blob_storage_client
+	return tantalus_api
+
+
+@pytest.fixture
+def colossus_api(fake_apis):
+	from dbclients.colossus import ColossusApi
+
+	return ColossusApi()
+
+
+def write_files(storage_client, filenames, content=b'0'):
+	for filename in filenames:
+		storage_client.write_data(filename, io.BytesIO(content))
+
+
+def add_file_records(fake_tantalus, storage_name, filenames, size=1, sequencefileinfo=None):
+	""" Register files directly in the fake tantalus.
+
+	Returns:
+		list of file resource ids
+	"""
+	storage_id = fake_tantalus.query('storage', {'name': [storage_name]})[0]
+
+	resource_ids = fake_tantalus.add_records('file_resource', [
+		{
+			'filename': filename,
+			'size': size,
+			'created': '2021-01-01T00:00:00+00:00',
+			'sequencefileinfo': sequencefileinfo[idx] if sequencefileinfo else None,
+		}
+		for idx, filename in enumerate(filenames)])
+
+	fake_tantalus.add_records('file_instance', [
+		{'file_resource': pk, 'storage': storage_id} for pk in resource_ids])
+
+	return resource_ids
+
+
+def add_library_cells(fake_colossus, library_id, num_cells, sample_id='SA1'):
+	""" Add a colossus library with one sublibrary per cell.
+
+	Returns:
+		list of index sequences in cell order
+	"""
+	library_pk, = fake_colossus.add_records('library', [{'pool_id': library_id, 'jira_ticket': 'SC-1'}])
+
+	sublibraries = []
+	index_sequences = []
+	for idx in range(num_cells):
+		row, column = divmod(idx, 72)
+		primer_i7 = f'{idx:06d}'.replace('0', 'A').replace('1', 'C')
+		primer_i5 = f'{idx:06d}'.replace('0', 'G').replace('1', 'T')
+		index_sequences.append(f'{primer_i7}-{primer_i5}')
+		sublibraries.append({
+			'library': library_pk,
+			'sample_id': {'sample_id': sample_id, 'sample_type': 'P'},
+			'row': row + 1,
+			'column': column + 1,
+			'img_col': column + 1,
+			'pick_met': 'C1',
+			'condition': 'A',
+			'primer_i5': primer_i5,
+			'index_i5': f'i5-{idx}',
+			'primer_i7': primer_i7,
+			'index_i7': f'i7-{idx}',
+			'metadata': {'is_control': 'False'},
+		})
+
+	fake_colossus.add_records('sublibraries', sublibraries)
+
+	return index_sequences
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+
+ENTRY_POINTS = [
+	'workflows.analysis.run',
+	'workflows.run_tenx',
+	'datamanagement.transfer_files',
+]
+
+
+@pytest.mark.parametrize('module', ENTRY_POINTS)
+def test_help_startup(benchmark, module, fake_apis):
+	""" Time `--help`, which should not touch either api.
+	"""
+	fake_tantalus, fake_colossus = fake_apis
+	request_count = fake_tantalus.request_count + fake_colossus.request_count
+
+	env = dict(os.environ, JIRA_USERNAME='benchmark', JIRA_PASSWORD='benchmark')
+
+	def run_help():
+		subprocess.run([sys.executable, '-m', module, '--help'], cwd=ROOT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+	benchmark.pedantic(run_help, rounds=5)
+
+	assert fake_tantalus.request_count + fake_colossus.request_count == request_count
@@ -0,0 +1,78 @@
+import os
+import yaml
+
+from tests.benchmarks.conftest import (
+	BLOB_STORAGE_NAME,
+	SERVER_STORAGE_NAME,
+	add_file_records,
+	write_files,
+)
+
+
+def _cell_filenames(num_files, directory):
+	return [os.path.join(directory, f'cell_{idx}.bam') for idx in range(num_files)]
+
+
+def test_transfer_dataset(benchmark, scale, fake_tantalus, tantalus_api, storage_dirs, blob_storage_client):
+	from datamanagement.transfer_files import transfer_dataset
+
+	server_client = tantalus_api.get_storage_client(SERVER_STORAGE_NAME)
+	filenames = _cell_filenames(scale['cells'], 'transfer/bams')
+	write_files(server_client, filenames)
+
+	resource_ids = add_file_records(fake_tantalus, SERVER_STORAGE_NAME, filenames)
+	dataset_id, = fake_tantalus.add_records('sequencedataset', [
+		{'name': 'transfer', 'dataset_type': 'BAM', 'file_resources': resource_ids}])
+	snapshot = fake_tantalus.snapshot()
+
+	def setup():
+		fake_tantalus.restore(snapshot)
+		for filename in filenames:
+			if blob_storage_client.exists(filename):
+				blob_storage_client.delete(filename)
+
+	benchmark.pedantic(
+		transfer_dataset,
+		args=(tantalus_api, dataset_id, 'sequencedataset', SERVER_STORAGE_NAME, BLOB_STORAGE_NAME),
+		setup=setup,
+		rounds=3,
+	)
+
+	assert tantalus_api.is_dataset_on_storage(dataset_id, 'sequencedataset', BLOB_STORAGE_NAME)
+
+
+def test_add_file(benchmark, scale, fake_tantalus, tantalus_api, blob_storage_client):
+	filenames = _cell_filenames(scale['files'], 'add_file/bams')
+	write_files(blob_storage_client, filenames)
+	snapshot = fake_tantalus.snapshot()
+
+	def add_files():
+		for filename in filenames:
+			tantalus_api.add_file(BLOB_STORAGE_NAME, os.path.join(blob_storage_client.prefix, filename))
+
+	benchmark.pedantic(add_files, setup=lambda: fake_tantalus.restore(snapshot), rounds=1)
+
+	assert len(fake_tantalus.records('file_resource')) >= scale['files']
+
+
+def test_create_dlp_results(benchmark, scale, fake_tantalus, tantalus_api, blob_storage_client):
+	from workflows.analysis.dlp.results_import import create_dlp_results
+
+	results_dir = 'SC-1/results/annotation'
+	filenames = [f'metrics/cell_{idx}.csv.gz' for idx in range(scale['files'])]
+	write_files(blob_storage_client, [os.path.join(results_dir, a) for a in filenames])
+	blob_storage_client.write_data_raw(
+		os.path.join(results_dir, 'metadata.yaml'),
+		yaml.safe_dump({'filenames': filenames, 'meta': {'type': 'annotation', 'version': '0.0.1'}}))
+
+	analysis_id, = fake_tantalus.add_records('analysis', [{'name': 'annotation', 'jira_ticket': 'SC-1'}])
+	snapshot = fake_tantalus.snapshot()
+
+	results = benchmark.pedantic(
+		create_dlp_results,
+		args=(tantalus_api, results_dir, analysis_id, 'SC-1_annotation', [], [], BLOB_STORAGE_NAME),
+		setup=lambda: fake_tantalus.restore(snapshot),
+		rounds=1,
+	)
+
+	assert len(results['file_resources']) == scale['files'] + 1
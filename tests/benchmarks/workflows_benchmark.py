@@ -0,0 +1,88 @@
+import datetime
+import yaml
+
+from tests.benchmarks.conftest import (
+	BLOB_STORAGE_NAME,
+	add_file_records,
+	add_library_cells,
+	write_files,
+)
+
+
+def test_generate_inputs_yaml(benchmark, scale, fake_tantalus, fake_colossus, tantalus_api, blob_storage_client, storages, tmp_path):
+	from workflows.analysis.dlp.hmmcopy import HMMCopyAnalysis
+
+	library_id = 'A00001A'
+	index_sequences = add_library_cells(fake_colossus, library_id, scale['cells'])
+
+	filenames = []
+	sequencefileinfo = []
+	for index_sequence in index_sequences:
+		for suffix in ('.bam', '.bam.bai'):
+			filenames.append(f'{library_id}/bams/{index_sequence}{suffix}')
+			sequencefileinfo.append({'index_sequence': index_sequence})
+	write_files(blob_storage_client, filenames)
+	resource_ids = add_file_records(fake_tantalus, BLOB_STORAGE_NAME, filenames, sequencefileinfo=sequencefileinfo)
+
+	dataset_id, = fake_tantalus.add_records('sequencedataset', [
+		{'name': f'{library_id}_bams', 'dataset_type': 'BAM', 'file_resources': resource_ids}])
+	analysis = {
+		'id': 1,
+		'name': f'sc_hmmcopy_{library_id}',
+		'analysis_type': 'hmmcopy',
+		'jira_ticket': 'SC-1',
+		'version': 'v0.0.0',
+		'args': {'library_id': library_id},
+		'input_datasets': [dataset_id],
+		'input_results': [],
+	}
+	inputs_yaml_filename = str(tmp_path / 'inputs.yaml')
+
+	analysis = HMMCopyAnalysis(tantalus_api, analysis)
+	benchmark.pedantic(analysis.generate_inputs_yaml, args=(storages, inputs_yaml_filename), rounds=3)
+
+	with open(inputs_yaml_filename) as f:
+		assert len(yaml.safe_load(f)) == scale['cells']
+
+
+def test_run_qc_polling(benchmark, scale, fake_colossus, tantalus_api, colossus_api, mocker, monkeypatch):
+	monkeypatch.setenv('JIRA_USERNAME', 'benchmark')
+	monkeypatch.setenv('JIRA_PASSWORD', 'benchmark')
+	mocker.patch('jira.JIRA')
+
+	# normal_config.json is deployment specific, load the template in its place
+	from workflows.utils import file_utils
+	load_json = file_utils.load_json
+	mocker.patch.object(
+		file_utils, 'load_json',
+		side_effect=lambda filename: load_json(filename.replace('normal_config.json', 'normal_config_template.json')))
+
+	import workflows.run_qc as run_qc
+
+	for step in ('run_align', 'run_hmmcopy', 'run_annotation'):
+		mocker.patch.object(run_qc, step, return_value=True)
+
+	last_updated = datetime.datetime.now().isoformat(timespec='microseconds') + '-07:00'
+	library_ids = fake_colossus.add_records('library', [
+		{'pool_id': f'A{idx:05d}A', 'jira_ticket': f'SC-{idx}', 'sample': {'taxonomy_id': '9606'}}
+		for idx in range(scale['analyses'])])
+	analysis_run_ids = fake_colossus.add_records('analysis_run', [
+		{'run_status': 'running', 'last_updated': last_updated} for _ in library_ids])
+	fake_colossus.add_records('analysis_information', [
+		{
+			'library': library_id,
+			'analysis_jira_ticket': f'SC-{library_id}',
+			'aligner': 'A',
+			'analysis_run': analysis_run_id,
+		}
+		for library_id, analysis_run_id in zip(library_ids, analysis_run_ids)])
+	snapshot = fake_colossus.snapshot()
+
+	benchmark.pedantic(
+		run_qc.run_qc,
+		args=('A', tantalus_api, colossus_api, None, {'default_aligner': 'A'}),
+		setup=lambda: fake_colossus.restore(snapshot),
+		rounds=3,
+	)
+
+	assert all(a['run_status'] == 'complete' for a in fake_colossus.records('analysis_run'))
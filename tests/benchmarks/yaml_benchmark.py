@@ -0,0 +1,71 @@
+import hashlib
+import pytest
+import yaml
+
+from datamanagement.utils import yaml_utils
+
+PURE_LOADER = yaml.SafeLoader
+PURE_DUMPER = yaml.SafeDumper
+
+
+@pytest.fixture(scope='module')
+def inputs(scale):
+	""" Per cell inputs of the size written by generate_inputs_yaml.
+	"""
+	return {
+		f'SC-1-A00001A-R{i // 72:02d}-C{i % 72:02d}': {
+			'bam': f'/data/A00001A/bams/A00001A-R{i // 72:02d}-C{i % 72:02d}.bam',
+			'column': i % 72,
+			'row': i // 72,
+			'condition': 'A',
+			'img_col': i % 72,
+			'index_i5': 'i5-1',
+			'index_i7': 'i7-1',
+			'is_control': False,
+			'pick_met': 'C1',
+			'primer_i5': 'ACGTACGT',
+			'primer_i7': 'TGCATGCA',
+			'sample_type': 'C',
+		}
+		for i in range(scale['cells'])
+	}
+
+
+@pytest.mark.parametrize('implementation', ['pure', 'yaml_utils'])
+def test_dump_inputs(benchmark, inputs, implementation):
+	if implementation == 'pure':
+		dump = lambda data: yaml.dump(data, Dumper=PURE_DUMPER, default_flow_style=False)
+	else:
+		dump = yaml_utils.safe_dump
+
+	text = benchmark(dump, inputs)
+
+	assert text == yaml.dump(inputs, Dumper=PURE_DUMPER, default_flow_style=False)
+
+
+@pytest.mark.parametrize('implementation', ['pure', 'yaml_utils'])
+def test_load_metadata(benchmark, inputs, implementation):
+	text = yaml_utils.safe_dump({'filenames': [a['bam'] for a in inputs.values()], 'meta': {'type': 'align'}})
+
+	if implementation == 'pure':
+		load = lambda text: yaml.load(text, Loader=PURE_LOADER)
+	else:
+		load = yaml_utils.safe_load
+
+	metadata = benchmark(load, text)
+
+	assert len(metadata['filenames']) == len(inputs)
+
+
+@pytest.mark.parametrize('implementation', ['pure', 'yaml_utils'])
+def test_sentinel_hash(benchmark, inputs, implementation):
+	args = ('/pipeline/inputs.yaml', {'working_inputs': 'singlecellblob', 'remote_inputs': 'singlecellblob'})
+	kwargs = {'run_options': {'update': False, 'clean': False}, 'dirs': list(inputs)}
+
+	if implementation == 'pure':
+		hash_args = lambda *args, **kwargs: hashlib.md5(
+			(yaml.dump(args, Dumper=yaml.Dumper) + yaml.dump(kwargs, Dumper=yaml.Dumper)).encode('utf-8')).hexdigest()
+	else:
+		hash_args = yaml_utils.hash_args
+
+	assert benchmark(hash_args, *args, **kwargs) == yaml_utils.hash_args(*args, **kwargs)
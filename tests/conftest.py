@@ -0,0 +1,12 @@
+import pytest
+
+import dbclients.colossus
+
+
+@pytest.fixture(autouse=True)
+def clear_sublibrary_cache():
+	""" Sublibrary indices are cached per process, isolate tests from each other.
+	"""
+	dbclients.colossus.clear_sublibrary_cache()
+	yield
+	dbclients.colossus.clear_sublibrary_cache()
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+
+from datamanagement import brc_tenx_import
+from datamanagement.utils import import_ledger
+from datamanagement.utils.import_ledger import ImportLedger
+
+from tests.fakes.storage import FakeBlobStorageClient
+
+
+LIBRARIES = {
+	'SCRNA1': 1,
+	'SCRNA2': 2,
+	'SCRNA3': 3,
+	'SCRNA4': 4,
+}
+
+
+@pytest.fixture
+def bcl_directory(tmp_path):
+	bcl_directory = tmp_path / 'bcl'
+	for library_name in list(LIBRARIES) + ['OTHER']:
+		os.makedirs(bcl_directory / library_name)
+		for lane_number in (1, 2):
+			for read_end in (1, 2):
+				fastq = bcl_directory / library_name / f'{library_name}_S1_L00{lane_number}_R{read_end}_001.fastq.gz'
+				fastq.write_bytes(b'@read\nACGT\n+\nFFFF\n' * (lane_number * 10))
+	# Files without a lane are not fastqs
+	(bcl_directory / 'SCRNA1' / 'SampleSheet.csv').write_text('Lane,Sample\n')
+	return str(bcl_directory)
+
+
+@pytest.fixture
+def colossus_api(mocker):
+	libraries = {name: {'id': pk, 'jira_ticket': f'SC-{pk}', 'sample': {'sample_id': f'SA{pk}'}} for name, pk in LIBRARIES.items()}
+	libraries['OTHER'] = {'id': 99, 'jira_ticket': 'SC-99', 'sample': {'sample_id': 'SA99'}}
+
+	colossus_api = mocker.Mock()
+	colossus_api.get.side_effect = lambda table_name, name: libraries[name]
+	mocker.patch.object(brc_tenx_import, 'colossus_api', colossus_api)
+
+	return colossus_api
+
+
+def test_import_libraries(bcl_directory, colossus_api, mocker, tmp_path):
+	storage_client = FakeBlobStorageClient(str(tmp_path / 'blob'), 'scrna_fastq')
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'))
+	pool = {'id': 1, 'libraries': list(LIBRARIES.values())}
+
+	registered = []
+	def register_library(library_import, uploaded, flowcell, sequencing_id, **kwargs):
+		if library_import['library_name'] == 'SCRNA3':
+			raise Exception('colossus unavailable')
+		registered.append((library_import['library_name'], uploaded['filenames']))
+	mocker.patch.object(brc_tenx_import, 'register_library', register_library)
+
+	def import_libraries():
+		return brc_tenx_import.import_libraries(
+			sorted(os.listdir(bcl_directory)), pool, 'FC1', bcl_directory, storage_client, ledger, 10,
+			num_libraries=2, num_uploads=3)
+
+	summaries = import_libraries()
+
+	# Libraries outside the pool are skipped
+	assert [(a['library'], a['state']) for a in summaries] == [
+		('SCRNA1', import_ledger.COMPLETE),
+		('SCRNA2', import_ledger.COMPLETE),
+		('SCRNA3', import_ledger.FAILED),
+		('SCRNA4', import_ledger.COMPLETE),
+	]
+	assert summaries[0]['files'] == 4
+	assert summaries[0]['bytes'] == 2 * 30 * len(b'@read\nACGT\n+\nFFFF\n')
+	assert summaries[2]['error'] == 'colossus unavailable'
+
+	assert sorted(registered)[0] == ('SCRNA1', {
+		'1': [f'scrna_fastq/SCRNA1/FC1_1/SCRNA1_SA1_S1_L001_R{read_end}_001.fastq.gz' for read_end in (1, 2)],
+		'2': [f'scrna_fastq/SCRNA1/FC1_2/SCRNA1_SA1_S1_L002_R{read_end}_001.fastq.gz' for read_end in (1, 2)],
+	})
+	assert storage_client.exists('SCRNA4/FC1_2/SCRNA4_SA4_S1_L002_R2_001.fastq.gz')
+
+	assert ledger.lane_state(brc_tenx_import.LEDGER_IMPORTER, 'SCRNA2', 'FC1_1') == import_ledger.COMPLETE
+	assert ledger.lane_state(brc_tenx_import.LEDGER_IMPORTER, 'SCRNA3', 'FC1_1') == import_ledger.FAILED
+
+	brc_tenx_import.log_import_summary(summaries, 1.)
+
+	# A rerun only retries the failed library
+	registered.clear()
+	summaries = import_libraries()
+	assert [a['library'] for a in summaries] == ['SCRNA3']
+
+
+def test_upload_failure(bcl_directory, colossus_api, mocker, tmp_path):
+	storage_client = FakeBlobStorageClient(str(tmp_path / 'blob'), 'scrna_fastq')
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'))
+	pool = {'id': 1, 'libraries': list(LIBRARIES.values())}
+	register_library = mocker.patch.object(brc_tenx_import, 'register_library')
+
+	# An existing blob of a different size fails the upload unless updating
+	storage_client.write_data_raw('SCRNA2/FC1_1/SCRNA2_SA2_S1_L001_R1_001.fastq.gz', b'truncated')
+
+	summaries = brc_tenx_import.import_libraries(
+		['SCRNA1', 'SCRNA2'], pool, 'FC1', bcl_directory, storage_client, ledger, 10, num_libraries=2)
+
+	assert [(a['library'], a['state']) for a in summaries] == [
+		('SCRNA1', import_ledger.COMPLETE),
+		('SCRNA2', import_ledger.FAILED),
+	]
+	assert register_library.call_count == 1
+	assert ledger.lane_state(brc_tenx_import.LEDGER_IMPORTER, 'SCRNA2', 'FC1_2') == import_ledger.FAILED
+
+
+def test_prepare_failure(bcl_directory, colossus_api, mocker, tmp_path):
+	storage_client = FakeBlobStorageClient(str(tmp_path / 'blob'), 'scrna_fastq')
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'))
+	pool = {'id': 1, 'libraries': list(LIBRARIES.values())}
+	mocker.patch.object(brc_tenx_import, 'register_library')
+	create = mocker.spy(storage_client, 'create')
+
+	get_library = colossus_api.get.side_effect
+	def get(table_name, name):
+		if name == 'SCRNA1':
+			raise Exception('colossus unavailable')
+		return get_library(table_name, name)
+	colossus_api.get.side_effect = get
+
+	summaries = brc_tenx_import.import_libraries(
+		['SCRNA1', 'SCRNA2'], pool, 'FC1', bcl_directory, storage_client, ledger, 10, num_libraries=2, num_uploads=4)
+
+	# A library failing before its lanes are known does not stop the others
+	assert [(a['library'], a['state'], a['error']) for a in summaries] == [
+		('SCRNA1', import_ledger.FAILED, 'colossus unavailable'),
+		('SCRNA2', import_ledger.COMPLETE, None),
+	]
+
+	# Concurrent uploads share the block transfers
+	assert {a.kwargs['max_concurrency'] for a in create.call_args_list} == {brc_tenx_import.UPLOAD_CONCURRENCY // 4}
@@ -0,0 +1,105 @@
+import json
+import os
+
+import PIL.Image
+import pandas as pd
+import pytest
+import yaml
+
+from datamanagement import catalog_cellenone_images
+from datamanagement.catalog_cellenone_images import catalog_images
+
+
+WELLS = [(1, 1), (1, 2), (2, 5), (3, 3)]
+
+
+def write_run(source_dir, run_name, wells, background_extension='.tiff'):
+	""" A cellenone run directory with an isolated.xls, background, log and images.
+	"""
+	run_dir = os.path.join(source_dir, run_name)
+	os.makedirs(run_dir)
+
+	rows = []
+	for idx, (row, column) in enumerate(wells):
+		image_filename = f'{run_name}_{idx}.png'
+		PIL.Image.new('L', (4, 4), color=idx).save(os.path.join(run_dir, image_filename))
+		rows.append({
+			'DropNo': idx, 'X': 1., 'Y': 1., 'Diameter': 20., 'Elong': 1., 'Circ': 1., 'Intensity': 1.,
+			'Plate': 1, 'Well': 'A1', 'Target': 1, 'Field': 1, 'XPos': column, 'YPos': row,
+			'Date': '2021-01-01', 'Time': '00:00', 'ImageFile': f'=HYPERLINK("{image_filename}")',
+		})
+	pd.DataFrame(rows).to_csv(os.path.join(run_dir, f'{run_name}__isolated.xls'), sep='\t', index=False)
+
+	PIL.Image.new('L', (4, 4)).save(os.path.join(run_dir, f'{run_name}__isolated_Background{background_extension}'))
+
+	with open(os.path.join(run_dir, f'{run_name}_Logfile.log'), 'w') as f:
+		f.write('Ejection zone bondary: 10 Sedimentation zone bondary: 20\n')
+
+
+@pytest.fixture
+def cellenone_dirs(tmp_path):
+	source_dir = str(tmp_path / 'source')
+	destination_dir = str(tmp_path / 'destination')
+	temp_dir = str(tmp_path / 'temp')
+	for a in (source_dir, destination_dir, temp_dir):
+		os.makedirs(a)
+	write_run(source_dir, 'run1', WELLS[:2])
+	write_run(source_dir, 'run2', WELLS[2:], background_extension='.png')
+	return source_dir, destination_dir, temp_dir
+
+
+def test_catalog_images(cellenone_dirs):
+	source_dir, destination_dir, temp_dir = cellenone_dirs
+
+	filepaths = catalog_images('A1', source_dir, destination_dir, temp_dir, num_threads=2, num_processes=2)
+
+	# Images are renamed by chip well
+	catalog = pd.read_csv(os.path.join(destination_dir, 'catalog.csv'))
+	renamed = dict(zip(catalog['original_filename'], catalog['filename']))
+	assert renamed['run1/run1_1.png'] == 'A1_R01_C02.png'
+	assert renamed['run2/run2_0.png'] == 'A1_R02_C05.png'
+	assert sorted(os.path.basename(a) for a in filepaths) == sorted(
+		[f'A1_R{row:02d}_C{column:02d}.png' for row, column in WELLS] +
+		['background_0.png', 'background_1.png', 'catalog.csv', 'metadata.yaml'])
+	assert all(os.path.exists(a) for a in filepaths)
+	assert PIL.Image.open(os.path.join(destination_dir, 'A1_R01_C02.png')).getpixel((0, 0)) == 1
+
+	with open(os.path.join(destination_dir, 'metadata.yaml')) as f:
+		metadata = yaml.safe_load(f)
+	assert metadata['meta']['cell_images']['instances'][2] == {'row': 2, 'column': 5, 'library_id': 'A1'}
+
+	# The manifest records the source of each file and its conversion
+	with open(os.path.join(destination_dir, catalog_cellenone_images.manifest_filename)) as f:
+		manifest = json.load(f)
+	assert manifest['A1_R02_C05.png']['path'] == os.path.join(source_dir, 'run2', 'run2_0.png')
+	assert manifest['A1_R02_C05.png']['size'] == os.path.getsize(os.path.join(source_dir, 'run2', 'run2_0.png'))
+	assert manifest['background_0.png']['original_path'] == os.path.join(source_dir, 'run1', 'run1__isolated_Background.tiff')
+
+
+def test_catalog_images_rerun(cellenone_dirs, mocker):
+	source_dir, destination_dir, temp_dir = cellenone_dirs
+	catalog_images('A1', source_dir, destination_dir, temp_dir, num_threads=2, num_processes=1)
+
+	# Unchanged files are neither copied nor converted again
+	copyfile = mocker.spy(catalog_cellenone_images.shutil, 'copyfile')
+	file_md5 = mocker.spy(catalog_cellenone_images, '_file_md5')
+	catalog_images('A1', source_dir, destination_dir, temp_dir, num_threads=2, num_processes=1)
+	assert copyfile.call_count == 0
+	assert file_md5.call_count == 0
+
+	# A changed image is copied again
+	PIL.Image.new('L', (8, 8), color=200).save(os.path.join(source_dir, 'run1', 'run1_0.png'))
+	catalog_images('A1', source_dir, destination_dir, temp_dir, num_threads=2, num_processes=1)
+	assert [os.path.basename(a.args[1]) for a in copyfile.call_args_list] == ['A1_R01_C01.png']
+	assert PIL.Image.open(os.path.join(destination_dir, 'A1_R01_C01.png')).size == (8, 8)
+
+
+def test_catalog_images_worker_failure(cellenone_dirs):
+	source_dir, destination_dir, temp_dir = cellenone_dirs
+	os.remove(os.path.join(source_dir, 'run2', 'run2_1.png'))
+
+	with pytest.raises(FileNotFoundError, match='run2_1.png'):
+		catalog_images('A1', source_dir, destination_dir, temp_dir, num_threads=2, num_processes=1)
+
+	# No manifest is written for a failed catalog
+	assert not os.path.exists(os.path.join(destination_dir, catalog_cellenone_images.manifest_filename))
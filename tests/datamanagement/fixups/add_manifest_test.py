@@ -0,0 +1,107 @@
+import os
+
+import pytest
+import yaml
+
+from dbclients.tantalus import TantalusApi
+from datamanagement.fixups.add_manifest import Checkpoint, backfill_manifests
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES
+from tests.fakes.storage import FakeBlobStorageClient
+
+
+@pytest.fixture
+def fake_tantalus(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		server.add_records('storage', [{
+			'name': 'singlecellresults',
+			'storage_type': 'blob',
+			'prefix': 'singlecelldata/results',
+			'storage_account': 'fakeaccount',
+			'storage_container': 'fake',
+		}])
+		yield server
+
+
+@pytest.fixture
+def client(tmp_path):
+	return FakeBlobStorageClient(str(tmp_path), 'singlecelldata/results')
+
+
+@pytest.fixture
+def tantalus_api(fake_tantalus, client):
+	tantalus_api = TantalusApi()
+	tantalus_api.cached_storage_clients['singlecellresults'] = client
+	return tantalus_api
+
+
+def add_hmmcopy_results(fake_tantalus, client, num_results):
+	sample_id, = fake_tantalus.add_records('sample', [{'sample_id': 'SA1'}])
+	library_id, = fake_tantalus.add_records('dna_library', [{'library_id': 'A1'}])
+
+	for idx in range(num_results):
+		ticket = f'SC-{idx}'
+		filenames = [f'{ticket}/results/hmmcopy/reads.csv.gz', f'{ticket}/results/hmmcopy/metrics.csv.gz']
+		for filename in filenames:
+			client.write_data_raw(filename, b'0')
+		resource_ids = fake_tantalus.add_records('file_resource', [{'filename': a, 'size': 1} for a in filenames])
+		analysis_id, = fake_tantalus.add_records('analysis', [{'name': ticket, 'jira_ticket': ticket, 'input_datasets': [], 'input_results': []}])
+		fake_tantalus.add_records('resultsdataset', [{
+			'name': ticket,
+			'results_type': 'hmmcopy',
+			'results_version': 'v0.3.1',
+			'analysis': analysis_id,
+			'file_resources': resource_ids,
+			'samples': [sample_id],
+			'libraries': [library_id],
+		}])
+
+
+def test_backfill_manifests(fake_tantalus, tantalus_api, client, tmp_path):
+	add_hmmcopy_results(fake_tantalus, client, 5)
+	client.write_data_raw('SC-0/results/hmmcopy/metadata.yaml', b'existing')
+
+	results_list = list(tantalus_api.list('results'))
+	existing_manifests = set(a for a in client.list('') if a.endswith('metadata.yaml'))
+	checkpoint = Checkpoint(str(tmp_path / 'checkpoint.txt'))
+
+	backfill_manifests(tantalus_api, client, results_list, existing_manifests, num_workers=3, chunk_size=2, checkpoint=checkpoint)
+
+	with open(os.path.join(str(tmp_path), 'SC-0/results/hmmcopy/metadata.yaml')) as f:
+		assert f.read() == 'existing'
+
+	with open(os.path.join(str(tmp_path), 'SC-3/results/hmmcopy/metadata.yaml')) as f:
+		manifest = yaml.safe_load(f)
+	assert manifest['meta']['library_id'] == 'A1'
+	assert manifest['filenames'] == ['reads.csv.gz', 'metrics.csv.gz']
+
+	results = tantalus_api.get('results', name='SC-3')
+	assert len(results['file_resources']) == 3
+
+	# Completed results are skipped on resume
+	assert Checkpoint(checkpoint.filename).completed == set(a['id'] for a in results_list)
+	request_count = fake_tantalus.request_count
+	backfill_manifests(tantalus_api, client, results_list, existing_manifests, checkpoint=Checkpoint(checkpoint.filename))
+	assert fake_tantalus.request_count == request_count
+
+
+def test_backfill_manifests_failure(fake_tantalus, tantalus_api, client, tmp_path):
+	add_hmmcopy_results(fake_tantalus, client, 4)
+
+	write_data = client.write_data
+	def failing_write_data(blobname, stream):
+		if blobname.startswith('SC-1/'):
+			raise OSError('storage unavailable')
+		return write_data(blobname, stream)
+	client.write_data = failing_write_data
+
+	results_list = list(tantalus_api.list('results'))
+	checkpoint = Checkpoint(str(tmp_path / 'checkpoint.txt'))
+
+	failures = backfill_manifests(tantalus_api, client, results_list, set(), num_workers=2, checkpoint=checkpoint)
+
+	# One failed results does not stop the others
+	assert [(results['name'], str(error)) for results, error in failures] == [('SC-1', 'storage unavailable')]
+	assert checkpoint.completed == set(a['id'] for a in results_list if a['name'] != 'SC-1')
@@ -0,0 +1,89 @@
+import pytest
+
+from datamanagement import query_gsc_for_tenx_fastqs
+
+
+class FakeGSCAPI(object):
+	def __init__(self, responses):
+		self.responses = responses
+		self.queries = []
+
+	def batch_query(self, query_strings):
+		self.queries.extend(dict.fromkeys(query_strings))
+		return [self.responses[a] for a in query_strings]
+
+
+def libcore(libcore_id, index, flowcell_id, lane_number):
+	return {
+		'id': libcore_id,
+		'primer': {'name': index},
+		'library': {'name': f'PX{libcore_id}'},
+		'run': {'flowcell_id': flowcell_id, 'lane_number': lane_number, 'run_datetime': '2021-01-01', 'machine': 'HiSeqX-2'},
+	}
+
+
+@pytest.fixture
+def pool(mocker):
+	index_lib = {
+		'SI-GA-A1': dict(tenxlib={'id': 1}, library='SCRNA1', sample='SA1'),
+		'SI-GA-A2': dict(tenxlib={'id': 2}, library='SCRNA2', sample='SA2'),
+	}
+
+	libcore_query = 'libcore?run_id={}&relations=primer%2Crun%2Clibrary&primer_columns=name'
+	responses = {
+		libcore_query.format(1): [libcore(11, 'SI-GA-A1', 100, 1), libcore(12, 'SI-GA-A2', 100, 1)],
+		libcore_query.format(2): [libcore(21, 'SI-GA-A1', 100, 2), libcore(22, 'SI-GA-A2', 100, 2)],
+		libcore_query.format(3): [],
+		'flowcell?id=100': [{'lims_flowcell_code': 'HXXX'}],
+	}
+	for libcore_id in (11, 12, 21, 22):
+		responses[f'concat_fastq?libcore_id={libcore_id}'] = [
+			{'file_type': {'filename_pattern': f'*_{read_end}_*.fastq.gz'}, 'data_path': f'/gsc/{libcore_id}_{read_end}.fastq.gz'}
+			for read_end in (1, 2)]
+
+	gsc_api = FakeGSCAPI(responses)
+	mocker.patch.object(query_gsc_for_tenx_fastqs, 'gsc_api', gsc_api)
+
+	tantalus_api = mocker.Mock()
+	tantalus_api.list.side_effect = lambda table_name, dna_library__library_id: (
+		[{'flowcell_id': 'HXXX', 'lane_number': '1'}] if dna_library__library_id == 'SCRNA1' else [])
+	mocker.patch.object(query_gsc_for_tenx_fastqs, 'tantalus_api', tantalus_api)
+
+	return gsc_api, tantalus_api, index_lib
+
+
+def test_plan_pool_import(pool):
+	gsc_api, tantalus_api, index_lib = pool
+
+	plan = query_gsc_for_tenx_fastqs.plan_pool_import([{'id': 1}, {'id': 2}, {'id': 3}], index_lib, 'prefix')
+
+	assert [(run['run_id'], [a['flowcell_lane'] for a in run['lanes']]) for run in plan] == [
+		(1, ['HXXX_1']),
+		(2, ['HXXX_2', 'HXXX_2']),
+	]
+	assert [a['library'] for a in plan[1]['lanes']] == ['SCRNA1', 'SCRNA2']
+
+	lane = plan[0]['lanes'][0]
+	assert lane['library'] == 'SCRNA2'
+	assert lane['gsc_library_id'] == 'PX12'
+	assert lane['sequencing_instrument'] == 'HX'
+	assert lane['fastqs'] == [
+		{
+			'data_path': f'/gsc/12_{read_end}.fastq.gz',
+			'blobname': f'SCRNA2/HXXX_1/SCRNA2_SA2_S1_L001_R{read_end}_001.fastq.gz',
+			'filepath': f'prefix/SCRNA2/HXXX_1/SCRNA2_SA2_S1_L001_R{read_end}_001.fastq.gz',
+		}
+		for read_end in (1, 2)]
+
+	# One lane snapshot per library, one flowcell query, fastqs only for planned lanes
+	assert tantalus_api.list.call_count == 2
+	assert [a for a in gsc_api.queries if a.startswith('flowcell')] == ['flowcell?id=100']
+	assert 'concat_fastq?libcore_id=11' not in gsc_api.queries
+
+
+def test_plan_pool_import_unknown_index(pool):
+	gsc_api, tantalus_api, index_lib = pool
+	del index_lib['SI-GA-A2']
+
+	with pytest.raises(Exception, match='Index not found: SI-GA-A2'):
+		query_gsc_for_tenx_fastqs.plan_pool_import([{'id': 1}], index_lib, 'prefix')
@@ -0,0 +1,75 @@
+import gzip
+import os
+
+import yaml
+
+from datamanagement.testing import create_dlp_test_fastq
+from datamanagement.testing.create_dlp_test_fastq import create_tumour_fastqs
+
+
+def test_synthetic_tumour_fastqs(tmp_path):
+	fastq_dir = str(tmp_path / 'tumour_fastqs')
+	os.makedirs(fastq_dir)
+
+	create_tumour_fastqs(fastq_dir, str(tmp_path), num_workers=3, num_cells=5, num_reads=25)
+
+	with open(os.path.join(fastq_dir, 'metadata.yaml')) as f:
+		metadata = yaml.safe_load(f)
+
+	assert len(metadata['meta']['cell_ids']) == 5
+	assert len(metadata['filenames']) == 10
+
+	# Cells are distinguished by their index sequences
+	index_sequences = set(
+		(a['primer_i7'], a['primer_i5']) for a in metadata['meta']['fastqs']['instances'])
+	assert len(index_sequences) == 5
+
+	for filename in metadata['filenames']:
+		with gzip.open(os.path.join(fastq_dir, filename)) as f:
+			lines = f.read().splitlines()
+		assert len(lines) == 25 * 4
+		assert lines[2] == b'+'
+
+
+
+def test_synthetic_cells_unique_index():
+	cells = create_dlp_test_fastq.synthetic_cells(200)
+	index_sequences = set(f"{a['sublib']['primer_i7']}-{a['sublib']['primer_i5']}" for a in cells.values())
+	assert len(index_sequences) == 200
+
+
+class FakeProcess(object):
+	""" Stand in for samtools, the fastq stage writes its outputs.
+	"""
+
+	def __init__(self, cmd, stdin=None, stdout=None):
+		self.cmd = cmd
+		self.stdout = open(os.devnull, 'rb') if stdout is not None else None
+		self.returncode = 0
+		if cmd[1] == 'fastq':
+			for read_end in ('-1', '-2'):
+				with gzip.open(cmd[cmd.index(read_end) + 1], 'wb') as f:
+					f.write(b'@read/1\nACGT\n+\nIIII\n')
+
+	def wait(self):
+		return self.returncode
+
+
+def test_stream_cell_fastqs(tmp_path, mocker):
+	popen = mocker.patch('subprocess.Popen', side_effect=FakeProcess)
+	temp_dir = tmp_path / 'temp'
+	temp_dir.mkdir()
+	fastqs = [str(tmp_path / f'SA1-A1-R01-C01_{read_end}.fastq.gz') for read_end in (1, 2)]
+
+	create_dlp_test_fastq.stream_cell_fastqs(*fastqs, 'cell.bam', str(temp_dir), threads=2)
+
+	# One pipeline of view, name sort and fastq, outputs moved into place
+	assert [a.args[0][1] for a in popen.call_args_list] == ['view', 'sort', 'fastq']
+	assert popen.call_args_list[0].args[0][3:] == ['cell.bam'] + create_dlp_test_fastq.regions
+	assert all(os.path.exists(a) for a in fastqs)
+	assert list(temp_dir.iterdir()) == []
+
+	# Existing outputs are not made again
+	popen.reset_mock()
+	create_dlp_test_fastq.stream_cell_fastqs(*fastqs, 'cell.bam', str(temp_dir))
+	popen.assert_not_called()
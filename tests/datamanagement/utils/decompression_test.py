@@ -0,0 +1,90 @@
+import os
+import subprocess
+
+import pytest
+
+from dbclients.basicclient import NotFoundError
+from datamanagement.utils import decompression
+
+
+@pytest.fixture
+def samtools(mocker):
+	""" Stand in for samtools, writing output files and recording commands.
+	"""
+	commands = []
+
+	def check_call(cmd):
+		commands.append(cmd)
+		if cmd[:2] == ['samtools', 'view']:
+			with open(cmd[cmd.index('-o') + 1], 'wb') as f:
+				f.write(b'bam' * 10)
+		elif cmd[:2] == ['samtools', 'index']:
+			with open(cmd[-1] + '.bai', 'wb') as f:
+				f.write(b'bai')
+
+	mocker.patch.object(subprocess, 'check_call', side_effect=check_call)
+
+	return commands
+
+
+@pytest.fixture
+def tantalus_api(mocker):
+	tantalus_api = mocker.Mock()
+	tantalus_api.get.side_effect = NotFoundError
+	tantalus_api.add_file.side_effect = lambda storage_name, filepath, update: ({'id': filepath}, {})
+	return tantalus_api
+
+
+def test_batch_create_bams(tmp_path, samtools, tantalus_api):
+	storage = {'name': 'local', 'prefix': str(tmp_path / 'storage')}
+
+	sources = []
+	for idx in range(6):
+		cram_path = tmp_path / f'{idx}.cram'
+		cram_path.write_bytes(b'cram')
+		sources.append({
+			'source_path': str(cram_path),
+			'output_bam_path': os.path.join(storage['prefix'], f'L{idx}', f'{idx}.bam'),
+			'library_id': f'L{idx}',
+			'reference_genome': 'grch37',
+		})
+
+	results, stats = decompression.batch_create_bams(
+		tantalus_api, sources, storage, num_fetch=2, num_decompress=3, threads=2)
+
+	assert results == [a['output_bam_path'] for a in sources]
+	assert all(os.path.exists(a + '.bai') for a in results)
+
+	views = [a for a in samtools if a[1] == 'view']
+	assert len(views) == 6
+	assert all(a[a.index('-@') + 1] == '2' for a in views)
+	assert all(a[a.index('-T') + 1] == decompression.HUMAN_REFERENCE_GENOMES_MAP['HG19'] for a in views)
+
+	assert tantalus_api.add_file.call_count == 12
+
+	summary = {a['stage']: a for a in stats.summary()}
+	assert summary['fetch']['bytes'] == 6 * 4
+	assert summary['decompress']['files'] == 6
+	assert summary['register']['files'] == 6
+
+
+def test_batch_create_bams_skips_existing(tmp_path, samtools, tantalus_api):
+	storage = {'name': 'local', 'prefix': str(tmp_path)}
+	cram_path = tmp_path / 'a.cram'
+	cram_path.write_bytes(b'cram')
+	bam_path = tmp_path / 'a.bam'
+	bam_path.write_bytes(b'bam')
+
+	tantalus_api.get.side_effect = None
+	tantalus_api.get.return_value = {'size': 3}
+
+	results, stats = decompression.batch_create_bams(tantalus_api, [{
+		'source_path': str(cram_path),
+		'output_bam_path': str(bam_path),
+		'library_id': 'L1',
+		'reference_genome': 'hg19',
+	}], storage)
+
+	assert results == [None]
+	assert samtools == []
+	tantalus_api.add_file.assert_not_called()
@@ -0,0 +1,84 @@
+import pytest
+
+from datamanagement.utils.fastq_index import (
+	FastqIndex,
+	FastqKey,
+	parse_bcl2fastq_filename,
+	generate_bcl2fastq_filename,
+)
+
+
+@pytest.fixture
+def fastq_filenames():
+	return [
+		'SA992-A90632-R01-C01_S1_L001_R1_001.fastq.gz',
+		'SA992-A90632-R01-C01_S1_L001_R2_001.fastq.gz',
+		'SA992-A90632-R01-C01_S1_L002_R1_001.fastq.gz',
+		'SA992-A90632-R01-C01_S1_L002_R2_001.fastq.gz',
+		'SA992-A90632-R01-C02_S2_L001_R1_001.fastq.gz',
+		'SA992-A90632-R01-C02_S2_L001_R2_001.fastq.gz',
+	]
+
+
+class TestParseFilename():
+	def test_parse(self):
+		entry = parse_bcl2fastq_filename('SA992-A90632-R54-C54_S317_L004_R1_001.fastq.gz')
+
+		assert entry.library_id == 'A90632'
+		assert (entry.row, entry.column) == (54, 54)
+		assert entry.sample_number == 317
+		assert entry.lane_number == 4
+		assert entry.read_end == 1
+
+	def test_parse_no_lane(self):
+		entry = parse_bcl2fastq_filename('SA992-A90632-R54-C54_S317_R2_001.fastq.gz')
+
+		assert entry.lane_number is None
+		assert entry.read_end == 2
+
+	def test_parse_unrecognized(self):
+		with pytest.raises(Exception):
+			parse_bcl2fastq_filename('Undetermined_S0_L001_R1_001.fastq.gz')
+
+	def test_generate_round_trip(self):
+		filename = generate_bcl2fastq_filename('SA992', 'A90632', 3, 7, 2, 1)
+		entry = parse_bcl2fastq_filename(filename)
+
+		assert filename == 'SA992-A90632-R3-C7_S0_L002_R1_001.fastq.gz'
+		assert (entry.row, entry.column, entry.lane_number, entry.read_end) == (3, 7, 2, 1)
+
+
+class TestFastqIndex():
+	def test_keys(self, fastq_filenames):
+		index = FastqIndex.from_filenames(fastq_filenames)
+
+		assert len(index) == 6
+		assert FastqKey('A90632', 1, 2, 1, 2) in index
+		assert FastqKey('A90632', 1, 2, 2, 1) not in index
+		assert index.library_ids == ['A90632']
+
+	def test_duplicate(self, fastq_filenames):
+		with pytest.raises(Exception):
+			FastqIndex.from_filenames(fastq_filenames + ['SA1-A90632-R01-C01_S9_L001_R1_001.fastq.gz'])
+
+	def test_missing_lanes(self, fastq_filenames):
+		index = FastqIndex.from_filenames(fastq_filenames)
+
+		missing = index.get_missing_lanes('A90632', [(1, 1), (1, 2)])
+
+		assert missing == {(1, 1): [], (1, 2): [2]}
+
+	def test_missing_skipped_cell(self, fastq_filenames):
+		index = FastqIndex.from_filenames(fastq_filenames)
+
+		missing = index.get_missing_lanes('A90632', [(1, 1), (1, 2), (1, 3)])
+
+		assert missing == {(1, 1): [], (1, 2): [2], (1, 3): [1, 2]}
+
+	def test_from_directory(self, fastq_filenames, tmp_path):
+		for filename in fastq_filenames + ['Undetermined_S0_L001_R1_001.fastq.gz', 'SampleSheet.csv']:
+			(tmp_path / filename).touch()
+
+		index = FastqIndex.from_directory(str(tmp_path))
+
+		assert sorted(entry.filename for entry in index) == sorted(fastq_filenames)
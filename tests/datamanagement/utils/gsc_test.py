@@ -0,0 +1,94 @@
+import pytest
+
+from datamanagement.utils.gsc import GSCAPI, ResponseCache, normalize_query
+
+
+class FakeResponse(object):
+	def __init__(self, data, status_code=200):
+		self.data = data
+		self.status_code = status_code
+
+	def json(self):
+		return self.data
+
+
+@pytest.fixture
+def gsc_requests(mocker):
+	""" Patch the GSC session, recording each GET url.
+	"""
+	urls = []
+
+	def get(url, headers=None):
+		urls.append(url)
+		return FakeResponse([{'url': url}])
+
+	mocker.patch('requests.Session.post', return_value=FakeResponse({'token': 'token'}))
+	mocker.patch('requests.Session.get', side_effect=get)
+
+	return urls
+
+
+def test_normalize_query():
+	assert normalize_query('library?name=PX1&id=2') == normalize_query('library?id=2&name=PX1')
+	assert normalize_query('flowcell/12') == 'flowcell/12'
+
+
+def test_response_cache_ttl(mocker):
+	cache = ResponseCache(10)
+	time = mocker.patch('datamanagement.utils.gsc.time.time', return_value=100.)
+
+	cache.set('library?id=1', [{'id': 1}])
+	assert cache.get('library?id=1') == [{'id': 1}]
+
+	cache.get('library?id=1')[0]['id'] = 2
+	assert cache.get('library?id=1') == [{'id': 1}]
+
+	time.return_value = 111.
+	assert cache.get('library?id=1') is None
+
+
+def test_response_cache_persists(tmp_path):
+	filename = str(tmp_path / 'gsc_cache.sqlite')
+
+	ResponseCache(60, filename=filename).set('library?id=1', [{'id': 1}])
+
+	assert ResponseCache(60, filename=filename).get('library?id=1') == [{'id': 1}]
+	assert ResponseCache(0, filename=filename).get('library?id=1') is None
+
+
+def test_response_cache_skips_empty(tmp_path):
+	cache = ResponseCache(60, filename=str(tmp_path / 'gsc_cache.sqlite'))
+
+	cache.set('concat_fastq?libcore_id=1', [])
+	assert cache.get('concat_fastq?libcore_id=1') is None
+
+
+def test_query_uses_cache(gsc_requests):
+	gsc_api = GSCAPI(cache_ttl=60)
+
+	gsc_api.query('library?name=PX1&id=2')
+	gsc_api.query('library?id=2&name=PX1')
+	gsc_api.query('library?id=2&name=PX1', use_cache=False)
+
+	assert len(gsc_requests) == 2
+
+
+def test_query_cache_opt_in(gsc_requests, monkeypatch):
+	monkeypatch.delenv('GSC_API_CACHE_TTL', raising=False)
+	gsc_api = GSCAPI()
+
+	# Importers polling for new data see it as soon as it arrives
+	gsc_api.query('library?name=PX1')
+	gsc_api.query('library?name=PX1')
+
+	assert len(gsc_requests) == 2
+
+
+def test_batch_query(gsc_requests):
+	gsc_api = GSCAPI(cache_ttl=0, max_workers=4)
+
+	queries = ['flowcell?id={}'.format(a % 5) for a in range(20)]
+	results = gsc_api.batch_query(queries)
+
+	assert len(gsc_requests) == 5
+	assert [a[0]['url'] for a in results] == [gsc_api.gsc_api_url + a for a in queries]
@@ -0,0 +1,101 @@
+import os
+
+from click.testing import CliRunner
+
+from datamanagement.utils import import_ledger
+from datamanagement.utils.import_ledger import ImportLedger
+
+
+HOUR = 3600
+
+
+def sequencing(sequencing_id, lanes_requested=1):
+	return {'id': sequencing_id, 'number_of_lanes_requested': lanes_requested, 'gsc_library_id': None, 'lane_requested_date': '2021-01-01'}
+
+
+def test_due(tmp_path):
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'), check_interval=HOUR, max_interval=10 * HOUR)
+	sequencings = [sequencing(1), sequencing(2), sequencing(3)]
+
+	assert ledger.due('gsc_tenx', sequencings, now=0) == sequencings
+
+	ledger.record_check('gsc_tenx', sequencings[0], import_ledger.IMPORTED, now=0)
+	ledger.record_check('gsc_tenx', sequencings[1], import_ledger.NO_DATA, now=0)
+
+	# Unchecked sequencings, and checked ones once their interval passes
+	assert [a['id'] for a in ledger.due('gsc_tenx', sequencings, now=HOUR / 2)] == [3]
+	assert [a['id'] for a in ledger.due('gsc_tenx', sequencings, now=HOUR + 1)] == [1, 3]
+	assert [a['id'] for a in ledger.due('gsc_tenx', sequencings, now=2 * HOUR + 1)] == [1, 2, 3]
+
+	# Other importers have their own state
+	assert len(ledger.due('gsc_dlp', sequencings, now=0)) == 3
+
+	# A change in Colossus makes a sequencing due immediately
+	assert [a['id'] for a in ledger.due('gsc_tenx', [sequencing(1, lanes_requested=2)], now=1)] == [1]
+
+
+def test_backoff(tmp_path):
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'), check_interval=HOUR, max_interval=10 * HOUR)
+	pool = sequencing(1)
+
+	now = 0
+	intervals = []
+	for _ in range(5):
+		ledger.record_check('gsc_tenx', pool, import_ledger.FAILED, error='timeout', now=now)
+		next_now = now
+		while not ledger.due('gsc_tenx', [pool], now=next_now):
+			next_now += HOUR
+		intervals.append((next_now - now) // HOUR)
+		now = next_now
+
+	assert intervals == [2, 4, 8, 10, 10]
+
+	# Success resets the backoff
+	ledger.record_check('gsc_tenx', pool, import_ledger.IMPORTED, now=now)
+	assert not ledger.due('gsc_tenx', [pool], now=now + HOUR - 1)
+	assert ledger.due('gsc_tenx', [pool], now=now + HOUR)
+
+
+def test_report(tmp_path):
+	filename = str(tmp_path / 'ledger.sqlite')
+	ledger = ImportLedger(filename)
+
+	ledger.record_lanes('gsc_tenx', 1, [('SCRNA1', 'HXXX_1'), ('SCRNA2', 'HXXX_1')], import_ledger.PENDING)
+	ledger.record_lanes('gsc_tenx', 1, [('SCRNA1', 'HXXX_1')], import_ledger.COMPLETE)
+	ledger.fail_pending_lanes('gsc_tenx', 1, 'upload failed')
+	ledger.record_lanes('gsc_tenx', 2, [('SCRNA3', 'HXXX_2')], import_ledger.PENDING)
+	ledger.record_check('gsc_tenx', sequencing(1), import_ledger.FAILED, name='TENXPOOL0001', error='upload failed')
+
+	report = ledger.report('gsc_tenx')
+	assert [a['library'] for a in report['complete']] == ['SCRNA1']
+	assert [(a['library'], a['error']) for a in report['failed']] == [('SCRNA2', 'upload failed')]
+	assert [a['library'] for a in report['pending']] == ['SCRNA3']
+	assert [a['name'] for a in report['failed_sequencings']] == ['TENXPOOL0001']
+
+	assert ledger.lane_state('gsc_tenx', 'SCRNA1', 'HXXX_1') == import_ledger.COMPLETE
+	assert ledger.lane_state('gsc_tenx', 'SCRNA4', 'HXXX_1') is None
+
+	result = CliRunner().invoke(import_ledger.report, ['--ledger', filename])
+	assert result.exit_code == 0
+	assert 'failed lanes: 1' in result.output
+	assert 'gsc_tenx SCRNA2 HXXX_1: upload failed' in result.output
+
+
+def test_default_ledger_filename(monkeypatch, tmp_path):
+	monkeypatch.delenv('SISYPHUS_IMPORT_LEDGER', raising=False)
+	monkeypatch.delenv('DATAMANAGEMENT_DIR', raising=False)
+	assert os.path.isabs(import_ledger.default_ledger_filename())
+
+	monkeypatch.chdir(tmp_path)
+	monkeypatch.setenv('DATAMANAGEMENT_DIR', 'datamanagement')
+	assert import_ledger.default_ledger_filename() == str(tmp_path / 'datamanagement' / 'import_ledger.sqlite')
+
+
+def test_default_max_interval(tmp_path):
+	ledger = ImportLedger(str(tmp_path / 'ledger.sqlite'))
+	pool = sequencing(1)
+
+	# Checks that find nothing are repeated at least daily
+	for attempt in range(10):
+		ledger.record_check('gsc_tenx', pool, import_ledger.NO_DATA, now=0)
+	assert ledger.due('gsc_tenx', [pool], now=24 * HOUR)
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import paramiko
+import pytest
+
+from datamanagement.utils.remote_transfer import RemoteFiles, run_transfer_pipeline
+
+
+def test_results_in_item_order():
+	def fetch(item):
+		time.sleep(0.001 * (item % 3))
+		return item * 2
+
+	def upload(item, staged):
+		return (item, staged)
+
+	results = run_transfer_pipeline(list(range(20)), fetch, upload, num_fetch=3, num_upload=2)
+
+	assert results == [(a, a * 2) for a in range(20)]
+
+
+def test_staged_items_bounded():
+	lock = threading.Lock()
+	staged = set()
+	max_staged = []
+
+	def fetch(item):
+		with lock:
+			staged.add(item)
+			max_staged.append(len(staged))
+		return item
+
+	def upload(item, _):
+		time.sleep(0.002)
+		with lock:
+			staged.remove(item)
+
+	run_transfer_pipeline(list(range(30)), fetch, upload, num_fetch=4, num_upload=1, max_staged=3)
+
+	assert max(max_staged) <= 3
+
+
+def test_fetch_and_upload_overlap():
+	upload_started = threading.Event()
+	overlapped = []
+
+	def fetch(item):
+		if item > 0:
+			overlapped.append(upload_started.wait(1))
+		return item
+
+	def upload(item, _):
+		upload_started.set()
+		time.sleep(0.01)
+
+	run_transfer_pipeline([0, 1, 2], fetch, upload, num_fetch=1, num_upload=1)
+
+	assert all(overlapped)
+
+
+def test_errors_propagate():
+	def fetch(item):
+		if item == 3:
+			raise ValueError('fetch failed')
+		return item
+
+	with pytest.raises(ValueError):
+		run_transfer_pipeline(list(range(10)), fetch, lambda item, staged: staged)
+
+
+def test_remote_files_listing(tmp_path):
+	(tmp_path / 'a.bam').write_bytes(b'12345')
+	remote_files = RemoteFiles()
+
+	assert remote_files.exists(str(tmp_path / 'a.bam'))
+	assert remote_files.get_size(str(tmp_path / 'a.bam')) == 5
+	assert not remote_files.exists(str(tmp_path / 'a.bam.bai'))
+	assert not remote_files.exists(str(tmp_path / 'missing' / 'a.bam'))
+
+	# Listings are cached until invalidated
+	(tmp_path / 'a.bam.bai').write_bytes(b'1')
+	assert not remote_files.exists(str(tmp_path / 'a.bam.bai'))
+	remote_files.invalidate(str(tmp_path / 'a.bam.bai'))
+	assert remote_files.exists(str(tmp_path / 'a.bam.bai'))
+
+
+def test_remote_files_rsync_skips_existing(tmp_path, mocker):
+	(tmp_path / 'src').mkdir()
+	(tmp_path / 'dst').mkdir()
+	(tmp_path / 'src' / 'a.bam').write_bytes(b'12345')
+	(tmp_path / 'dst' / 'a.bam').write_bytes(b'54321')
+	check_call = mocker.patch('subprocess.check_call')
+
+	remote_files = RemoteFiles()
+	remote_files.prefetch([str(tmp_path / 'src' / 'a.bam')])
+	remote_files.rsync(str(tmp_path / 'src' / 'a.bam'), str(tmp_path / 'dst' / 'a.bam'))
+
+	check_call.assert_not_called()
+
+	with pytest.raises(Exception):
+		remote_files.rsync(str(tmp_path / 'src' / 'b.bam'), str(tmp_path / 'dst' / 'b.bam'))
+
+
+class FakeSFTPClient(object):
+	""" SFTP client for local files.
+	"""
+
+	def listdir_attr(self, path):
+		attrs = []
+		for filename in os.listdir(path):
+			attr = paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, filename)), filename)
+			attrs.append(attr)
+		return attrs
+
+	def stat(self, path):
+		return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+
+def test_remote_files_symlink(tmp_path, mocker):
+	(tmp_path / 'src').mkdir()
+	(tmp_path / 'src' / 'a.bam').write_bytes(b'12345' * 100)
+	(tmp_path / 'src' / 'link.bam').symlink_to(tmp_path / 'src' / 'a.bam')
+	(tmp_path / 'src' / 'dangling.bam').symlink_to(tmp_path / 'src' / 'missing.bam')
+	mocker.patch.object(RemoteFiles, '_connect', return_value=FakeSFTPClient())
+
+	remote_files = RemoteFiles('thost')
+
+	# Links have the size of their targets, as copied by rsync -L
+	assert remote_files.get_size(str(tmp_path / 'src' / 'link.bam')) == 500
+	assert not remote_files.exists(str(tmp_path / 'src' / 'dangling.bam'))
+
+	(tmp_path / 'dst').mkdir()
+	(tmp_path / 'dst' / 'link.bam').write_bytes(b'12345' * 100)
+	check_call = mocker.patch('subprocess.check_call')
+	remote_files.rsync(str(tmp_path / 'src' / 'link.bam'), str(tmp_path / 'dst' / 'link.bam'))
+	check_call.assert_not_called()
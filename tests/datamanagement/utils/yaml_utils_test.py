@@ -0,0 +1,31 @@
+import hashlib
+import yaml
+
+from datamanagement.utils import yaml_utils
+
+
+def test_round_trip(tmp_path):
+	data = {'SC-1-A00001A-R01-C01': {'bam': '/data/R01-C01.bam', 'column': 1, 'pass': True, 'fastqs': {'HXXX_1': None}}}
+	filename = str(tmp_path / 'inputs.yaml')
+
+	yaml_utils.dump_file(data, filename)
+
+	with open(filename) as f:
+		text = f.read()
+	assert text == yaml.safe_dump(data, default_flow_style=False)
+	assert yaml_utils.load_file(filename) == data
+	assert yaml_utils.safe_load(yaml_utils.safe_dump(data)) == data
+
+
+def test_hash_args():
+	args = ('/pipeline', ['a', 'b'], {'working_inputs': 's1', 'remote_inputs': 's2'})
+	kwargs = {'update': False, 'run_options': {'clean': True, 'digests': {'v1': 'sha256:ab'}}}
+
+	# Same hash as the pure python dumper that sentinels previously used
+	expected = yaml.dump(args, Dumper=yaml.Dumper) + yaml.dump(kwargs, Dumper=yaml.Dumper)
+	assert yaml_utils.hash_args(*args, **kwargs) == hashlib.md5(expected.encode('utf-8')).hexdigest()
+
+	# Independent of dict ordering
+	reordered = {'run_options': {'digests': {'v1': 'sha256:ab'}, 'clean': True}, 'update': False}
+	assert yaml_utils.hash_args(*args, **reordered) == yaml_utils.hash_args(*args, **kwargs)
+	assert yaml_utils.hash_args(*args, update=True) != yaml_utils.hash_args(*args, update=False)
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotFoundError, ResourceModifiedError
+
+from dbclients.blob_upload import upload_file
+
+
+class FakeBlobClient(object):
+	""" In memory blob, failing stage_block calls after fail_after blocks.
+	"""
+	def __init__(self, blob_name='a/b.fastq.gz'):
+		self.blob_name = blob_name
+		self.url = f'https://account.blob.core.windows.net/container/{blob_name}'
+		self.data = None
+		self.etag = None
+		self.staged = {}
+		self.calls = []
+		self.fail_after = None
+
+	def get_blob_properties(self, **kwargs):
+		self.calls.append('get_blob_properties')
+		if self.data is None:
+			raise ResourceNotFoundError('not found')
+		return type('BlobProperties', (), {'size': len(self.data), 'etag': self.etag})
+
+	def _check(self, etag=None, match_condition=None):
+		if match_condition == MatchConditions.IfMissing and self.data is not None:
+			raise ResourceModifiedError('exists')
+		if match_condition == MatchConditions.IfNotModified and etag != self.etag:
+			raise ResourceModifiedError('modified')
+
+	def _write(self, data):
+		self.data = data
+		self.etag = str(len(self.calls))
+		self.staged = {}
+
+	def upload_blob(self, stream, overwrite=False, **kwargs):
+		self.calls.append('upload_blob')
+		self._check(kwargs.get('etag'), kwargs.get('match_condition'))
+		self._write(stream.read())
+
+	def stage_block(self, block_id, data, length=None, **kwargs):
+		if self.fail_after is not None and len(self.staged) >= self.fail_after:
+			raise IOError('connection reset')
+		self.calls.append('stage_block')
+		self.staged[block_id] = data
+
+	def get_block_list(self, block_list_type, **kwargs):
+		self.calls.append('get_block_list')
+		return [], [type('BlobBlock', (), {'id': a}) for a in self.staged]
+
+	def commit_block_list(self, block_list, **kwargs):
+		self.calls.append('commit_block_list')
+		self._check(kwargs.get('etag'), kwargs.get('match_condition'))
+		self._write(b''.join(self.staged[a.id] for a in block_list))
+
+
+@pytest.fixture
+def local_file(tmp_path):
+	filepath = tmp_path / 'local.fastq.gz'
+	filepath.write_bytes(os.urandom(1000))
+	return str(filepath)
+
+
+def test_resume_upload(tmp_path, local_file):
+	blob_client = FakeBlobClient()
+	journal_dir = str(tmp_path / 'journal')
+
+	blob_client.fail_after = 4
+	with pytest.raises(IOError):
+		upload_file(blob_client, local_file, block_size=100, max_concurrency=1, journal_dir=journal_dir)
+	assert blob_client.data is None
+	assert len(os.listdir(journal_dir)) == 1
+
+	blob_client.fail_after = None
+	blob_client.calls = []
+	assert upload_file(blob_client, local_file, block_size=100, max_concurrency=3, journal_dir=journal_dir)
+
+	# Only the blocks not staged before the failure are staged again
+	assert blob_client.calls.count('stage_block') == 6
+	with open(local_file, 'rb') as f:
+		assert blob_client.data == f.read()
+	assert os.listdir(journal_dir) == []
+
+
+def test_existing_blob(tmp_path, local_file):
+	blob_client = FakeBlobClient()
+	journal_dir = str(tmp_path / 'journal')
+
+	assert upload_file(blob_client, local_file, block_size=100, journal_dir=journal_dir)
+
+	blob_client.calls = []
+	assert not upload_file(blob_client, local_file, block_size=100, journal_dir=journal_dir)
+	assert blob_client.calls == ['get_blob_properties']
+
+	with open(local_file, 'ab') as f:
+		f.write(b'more')
+
+	with pytest.raises(ValueError, match='use update to overwrite'):
+		upload_file(blob_client, local_file, block_size=100, journal_dir=journal_dir)
+
+	assert upload_file(blob_client, local_file, block_size=2000, update=True, journal_dir=journal_dir)
+	assert len(blob_client.data) == 1004
+
+
+def test_conditional_commit(tmp_path, local_file):
+	blob_client = FakeBlobClient()
+
+	# Another writer creates the blob between the check and the commit
+	stage_block = blob_client.stage_block
+	def racing_stage_block(block_id, data, **kwargs):
+		stage_block(block_id, data, **kwargs)
+		blob_client.data = b'other'
+	blob_client.stage_block = racing_stage_block
+
+	with pytest.raises(ResourceModifiedError):
+		upload_file(blob_client, local_file, block_size=100, journal_dir=str(tmp_path))
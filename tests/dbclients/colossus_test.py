@@ -0,0 +1,98 @@
+import pytest
+
+import dbclients.colossus
+from dbclients.colossus import ColossusApi
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import COLOSSUS_TABLES
+
+
+@pytest.fixture
+def fake_colossus(monkeypatch):
+	with FakeApiServer(COLOSSUS_TABLES, page_size=10) as server:
+		monkeypatch.setenv('COLOSSUS_BASE_URL', server.base_url)
+		yield server
+
+
+def add_sublibraries(fake_colossus, library_id, num_rows=3, num_columns=10):
+	library_pk, = fake_colossus.add_records('library', [{'pool_id': library_id}])
+	return fake_colossus.add_records('sublibraries', [
+		{
+			'library': library_pk,
+			'sample_id': {'sample_id': 'SA1', 'sample_type': 'C'},
+			'row': row,
+			'column': column,
+			'cell_id': f'SA1-{library_id}-R{row:02d}-C{column:02d}',
+			'primer_i7': f'I7{row:02d}',
+			'primer_i5': f'I5{column:02d}',
+		}
+		for row in range(1, num_rows + 1) for column in range(1, num_columns + 1)])
+
+
+def test_sublibrary_index(fake_colossus):
+	add_sublibraries(fake_colossus, 'A1')
+	colossus_api = ColossusApi()
+	other_colossus_api = ColossusApi()
+
+	request_count = fake_colossus.request_count
+	by_cell_id = colossus_api.get_sublibraries_by_cell_id('A1')
+	by_index_sequence = other_colossus_api.get_sublibraries_by_index_sequence('A1')
+
+	# Fetched once, 30 sublibraries in pages of 10, shared between clients
+	assert fake_colossus.request_count - request_count == 3
+
+	assert len(by_cell_id) == 30
+	assert by_index_sequence['I702-I503']['cell_id'] == 'SA1-A1-R02-C03'
+
+	index = colossus_api.get_sublibrary_index('A1')
+	assert index.by_row_column()[(3, 10)]['cell_id'] == 'SA1-A1-R03-C10'
+	assert index.table['row'].dtype == int
+	assert set(index.table['sample_id']) == {'SA1'}
+
+	assert len(colossus_api.get_colossus_sublibraries_from_library_id('A1')) == 30
+	assert fake_colossus.request_count - request_count == 3
+
+	# Callers get their own copy of the sublibraries
+	colossus_api.get_colossus_sublibraries_from_library_id('A1')[0]['cell_id'] = 'modified'
+	assert index.sublibraries[0]['cell_id'] != 'modified'
+
+
+def test_sublibrary_index_invalidation(fake_colossus):
+	add_sublibraries(fake_colossus, 'A1')
+	colossus_api = ColossusApi()
+
+	index = colossus_api.get_sublibrary_index('A1')
+	assert dbclients.colossus.get_sublibrary_index('A1', colossus_api) is index
+
+	# Fetched again once older than max_age, or once cleared
+	assert dbclients.colossus.get_sublibrary_index('A1', colossus_api, max_age=0) is not index
+
+	index = colossus_api.get_sublibrary_index('A1')
+	dbclients.colossus.clear_sublibrary_cache('A1')
+	assert colossus_api.get_sublibrary_index('A1') is not index
+
+
+def test_sublibrary_disk_cache(fake_colossus, tmp_path, monkeypatch):
+	monkeypatch.setenv('SISYPHUS_SUBLIBRARY_CACHE_DIR', str(tmp_path))
+	add_sublibraries(fake_colossus, 'A1')
+	colossus_api = ColossusApi()
+
+	assert len(colossus_api.get_sublibrary_index('A1').sublibraries) == 30
+	cache_filename, = tmp_path.iterdir()
+	cache_mtime = cache_filename.stat().st_mtime_ns
+
+	# Later processes revalidate the cached pages, unchanged pages are not rewritten
+	dbclients.colossus.clear_sublibrary_cache()
+	assert len(colossus_api.get_sublibrary_index('A1').sublibraries) == 30
+	assert cache_filename.stat().st_mtime_ns == cache_mtime
+
+	dbclients.colossus.clear_sublibrary_cache()
+	fake_colossus.update('sublibraries', fake_colossus.records('sublibraries')[25]['id'], {'cell_id': 'SA1-A1-R03-C06-X'})
+
+	cached_pages = colossus_api.list_pages('sublibraries', library__pool_id='A1')
+	index = colossus_api.get_sublibrary_index('A1')
+	assert index.by_row_column()[(3, 6)]['cell_id'] == 'SA1-A1-R03-C06-X'
+
+	# Pages revalidated against themselves are all reused
+	pages = colossus_api.list_pages('sublibraries', cached_pages=cached_pages, library__pool_id='A1')
+	assert pages == cached_pages
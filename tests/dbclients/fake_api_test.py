@@ -0,0 +1,71 @@
+import pytest
+
+from dbclients.basicclient import NotFoundError, ExistsError
+from dbclients.tantalus import TantalusApi
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES
+from tests.fakes.storage import FakeBlobStorageClient
+
+
+@pytest.fixture
+def fake_tantalus(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES, page_size=2) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		yield server
+
+
+@pytest.fixture
+def tantalus_api(fake_tantalus):
+	return TantalusApi()
+
+
+class TestFakeApi():
+	def test_list_paginates(self, fake_tantalus, tantalus_api):
+		fake_tantalus.add_records('sample', [{'sample_id': f'SA{i}'} for i in range(5)])
+
+		samples = list(tantalus_api.list('sample'))
+
+		assert [a['sample_id'] for a in samples] == [f'SA{i}' for i in range(5)]
+
+	def test_get_create_update(self, tantalus_api):
+		with pytest.raises(NotFoundError):
+			tantalus_api.get('sample', sample_id='SA1')
+
+		sample, _ = tantalus_api.create('sample', {'sample_id': 'SA1'}, ['sample_id'])
+
+		with pytest.raises(ExistsError):
+			tantalus_api.create('sample', {'sample_id': 'SA1'}, ['sample_id'])
+
+		sample = tantalus_api.update('sample', id=sample['id'], external_sample_id='EXT1')
+
+		assert tantalus_api.get('sample', sample_id='SA1')['external_sample_id'] == 'EXT1'
+
+	def test_related_filters(self, fake_tantalus, tantalus_api):
+		storage_id, = fake_tantalus.add_records('storage', [{'name': 'store', 'storage_type': 'blob', 'prefix': 'pre'}])
+		resource_ids = fake_tantalus.add_records('file_resource', [
+			{'filename': 'a.bam', 'size': 1, 'is_folder': False},
+			{'filename': 'a.bam.bai', 'size': 1, 'is_folder': False},
+			{'filename': 'b.bam', 'size': 1, 'is_folder': False},
+		])
+		fake_tantalus.add_records('file_instance', [
+			{'file_resource': pk, 'storage': storage_id, 'is_deleted': False} for pk in resource_ids])
+		dataset_id, = fake_tantalus.add_records('sequencedataset', [{'name': 'ds', 'file_resources': resource_ids[:2]}])
+
+		resources = tantalus_api.get_dataset_file_resources(dataset_id, 'sequencedataset', {'filename__endswith': '.bam'})
+		instances = tantalus_api.get_dataset_file_instances(dataset_id, 'sequencedataset', 'store')
+
+		assert [a['filename'] for a in resources] == ['a.bam']
+		assert sorted(a['filepath'] for a in instances) == ['pre/a.bam', 'pre/a.bam.bai']
+
+	def test_add_file(self, fake_tantalus, tantalus_api, tmp_path):
+		fake_tantalus.add_records('storage', [{'name': 'store', 'storage_type': 'blob', 'prefix': 'pre'}])
+		storage_client = FakeBlobStorageClient(str(tmp_path), 'pre')
+		tantalus_api.cached_storage_clients['store'] = storage_client
+		storage_client.write_data_raw('results/a.csv', 'data')
+
+		file_resource, file_instance = tantalus_api.add_file('store', 'pre/results/a.csv')
+
+		assert file_resource['size'] == 4
+		assert file_instance['storage']['name'] == 'store'
+		assert tantalus_api.add_file('store', 'pre/results/a.csv')[0]['id'] == file_resource['id']
@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+from jira.exceptions import JIRAError
+
+from dbclients.jira_client import JiraClient, JiraWriteError
+
+
+class FakeIssue(object):
+	def __init__(self, key):
+		self.key = key
+
+
+@pytest.fixture
+def jira(mocker):
+	jira = mocker.Mock()
+	jira.issue.side_effect = lambda key, fields=None: FakeIssue(key)
+	jira.search_issues.side_effect = lambda jql, fields=None, maxResults=None: [
+		FakeIssue(a) for a in jql[len('key in ('):-1].split(',')]
+	mocker.patch('dbclients.jira_client.JIRA', return_value=jira)
+	return jira
+
+
+@pytest.fixture
+def jira_client():
+	return JiraClient(username='user', password='password', backoff=0, search_batch_size=2)
+
+
+def test_lazy_connection(mocker):
+	factory = mocker.patch('dbclients.jira_client.JIRA')
+	jira_client = JiraClient(username='user', password='password')
+	factory.assert_not_called()
+
+	jira_client.issue('SC-1')
+	factory.assert_called_once()
+
+
+def test_issue_cache_fields(jira, jira_client):
+	jira_client.issue('SC-1', fields=['parent', 'status'])
+	jira_client.issue('SC-1', fields=['parent'])
+	assert jira.issue.call_count == 1
+
+	jira_client.issue('SC-1', fields=['attachment'])
+	assert jira.issue.call_count == 2
+	assert set(jira.issue.call_args[1]['fields'].split(',')) == {'attachment', 'parent', 'status'}
+
+	jira_client.invalidate('SC-1')
+	jira_client.issue('SC-1', fields=['parent'])
+	assert jira.issue.call_count == 3
+
+
+def test_bulk_issues(jira, jira_client):
+	jira_client.issue('SC-1', fields=['parent'])
+
+	issues = jira_client.issues(['SC-1', 'SC-2', 'SC-3', 'SC-4'], fields=['parent'])
+
+	assert sorted(issues) == ['SC-1', 'SC-2', 'SC-3', 'SC-4']
+	assert jira.search_issues.call_count == 2
+
+	jira_client.issue('SC-3', fields=['parent'])
+	assert jira.issue.call_count == 1
+
+
+def test_queued_writes_coalesce_and_retry(jira, jira_client):
+	jira.add_comment.side_effect = [Exception('timeout'), None]
+
+	# Hold the writer until both comments are queued
+	blocked = threading.Event()
+	jira.add_attachment.side_effect = lambda **kwargs: blocked.wait(1)
+
+	jira_client.add_attachment('SC-1', '/tmp/report.html', filename='report.html')
+	jira_client.add_comment('SC-1', 'first')
+	jira_client.add_comment('SC-1', 'second')
+	blocked.set()
+
+	assert jira_client.flush(timeout=5)
+
+	assert jira.add_comment.call_count == 2
+	jira.add_comment.assert_called_with('SC-1', 'first\n\nsecond')
+	assert jira_client.failed_writes == []
+
+
+def test_bulk_issues_missing_key(jira, jira_client):
+	def search_issues(jql, fields=None, maxResults=None):
+		if 'SC-3' in jql:
+			raise JIRAError(status_code=400, text="An issue with key 'SC-3' does not exist")
+		return [FakeIssue(a) for a in jql[len('key in ('):-1].split(',')]
+	jira.search_issues.side_effect = search_issues
+
+	def issue(key, fields=None):
+		if key == 'SC-3':
+			raise JIRAError(status_code=404)
+		return FakeIssue(key)
+	jira.issue.side_effect = issue
+
+	issues = jira_client.issues(['SC-1', 'SC-2', 'SC-3', 'SC-4'], fields=['parent'])
+
+	# Only the batch with the missing key is fetched one issue at a time
+	assert sorted(issues) == ['SC-1', 'SC-2', 'SC-4']
+	assert [a[0][0] for a in jira.issue.call_args_list] == ['SC-3', 'SC-4']
+
+
+def test_queued_attachments_not_replaced(jira, jira_client):
+	jira_client.add_attachment('SC-1', '/tmp/a.html')
+	jira_client.add_attachment('SC-1', '/tmp/b.html')
+	jira_client.add_attachment('SC-1', '/tmp/c.html', filename='report.html')
+
+	assert jira_client.flush(timeout=5)
+
+	assert sorted(a[1]['attachment'] for a in jira.add_attachment.call_args_list) == ['/tmp/a.html', '/tmp/b.html', '/tmp/c.html']
+
+
+def test_pending_attachments(jira, jira_client):
+	sent = threading.Event()
+	jira.add_attachment.side_effect = lambda **kwargs: sent.wait(5)
+
+	jira_client.add_attachment('SC-1', '/tmp/a.html')
+	jira_client.add_attachment('SC-1', '/tmp/c.html', filename='report.html')
+	jira_client.add_attachment('SC-2', '/tmp/b.html')
+
+	# Queued and in flight attachments are pending until sent
+	assert sorted(jira_client.pending_attachments('SC-1')) == ['a.html', 'report.html']
+	assert jira_client.pending_attachments('SC-2') == ['b.html']
+
+	sent.set()
+	assert jira_client.flush(timeout=5)
+	assert jira_client.pending_attachments('SC-1') == []
+
+
+def test_failed_writes_raised_on_flush(jira, jira_client):
+	jira.add_comment.side_effect = Exception('timeout')
+
+	jira_client.add_comment('SC-1', 'done')
+
+	with pytest.raises(JiraWriteError, match='comment on SC-1'):
+		jira_client.flush(timeout=5)
+
+	# Failures are reported once
+	assert jira_client.flush(timeout=5)
+	assert jira_client.close(timeout=5)
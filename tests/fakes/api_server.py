@@ -0,0 +1,534 @@
+"""
+In-process stand-in for the Tantalus and Colossus REST APIs.
+
+Implements the subset of the django rest framework behaviour used by
+BasicAPIClient: an openapi schema at /api/swagger/, paginated list
+endpoints with django style filters, create, patch and delete, and ETags
+for conditional GETs.
+"""
+import json
+import hashlib
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# django filter lookups understood by the fake
+LOOKUPS = ('in', 'startswith', 'endswith', 'contains', 'icontains', 'gt', 'gte', 'lt', 'lte', 'ne', 'isnull')
+
+PAGINATION_PARAMS = ('page', 'page_size')
+
+
+def _to_query_str(value):
+	""" Render a stored value the way it would appear in a query string.
+	"""
+	if isinstance(value, bool) or value is None:
+		return {True: 'true', False: 'false', None: ''}[value]
+	return str(value)
+
+
+def _compare(value, lookup, query_values):
+	if lookup == 'in':
+		candidates = set()
+		for query_value in query_values:
+			candidates.update(query_value.split(','))
+		return _to_query_str(value) in candidates
+
+	query_value = query_values[-1]
+
+	if lookup == 'exact':
+		return _to_query_str(value) == query_value
+	if lookup == 'ne':
+		return _to_query_str(value) != query_value
+	if lookup == 'isnull':
+		return (value is None) == (query_value.lower() == 'true')
+	if value is None:
+		return False
+	if lookup == 'startswith':
+		return str(value).startswith(query_value)
+	if lookup == 'endswith':
+		return str(value).endswith(query_value)
+	if lookup == 'contains':
+		return query_value in str(value)
+	if lookup == 'icontains':
+		return query_value.lower() in str(value).lower()
+
+	if isinstance(value, (int, float)) and not isinstance(value, bool):
+		query_value = type(value)(query_value)
+	else:
+		value = str(value)
+
+	if lookup == 'gt':
+		return value > query_value
+	if lookup == 'gte':
+		return value >= query_value
+	if lookup == 'lt':
+		return value < query_value
+	if lookup == 'lte':
+		return value <= query_value
+
+	raise ValueError(f'unsupported lookup {lookup}')
+
+
+class FakeApiServer(object):
+	""" Fake REST API served from a background thread.
+
+	Tables are configured with a dict keyed by table name, each value a
+	dict with optional entries:
+
+		fields: model fields accepted on create
+		defaults: values for fields omitted on create
+		filters: additional list filters, for example 'library__pool_id'
+		foreign: foreign key fields and their table, {field: table}
+		nested: foreign key fields expanded into full records in responses
+		reverse: reverse relations usable in filters, {name: (table, field)}
+		computed: callable(server, record) returning extra response fields
+		aliases: other endpoint names for the same table
+
+	Args:
+		tables (dict): table configuration
+
+	KwArgs:
+		page_size (int): default page size
+		max_page_size (int): maximum page size a client may request
+		latency (float): seconds to sleep before answering each request
+	"""
+	def __init__(self, tables, page_size=100, max_page_size=1000, latency=0.):
+		self.tables = {}
+		self.aliases = {}
+		for name, config in tables.items():
+			self.tables[name] = dict(config)
+			self.aliases[name] = name
+			for alias in config.get('aliases', ()):
+				self.aliases[alias] = name
+
+		self.page_size = page_size
+		self.max_page_size = max_page_size
+		self.latency = latency
+
+		self.request_count = 0
+
+		self._lock = threading.RLock()
+		self._records = {name: {} for name in self.tables}
+		self._next_id = {name: 1 for name in self.tables}
+		self._field_indices = {name: {} for name in self.tables}
+		self._reverse_indices = {}
+		self._list_cache = {}
+
+		self._httpd = None
+		self._thread = None
+
+	@property
+	def base_url(self):
+		host, port = self._httpd.server_address[:2]
+		return f'http://{host}:{port}'
+
+	def start(self):
+		server = self
+
+		class Handler(_FakeApiHandler):
+			fake_api = server
+
+		self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self._httpd.daemon_threads = True
+		self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._httpd.shutdown()
+		self._httpd.server_close()
+		self._thread.join()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
+
+	# Data access, usable directly from tests to populate and inspect
+
+	def add_records(self, table_name, records):
+		""" Bulk insert records without going through http.
+
+		Returns:
+			list of ids of the inserted records
+		"""
+		with self._lock:
+			return [self.create(table_name, record)['id'] for record in records]
+
+	def records(self, table_name):
+		with self._lock:
+			return list(self._records[self.aliases[table_name]].values())
+
+	def snapshot(self):
+		with self._lock:
+			return json.dumps({'records': self._records, 'next_id': self._next_id})
+
+	def restore(self, snapshot):
+		with self._lock:
+			data = json.loads(snapshot)
+			self._records = {
+				name: {int(pk): record for pk, record in records.items()}
+				for name, records in data['records'].items()}
+			self._next_id = data['next_id']
+			for name in self.tables:
+				self._touch(name)
+				self._field_indices[name] = {}
+
+	def create(self, table_name, fields):
+		table_name = self.aliases[table_name]
+		with self._lock:
+			record = dict(self.tables[table_name].get('defaults', {}))
+			record.update(fields)
+			if 'id' not in record:
+				record['id'] = self._next_id[table_name]
+			self._next_id[table_name] = max(self._next_id[table_name], record['id'] + 1)
+			self._records[table_name][record['id']] = record
+			self._index_record(table_name, record)
+			self._touch(table_name)
+			return record
+
+	def update(self, table_name, pk, fields):
+		table_name = self.aliases[table_name]
+		with self._lock:
+			record = self._records[table_name][pk]
+			self._unindex_record(table_name, record)
+			record.update(fields)
+			self._index_record(table_name, record)
+			self._touch(table_name)
+			return record
+
+	def delete(self, table_name, pk):
+		table_name = self.aliases[table_name]
+		with self._lock:
+			record = self._records[table_name].pop(pk)
+			self._unindex_record(table_name, record)
+			self._touch(table_name)
+
+	def serialize(self, table_name, record):
+		""" Render a stored record as the api would, expanding nested relations.
+		"""
+		table = self.tables[table_name]
+		result = dict(record)
+		for field in table.get('nested', ()):
+			target = table['foreign'][field]
+			value = record.get(field)
+			if isinstance(value, list):
+				result[field] = [a if isinstance(a, dict) else self._records[target][a] for a in value]
+			elif value is not None and not isinstance(value, dict):
+				result[field] = self._records[target][value]
+		if 'computed' in table:
+			result.update(table['computed'](self, record))
+		return result
+
+	def query(self, table_name, filters):
+		""" Ids of records matching django style filters.
+
+		Args:
+			table_name (str): table to query
+			filters (dict): lists of query string values keyed by filter name
+		"""
+		table_name = self.aliases[table_name]
+		with self._lock:
+			# Cache results so that paging through a list does not
+			# repeat the search, cleared on any write
+			cache_key = (table_name, tuple(sorted((k, tuple(v)) for k, v in filters.items())))
+			if cache_key not in self._list_cache:
+				pks = self._candidates(table_name, filters)
+				pks = sorted(pk for pk in pks if self._matches(table_name, self._records[table_name][pk], filters))
+				self._list_cache[cache_key] = pks
+			return self._list_cache[cache_key]
+
+	# Internals
+
+	def _touch(self, table_name):
+		self._list_cache = {}
+		self._reverse_indices = {
+			key: value for key, value in self._reverse_indices.items() if key[0] != table_name}
+
+	def _index_record(self, table_name, record):
+		for field, index in list(self._field_indices[table_name].items()):
+			if index is None:
+				continue
+			value = record.get(field)
+			if isinstance(value, (list, dict)):
+				self._field_indices[table_name][field] = None
+				continue
+			index.setdefault(_to_query_str(value), set()).add(record['id'])
+
+	def _unindex_record(self, table_name, record):
+		for field, index in self._field_indices[table_name].items():
+			if index is not None:
+				index.get(_to_query_str(record.get(field)), set()).discard(record['id'])
+
+	def _field_index(self, table_name, field):
+		""" Exact match index for a field, None for list or nested fields.
+		"""
+		if field not in self._field_indices[table_name]:
+			index = {}
+			for record in self._records[table_name].values():
+				value = record.get(field)
+				if isinstance(value, (list, dict)):
+					index = None
+					break
+				index.setdefault(_to_query_str(value), set()).add(record['id'])
+			self._field_indices[table_name][field] = index
+		return self._field_indices[table_name][field]
+
+	def _reverse_index(self, table_name, field):
+		""" Map ids referenced by table_name.field to the referencing record ids.
+		"""
+		key = (table_name, field)
+		if key not in self._reverse_indices:
+			index = {}
+			for record in self._records[table_name].values():
+				values = record.get(field)
+				if not isinstance(values, list):
+					values = [values]
+				for value in values:
+					index.setdefault(value, []).append(record['id'])
+			self._reverse_indices[key] = index
+		return self._reverse_indices[key]
+
+	def _candidates(self, table_name, filters):
+		""" Narrow the search using exact match indices on direct fields.
+		"""
+		table = self.tables[table_name]
+		pks = None
+		for name, values in filters.items():
+			if '__' in name or name in table.get('reverse', {}):
+				continue
+			index = self._field_index(table_name, name)
+			if index is None:
+				continue
+			matched = index.get(values[-1], set())
+			pks = set(matched) if pks is None else pks & matched
+		if pks is None:
+			pks = self._records[table_name].keys()
+		return pks
+
+	def _matches(self, table_name, record, filters):
+		for name, values in filters.items():
+			parts = name.split('__')
+			lookup = 'exact'
+			if parts[-1] in LOOKUPS and len(parts) > 1:
+				lookup = parts.pop()
+			elif parts[-1].endswith('_ne') and parts[-1] not in record:
+				parts[-1] = parts[-1][:-len('_ne')]
+				lookup = 'ne'
+
+			resolved = self._resolve(table_name, record, parts)
+
+			if lookup == 'ne':
+				if any(not _compare(value, 'ne', values) for value in resolved):
+					return False
+			elif not any(_compare(value, lookup, values) for value in resolved):
+				return False
+		return True
+
+	def _resolve(self, table_name, record, parts):
+		""" Follow a related lookup path, returning all reachable values.
+		"""
+		if not parts:
+			return [record.get('id') if isinstance(record, dict) else record]
+
+		table = self.tables.get(table_name, {})
+		part, rest = parts[0], parts[1:]
+
+		if part in table.get('reverse', {}):
+			other_table, other_field = table['reverse'][part]
+			other_pks = self._reverse_index(other_table, other_field).get(record['id'], [])
+			values = []
+			for pk in other_pks:
+				values.extend(self._resolve(other_table, self._records[other_table][pk], rest))
+			return values
+
+		value = record.get(part)
+		items = value if isinstance(value, list) else [value]
+
+		values = []
+		for item in items:
+			target = table.get('foreign', {}).get(part)
+			if target is not None and not isinstance(item, dict) and item is not None:
+				item = self._records[target].get(item)
+				if item is None:
+					continue
+			if not rest:
+				values.append(item['id'] if isinstance(item, dict) else item)
+			elif isinstance(item, dict):
+				values.extend(self._resolve(target, item, rest))
+		return values
+
+	def schema(self):
+		""" Swagger 2.0 document describing the configured tables.
+		"""
+		paths = {}
+		for endpoint, table_name in self.aliases.items():
+			table = self.tables[table_name]
+			fields = list(table.get('fields', ()))
+			filters = set(fields) | set(table.get('filters', ())) | {'id'}
+
+			list_params = [
+				{'name': name, 'in': 'query', 'required': False, 'type': 'string'}
+				for name in sorted(filters) + list(PAGINATION_PARAMS)]
+
+			create_params = [{
+				'name': 'data',
+				'in': 'body',
+				'required': True,
+				'schema': {
+					'type': 'object',
+					'properties': {name: {'type': 'string'} for name in fields},
+				},
+			}]
+
+			paths[f'/{endpoint}/'] = {
+				'get': {'operationId': f'{endpoint}_list', 'tags': [endpoint], 'parameters': list_params},
+				'post': {'operationId': f'{endpoint}_create', 'tags': [endpoint], 'parameters': create_params},
+			}
+
+		return {
+			'swagger': '2.0',
+			'info': {'title': 'Fake API', 'version': ''},
+			'basePath': '/api',
+			'consumes': ['application/json'],
+			'produces': ['application/json'],
+			'paths': paths,
+		}
+
+
+class _FakeApiHandler(BaseHTTPRequestHandler):
+	fake_api = None
+
+	protocol_version = 'HTTP/1.1'
+
+	# headers and body are separate writes, avoid nagle stalls on keep-alive
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	def _send_json(self, data, status=200, content_type='application/json'):
+		body = json.dumps(data).encode('utf-8')
+
+		# Conditional GET, as django's ConditionalGetMiddleware
+		etag = None
+		if self.command == 'GET' and status == 200:
+			etag = '"' + hashlib.md5(body).hexdigest() + '"'
+			if self.headers.get('If-None-Match') == etag:
+				self.send_response(304)
+				self.send_header('ETag', etag)
+				self.send_header('Content-Length', '0')
+				self.end_headers()
+				return
+
+		self.send_response(status)
+		self.send_header('Content-Type', content_type)
+		self.send_header('Content-Length', str(len(body)))
+		if etag is not None:
+			self.send_header('ETag', etag)
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _read_json(self):
+		length = int(self.headers.get('Content-Length') or 0)
+		if length == 0:
+			return {}
+		return json.loads(self.rfile.read(length))
+
+	def _route(self):
+		""" Split the request path into (endpoint, id, query).
+		"""
+		url = urllib.parse.urlparse(self.path)
+		parts = [a for a in url.path.split('/') if a]
+		query = urllib.parse.parse_qs(url.query, keep_blank_values=True)
+
+		if not parts or parts[0] != 'api':
+			return None, None, query
+		endpoint = parts[1] if len(parts) > 1 else None
+		pk = int(parts[2]) if len(parts) > 2 else None
+		return endpoint, pk, query
+
+	def _begin(self):
+		api = self.fake_api
+		with api._lock:
+			api.request_count += 1
+		if api.latency:
+			time.sleep(api.latency)
+
+	def do_GET(self):
+		self._begin()
+		api = self.fake_api
+		endpoint, pk, query = self._route()
+
+		if endpoint == 'swagger':
+			return self._send_json(api.schema(), content_type='application/openapi+json')
+
+		if endpoint not in api.aliases:
+			return self._send_json({'detail': 'Not found.'}, status=404)
+
+		table_name = api.aliases[endpoint]
+
+		if pk is not None:
+			with api._lock:
+				record = api._records[table_name].get(pk)
+				if record is None:
+					return self._send_json({'detail': 'Not found.'}, status=404)
+				return self._send_json(api.serialize(table_name, record))
+
+		page = int(query.pop('page', ['1'])[-1])
+		page_size = min(int(query.pop('page_size', [api.page_size])[-1]), api.max_page_size)
+
+		with api._lock:
+			pks = api.query(table_name, query)
+			start = (page - 1) * page_size
+			results = [
+				api.serialize(table_name, api._records[table_name][a])
+				for a in pks[start:start + page_size]]
+
+		next_url = None
+		if start + page_size < len(pks):
+			next_query = dict(query, page=[str(page + 1)], page_size=[str(page_size)])
+			next_url = f'{api.base_url}/api/{endpoint}/?{urllib.parse.urlencode(next_query, doseq=True)}'
+
+		self._send_json({
+			'count': len(pks),
+			'next': next_url,
+			'previous': None,
+			'results': results,
+		})
+
+	def do_POST(self):
+		self._begin()
+		api = self.fake_api
+		endpoint, _, _ = self._route()
+		if endpoint not in api.aliases:
+			return self._send_json({'detail': 'Not found.'}, status=404)
+		table_name = api.aliases[endpoint]
+		record = api.create(table_name, self._read_json())
+		with api._lock:
+			self._send_json(api.serialize(table_name, record), status=201)
+
+	def do_PATCH(self):
+		self._begin()
+		api = self.fake_api
+		endpoint, pk, _ = self._route()
+		if endpoint not in api.aliases or pk not in api._records[api.aliases[endpoint]]:
+			return self._send_json({'detail': 'Not found.'}, status=404)
+		table_name = api.aliases[endpoint]
+		record = api.update(table_name, pk, self._read_json())
+		with api._lock:
+			self._send_json(api.serialize(table_name, record))
+
+	def do_DELETE(self):
+		self._begin()
+		api = self.fake_api
+		endpoint, pk, _ = self._route()
+		if endpoint not in api.aliases or pk not in api._records[api.aliases[endpoint]]:
+			return self._send_json({'detail': 'Not found.'}, status=404)
+		api.delete(api.aliases[endpoint], pk)
+		self.send_response(204)
+		self.send_header('Content-Length', '0')
+		self.end_headers()
@@ -0,0 +1,155 @@
+"""
+Filesystem backed stand-ins for BlobStorageClient and AsyncBlobStorageClient.
+
+Blobs are plain files under a local directory. An optional latency is
+added to every call that would be a round trip to blob storage.
+"""
+import asyncio
+import datetime
+import os
+import shutil
+import time
+
+
+class FakeBlobStorageClient(object):
+	def __init__(self, storage_directory, prefix, storage_container='fake', latency=0.):
+		self.storage_directory = storage_directory
+		self.storage_container = storage_container
+		self.prefix = prefix
+		self.latency = latency
+		self.request_count = 0
+
+	def _round_trip(self):
+		self.request_count += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+	def _path(self, blobname):
+		return os.path.join(self.storage_directory, blobname)
+
+	def get_size(self, blobname):
+		self._round_trip()
+		return os.path.getsize(self._path(blobname))
+
+	def get_created_time(self, blobname):
+		self._round_trip()
+		mtime = os.path.getmtime(self._path(blobname))
+		return datetime.datetime.fromtimestamp(mtime, tz=datetime.timezone.utc).isoformat()
+
+	def get_etag(self, blobname):
+		self._round_trip()
+		stat = os.stat(self._path(blobname))
+		return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+	def get_url(self, blobname, write_permission=False):
+		return self._path(blobname)
+
+	def delete(self, blobname):
+		self._round_trip()
+		os.remove(self._path(blobname))
+
+	def open_file(self, blobname):
+		self._round_trip()
+		return open(self._path(blobname), 'rb')
+
+	def exists(self, blobname):
+		self._round_trip()
+		return os.path.exists(self._path(blobname))
+
+	def list(self, prefix):
+		self._round_trip()
+		for root, dirs, files in os.walk(self.storage_directory):
+			for filename in files:
+				blobname = os.path.relpath(os.path.join(root, filename), self.storage_directory)
+				if blobname.startswith(prefix):
+					yield blobname
+
+	def write_data(self, blobname, stream):
+		stream.seek(0)
+		self.write_data_raw(blobname, stream.read())
+
+	def write_data_raw(self, blobname, data):
+		self._round_trip()
+		filepath = self._path(blobname)
+		os.makedirs(os.path.dirname(filepath), exist_ok=True)
+		if isinstance(data, str):
+			data = data.encode('utf-8')
+		with open(filepath, 'wb') as f:
+			f.write(data)
+
+	def create(self, blobname, filepath, update=False, max_concurrency=None, timeout=None):
+		if self.exists(blobname):
+			blobsize = self.get_size(blobname)
+			filesize = os.path.getsize(filepath)
+			if blobsize == filesize:
+				return
+			elif not update:
+				raise Exception("blob size is {} but local file size is {}".format(blobsize, filesize))
+
+		self._round_trip()
+		destination = self._path(blobname)
+		os.makedirs(os.path.dirname(destination), exist_ok=True)
+		shutil.copyfile(filepath, destination)
+
+	def copy(self, blobname, new_blobname, wait=False):
+		self._round_trip()
+		destination = self._path(new_blobname)
+		os.makedirs(os.path.dirname(destination), exist_ok=True)
+		shutil.copyfile(self._path(blobname), destination)
+
+	def download(self, blob_name, destination_file_path, max_concurrency=None, timeout=None):
+		self._round_trip()
+		shutil.copyfile(self._path(blob_name), destination_file_path)
+
+
+class FakeAsyncBlobStorageClient(object):
+	def __init__(self, storage_directory, prefix, storage_container='fake', concurrency=20, latency=0.):
+		self.storage_directory = storage_directory
+		self.storage_container = storage_container
+		self.prefix = prefix
+		self.concurrency = concurrency
+		self.latency = latency
+
+	def _path(self, blobname):
+		return os.path.join(self.storage_directory, blobname)
+
+	async def _upload(self, queue, update):
+		while not queue.empty():
+			blobname, source_file = await queue.get()
+			try:
+				await asyncio.sleep(self.latency)
+				destination = self._path(blobname)
+
+				if os.path.exists(destination):
+					blobsize = os.path.getsize(destination)
+					filesize = os.path.getsize(source_file)
+					if blobsize == filesize:
+						continue
+					elif not update:
+						raise Exception(f"blob size is {blobsize} but local file size is {filesize}")
+
+				os.makedirs(os.path.dirname(destination), exist_ok=True)
+				shutil.copyfile(source_file, destination)
+			finally:
+				queue.task_done()
+
+	async def _delete(self, queue):
+		while not queue.empty():
+			blobname = await queue.get()
+			try:
+				await asyncio.sleep(self.latency)
+				os.remove(self._path(blobname))
+			finally:
+				queue.task_done()
+
+	async def batch_upload_files(self, data, update=False):
+		queue = asyncio.Queue()
+		for upload_info in data:
+			await queue.put(upload_info)
+		await asyncio.gather(*[self._upload(queue, update) for _ in range(self.concurrency)])
+
+	async def batch_delete_files(self, data):
+		queue = asyncio.Queue()
+		for blobname in data:
+			await queue.put(blobname)
+		await asyncio.gather(*[self._delete(queue) for _ in range(self.concurrency)])
@@ -0,0 +1,162 @@
+"""
+Table configuration for FakeApiServer covering the Tantalus and Colossus
+endpoints used by sisyphus.
+"""
+import os
+
+
+def _file_instance_filepath(server, record):
+	storage = server._records['storage'][record['storage']]
+	file_resource = server._records['file_resource'][record['file_resource']]
+	return {'filepath': os.path.join(storage['prefix'], file_resource['filename'])}
+
+
+TANTALUS_TABLES = {
+	'storage': {
+		'fields': ['name', 'storage_type', 'prefix', 'storage_account', 'storage_container', 'storage_directory', 'server_ip'],
+	},
+	'sample': {
+		'fields': ['sample_id', 'external_sample_id'],
+	},
+	'dna_library': {
+		'fields': ['library_id', 'library_type', 'index_format'],
+	},
+	'sequencing_lane': {
+		'fields': ['flowcell_id', 'lane_number', 'sequencing_centre', 'sequencing_instrument', 'read_type', 'dna_library'],
+		'foreign': {'dna_library': 'dna_library'},
+		'filters': ['dna_library__library_id'],
+	},
+	'file_resource': {
+		'fields': ['filename', 'created', 'size', 'is_folder', 'compression', 'file_type', 'sequencefileinfo'],
+		'defaults': {'is_folder': False},
+		'filters': [
+			'filename__endswith',
+			'filename__startswith',
+			'sequencedataset__id',
+			'resultsdataset__id',
+			'resultsdataset__id__in',
+			'fileinstance__storage__name',
+			'id__in',
+		],
+		'reverse': {
+			'sequencedataset': ('sequencedataset', 'file_resources'),
+			'resultsdataset': ('resultsdataset', 'file_resources'),
+			'fileinstance': ('file_instance', 'file_resource'),
+		},
+	},
+	'file_instance': {
+		'fields': ['file_resource', 'storage', 'is_deleted'],
+		'defaults': {'is_deleted': False},
+		'foreign': {'file_resource': 'file_resource', 'storage': 'storage'},
+		'nested': ['file_resource', 'storage'],
+		'computed': _file_instance_filepath,
+		'filters': [
+			'storage__name',
+			'file_resource__filename',
+			'file_resource__filename__endswith',
+			'file_resource__sequencedataset__id',
+			'file_resource__resultsdataset__id',
+			'file_resource__sequencedataset__id__in',
+			'file_resource__resultsdataset__id__in',
+		],
+	},
+	'sequencedataset': {
+		'aliases': ['sequence_dataset'],
+		'fields': [
+			'name', 'dataset_type', 'sample', 'library', 'sequence_lanes', 'file_resources', 'is_complete',
+			'last_updated', 'aligner', 'reference_genome', 'region_split_length', 'analysis',
+		],
+		'foreign': {
+			'sample': 'sample',
+			'library': 'dna_library',
+			'sequence_lanes': 'sequencing_lane',
+			'file_resources': 'file_resource',
+			'analysis': 'analysis',
+		},
+		'nested': ['sample', 'library', 'sequence_lanes'],
+		'filters': [
+			'sample__sample_id',
+			'library__library_id',
+			'library__library_id__in',
+			'sequence_lanes__flowcell_id',
+			'analysis__jira_ticket',
+			'aligner__name',
+			'aligner__name__startswith',
+			'reference_genome__name',
+			'file_resources__id',
+			'id__in',
+		],
+	},
+	'resultsdataset': {
+		'aliases': ['results'],
+		'fields': ['name', 'results_type', 'results_version', 'analysis', 'file_resources', 'samples', 'libraries'],
+		'foreign': {
+			'analysis': 'analysis',
+			'file_resources': 'file_resource',
+			'samples': 'sample',
+			'libraries': 'dna_library',
+		},
+		'nested': ['samples', 'libraries'],
+		'filters': [
+			'samples__sample_id',
+			'libraries__library_id',
+			'libraries__library_id__in',
+			'analysis__jira_ticket',
+			'analysis__analysis_type',
+			'analysis__id__in',
+			'file_resources__id',
+			'id__in',
+		],
+	},
+	'analysis': {
+		'fields': [
+			'name', 'analysis_type', 'jira_ticket', 'args', 'input_datasets', 'input_results',
+			'version', 'status', 'last_updated',
+		],
+		'defaults': {'status': 'Unknown'},
+		'foreign': {'input_datasets': 'sequencedataset', 'input_results': 'resultsdataset'},
+		'filters': ['id__in', 'analysis_type__name', 'input_results__id__in'],
+	},
+	'tag': {
+		'fields': ['name', 'sequencedataset_set', 'resultsdataset_set'],
+	},
+}
+
+
+COLOSSUS_TABLES = {
+	'library': {
+		'fields': ['pool_id', 'jira_ticket', 'chip', 'sample', 'dlpsequencing_set', 'exclude_from_analysis', 'projects'],
+		'filters': ['pool_id'],
+	},
+	'sublibraries': {
+		'aliases': ['sublibraries_brief'],
+		'fields': [
+			'library', 'sample_id', 'row', 'column', 'img_col', 'pick_met', 'condition', 'primer_i5', 'index_i5',
+			'primer_i7', 'index_i7', 'metadata', 'cell_id', 'spot_class', 'num_drops', 'file_ch1', 'file_ch2',
+		],
+		'foreign': {'library': 'library'},
+		'filters': ['library__pool_id'],
+	},
+	'sequencing': {
+		'fields': ['library', 'sequencing_center', 'sequencing_instrument', 'number_of_lanes_requested', 'dlplane_set', 'gsc_library_id'],
+		'foreign': {'dlplane_set': 'lane'},
+		'nested': ['dlplane_set'],
+		'filters': ['id__in', 'library__pool_id'],
+	},
+	'lane': {
+		'fields': ['flow_cell_id', 'sequencing', 'sequencing_date', 'path_to_archive'],
+		'filters': ['id__in', 'sequencing__id'],
+	},
+	'analysis_run': {
+		'fields': ['run_status', 'last_updated', 'log_file', 'blob_path'],
+	},
+	'analysis_information': {
+		'fields': ['library', 'analysis_jira_ticket', 'aligner', 'reference_genome', 'analysis_run', 'montage_status', 'sequencings'],
+		'foreign': {'library': 'library', 'analysis_run': 'analysis_run'},
+		'nested': ['library', 'analysis_run'],
+		'filters': [
+			'analysis_run__run_status', 'analysis_run__run_status_ne', 'analysis_run__last_updated__gte',
+			'library__pool_id', 'montage_status',
+		],
+	},
+}
@@ -0,0 +1,18 @@
+import unittest
+
+from workflows.analysis.base import Analysis
+
+
+class AnalysisRegistryTestCase(unittest.TestCase):
+	def test_analysis_modules_register_their_type(self):
+		for analysis_type in Analysis.analysis_modules:
+			analysis_class = Analysis.get_analysis_class(analysis_type)
+
+			self.assertEqual(analysis_class.analysis_type_, analysis_type)
+
+	def test_unknown_analysis_type(self):
+		with self.assertRaises(ValueError):
+			Analysis.get_analysis_class('not_an_analysis')
+
+if __name__ == '__main__':
+	unittest.main()
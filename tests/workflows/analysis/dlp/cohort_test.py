@@ -0,0 +1,164 @@
+import copy
+
+import pytest
+
+from dbclients.tantalus import TantalusApi, DataNotOnStorageError
+from workflows.analysis.dlp.cohort import CohortResolver, InputKey
+from workflows.analysis.dlp.snv_genotyping import SnvGenotypingAnalysis
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES
+
+
+NUM_LIBRARIES = 12
+
+
+@pytest.fixture
+def fake_tantalus(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES, page_size=1000) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		yield server
+
+
+def add_cohort(fake_tantalus):
+	""" Tumour libraries sequenced against one normal, each with cell bams,
+	variant calling and annotation results, and an older variant calling.
+	"""
+	storage_id, = fake_tantalus.add_records('storage', [{'name': 'singlecellresults', 'storage_type': 'blob', 'prefix': 'results'}])
+	normal_sample_pk, = fake_tantalus.add_records('sample', [{'sample_id': 'N1'}])
+	normal_library_pk, = fake_tantalus.add_records('dna_library', [{'library_id': 'N1'}])
+
+	for idx in range(NUM_LIBRARIES):
+		library_id, sample_id = f'A{idx}', f'S{idx}'
+		sample_pk, = fake_tantalus.add_records('sample', [{'sample_id': sample_id}])
+		library_pk, = fake_tantalus.add_records('dna_library', [{'library_id': library_id}])
+
+		filenames = [f'{library_id}/bams/{cell}.bam' for cell in range(3)] + [f'{library_id}/bams/{cell}.bam.bai' for cell in range(3)]
+		resource_ids = fake_tantalus.add_records('file_resource', [{'filename': a} for a in filenames])
+		fake_tantalus.add_records('file_instance', [{'file_resource': a, 'storage': storage_id} for a in resource_ids])
+		fake_tantalus.add_records('sequencedataset', [
+			{
+				'name': f'{library_id}_{name}',
+				'dataset_type': 'BAM',
+				'region_split_length': None,
+				'sample': sample_pk,
+				'library': library_pk,
+				'file_resources': resource_ids if is_complete else [],
+				'is_complete': is_complete,
+				'last_updated': last_updated,
+			}
+			for name, is_complete, last_updated in [
+				('old', True, '2020-01-01T00:00:00-08:00'),
+				('bams', True, '2021-01-01T00:00:00-08:00'),
+				('incomplete', False, '2022-01-01T00:00:00-08:00'),
+			]])
+
+		for results_type, suffixes in [('variant_calling', ['museq.vcf.gz', 'strelka_snv.vcf.gz']), ('annotation', ['metrics.csv.gz'])]:
+			for version in ('old', 'new'):
+				resource_ids = fake_tantalus.add_records('file_resource', [{'filename': f'{library_id}/{results_type}_{version}/{a}'} for a in suffixes])
+				fake_tantalus.add_records('file_instance', [{'file_resource': a, 'storage': storage_id} for a in resource_ids])
+				fake_tantalus.add_records('resultsdataset', [{
+					'name': f'{library_id}_{results_type}_{version}',
+					'results_type': results_type,
+					'file_resources': resource_ids,
+					'samples': [sample_pk, normal_sample_pk] if results_type == 'variant_calling' else [sample_pk],
+					'libraries': [library_pk, normal_library_pk] if results_type == 'variant_calling' else [library_pk],
+				}])
+
+
+def test_most_recent(fake_tantalus):
+	add_cohort(fake_tantalus)
+	resolver = CohortResolver(TantalusApi(), batch_size=5)
+	keys = [InputKey(f'A{idx}', f'S{idx}') for idx in range(NUM_LIBRARIES)]
+
+	request_count = fake_tantalus.request_count
+	results = resolver.get_most_recent_results(keys, 'variant_calling')
+	datasets = resolver.get_most_recent_datasets(keys, dataset_type='BAM')
+
+	# One query per batch of libraries
+	assert fake_tantalus.request_count - request_count == 2 * 3
+
+	assert {key: a['name'] for key, a in results.items()} == {key: f'{key.library_id}_variant_calling_new' for key in keys}
+	assert {key: a['name'] for key, a in datasets.items()} == {key: f'{key.library_id}_bams' for key in keys}
+
+	annotation = resolver.get_most_recent_results([InputKey('A3', None)], 'annotation')
+	assert annotation[InputKey('A3', None)]['name'] == 'A3_annotation_new'
+
+	with pytest.raises(ValueError, match='A3'):
+		resolver.get_most_recent_results([InputKey('A3', 'S4')], 'variant_calling')
+
+
+def test_get_input_files(fake_tantalus):
+	add_cohort(fake_tantalus)
+	resolver = CohortResolver(TantalusApi())
+	dataset_ids = [a['id'] for a in fake_tantalus.records('sequencedataset') if a['name'].endswith('_bams')]
+
+	request_count = fake_tantalus.request_count
+	input_files = resolver.get_input_files('sequencedataset', dataset_ids, 'singlecellresults', suffixes=['.bam'])
+	assert fake_tantalus.request_count - request_count == 2
+
+	dataset, file_instances = input_files[dataset_ids[1]]
+	assert dataset['library']['library_id'] == 'A1'
+	assert [a['filepath'] for a in file_instances] == [f'results/A1/bams/{cell}.bam' for cell in range(3)]
+
+	# Missing index files only matter if they are inputs
+	bai_resource_id = dataset['file_resources'][-1]
+	bai_instance, = [a for a in fake_tantalus.records('file_instance') if a['file_resource'] == bai_resource_id]
+	fake_tantalus.update('file_instance', bai_instance['id'], {'is_deleted': True})
+
+	assert len(resolver.get_input_files('sequencedataset', dataset_ids, 'singlecellresults', suffixes=['.bam'])) == NUM_LIBRARIES
+
+	with pytest.raises(DataNotOnStorageError, match='A1/bams/2.bam.bai'):
+		resolver.get_input_files('sequencedataset', dataset_ids, 'singlecellresults')
+
+
+def test_without_in_filters(monkeypatch):
+	tables = copy.deepcopy(TANTALUS_TABLES)
+	for table in tables.values():
+		table['filters'] = [a for a in table.get('filters', []) if not a.endswith('__in')]
+
+	with FakeApiServer(tables, page_size=1000) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		add_cohort(server)
+		resolver = CohortResolver(TantalusApi(), batch_size=5)
+		keys = [InputKey(f'A{idx}', f'S{idx}') for idx in range(NUM_LIBRARIES)]
+
+		# Falls back to a query per library
+		request_count = server.request_count
+		results = resolver.get_most_recent_results(keys, 'variant_calling')
+		assert server.request_count - request_count == NUM_LIBRARIES
+		assert {key: a['name'] for key, a in results.items()} == {key: f'{key.library_id}_variant_calling_new' for key in keys}
+
+		datasets = resolver.get_most_recent_datasets(keys, dataset_type='BAM')
+		assert {key: a['name'] for key, a in datasets.items()} == {key: f'{key.library_id}_bams' for key in keys}
+
+		dataset_ids = [a['id'] for a in datasets.values()]
+		input_files = resolver.get_input_files('sequencedataset', dataset_ids, 'singlecellresults', suffixes=['.bam'])
+		dataset, file_instances = input_files[datasets[InputKey('A1', 'S1')]['id']]
+		assert [a['filepath'] for a in file_instances] == [f'results/A1/bams/{cell}.bam' for cell in range(3)]
+
+
+def test_snv_genotyping_inputs(fake_tantalus):
+	add_cohort(fake_tantalus)
+	args = {
+		'group_id': 'G1',
+		'inputs': [
+			{
+				'library_jira_id': f'SC-{idx}',
+				'library_id': f'A{idx}',
+				'sample_id': f'S{idx}',
+				'normal_library_id': 'N1',
+				'normal_sample_id': 'N1',
+			}
+			for idx in range(NUM_LIBRARIES)],
+	}
+
+	results_ids = SnvGenotypingAnalysis.search_input_results(TantalusApi(), 'SC-1', 'v0.0.1', args)
+	dataset_ids = SnvGenotypingAnalysis.search_input_datasets(TantalusApi(), 'SC-1', 'v0.0.1', args)
+
+	results_names = {a['id']: a['name'] for a in fake_tantalus.records('resultsdataset')}
+	assert sorted(results_names[a] for a in results_ids) == sorted(
+		f'A{idx}_{results_type}_new' for idx in range(NUM_LIBRARIES) for results_type in ('variant_calling', 'annotation'))
+
+	dataset_names = {a['id']: a['name'] for a in fake_tantalus.records('sequencedataset')}
+	assert [dataset_names[a] for a in dataset_ids] == [f'A{idx}_bams' for idx in range(NUM_LIBRARIES)]
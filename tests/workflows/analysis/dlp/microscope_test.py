@@ -0,0 +1,86 @@
+import pytest
+import yaml
+
+from dbclients.tantalus import TantalusApi
+from workflows.analysis.dlp.microscope import MicroscopePreprocessing, get_tantalus_tifs
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES, COLOSSUS_TABLES
+
+
+@pytest.fixture
+def fake_apis(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES) as fake_tantalus, FakeApiServer(COLOSSUS_TABLES) as fake_colossus:
+		monkeypatch.setenv('TANTALUS_BASE_URL', fake_tantalus.base_url)
+		monkeypatch.setenv('COLOSSUS_BASE_URL', fake_colossus.base_url)
+		yield fake_tantalus, fake_colossus
+
+
+def test_generate_inputs_yaml(fake_apis, tmp_path):
+	fake_tantalus, fake_colossus = fake_apis
+
+	library_pk, = fake_colossus.add_records('library', [{'pool_id': 'A1'}])
+	cells = [(row, column) for row in range(1, 4) for column in range(1, 5)]
+	fake_colossus.add_records('sublibraries', [
+		{
+			'library': library_pk,
+			'row': row,
+			'column': column,
+			'cell_id': f'SA1-A1-R{row:02d}-C{column:02d}',
+			'file_ch1': f'\\chip\\R{row}_C{column}_ch1.tif',
+			'file_ch2': f'\\chip\\R{row}_C{column}_ch2.tif',
+		}
+		for row, column in cells])
+
+	storage_id, = fake_tantalus.add_records('storage', [{'name': 'singlecellresults', 'storage_type': 'blob', 'prefix': 'results'}])
+
+	# The last cell only has one channel imported
+	filenames = [f'microscope/chip/R{row}_C{column}_ch{ch}.tif' for row, column in cells for ch in (1, 2)][:-1]
+	resource_ids = fake_tantalus.add_records('file_resource', [{'filename': a, 'size': 1} for a in filenames])
+	fake_tantalus.add_records('file_instance', [{'file_resource': a, 'storage': storage_id} for a in resource_ids])
+	results_ids = fake_tantalus.add_records('resultsdataset', [
+		{'name': 'microscope_1', 'file_resources': resource_ids[:10]},
+		{'name': 'microscope_2', 'file_resources': resource_ids[10:]},
+	])
+
+	analysis = MicroscopePreprocessing(TantalusApi(), {
+		'id': 1,
+		'name': 'microscope_preprocessing_A1',
+		'analysis_type': 'microscope_preprocessing',
+		'jira_ticket': 'SC-1',
+		'version': 'v0.0.1',
+		'args': {'library_id': 'A1'},
+		'input_datasets': [],
+		'input_results': results_ids,
+	})
+
+	inputs_yaml_filename = str(tmp_path / 'inputs.yaml')
+
+	with pytest.raises(AssertionError, match='SA1-A1-R03-C04'):
+		analysis.generate_inputs_yaml({'working_results': 'singlecellresults'}, inputs_yaml_filename)
+
+	missing_id, = fake_tantalus.add_records('file_resource', [{'filename': 'microscope/chip/R3_C4_ch2.tif', 'size': 1}])
+	fake_tantalus.add_records('file_instance', [{'file_resource': missing_id, 'storage': storage_id}])
+	fake_tantalus.update('resultsdataset', results_ids[1], {'file_resources': resource_ids[10:] + [missing_id]})
+
+	analysis.generate_inputs_yaml({'working_results': 'singlecellresults'}, inputs_yaml_filename)
+
+	with open(inputs_yaml_filename) as f:
+		cell_images = yaml.safe_load(f)['cell_images']
+
+	assert len(cell_images) == len(cells)
+	assert cell_images['SA1-A1-R02-C03'] == {
+		'cfse': 'singlecellresults/results/microscope/chip/R2_C3_ch1.tif',
+		'livedead': 'singlecellresults/results/microscope/chip/R2_C3_ch2.tif',
+	}
+
+
+def test_get_tantalus_tifs_no_results(fake_apis):
+	fake_tantalus, fake_colossus = fake_apis
+	storage_id, = fake_tantalus.add_records('storage', [{'name': 'singlecellresults', 'storage_type': 'blob', 'prefix': 'results'}])
+	resource_id, = fake_tantalus.add_records('file_resource', [{'filename': 'microscope/chip/R1_C1_ch1.tif', 'size': 1}])
+	fake_tantalus.add_records('file_instance', [{'file_resource': resource_id, 'storage': storage_id}])
+
+	request_count = fake_tantalus.request_count
+	assert get_tantalus_tifs([]).empty
+	assert fake_tantalus.request_count == request_count
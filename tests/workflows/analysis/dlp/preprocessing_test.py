@@ -0,0 +1,93 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from dbclients.tantalus import TantalusApi
+from workflows.analysis.dlp import preprocessing
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.storage import FakeBlobStorageClient
+from tests.fakes.tables import TANTALUS_TABLES
+
+
+@pytest.fixture
+def fake_tantalus(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		yield server
+
+
+def write_metrics(storage_client, filename, num_cells, contaminated):
+	data = pd.DataFrame({
+		'cell_id': [f'SA1-A{filename[1]}-R01-C{idx:02d}' for idx in range(num_cells)],
+		'is_contaminated': [idx in contaminated for idx in range(num_cells)],
+		'total_reads': 1000,
+		'fastqscreen_grch37': 1000,
+		'fastqscreen_grch37_multihit': 0,
+		'fastqscreen_mm10': [100 if idx in contaminated else 0 for idx in range(num_cells)],
+		'fastqscreen_mm10_multihit': 0,
+		'fastqscreen_salmon': 0,
+		'fastqscreen_salmon_multihit': 0,
+		'quality': 0.9,
+	})
+	stream = io.BytesIO()
+	data.to_csv(stream, index=False, compression={'method': 'gzip'})
+	storage_client.write_data(filename, stream)
+
+
+def add_annotation_results(fake_tantalus, library_ids, versions):
+	storage_id, = fake_tantalus.add_records('storage', [{'name': 'singlecellresults', 'storage_type': 'blob', 'prefix': 'results'}])
+	library_pks = fake_tantalus.add_records('dna_library', [{'library_id': a} for a in library_ids])
+	resource_ids = fake_tantalus.add_records('file_resource', [{'filename': f'{a}/metrics.csv.gz'} for a in library_ids])
+	fake_tantalus.add_records('file_instance', [{'file_resource': a, 'storage': storage_id} for a in resource_ids])
+	return fake_tantalus.add_records('resultsdataset', [
+		{
+			'name': f'{library_id}_annotation',
+			'results_type': 'annotation',
+			'results_version': version,
+			'file_resources': [resource_id],
+			'libraries': [library_pk],
+		}
+		for library_id, library_pk, resource_id, version in zip(library_ids, library_pks, resource_ids, versions)])
+
+
+def test_get_passed_cell_ids(fake_tantalus, tmp_path):
+	storage_client = FakeBlobStorageClient(str(tmp_path / 'blob'), 'results')
+	tantalus_api = TantalusApi()
+	tantalus_api.cached_storage_clients['singlecellresults'] = storage_client
+	cache_dir = str(tmp_path / 'cache')
+
+	write_metrics(storage_client, 'A1/metrics.csv.gz', 10, contaminated={0, 1})
+	write_metrics(storage_client, 'A2/metrics.csv.gz', 5, contaminated={4})
+	results_ids = add_annotation_results(fake_tantalus, ['A1', 'A2'], ['v0.8.0', 'v0.5.0'])
+
+	passed = {
+		results_id: preprocessing.get_passed_cell_ids(tantalus_api, results_id, 'singlecellresults', cache_dir=cache_dir)
+		for results_id in results_ids
+	}
+
+	assert passed[results_ids[0]] == {f'SA1-A1-R01-C{idx:02d}' for idx in range(2, 10)}
+	assert passed[results_ids[1]] == {f'SA1-A2-R01-C{idx:02d}' for idx in range(4)}
+
+	# Cached by ETag, unchanged metrics are not read again
+	storage_client.open_file = lambda filename: pytest.fail(f'read {filename}')
+	assert preprocessing.get_passed_cell_ids(tantalus_api, results_ids[0], 'singlecellresults', cache_dir=cache_dir) == passed[results_ids[0]]
+
+	# Rewritten metrics have a new ETag and are read again
+	del storage_client.open_file
+	write_metrics(storage_client, 'A1/metrics.csv.gz', 10, contaminated={0, 1, 2, 3, 4, 5})
+	assert len(preprocessing.get_passed_cell_ids(tantalus_api, results_ids[0], 'singlecellresults', cache_dir=cache_dir)) == 4
+
+
+def test_prune_cache(tmp_path):
+	cache_dir = tmp_path / 'cache'
+	cache_dir.mkdir()
+	(cache_dir / 'old.json').write_text('[]')
+	(cache_dir / 'new.json').write_text('[]')
+	os.utime(cache_dir / 'old.json', (0, 0))
+
+	preprocessing.prune_cache(str(cache_dir))
+
+	assert [a.name for a in cache_dir.iterdir()] == ['new.json']
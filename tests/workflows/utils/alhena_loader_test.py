@@ -0,0 +1,46 @@
+import subprocess
+import threading
+import time
+
+from workflows.utils import alhena_loader
+from workflows.utils.alhena_loader import AlhenaLoader
+
+
+def test_run_all(mocker):
+	lock = threading.Lock()
+	running = [0]
+	max_running = [0]
+	commands = []
+
+	def fake_run(cmd, **kwargs):
+		with lock:
+			commands.append(cmd)
+			running[0] += 1
+			max_running[0] = max(max_running[0], running[0])
+		time.sleep(0.05)
+		with lock:
+			running[0] -= 1
+		returncode = 1 if 'SC-3' in cmd[-1] else 0
+		return subprocess.CompletedProcess(cmd, returncode, stdout=f'loaded {cmd[-1]}')
+
+	mocker.patch.object(alhena_loader.subprocess, 'run', side_effect=fake_run)
+	mock_call = mocker.patch.object(alhena_loader.subprocess, 'call')
+	mock_start_vm = mocker.patch.object(alhena_loader, 'start_vm')
+	mock_stop_vm = mocker.patch.object(alhena_loader, 'stop_vm')
+
+	loads = [(f'SC-{idx}', f'bash load_ticket.sh SC-{idx}') for idx in range(6)]
+
+	with AlhenaLoader(max_loads=2, vm_name='loader-vm', resource_group='loader-rg') as loader:
+		mock_start_vm.assert_called_once_with('loader-vm', 'loader-rg')
+		results = loader.run_all(loads)
+
+	mock_stop_vm.assert_called_once_with('loader-vm', 'loader-rg')
+
+	assert [a['name'] for a in results] == [name for name, _ in loads]
+	assert [a['returncode'] for a in results] == [0, 0, 0, 1, 0, 0]
+	assert all(a['seconds'] > 0 for a in results)
+	assert max_running[0] == 2
+
+	# All loads share one control connection, which is closed on exit
+	assert all(f'ControlPath={loader.control_path}' in a and 'ControlMaster=auto' in a for a in commands)
+	assert mock_call.call_args[0][0][-3:] == ['-O', 'exit', 'loader']
@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+
+from dbclients.colossus import ColossusApi
+from workflows.utils.analysis_snapshot import AnalysisSnapshot
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import COLOSSUS_TABLES
+
+
+def timestamp(days_ago=0):
+	date = datetime.datetime.now() - datetime.timedelta(days=days_ago)
+	return date.isoformat(timespec='microseconds') + '-07:00'
+
+
+@pytest.fixture
+def fake_colossus(monkeypatch):
+	with FakeApiServer(COLOSSUS_TABLES) as server:
+		monkeypatch.setenv('COLOSSUS_BASE_URL', server.base_url)
+		yield server
+
+
+def add_analyses(fake_colossus, analyses):
+	library_ids = fake_colossus.add_records('library', [{'pool_id': f'A{idx:05d}A'} for idx in range(len(analyses))])
+	analysis_run_ids = fake_colossus.add_records('analysis_run', [
+		{'run_status': run_status, 'last_updated': timestamp(days_ago)} for run_status, _, days_ago in analyses])
+	return fake_colossus.add_records('analysis_information', [
+		{'library': library_id, 'aligner': 'A', 'analysis_run': analysis_run_id, 'montage_status': montage_status}
+		for library_id, analysis_run_id, (_, montage_status, _) in zip(library_ids, analysis_run_ids, analyses)])
+
+
+def test_sync(fake_colossus, tmp_path):
+	colossus_api = ColossusApi()
+	filename = str(tmp_path / 'snapshot.json')
+
+	running_id, old_id, complete_id = add_analyses(fake_colossus, [
+		('running', 'Pending', 1),
+		('running', 'Pending', 300),
+		('complete', 'Pending', 2),
+	])
+
+	snapshot = AnalysisSnapshot(filename)
+	assert snapshot.sync(colossus_api) == 2
+	assert [a['id'] for a in snapshot.qc_candidates('A')] == [running_id]
+	assert snapshot.qc_candidates('M') == []
+
+	# A new run resumes from the saved high water mark and only fetches the update
+	fake_colossus.update('analysis_run', fake_colossus.records('analysis_information')[0]['analysis_run'], {
+		'run_status': 'complete', 'last_updated': timestamp()})
+
+	snapshot = AnalysisSnapshot(filename)
+	assert snapshot.sync(colossus_api) == 1
+	assert snapshot.qc_candidates('A') == []
+
+	assert snapshot.sync(colossus_api, full=True) == 2
+
+
+def test_viz_candidates(fake_colossus, tmp_path):
+	colossus_api = ColossusApi()
+	filename = str(tmp_path / 'snapshot.json')
+
+	loaded_id, pending_id, running_id, old_id = add_analyses(fake_colossus, [
+		('complete', 'Success', 3),
+		('complete', 'Pending', 2),
+		('running', 'Pending', 1),
+		('complete', 'Pending', 300),
+	])
+
+	snapshot = AnalysisSnapshot(filename)
+	snapshot.sync(colossus_api)
+	assert [a['id'] for a in snapshot.viz_candidates(colossus_api)] == [pending_id]
+
+	# Loading status changes without touching the run, so a delta sync does
+	# not see it, but the analysis is still a candidate
+	fake_colossus.update('analysis_information', loaded_id, {'montage_status': 'Pending'})
+	fake_colossus.update('analysis_information', pending_id, {'montage_status': 'Success'})
+	snapshot.sync(colossus_api)
+	assert snapshot.analyses[loaded_id]['montage_status'] == 'Success'
+	assert [a['id'] for a in snapshot.viz_candidates(colossus_api)] == [loaded_id]
+	assert AnalysisSnapshot(filename).analyses[loaded_id]['montage_status'] == 'Pending'
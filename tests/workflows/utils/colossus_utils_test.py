@@ -0,0 +1,65 @@
+import copy
+
+import pytest
+
+from dbclients.basicclient import NotFoundError
+from dbclients.colossus import ColossusApi
+from workflows.utils import colossus_utils
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import COLOSSUS_TABLES
+
+
+@pytest.fixture
+def fake_colossus(monkeypatch):
+	with FakeApiServer(COLOSSUS_TABLES) as server:
+		monkeypatch.setenv('COLOSSUS_BASE_URL', server.base_url)
+		monkeypatch.setattr(colossus_utils, 'colossus_api', ColossusApi())
+		yield server
+
+
+def test_get_lanes_from_sequencings(fake_colossus):
+	lane_ids = fake_colossus.add_records('lane', [{'flow_cell_id': f'FC{idx}'} for idx in range(250)])
+	sequencing_ids = fake_colossus.add_records('sequencing', [
+		{'dlplane_set': lane_ids[idx:idx + 2]} for idx in range(0, 250, 2)])
+
+	request_count = fake_colossus.request_count
+	lanes = colossus_utils.get_lanes_from_sequencings(sequencing_ids)
+
+	assert sorted(lanes) == lane_ids
+	# One paged id__in query per 100 sequencings
+	assert fake_colossus.request_count - request_count == 2
+
+	with pytest.raises(NotFoundError):
+		colossus_utils.get_lanes_from_sequencings(sequencing_ids + [1000])
+
+
+def test_get_lanes_from_sequencings_without_in_filter(monkeypatch):
+	tables = copy.deepcopy(COLOSSUS_TABLES)
+	tables['sequencing']['filters'].remove('id__in')
+
+	with FakeApiServer(tables) as server:
+		monkeypatch.setenv('COLOSSUS_BASE_URL', server.base_url)
+		monkeypatch.setattr(colossus_utils, 'colossus_api', ColossusApi())
+
+		lane_ids = server.add_records('lane', [{'flow_cell_id': f'FC{idx}'} for idx in range(6)])
+		sequencing_ids = server.add_records('sequencing', [
+			{'dlplane_set': lane_ids[idx:idx + 2]} for idx in range(0, 6, 2)])
+
+		# Falls back to a query per sequencing
+		request_count = server.request_count
+		assert sorted(colossus_utils.get_lanes_from_sequencings(sequencing_ids)) == lane_ids
+		assert server.request_count - request_count == 3
+
+
+def test_get_projects_from_library_id(fake_colossus):
+	fake_colossus.add_records('library', [
+		{'pool_id': 'A1', 'projects': [{'id': 1, 'name': 'P1'}, {'id': 2, 'name': 'P2'}]},
+		{'pool_id': 'A2', 'projects': []},
+	])
+
+	assert colossus_utils.get_projects_from_library_id('A1') == [{'id': 1, 'name': 'P1'}, {'id': 2, 'name': 'P2'}]
+	assert colossus_utils.get_projects_from_library_id('A2') == []
+
+	with pytest.raises(NotFoundError):
+		colossus_utils.get_projects_from_library_id('A3')
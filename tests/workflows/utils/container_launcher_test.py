@@ -0,0 +1,121 @@
+import os
+import json
+import subprocess
+
+import pytest
+
+from workflows.utils import container_launcher
+from workflows.utils.container_launcher import ContainerLauncher
+
+
+DIGEST = 'sha256:' + 'a' * 64
+
+
+@pytest.fixture
+def docker(mocker, monkeypatch, tmp_path):
+	""" Stand in for docker, recording commands and starting work in tmp_path/tmp.
+	"""
+	monkeypatch.setattr(container_launcher, '_image_refs', {})
+	monkeypatch.setenv('SISYPHUS_WARM_CONTAINER_DIR', str(tmp_path / 'warm_containers'))
+
+	state = {'commands': [], 'pulled': False, 'running': set(), 'warm': [], 'busy': set()}
+
+	def check_output(cmd, **kwargs):
+		state['commands'].append(list(cmd))
+		if cmd[1:3] == ('image', 'inspect'):
+			if not state['pulled']:
+				raise subprocess.CalledProcessError(1, cmd)
+			return json.dumps([f'registry/single_cell@{DIGEST}'])
+		if cmd[1] == 'ps' and '--all' in cmd:
+			return '\n'.join(state['warm'])
+		if cmd[1] == 'top':
+			return 'PID\n1' + ('\n2' if cmd[2] in state['busy'] else '')
+		if cmd[1] == 'ps':
+			name = cmd[-1].split('=')[1].strip('^$')
+			return 'abc123' if name in state['running'] else ''
+
+	def check_call(cmd, shell=False, **kwargs):
+		state['commands'].append(cmd)
+		if cmd[:2] == ['docker', 'pull']:
+			state['pulled'] = True
+		elif shell and cmd.startswith('docker run --detach'):
+			state['running'].add(cmd.split()[4])
+		elif shell:
+			(tmp_path / 'tmp').mkdir(exist_ok=True)
+			(tmp_path / 'tmp' / 'job').write_text('started')
+
+	mocker.patch.object(subprocess, 'check_output', side_effect=check_output)
+	mocker.patch.object(subprocess, 'check_call', side_effect=check_call)
+	mocker.patch.object(subprocess, 'call')
+
+	return state
+
+
+def test_cold_launch(docker, tmp_path):
+	stats_filename = str(tmp_path / 'stats.jsonl')
+	launcher = ContainerLauncher(
+		'registry/single_cell', ['-v', '$PWD:$PWD'], digests={'v1': DIGEST},
+		stats_filename=stats_filename, poll_interval=0.01)
+
+	for _ in range(2):
+		stats = launcher.run('v1', ['single_cell', 'annotation'], ready_path=str(tmp_path / 'tmp'))
+
+	runs = [a for a in docker['commands'] if isinstance(a, str)]
+	assert runs == [f'docker run -w $PWD -v $PWD:$PWD --rm registry/single_cell@{DIGEST} single_cell annotation'] * 2
+
+	# Pulled and verified once
+	assert [a for a in docker['commands'] if a[:2] == ['docker', 'pull']] == [['docker', 'pull', 'registry/single_cell:v1']]
+
+	assert stats['mode'] == 'cold'
+	assert stats['first_job_seconds'] is not None
+	with open(stats_filename) as f:
+		assert len(f.readlines()) == 2
+
+
+def test_warm_launch(docker, tmp_path):
+	launcher = ContainerLauncher('registry/single_cell', ['-v', '$PWD:$PWD'], warm=True)
+	name = launcher.container_name('v1')
+
+	for _ in range(3):
+		launcher.run('v1', ['single_cell', 'annotation'])
+
+	runs = [a for a in docker['commands'] if isinstance(a, str)]
+	assert runs[0] == (
+		f'docker run --detach --name {name} --label sisyphus.warm '
+		f'-v $PWD:$PWD --entrypoint sleep registry/single_cell@{DIGEST} infinity')
+	assert runs[1:] == [f'docker exec -w $PWD {name} single_cell annotation'] * 3
+
+	# Launchers in other processes share the container
+	assert ContainerLauncher('registry/single_cell', ['-v', '$PWD:$PWD'], warm=True).container_name('v1') == name
+
+	# A different mount set gets its own container, the same mounts in another order do not
+	assert ContainerLauncher('registry/single_cell', ['-v', '/data:/data'], warm=True).container_name('v1') != name
+	mounts = ['-v', '/data:/data', '-v', '/refs:/refs']
+	assert (
+		ContainerLauncher('registry/single_cell', mounts, warm=True).container_name('v1') ==
+		ContainerLauncher('registry/single_cell', mounts[2:] + mounts[:2], warm=True).container_name('v1'))
+
+
+def test_reap_warm_containers(docker, tmp_path):
+	docker['warm'] = ['sisyphus-warm-recent', 'sisyphus-warm-idle', 'sisyphus-warm-busy', 'sisyphus-warm-unknown']
+	docker['busy'] = {'sisyphus-warm-busy'}
+
+	for name in docker['warm'][:3]:
+		container_launcher._touch(name)
+	for name in docker['warm'][1:3]:
+		os.utime(tmp_path / 'warm_containers' / name, (0, 0))
+
+	# Idle containers not running a command are removed
+	assert container_launcher.reap_warm_containers(idle_ttl=60) == ['sisyphus-warm-idle', 'sisyphus-warm-unknown']
+	assert sorted(a.name for a in (tmp_path / 'warm_containers').iterdir()) == ['sisyphus-warm-busy', 'sisyphus-warm-recent']
+	assert [a.args[0] for a in subprocess.call.call_args_list] == [
+		['docker', 'rm', '--force', 'sisyphus-warm-idle'],
+		['docker', 'rm', '--force', 'sisyphus-warm-unknown'],
+	]
+
+
+def test_digest_mismatch(docker):
+	launcher = ContainerLauncher('registry/single_cell', [], digests={'v1': 'sha256:' + 'b' * 64})
+
+	with pytest.raises(Exception, match='expected sha256:b'):
+		launcher.image('v1')
@@ -0,0 +1,89 @@
+import pytest
+
+from dbclients.basicclient import NotFoundError
+from dbclients.tantalus import TantalusApi
+from workflows.utils.lineage import Lineage
+
+from tests.fakes.api_server import FakeApiServer
+from tests.fakes.tables import TANTALUS_TABLES
+
+
+@pytest.fixture
+def fake_tantalus(monkeypatch):
+	with FakeApiServer(TANTALUS_TABLES) as server:
+		monkeypatch.setenv('TANTALUS_BASE_URL', server.base_url)
+		yield server
+
+
+@pytest.fixture
+def graph(fake_tantalus):
+	""" Diamond shaped lineage:
+
+		datasets 1, 2 -> align -> results A -> hmmcopy -> results B -> pseudobulk -> results D
+		                                 \\-> annotation (A, B) -> results C ------/
+	"""
+	add = fake_tantalus.add_records
+
+	dataset_1, dataset_2 = add('sequencedataset', [{'name': 'd1'}, {'name': 'd2'}])
+	align, = add('analysis', [{'name': 'align', 'input_datasets': [dataset_1, dataset_2], 'input_results': []}])
+	results_a, = add('resultsdataset', [{'name': 'A', 'analysis': align}])
+	hmmcopy, = add('analysis', [{'name': 'hmmcopy', 'input_datasets': [], 'input_results': [results_a]}])
+	results_b, = add('resultsdataset', [{'name': 'B', 'analysis': hmmcopy}])
+	annotation, = add('analysis', [{'name': 'annotation', 'input_datasets': [], 'input_results': [results_a, results_b]}])
+	results_c, = add('resultsdataset', [{'name': 'C', 'analysis': annotation}])
+	pseudobulk, = add('analysis', [{'name': 'pseudobulk', 'input_datasets': [], 'input_results': [results_b, results_c]}])
+	results_d, = add('resultsdataset', [{'name': 'D', 'analysis': pseudobulk}])
+
+	return {
+		'datasets': {dataset_1, dataset_2},
+		'results': [results_a, results_b, results_c, results_d],
+		'analyses': [align, hmmcopy, annotation, pseudobulk],
+	}
+
+
+def test_upstream(fake_tantalus, graph):
+	lineage = Lineage(TantalusApi())
+	results_a, results_b, results_c, results_d = graph['results']
+
+	request_count = fake_tantalus.request_count
+	dataset_ids, results_ids = lineage.upstream([results_d])
+
+	assert dataset_ids == graph['datasets']
+	assert results_ids == {results_a, results_b, results_c}
+
+	# Three levels, one results and one analysis query each
+	assert fake_tantalus.request_count - request_count <= 6
+
+	request_count = fake_tantalus.request_count
+	assert lineage.upstream([results_c])[0] == graph['datasets']
+	assert fake_tantalus.request_count == request_count
+
+
+def test_downstream(graph):
+	lineage = Lineage(TantalusApi())
+	results_a, results_b, results_c, results_d = graph['results']
+
+	analysis_ids, results_ids = lineage.downstream([results_a])
+
+	assert analysis_ids == set(graph['analyses'][1:])
+	assert results_ids == {results_b, results_c, results_d}
+
+	assert lineage.downstream([results_d]) == (set(), set())
+
+
+def test_save_load(graph, tmp_path):
+	filename = str(tmp_path / 'lineage.json')
+	results_a, results_b, results_c, results_d = graph['results']
+
+	lineage = Lineage(TantalusApi())
+	lineage.upstream([results_d])
+	lineage.downstream([results_a])
+	lineage.save(filename)
+
+	offline = Lineage.load(filename)
+
+	assert offline.upstream([results_d]) == lineage.upstream([results_d])
+	assert offline.downstream([results_b]) == ({graph['analyses'][2], graph['analyses'][3]}, {results_c, results_d})
+
+	with pytest.raises(NotFoundError):
+		offline.upstream([results_d + 1])
@@ -1,5 +1,6 @@
 import json
 import click
+import importlib
 import logging
 import datetime
 import pandas as pd
@@ -20,20 +21,48 @@ class Analysis:
 
     analysis_classes = {}
 
+    # Modules defining each analysis type, imported on first use so that
+    # running one analysis does not import every pipeline
+    analysis_modules = {
+        'align': 'workflows.analysis.dlp.alignment',
+        'hmmcopy': 'workflows.analysis.dlp.hmmcopy',
+        'annotation': 'workflows.analysis.dlp.annotation',
+        'breakpoint_calling': 'workflows.analysis.dlp.breakpoint_calling',
+        'infer_haps': 'workflows.analysis.dlp.haplotype_calling',
+        'count_haps': 'workflows.analysis.dlp.haplotype_counting',
+        'merge_cell_bams': 'workflows.analysis.dlp.merge_cell_bams',
+        'split_wgs_bam': 'workflows.analysis.dlp.split_wgs_bam',
+        'variant_calling': 'workflows.analysis.dlp.variant_calling',
+        'snv_genotyping': 'workflows.analysis.dlp.snv_genotyping',
+        'microscope_preprocessing': 'workflows.analysis.dlp.microscope',
+        'germline_calling': 'workflows.analysis.dlp.germline_calling',
+    }
+
     @classmethod
     def register_analysis(cls, analysis):
         cls.analysis_classes[analysis.analysis_type_] = analysis
 
+    @classmethod
+    def get_analysis_class(cls, analysis_type):
+        """
+        Get the Analysis subclass for an analysis type, importing its module if necessary.
+        """
+        if analysis_type not in cls.analysis_classes:
+            if analysis_type not in cls.analysis_modules:
+                raise ValueError(f'unknown analysis type {analysis_type}')
+            importlib.import_module(cls.analysis_modules[analysis_type])
+        return cls.analysis_classes[analysis_type]
+
     @classmethod
     def get_by_id(cls, tantalus_api, id):
         tantalus_analysis = tantalus_api.get('analysis', id=id)
-        analysis_class = cls.analysis_classes[tantalus_analysis['analysis_type']]
+        analysis_class = cls.get_analysis_class(tantalus_analysis['analysis_type'])
         return analysis_class(tantalus_api, tantalus_analysis)
 
     @classmethod
     def create_from_args(cls, tantalus_api, jira, version, args, update=False):
         tantalus_analysis = cls.get_or_create_analysis(tantalus_api, jira, version, args, update=update)
-        analysis_class = cls.analysis_classes[tantalus_analysis['analysis_type']]
+        analysis_class = cls.get_analysis_class(tantalus_analysis['analysis_type'])
         return analysis_class(tantalus_api, tantalus_analysis)
 
     @property
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -12,6 +11,7 @@ import workflows.analysis.dlp.launchsc
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lane_str, get_datasets_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 from datamanagement.utils.dlp import create_sequence_dataset_models
 import workflows.analysis.dlp.results_import as results_import
 from workflows.generate_inputs import generate_sample_info
@@ -120,7 +120,7 @@ class AlignmentAnalysis(workflows.analysis.base.Analysis):
         return name
 
     def check_inputs_yaml(self, inputs_yaml_filename):
-        inputs_dict = yaml.load(open(inputs_yaml_filename))
+        inputs_dict = yaml_utils.load_file(inputs_yaml_filename)
 
         lanes = list(self._get_lanes().keys())
         input_lanes = list(inputs_dict.values())[0]['fastqs'].keys()
@@ -266,7 +266,7 @@ class AlignmentAnalysis(workflows.analysis.base.Analysis):
         input_info = self._generate_cell_metadata(storages['working_inputs'])
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
         self.check_inputs_yaml(inputs_yaml_filename)
 
@@ -318,7 +318,7 @@ class AlignmentAnalysis(workflows.analysis.base.Analysis):
         """
         storage_client = self.tantalus_api.get_storage_client(storages["working_inputs"])
         metadata_yaml_path = os.path.join(self.bams_dir, "metadata.yaml")
-        metadata_yaml = yaml.safe_load(storage_client.open_file(metadata_yaml_path))
+        metadata_yaml = yaml_utils.safe_load(storage_client.open_file(metadata_yaml_path))
 
         colossus_api = dbclients.colossus.ColossusApi()
         cell_sublibraries = colossus_api.get_sublibraries_by_cell_id(self.args['library_id'])
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -11,6 +10,7 @@ import workflows.analysis.dlp.launchsc
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_datasets_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 
 
@@ -109,7 +109,7 @@ class AnnotationAnalysis(workflows.analysis.base.Analysis):
                 input_info[file_type] = file_instance['filepath']
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -13,6 +12,7 @@ import workflows.analysis.dlp.utils
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.preprocessing as preprocessing
 import workflows.analysis.dlp.results_import as results_import
 
@@ -143,7 +143,7 @@ class BreakpointCallingAnalysis(workflows.analysis.base.Analysis):
                 )
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
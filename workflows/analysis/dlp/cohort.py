@@ -0,0 +1,168 @@
+"""
+Batched resolution of the inputs of cohort analyses.
+
+Cohort analyses such as snv genotyping take results and datasets from many
+libraries.  Rather than querying per library, sample and type, the keys of
+all inputs are gathered and resolved with a few batched __in queries, and
+the file instances of all resolved results and datasets are fetched
+together.
+"""
+import collections
+
+from dbclients.tantalus import DataNotOnStorageError
+import workflows.analysis.dlp.utils
+
+
+InputKey = collections.namedtuple('InputKey', ['library_id', 'sample_id'])
+
+InputFiles = collections.namedtuple('InputFiles', ['dataset', 'file_instances'])
+
+
+class CohortResolver(object):
+    """
+    Resolves inputs of many libraries with batched queries.
+
+    Args:
+        tantalus_api (TantalusApi): tantalus client
+
+    KwArgs:
+        batch_size (int): values per __in query
+    """
+
+    def __init__(self, tantalus_api, batch_size=100):
+        self.tantalus_api = tantalus_api
+        self.batch_size = batch_size
+
+    def _list_batched(self, table_name, filter_name, values, **filters):
+        return self.tantalus_api.list_batched(table_name, filter_name, values, batch_size=self.batch_size, **filters)
+
+    @staticmethod
+    def _keys_by_library(keys):
+        keys_by_library = collections.defaultdict(list)
+        for key in set(keys):
+            keys_by_library[key.library_id].append(key)
+        return keys_by_library
+
+    def get_most_recent_results(self, keys, results_type):
+        """
+        Most recent results of a type for each library and sample.
+
+        Args:
+            keys (list): InputKey for each input, a sample_id of None matches
+                results of any sample
+            results_type (str): type of results
+
+        Returns:
+            dict of results keyed by InputKey
+
+        Raises:
+            ValueError if there are no results for a key
+        """
+        keys_by_library = self._keys_by_library(keys)
+
+        most_recent = {}
+        for results in self._list_batched(
+                'resultsdataset', 'libraries__library_id__in', keys_by_library, results_type=results_type):
+            sample_ids = set(a['sample_id'] for a in results['samples'])
+            for library in results['libraries']:
+                for key in keys_by_library.get(library['library_id'], []):
+                    if key.sample_id is not None and key.sample_id not in sample_ids:
+                        continue
+                    if key not in most_recent or results['id'] > most_recent[key]['id']:
+                        most_recent[key] = results
+
+        for key in set(keys):
+            if key not in most_recent:
+                raise ValueError(f'no {results_type} results found for {key}')
+
+        return most_recent
+
+    def get_most_recent_datasets(self, keys, **filters):
+        """
+        Most recent complete sequence datasets for each library and sample.
+
+        Args:
+            keys (list): InputKey for each input, a sample_id of None matches
+                datasets of any sample
+            **filters: additional filters such as dataset_type
+
+        Returns:
+            dict of datasets keyed by InputKey
+
+        Raises:
+            ValueError if there are no datasets for a key
+        """
+        keys_by_library = self._keys_by_library(keys)
+
+        candidates = collections.defaultdict(list)
+        for dataset in self._list_batched(
+                'sequencedataset', 'library__library_id__in', keys_by_library, **filters):
+            for key in keys_by_library.get(dataset['library']['library_id'], []):
+                if key.sample_id is None or key.sample_id == dataset['sample']['sample_id']:
+                    candidates[key].append(dataset)
+
+        most_recent = {}
+        for key in set(keys):
+            dataset = workflows.analysis.dlp.utils.select_most_recent_dataset(candidates[key])
+            if dataset is None:
+                raise ValueError(f'no datasets found for {key} with search parameters {filters}')
+            most_recent[key] = dataset
+
+        return most_recent
+
+    def get_input_files(self, dataset_model, dataset_ids, storage_name, suffixes=None):
+        """
+        Datasets and their file instances on a storage, fetched together.
+
+        Args:
+            dataset_model (str): model type, sequencedataset or resultsdataset
+            dataset_ids (list): primary keys of the datasets
+            storage_name (str): name of the storage for which to retrieve file instances
+
+        KwArgs:
+            suffixes (list): only include files with one of these suffixes
+
+        Returns:
+            dict of InputFiles keyed by dataset id, file instances are in the
+            order of the file resources of each dataset
+
+        Raises:
+            DataNotOnStorageError if a file is not on the storage
+        """
+        if dataset_model not in ('sequencedataset', 'resultsdataset'):
+            raise ValueError('unrecognized dataset model {}'.format(dataset_model))
+
+        def is_input(filename):
+            return suffixes is None or filename.endswith(tuple(suffixes))
+
+        datasets = self.tantalus_api.list_by_ids(dataset_model, dataset_ids, batch_size=self.batch_size)
+        missing_datasets = set(dataset_ids) - set(datasets)
+        if missing_datasets:
+            raise ValueError(f'no {dataset_model} with ids {sorted(missing_datasets)}')
+
+        file_instances = {}
+        for file_instance in self._list_batched(
+                'file_instance', f'file_resource__{dataset_model}__id__in', datasets,
+                storage__name=storage_name, is_deleted=False):
+            file_instances[file_instance['file_resource']['id']] = file_instance
+
+        # Files not on the storage only matter if they are inputs, which
+        # requires their filenames
+        missing_resource_ids = set()
+        for dataset in datasets.values():
+            missing_resource_ids.update(set(dataset['file_resources']) - set(file_instances))
+
+        for file_resource in self.tantalus_api.list_by_ids('file_resource', missing_resource_ids).values():
+            if is_input(file_resource['filename']):
+                raise DataNotOnStorageError('file resource {} with filename {} not on {}'.format(
+                    file_resource['id'], file_resource['filename'], storage_name))
+
+        input_files = {}
+        for dataset_id, dataset in datasets.items():
+            input_files[dataset_id] = InputFiles(dataset, [
+                file_instances[file_resource_id] for file_resource_id in dataset['file_resources']
+                if file_resource_id in file_instances
+                and is_input(file_instances[file_resource_id]['file_resource']['filename'])
+            ])
+
+        return input_files
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -12,6 +11,7 @@ import workflows.analysis.dlp.launchsc
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lanes_hash, get_datasets_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 import workflows.analysis.dlp.preprocessing as preprocessing
 
@@ -143,7 +143,7 @@ class HaplotypeCountingAnalysis(workflows.analysis.base.Analysis):
         assert len(input_info['tumour']) > 0
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -13,6 +12,7 @@ import workflows.analysis.dlp.launchsc
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lanes_hash, get_datasets_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.preprocessing as preprocessing
 
 
@@ -116,7 +116,7 @@ class MergeCellBamsAnalysis(workflows.analysis.base.Analysis):
         assert len(input_info['cell_bams']) > 0
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
@@ -163,7 +163,7 @@ class MergeCellBamsAnalysis(workflows.analysis.base.Analysis):
 
         storage_client = self.tantalus_api.get_storage_client(storages["working_inputs"])
         metadata_yaml_path = os.path.join(self.bams_dir, "metadata.yaml")
-        metadata_yaml = yaml.safe_load(storage_client.open_file(metadata_yaml_path))
+        metadata_yaml = yaml_utils.safe_load(storage_client.open_file(metadata_yaml_path))
 
         name = templates.WGS_SPLIT_BAM_NAME_TEMPLATE.format(
             dataset_type="BAM",
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -8,58 +7,76 @@ import pandas as pd
 import dbclients.tantalus
 import workflows.analysis.base
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 import workflows.analysis.dlp.launchmic
 
 import pandas as pd
 import dbclients.colossus
+from dbclients.basicclient import LazyClient
 
 
-tantalus_api = dbclients.tantalus.TantalusApi()
-colossus_api = dbclients.colossus.ColossusApi()
+tantalus_api = LazyClient(dbclients.tantalus.TantalusApi)
+colossus_api = LazyClient(dbclients.colossus.ColossusApi)
+
+
+# Microscope channel number to the name used in the inputs yaml
+CHANNELS = {'1': 'cfse', '2': 'livedead'}
 
 
 def get_colossus_tifs(library_id):
-    cell_ids = {}
-    sublibraries = colossus_api.list('sublibraries', library__pool_id=library_id)
-    for sublibrary in sublibraries:
-        cell_ids[(sublibrary['row'], sublibrary['column'])] = sublibrary['cell_id']
-
-    colossus_tiffs = []
-    sublibrary_briefs = colossus_api.list('sublibraries_brief', library__pool_id=library_id)
-    for sublibrary_brief in sublibrary_briefs:
-        for tif_num in ('1', '2'):
-            colossus_tiffs.append(
-                {
-                    'file_ch': sublibrary_brief[f'file_ch{tif_num}'],
-                    'ch_number': tif_num,
-                    'row': str(sublibrary_brief['row']),
-                    'column': str(sublibrary_brief['column']),
-                    'cell_id': cell_ids[(sublibrary_brief['row'], sublibrary_brief['column'])],
-                }
-            )
+    """ One row per cell and channel, with the tif name recorded in colossus.
+    """
+    columns = ['row', 'column', 'cell_id', 'file_ch1', 'file_ch2']
+
+    sublibraries = dbclients.colossus.get_sublibrary_index(library_id, colossus_api).table
+    if sublibraries.empty:
+        return pd.DataFrame(columns=['row', 'column', 'cell_id', 'ch_number', 'file_ch'])
+
+    # Older colossus deployments only include the tif names in the brief listing
+    if 'file_ch1' not in sublibraries:
+        briefs = pd.DataFrame(list(colossus_api.list('sublibraries_brief', library__pool_id=library_id)))
+        sublibraries = sublibraries.merge(briefs[['row', 'column', 'file_ch1', 'file_ch2']], on=['row', 'column'])
 
-    return pd.DataFrame(colossus_tiffs)
+    cells = sublibraries[columns].astype({'row': int, 'column': int})
+
+    colossus_tiffs = cells.melt(
+        id_vars=['row', 'column', 'cell_id'],
+        value_vars=['file_ch1', 'file_ch2'],
+        var_name='ch_number',
+        value_name='file_ch',
+    )
+    colossus_tiffs['ch_number'] = colossus_tiffs['ch_number'].str[-1]
+
+    return colossus_tiffs
 
 
 def get_tantalus_tifs(dataset_ids):
-    tantalus_tiffs = []
-    for dataset_id in dataset_ids:
-        files = tantalus_api.list(
-            'file_resource',
-            resultsdataset__id=dataset_id,
-            filename__endswith='.tif',
-            fileinstance__storage__name='singlecellresults'
-        )
-        for file in files:
-            tantalus_tiffs.append(
-                {
-                    'file_ch': f"\\{file['filename'].split('/')[-2]}\\{file['filename'].split('/')[-1]}",
-                    'filename': file['filename'],
-                    'file_resource_id': str(file['id'])
-                }
-            )
-    return pd.DataFrame(tantalus_tiffs)
+    """ Tifs of the given results on singlecellresults, fetched with one query.
+    """
+    columns = ['file_ch', 'filename', 'file_resource_id']
+
+    # An empty id__in filter is ignored by the server, which would list every tif
+    if len(dataset_ids) == 0:
+        return pd.DataFrame(columns=columns)
+
+    files = tantalus_api.list(
+        'file_resource',
+        resultsdataset__id__in=','.join(str(a) for a in dataset_ids),
+        filename__endswith='.tif',
+        fileinstance__storage__name='singlecellresults'
+    )
+    tantalus_tiffs = pd.DataFrame([{'filename': a['filename'], 'file_resource_id': str(a['id'])} for a in files])
+    if tantalus_tiffs.empty:
+        return pd.DataFrame(columns=columns)
+
+    tantalus_tiffs = tantalus_tiffs.drop_duplicates('file_resource_id')
+
+    # Colossus records tifs as \<directory>\<filename>
+    parts = tantalus_tiffs['filename'].str.split('/')
+    tantalus_tiffs['file_ch'] = '\\' + parts.str[-2] + '\\' + parts.str[-1]
+
+    return tantalus_tiffs[columns]
 
 
 class MicroscopePreprocessing(workflows.analysis.base.Analysis):
@@ -96,23 +113,25 @@ class MicroscopePreprocessing(workflows.analysis.base.Analysis):
         c_df = get_colossus_tifs(self.args['library_id'])
         merged_df = pd.merge(left=c_df, right=t_df, left_on='file_ch', right_on='file_ch')
 
-        input_info = {'cell_images': {}}
         prefix = os.path.join(storages['working_results'], "results")
-        for index, row in merged_df.iterrows():
-            if row['cell_id'] not in input_info['cell_images'].keys():
-                input_info['cell_images'][row['cell_id']] = {}
-
-            if row['ch_number'] == '1':
-                input_info['cell_images'][row['cell_id']]["cfse"] = os.path.join(prefix, row['filename'])
-            else:
-                input_info['cell_images'][row['cell_id']]["livedead"] = os.path.join(prefix, row['filename'])
+        merged_df['path'] = prefix + os.sep + merged_df['filename']
+        merged_df['channel'] = merged_df['ch_number'].map(CHANNELS)
+
+        cell_images = (
+            merged_df
+            .groupby(['cell_id', 'channel'])['path'].last()
+            .unstack('channel')
+            .reindex(columns=list(CHANNELS.values()))
+        )
 
-        for cell_id in input_info['cell_images'].keys():
-            tif_count = len(input_info['cell_images'][cell_id].keys())
+        tif_counts = cell_images.notnull().sum(axis=1)
+        for cell_id, tif_count in tif_counts[tif_counts != 2].items():
             assert tif_count == 2, f'For cell_id "{cell_id}" expected 2 tifs but got {tif_count}'
 
+        input_info = {'cell_images': cell_images.to_dict(orient='index')}
+
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
 
     def run_pipeline(
@@ -1,29 +1,53 @@
+import os
+import json
+import time
+import hashlib
 import logging
 import packaging.version
 import pandas as pd
 
 
-def get_passed_cell_ids(tantalus_api, results_id, storage_name):
-    # Find the metrics file in the annotation results
-    results = tantalus_api.get('results', id=results_id)
-    assert len(results['libraries']) == 1
-    library_id = results['libraries'][0]['library_id']
-    file_instances = tantalus_api.get_dataset_file_instances(
-        results_id, 'resultsdataset', storage_name,
-        filters={'filename__endswith': 'metrics.csv.gz'})
-    assert len(file_instances) == 1
-    file_instance = file_instances[0]
+DEFAULT_CACHE_DIR = os.environ.get(
+    'SISYPHUS_METRICS_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.sisyphus', 'passed_cells'),
+)
 
-    storage_client = tantalus_api.get_storage_client(file_instance['storage']['name'])
-    f = storage_client.open_file(file_instance['file_resource']['filename'])
-    data = pd.read_csv(f, compression='gzip')
+# Cached passed cells not used for this many seconds are removed
+CACHE_MAX_AGE = 30 * 24 * 3600
 
-    # Recalculate the is_contaminated flag for results prior to v0.5.17
-    assert results['results_type'] == 'annotation'
-    annotation_version = results['results_version']
-    if packaging.version.parse(annotation_version) < packaging.version.parse('v0.5.17') or annotation_version in ('v0.6.3', 'v0.6.4'):
+# Columns of the annotation metrics used to filter cells
+METRICS_DTYPES = {
+    'cell_id': str,
+    'is_contaminated': bool,
+}
+
+# Additional columns used to recalculate is_contaminated
+CONTAMINATION_DTYPES = {
+    'total_reads': float,
+    'fastqscreen_grch37': float,
+    'fastqscreen_grch37_multihit': float,
+    'fastqscreen_mm10': float,
+    'fastqscreen_mm10_multihit': float,
+    'fastqscreen_salmon': float,
+    'fastqscreen_salmon_multihit': float,
+}
+
+
+def recalculate_contamination(annotation_version):
+    """ Whether is_contaminated must be recalculated for an annotation results version.
+    """
+    return packaging.version.parse(annotation_version) < packaging.version.parse('v0.5.17') or annotation_version in ('v0.6.3', 'v0.6.4')
+
+
+def read_passed_cell_ids(f, annotation_version):
+    """ Read the ids of cells not marked as contaminated from a gzipped metrics csv.
+    """
+    if recalculate_contamination(annotation_version):
         logging.info(f'recalculating is_contaminated for annotation results version {annotation_version}')
 
+        dtypes = dict(cell_id=str, **CONTAMINATION_DTYPES)
+        data = pd.read_csv(f, compression='gzip', usecols=list(dtypes), dtype=dtypes)
+
         data['fastqscreen_grch37_exclusive'] = data['fastqscreen_grch37'] - data['fastqscreen_grch37_multihit']
         data['fastqscreen_mm10_exclusive'] = data['fastqscreen_mm10'] - data['fastqscreen_mm10_multihit']
         data['fastqscreen_salmon_exclusive'] = data['fastqscreen_salmon'] - data['fastqscreen_salmon_multihit']
@@ -40,9 +64,76 @@ def get_passed_cell_ids(tantalus_api, results_id, storage_name):
     else:
         logging.info(f'using existing is_contaminated for annotation results version {annotation_version}')
 
+        data = pd.read_csv(f, compression='gzip', usecols=list(METRICS_DTYPES), dtype=METRICS_DTYPES)
+
     # Filter cells marked as contaminated
     data = data[~data['is_contaminated']]
 
     return set(data['cell_id'].values)
 
 
+def prune_cache(cache_dir, max_age=CACHE_MAX_AGE):
+    """ Remove cached passed cells not used within max_age seconds.
+    """
+    oldest = time.time() - max_age
+    for filename in os.listdir(cache_dir):
+        cache_filename = os.path.join(cache_dir, filename)
+        try:
+            if os.path.getmtime(cache_filename) < oldest:
+                os.remove(cache_filename)
+        except OSError:
+            continue
+
+
+def get_passed_cell_ids(tantalus_api, results_id, storage_name, cache_dir=None):
+    """ Ids of cells passing the contamination filter in annotation results.
+
+    Passed cells are cached locally keyed by the ETag of the metrics file, so
+    the metrics are only downloaded and parsed again if they change.  Cached
+    passed cells unused for CACHE_MAX_AGE are removed when others are added.
+
+    KwArgs:
+        cache_dir (str): directory of cached passed cells, defaults to DEFAULT_CACHE_DIR
+    """
+    if cache_dir is None:
+        cache_dir = DEFAULT_CACHE_DIR
+
+    # Find the metrics file in the annotation results
+    results = tantalus_api.get('results', id=results_id)
+    assert len(results['libraries']) == 1
+    library_id = results['libraries'][0]['library_id']
+    file_instances = tantalus_api.get_dataset_file_instances(
+        results_id, 'resultsdataset', storage_name,
+        filters={'filename__endswith': 'metrics.csv.gz'})
+    assert len(file_instances) == 1
+    file_instance = file_instances[0]
+
+    assert results['results_type'] == 'annotation'
+    annotation_version = results['results_version']
+
+    storage_client = tantalus_api.get_storage_client(file_instance['storage']['name'])
+    filename = file_instance['file_resource']['filename']
+
+    etag = storage_client.get_etag(filename)
+    cache_key = json.dumps([file_instance['storage']['name'], filename, etag, recalculate_contamination(annotation_version)])
+    cache_filename = os.path.join(cache_dir, hashlib.sha1(cache_key.encode()).hexdigest() + '.json')
+
+    if os.path.exists(cache_filename):
+        logging.info(f'using cached passed cells for {library_id} metrics {filename}')
+        with open(cache_filename) as f:
+            cell_ids = set(json.load(f))
+        os.utime(cache_filename)
+        return cell_ids
+
+    f = storage_client.open_file(filename)
+    cell_ids = read_passed_cell_ids(f, annotation_version)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_filename = cache_filename + f'.{os.getpid()}.tmp'
+    with open(temp_filename, 'w') as f:
+        json.dump(sorted(cell_ids), f)
+    os.replace(temp_filename, cache_filename)
+
+    prune_cache(cache_dir)
+
+    return cell_ids
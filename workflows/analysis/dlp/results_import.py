@@ -1,7 +1,8 @@
 import os
-import yaml
 import logging
 
+from datamanagement.utils import yaml_utils
+
 from workflows.scripts.low_complexity_filter import filter_reads
 import gzip
 from io import BytesIO
@@ -28,7 +29,7 @@ def create_dlp_results(
     # Load the metadata.yaml file, assumed to exist in the root of the results directory
     metadata_filename = os.path.join(results_dir, "metadata.yaml")
     print('metadata: {}'.format(metadata_filename))
-    metadata = yaml.safe_load(storage_client.open_file(metadata_filename))
+    metadata = yaml_utils.safe_load(storage_client.open_file(metadata_filename))
 
     # Add all files to tantalus including the metadata.yaml file
     file_resource_ids = set()
@@ -119,12 +120,12 @@ def filter_low_complexity_region(
 
     # update metadata entries
     metadata_filename = os.path.join(results_dir, "metadata.yaml")
-    metadata = yaml.safe_load(storage_client.open_file(metadata_filename))
+    metadata = yaml_utils.safe_load(storage_client.open_file(metadata_filename))
 
     if(os.path.basename(filtered_mseg_blobname) not in metadata["filenames"]):
         metadata["filenames"].append(os.path.basename(filtered_mseg_blobname))
     if(os.path.basename(filtered_masked_blobname) not in metadata["filenames"]):
         metadata["filenames"].append(os.path.basename(filtered_masked_blobname))
 
-    stream = yaml.dump(metadata)
+    stream = yaml_utils.safe_dump(metadata)
     storage_client.write_data_raw(metadata_filename, stream)
@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -9,8 +8,10 @@ import dbclients.tantalus
 import workflows.analysis.base
 import workflows.analysis.dlp.launchsc
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 import workflows.analysis.dlp.preprocessing as preprocessing
+from workflows.analysis.dlp.cohort import CohortResolver, InputKey
 
 
 class SnvGenotypingAnalysis(workflows.analysis.base.Analysis):
@@ -22,50 +23,35 @@ class SnvGenotypingAnalysis(workflows.analysis.base.Analysis):
 
     @classmethod
     def search_input_results(cls, tantalus_api, jira, version, args):
-        results_ids = set()
-
-        for info in args['inputs']:
-            library_jira_id = info['library_jira_id']
-            library_id = info['library_id']
-            sample_id = info['sample_id']
+        resolver = CohortResolver(tantalus_api)
 
-            results = workflows.analysis.dlp.utils.get_most_recent_result(
-                tantalus_api,
-                libraries__library_id=info['library_id'],
-                samples__sample_id=sample_id,
-                results_type="variant_calling")
+        variant_calling_results = resolver.get_most_recent_results(
+            [InputKey(info['library_id'], info['sample_id']) for info in args['inputs']],
+            'variant_calling')
 
-            results_ids.add(results['id'])
+        annotation_results = resolver.get_most_recent_results(
+            [InputKey(info['library_id'], None) for info in args['inputs']],
+            'annotation')
 
-            results = workflows.analysis.dlp.utils.get_most_recent_result(
-                tantalus_api,
-                libraries__library_id=info['library_id'],
-                results_type='annotation'
-            )
-            results_ids.add(results['id'])
+        results_ids = set()
+        results_ids.update(results['id'] for results in variant_calling_results.values())
+        results_ids.update(results['id'] for results in annotation_results.values())
 
         return list(results_ids)
 
     @classmethod
     def search_input_datasets(cls, tantalus_api, jira, version, args):
-        dataset_ids = []
+        resolver = CohortResolver(tantalus_api)
 
-        for info in args['inputs']:
-            library_jira_id = info['library_jira_id']
-            library_id = info['library_id']
-            sample_id = info['sample_id']
+        keys = [InputKey(info['library_id'], info['sample_id']) for info in args['inputs']]
 
-            dataset = workflows.analysis.dlp.utils.get_most_recent_dataset(
-                tantalus_api,
-                library__library_id=library_id,
-                sample__sample_id=sample_id,
-                dataset_type='BAM',
-                region_split_length=None
-            )
-
-            dataset_ids.append(dataset['id'])
+        datasets = resolver.get_most_recent_datasets(
+            keys,
+            dataset_type='BAM',
+            region_split_length=None,
+        )
 
-        return dataset_ids
+        return [datasets[key]['id'] for key in keys]
 
     @classmethod
     def generate_unique_name(cls, tantalus_api, jira, version, args, input_datasets, input_results):
@@ -89,9 +75,19 @@ class SnvGenotypingAnalysis(workflows.analysis.base.Analysis):
         assert len(tumour_sample_ids.intersection(normal_sample_ids)) == 0
         assert len(tumour_library_ids.intersection(normal_library_ids)) == 0
 
+        resolver = CohortResolver(self.tantalus_api)
+
         # Retrieve vcf files for museq and strelka snvs
+        snv_inputs = [
+            ('museq.vcf.gz', 'museq_vcf'),
+            ('strelka_snv.vcf.gz', 'strelka_snv_vcf'),
+        ]
+        input_results = resolver.get_input_files(
+            'resultsdataset', self.analysis['input_results'], storages['working_results'],
+            suffixes=[suffix for suffix, filetype in snv_inputs])
+
         for results_id in self.analysis['input_results']:
-            results = self.tantalus_api.get('results', id=results_id)
+            results, file_instances = input_results[results_id]
 
             if results['results_type'] != 'variant_calling':
                 continue
@@ -110,35 +106,28 @@ class SnvGenotypingAnalysis(workflows.analysis.base.Analysis):
             assert len(library_ids) == 1
             library_id = library_ids[0]
 
-
-            snv_inputs = [
-                ('museq.vcf.gz', 'museq_vcf'),
-                ('strelka_snv.vcf.gz', 'strelka_snv_vcf'),
-            ]
             for suffix, filetype in snv_inputs:
-                file_instances = self.tantalus_api.get_dataset_file_instances(
-                    results_id, 'resultsdataset', storages['working_results'],
-                    filters={'filename__endswith': suffix})
-                assert len(file_instances) == 1
-                file_instance = file_instances[0]
+                suffix_file_instances = [a for a in file_instances if a['file_resource']['filename'].endswith(suffix)]
+                assert len(suffix_file_instances) == 1
+                file_instance = suffix_file_instances[0]
 
                 input_info['vcf_files'].append(file_instance['filepath'])
-	
+
         assert len(input_info['vcf_files']) != 0
         colossus_api = dbclients.colossus.ColossusApi()
 
         # Retrieve bam files for input datasets
+        input_datasets = resolver.get_input_files(
+            'sequencedataset', self.analysis['input_datasets'], storages['working_inputs'],
+            suffixes=['.bam'])
+
         for dataset_id in self.analysis['input_datasets']:
-            dataset = self.tantalus_api.get('sequencedataset', id=dataset_id)
+            dataset, file_instances = input_datasets[dataset_id]
 
             sample_id = dataset['sample']['sample_id']
             library_id = dataset['library']['library_id']
             index_sequence_sublibraries = colossus_api.get_sublibraries_by_index_sequence(library_id)
 
-            file_instances = self.tantalus_api.get_dataset_file_instances(
-                dataset_id, 'sequencedataset', storages['working_inputs'],
-                filters={'filename__endswith': '.bam'})
-
             for file_instance in file_instances:
                 file_resource = file_instance['file_resource']
 
@@ -151,7 +140,7 @@ class SnvGenotypingAnalysis(workflows.analysis.base.Analysis):
                 input_info['tumour_cells'][sample_id][library_id][cell_id] = {'bam': str(file_instance['filepath'])}
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
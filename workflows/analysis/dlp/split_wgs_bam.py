@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -12,6 +11,7 @@ import workflows.analysis.dlp.utils
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lanes_hash, get_datasets_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 
 
@@ -66,7 +66,7 @@ class SplitWGSBamAnalysis(workflows.analysis.base.Analysis):
             input_info['normal']['bam'] = str(file_instance['filepath'])
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
@@ -112,7 +112,7 @@ class SplitWGSBamAnalysis(workflows.analysis.base.Analysis):
         input_dataset = self.tantalus_api.get('sequence_dataset', id=self.analysis['input_datasets'][0])
         storage_client = self.tantalus_api.get_storage_client(storages["working_inputs"])
         metadata_yaml_path = os.path.join(self.bams_dir, "metadata.yaml")
-        metadata_yaml = yaml.safe_load(storage_client.open_file(metadata_yaml_path))
+        metadata_yaml = yaml_utils.safe_load(storage_client.open_file(metadata_yaml_path))
 
         name = templates.WGS_SPLIT_BAM_NAME_TEMPLATE.format(
             dataset_type="BAM",
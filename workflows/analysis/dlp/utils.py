@@ -4,18 +4,28 @@ import dateutil.parser
 import dbclients.colossus
 
 
-def get_most_recent_dataset(tantalus_api, **kwargs):
-    datasets = collections.OrderedDict()
-    for dataset in tantalus_api.list('sequencedataset', **kwargs):
+def select_most_recent_dataset(datasets):
+    """ Most recently updated of the complete datasets, None if there are none.
+    """
+    most_recent = collections.OrderedDict()
+    for dataset in datasets:
         if not dataset['is_complete']:
             continue
 
-        datasets[dateutil.parser.parse(dataset['last_updated'])] = dataset
+        most_recent[dateutil.parser.parse(dataset['last_updated'])] = dataset
 
-    if len(datasets) == 0:
+    if len(most_recent) == 0:
+        return None
+
+    return most_recent.popitem()[1]
+
+def get_most_recent_dataset(tantalus_api, **kwargs):
+    dataset = select_most_recent_dataset(tantalus_api.list('sequencedataset', **kwargs))
+
+    if dataset is None:
         raise ValueError(f'no datasets found with search parameters {kwargs}')
 
-    return datasets.popitem()[1]
+    return dataset
 
 def get_most_recent_result(tantalus_api, **kwargs):
     datasets = {}
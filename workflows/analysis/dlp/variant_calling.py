@@ -1,5 +1,4 @@
 import os
-import yaml
 import logging
 import click
 import sys
@@ -12,6 +11,7 @@ import workflows.analysis.dlp.utils
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_lanes_hash
 from datamanagement.utils.constants import LOGGING_FORMAT
+from datamanagement.utils import yaml_utils
 import workflows.analysis.dlp.results_import as results_import
 
 
@@ -98,7 +98,7 @@ class VariantCallingAnalysis(workflows.analysis.base.Analysis):
                 filters={'filename__endswith': 'metadata.yaml'})
             assert len(file_instances) == 1
             file_instance = file_instances[0]
-            metadata = yaml.safe_load(storage_client.open_file(file_instance['file_resource']['filename']))
+            metadata = yaml_utils.safe_load(storage_client.open_file(file_instance['file_resource']['filename']))
 
             # All filenames relative to metadata.yaml
             base_dir = file_instance['file_resource']['filename'].replace('metadata.yaml', '')
@@ -129,7 +129,7 @@ class VariantCallingAnalysis(workflows.analysis.base.Analysis):
                 raise Exception(f'unrecognized dataset {dataset_id}')
 
         with open(inputs_yaml_filename, 'w') as inputs_yaml:
-            yaml.safe_dump(input_info, inputs_yaml, default_flow_style=False)
+            yaml_utils.safe_dump(input_info, inputs_yaml)
 
     def run_pipeline(
             self,
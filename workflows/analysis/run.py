@@ -8,30 +8,15 @@ import logging
 import subprocess
 from itertools import chain
 
-from jira import JIRA
-
-import workflows.launch_pipeline
-import workflows.generate_inputs
+# analysis modules are imported on demand by Analysis.get_analysis_class
 import workflows.analysis.base
-import workflows.analysis.dlp.alignment
-import workflows.analysis.dlp.hmmcopy
-import workflows.analysis.dlp.annotation
-import workflows.analysis.dlp.breakpoint_calling
-import workflows.analysis.dlp.haplotype_calling
-import workflows.analysis.dlp.haplotype_counting
-import workflows.analysis.dlp.merge_cell_bams
-import workflows.analysis.dlp.split_wgs_bam
-import workflows.analysis.dlp.variant_calling
-import workflows.analysis.dlp.snv_genotyping
-import workflows.analysis.dlp.microscope
-import workflows.analysis.dlp.germline_calling
 
 import datamanagement.templates as templates
 from datamanagement.transfer_files import transfer_dataset
 
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 
 from workflows.utils import file_utils, log_utils
 from workflows.utils.jira_utils import comment_jira
@@ -48,8 +33,8 @@ stream_handler.setFormatter(formatter)
 log.addHandler(stream_handler)
 log.propagate = False
 
-tantalus_api = TantalusApi()
-colossus_api = ColossusApi()
+tantalus_api = LazyClient(TantalusApi)
+colossus_api = LazyClient(ColossusApi)
 
 
 def transfer_inputs(dataset_ids, results_ids, from_storage, to_storage):
@@ -82,6 +67,9 @@ default_config = os.path.realpath(os.path.join(os.path.dirname(os.path.realpath(
 @click.option('--sisyphus_interactive', is_flag=True)
 @click.option('--jobs', type=int, default=1000)
 @click.option('--saltant', is_flag=True)
+@click.option('--warm_container', is_flag=True, help='Run in a warm container per pipeline version, shared between runs')
+@click.option('--warm_container_ttl', type=float, help='Seconds a warm container is kept without runs')
+@click.option('--launch_stats_file', help='Append container launch latencies to this file')
 def main(
         analysis_id,
         config_filename=None,
@@ -92,8 +80,6 @@ def main(
     if config_filename is None:
         config_filename = default_config
     
-    print(workflows.analysis.base.Analysis.analysis_classes)
-
     analysis = workflows.analysis.base.Analysis.get_by_id(tantalus_api, analysis_id)
 
     if reset_status:
@@ -116,6 +102,7 @@ def main(
     config = file_utils.load_json(config_filename)
     # since pipeline is modularized fetch and update appropriate docker image based on analysis type
     config_utils.update_config(config, "docker_server", DOCKER_IMAGES[analysis_type])
+    run_options['image_digests'] = config.get('docker_digests', {}).get(config['docker_server'])
 
     pipeline_dir = os.path.join(config['analysis_directory'], jira_id, analysis_name)
 
@@ -155,8 +142,10 @@ def main(
     try:
         analysis.set_run_status()
 
+        # Warm containers mount the analysis directory rather than the
+        # directory of this analysis, so they are shared between analyses
         dirs = [
-            pipeline_dir,
+            config['analysis_directory'] if run_options['warm_container'] else pipeline_dir,
             config['docker_path'],
             config['docker_sock_path'],
         ]
@@ -8,8 +8,9 @@ import os
 
 #import datamanagement.templates as templates
 import dbclients.colossus
+from dbclients.basicclient import LazyClient
 
-colossus_api = dbclients.colossus.ColossusApi()
+colossus_api = LazyClient(dbclients.colossus.ColossusApi)
 
 log = logging.getLogger('sisyphus')
 
@@ -30,7 +31,7 @@ def generate_sample_info(library_id, test_run=False):
         query_library_id = library_id.strip('TEST')
 
     #data = colossus_api.get('library', pool_id=query_library_id)
-    sublibraries = colossus_api.list('sublibraries', library__pool_id=query_library_id)
+    sublibraries = dbclients.colossus.get_sublibrary_index(query_library_id, colossus_api).sublibraries
     sample_ids = set()
 
     rows = []
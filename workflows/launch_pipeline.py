@@ -7,6 +7,7 @@ import logging
 from distutils.version import StrictVersion
 
 import datamanagement.templates as templates
+from workflows.utils.container_launcher import run_in_container
 
 log = logging.getLogger('sisyphus')
 
@@ -137,37 +138,27 @@ def run_pipeline(
             'azureblob',
         ]
 
-    # Append docker command to the beginning
-    docker_cmd = [
-        'docker',
-        'run',
-        '-w',
-        '$PWD',
+    # Mounts and environment for the pipeline container
+    docker_args = [
         '-v',
         '$PWD:$PWD',
         '-v',
         '/var/run/docker.sock',
         '-v',
         '/usr/bin/docker',
-        '--rm',
         '--env-file',
         docker_env_file,
     ]
 
     for d in dirs:
-        docker_cmd.extend([
+        docker_args.extend([
             '-v',
             '{d}:{d}'.format(d=d),
         ])
 
-    docker_cmd.append(f'{docker_server}:{version}')
-    run_cmd = docker_cmd + run_cmd
-
     if run_options['sc_config'] is not None:
         run_cmd += ['--config_file', run_options['sc_config']]
     if run_options['interactive']:
         run_cmd += ['--interactive']
 
-    run_cmd_string = r' '.join(run_cmd)
-    log.debug(run_cmd_string)
-    subprocess.check_call(run_cmd_string, shell=True)
+    run_in_container(docker_server, version, docker_args, run_cmd, run_options, ready_path=tmp_dir)
@@ -8,8 +8,6 @@ import logging
 import subprocess
 from itertools import chain
 
-from jira import JIRA
-
 import workflows.launch_pipeline
 import workflows.generate_inputs
 import workflows.models
@@ -19,7 +17,8 @@ from datamanagement.transfer_files import transfer_dataset
 
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
+from dbclients.jira_client import get_jira_client
 
 from workflows.utils import file_utils, log_utils, colossus_utils
 from workflows.utils.jira_utils import update_jira_dlp, add_attachment, comment_jira
@@ -33,8 +32,8 @@ stream_handler.setFormatter(formatter)
 log.addHandler(stream_handler)
 log.propagate = False
 
-tantalus_api = TantalusApi()
-colossus_api = ColossusApi()
+tantalus_api = LazyClient(TantalusApi)
+colossus_api = LazyClient(ColossusApi)
 
 
 def transfer_inputs(dataset_ids, results_ids, from_storage, to_storage):
@@ -85,8 +84,7 @@ def attach_qc_report(jira, library_id, storages):
 
 def get_contamination_comment(jira_ticket):
     jira_user = os.environ['JIRA_USERNAME']
-    jira_password = os.environ['JIRA_PASSWORD']
-    jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(jira_user, jira_password))
+    jira_api = get_jira_client()
 
     issue = jira_api.issue(jira_ticket)
     library_ticket_id = issue.fields.parent.key
@@ -5,6 +5,7 @@ import logging
 
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
+from dbclients.basicclient import LazyClient
 
 import workflows.analysis.dlp.utils
 from workflows.analysis.dlp import (
@@ -24,8 +25,8 @@ log.setLevel(logging.DEBUG)
 stream_handler = logging.StreamHandler()
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-tantalus_api = TantalusApi()
-colossus_api = ColossusApi()
+tantalus_api = LazyClient(TantalusApi)
+colossus_api = LazyClient(ColossusApi)
 
 # load config file
 config = file_utils.load_json(
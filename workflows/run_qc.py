@@ -6,7 +6,6 @@ import logging
 import traceback
 import subprocess
 from datetime import datetime, timedelta
-from dateutil import parser
 from workflows.vm_control import start_vm, stop_vm,check_vm_status
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
@@ -23,7 +22,8 @@ from workflows import run_pseudobulk
 from workflows.utils import saltant_utils, file_utils, tantalus_utils, colossus_utils
 #from workflows.utils.jira_utils import update_jira_dlp, add_attachment, comment_jira, update_jira_alhena, get_parent_issue
 from workflows.utils.jira_utils import update_jira_dlp#, add_attachment, comment_jira, update_jira_alhena, get_parent_issue
-from common_utils.utils import get_last_n_days
+from workflows.utils.analysis_snapshot import AnalysisSnapshot, default_snapshot_filename
+from workflows.utils.alhena_loader import AlhenaLoader, DEFAULT_MAX_LOADS
 
 from constants.workflows_constants import ALHENA_VALID_PROJECTS
 from workflows.chasm_run import chasmbot_run, post_to_jira
@@ -151,23 +151,18 @@ def generate_loader_command(jira, project_args, _reload, _filter, es_host="10.1.
 
     return command
 
-def load_data_to_alhena(jira, _reload=False, _filter=False, es_host="10.1.0.8"):
+def generate_alhena_load_command(jira, _reload=False, _filter=False, es_host="10.1.0.8"):
     """
-    SSH into loader machine and triggers import into Alhena
-    
+    Generate the loader command for a ticket, with the views of its library projects
+
     Arguments:
         jira {str} -- jira id
         es_host {str} -- elasticsearch VM host IP address
-    
-    Raises:
-        Exception: Ticket failed to load
     """
-    log.info(f"Loading {jira} into Alhena")
-
     projects = colossus_utils.get_projects_from_jira_id(jira)
 
     projects_cli_args = generate_alhena_loader_projects_cli_args(projects)
-    loader_command = generate_loader_command(
+    return generate_loader_command(
         jira=jira,
         project_args=projects_cli_args,
         _reload=_reload,
@@ -175,45 +170,54 @@ def load_data_to_alhena(jira, _reload=False, _filter=False, es_host="10.1.0.8"):
         es_host=es_host,
     )
 
-    try:
-        # TODO: add directory in config
-        subprocess.call([
-            'ssh',
-            '-t',
-            'loader',
-            loader_command,
-        ])
+def load_data_to_alhena(jira, _reload=False, _filter=False, es_host="10.1.0.8", loader=None):
+    """
+    SSH into loader machine and triggers import into Alhena
+    
+    Arguments:
+        jira {str} -- jira id
+        es_host {str} -- elasticsearch VM host IP address
+        loader {AlhenaLoader} -- loader connection, defaults to a new connection
+    
+    Raises:
+        Exception: Ticket failed to load
+    """
+    log.info(f"Loading {jira} into Alhena")
 
-        log.info(f"Successfully loaded {jira} into Alhena")
-    except Exception as e:
-        raise Exception(f"failed to load ticket: {e}") 
+    loader_command = generate_alhena_load_command(jira, _reload=_reload, _filter=_filter, es_host=es_host)
+
+    if loader is None:
+        with AlhenaLoader() as loader:
+            result = loader.run(jira, loader_command)
+    else:
+        result = loader.run(jira, loader_command)
+
+    if result['returncode'] != 0:
+        raise Exception(f"failed to load ticket, exit status {result['returncode']}")
+
+    log.info(f"Successfully loaded {jira} into Alhena")
 
 def run_viz(
     tantalus_api,
     colossus_api,
     storage_name,
+    analyses=None,
     ):
     """
     Update jira ticket, add QC report, and load data on Montage
+
+    Arguments:
+        analyses {list} -- analyses to load, defaults to recent analyses pending loading
     """
-    # get completed analyses that need montage loading
-    analyses = colossus_api.list(
-        "analysis_information",
-        montage_status="Pending",
-        analysis_run__run_status="complete",
-    )
+    # get recent completed analyses that need montage loading
+    if analyses is None:
+        analyses = AnalysisSnapshot().viz_candidates(colossus_api)
 
     failed = []
     for analysis in analyses:
         # get library id
         library_id = analysis["library"]["pool_id"]
 
-        # skip analyses older than this year
-        # parse off ending time range
-        last_updated_date = parser.parse(analysis["analysis_run"]["last_updated"][:-6])
-        if last_updated_date < get_last_n_days(200):
-            continue
-
         jira_ticket = analysis["analysis_jira_ticket"]
 
         # upload qc report to jira ticket
@@ -266,28 +270,30 @@ def run_viz_alhena(
     storage_name,
     _reload=False,
     _filter=False,
+    analyses=None,
+    loader=None,
     ):
     """
-    Update jira ticket, add QC report, and load data on Montage
+    Update jira ticket, add QC report, and load data on Alhena
+
+    Tickets are loaded concurrently once their QC reports are attached, the
+    loader is closed, stopping its VM if it has one, before jira is updated.
+
+    Arguments:
+        analyses {list} -- analyses to load, defaults to recent analyses pending loading
+        loader {AlhenaLoader} -- loader to run loads with, defaults to a loader without a VM
     """
-    # get completed analyses that need montage loading
-    analyses = colossus_api.list(
-        "analysis_information",
-        montage_status="Pending",
-        analysis_run__run_status="complete",
-    )
+    # get recent completed analyses that need montage loading
+    if analyses is None:
+        analyses = AnalysisSnapshot().viz_candidates(colossus_api)
 
     failed = []
+    loads = []
+    loaded = []
     for analysis in analyses:
         # get library id
         library_id = analysis["library"]["pool_id"]
 
-        # skip analyses older than this year
-        # parse off ending time range
-        last_updated_date = parser.parse(analysis["analysis_run"]["last_updated"][:-6])
-        if last_updated_date < get_last_n_days(200):
-            continue
-
         jira_ticket = analysis["analysis_jira_ticket"]
 
         # upload qc report to jira ticket
@@ -307,8 +313,7 @@ def run_viz_alhena(
             continue
 
         try:
-            # load analysis into alhena
-            load_data_to_alhena(jira=jira_ticket, _reload=_reload, _filter=_filter)
+            loads.append((jira_ticket, generate_alhena_load_command(jira_ticket, _reload=_reload, _filter=_filter)))
         except Exception as e:
             traceback_str = "".join(traceback.format_exception(etype=None, value=e, tb=e.__traceback__))
             message = f"Alhena loading failed for {library_id}, {jira_ticket}.\n {str(traceback_str)}"
@@ -316,7 +321,27 @@ def run_viz_alhena(
             failed.append(f"{library_id}, {jira_ticket}")
             continue
 
-                #Add ChasmBot Analysis to parent Jira ticket
+        loaded.append(analysis)
+
+    if loader is None:
+        loader = AlhenaLoader()
+
+    # load analyses into alhena
+    results = []
+    if loads:
+        with loader:
+            results = loader.run_all(loads)
+
+    for analysis, result in zip(loaded, results):
+        library_id = analysis["library"]["pool_id"]
+        jira_ticket = analysis["analysis_jira_ticket"]
+
+        if result['returncode'] != 0:
+            log.error(f"Alhena loading failed for {library_id}, {jira_ticket}, exit status {result['returncode']}")
+            failed.append(f"{library_id}, {jira_ticket}")
+            continue
+
+        #Add ChasmBot Analysis to parent Jira ticket
         try:
             chasmbot_run(jira_ticket)
         except Exception as e:
@@ -555,6 +580,7 @@ def run_qc(
     colossus_api,
     slack_client,
     config,
+    snapshot=None,
     ):
     """
     Gets all qc (align, hmmcopy, annotation) analyses set to ready 
@@ -563,26 +589,20 @@ def run_qc(
 
     Arguments:
         aligner {str} -- name of aligner 
+        snapshot {AnalysisSnapshot} -- synced analyses, defaults to syncing recent analyses
     """
+    if snapshot is None:
+        snapshot = AnalysisSnapshot()
+        snapshot.sync(colossus_api)
 
-    # get colossus analysis information objects with status not complete
-    analyses = colossus_api.list(
-        "analysis_information",
-        analysis_run__run_status_ne="complete",
-        aligner=aligner if aligner else config["default_aligner"],
-    )
+    # get recent colossus analysis information objects with status not complete
+    analyses = snapshot.qc_candidates(aligner if aligner else config["default_aligner"])
 
     failed = []
     for analysis in analyses:
         # get library id
         library_id = analysis["library"]["pool_id"]
 
-        # skip analyses older than this year
-        # parse off ending time range
-        last_updated_date = parser.parse(analysis["analysis_run"]["last_updated"][:-6])
-        if last_updated_date < get_last_n_days(200):
-            continue
-
         # get jira ticket
         jira = analysis["analysis_jira_ticket"]
 
@@ -643,11 +663,12 @@ def run_qc(
                     "analysis_run",
                     id=analysis_run_id,
                 )
-                colossus_api.update(
+                analysis["analysis_run"] = colossus_api.update(
                     "analysis_run",
                     id=analysis_run_id,
                     run_status="complete",
                 )
+                snapshot.update(analysis)
             except Exception as e:
                 traceback_str = "".join(traceback.format_exception(etype=None, value=e, tb=e.__traceback__))
                 message = f"Updating colossus failed for {library_id}, {jira}.\n {str(traceback_str)}"
@@ -663,11 +684,17 @@ def run_qc(
 
 @click.command()
 @click.option("--aligner", type=click.Choice(['A', 'M']))
-def main(aligner):
+@click.option("--snapshot", "snapshot_filename", default=default_snapshot_filename, help="Analysis snapshot file reused between runs")
+@click.option("--full_sync", is_flag=True, help="Fetch all recent analyses rather than those updated since the last run")
+@click.option("--alhena_max_loads", type=int, default=DEFAULT_MAX_LOADS, help="Tickets loaded into Alhena concurrently")
+def main(aligner, snapshot_filename, full_sync, alhena_max_loads):
     tantalus_api = TantalusApi()
     colossus_api = ColossusApi()
     slack_client = SlackClient()
 
+    snapshot = AnalysisSnapshot(snapshot_filename)
+    snapshot.sync(colossus_api, full=full_sync)
+
     if hasattr(sys, 'ps1') or sys.flags.interactive:
         config = file_utils.load_json('/home/prod/sisyphus/workflows/config/normal_config.json')
     else: 
@@ -687,41 +714,31 @@ def main(aligner):
             colossus_api,
             slack_client,
             config,
+            snapshot=snapshot,
         )
     except Exception as e:
         slack_client.post(f"{e}")
     finally:
-        analyses = colossus_api.list(
-        "analysis_information",
-        montage_status="Pending",
-        analysis_run__run_status="complete",
-        )
-        run = 0
-        for analysis in analyses:
-            # get library id
-            library_id = analysis["library"]["pool_id"]
-
-            # skip analyses that are older than 200 days
-            last_updated_date = parser.parse(analysis["analysis_run"]["last_updated"][:-6])
-            if last_updated_date < get_last_n_days(200):
-                continue
-            else:
-                run += 1
+        analyses = snapshot.viz_candidates(colossus_api)
 
-        if (run!=0):
+        if analyses:
             try:
-                start_vm("bccrc-pr-loader-vm", "bccrc-pr-cc-alhena-rg")
-            	# update ticket and load to montage
+                # loader VM is started for the loads and stopped once they finish
+                loader = AlhenaLoader(
+                    max_loads=alhena_max_loads,
+                    vm_name="bccrc-pr-loader-vm",
+                    resource_group="bccrc-pr-cc-alhena-rg",
+                )
+                # update ticket and load to alhena
                 run_viz_alhena(
-                tantalus_api,
-                colossus_api,
-                storage_name,
-                _reload=True,
-                _filter=True,
+                    tantalus_api,
+                    colossus_api,
+                    storage_name,
+                    _reload=True,
+                    _filter=True,
+                    analyses=analyses,
+                    loader=loader,
                 )
-            #load_data_to_alhena(jira="SC-9524", _reload=True, _filter=False)
-                stop_vm("bccrc-pr-loader-vm","bccrc-pr-cc-alhena-rg")
-
             except Exception as e:
                 log.error(f"{e}")
 if __name__ == "__main__":
@@ -12,12 +12,13 @@ from dateutil import parser
 import traceback
 import subprocess
 from itertools import chain
-from jira import JIRA, JIRAError
+from jira import JIRAError
+from dbclients.jira_client import get_jira_client
 
 import workflows.generate_inputs
 import workflows.launch_pipeline
 
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
 
@@ -38,8 +39,8 @@ log.setLevel(logging.DEBUG)
 stream_handler = logging.StreamHandler()
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-colossus_api = ColossusApi()
-tantalus_api = TantalusApi()
+colossus_api = LazyClient(ColossusApi)
+tantalus_api = LazyClient(TantalusApi)
 
 
 def download_data(storage_account, data_dir, library):
@@ -132,8 +133,7 @@ def create_analysis_jira_ticket(library_id, sample, library_ticket):
     '''
 
     JIRA_USER = os.environ['JIRA_USERNAME']
-    JIRA_PASSWORD = os.environ['JIRA_PASSWORD']
-    jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(JIRA_USER, JIRA_PASSWORD))
+    jira_api = get_jira_client()
 
     issue = jira_api.issue(library_ticket)
 
@@ -6,15 +6,15 @@ import yaml
 import subprocess
 import dbclients.tantalus
 import dbclients.colossus
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 
 import datamanagement.templates as templates
 from datamanagement.utils.utils import get_datasets_lanes_hash
 
 log = logging.getLogger('sisyphus')
 
-tantalus_api = dbclients.tantalus.TantalusApi()
-colossus_api = dbclients.colossus.ColossusApi()
+tantalus_api = LazyClient(dbclients.tantalus.TantalusApi)
+colossus_api = LazyClient(dbclients.colossus.ColossusApi)
 
 
 class AnalysisInfo:
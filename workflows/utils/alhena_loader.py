@@ -0,0 +1,143 @@
+"""
+Running Alhena loads on the loader VM over one multiplexed ssh connection.
+
+The first command opens an ssh ControlMaster connection that later commands
+reuse, so loads skip connection setup and authentication.  Loads run
+concurrently up to a limit on simultaneous Elasticsearch ingests, and the
+exit status and duration of each are recorded.  A loader given a VM starts
+it on entry and stops it as soon as the loads have drained.
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from workflows.vm_control import start_vm, stop_vm
+
+log = logging.getLogger('sisyphus')
+
+DEFAULT_HOST = 'loader'
+
+# Concurrent loads, each ingests into the same Elasticsearch
+DEFAULT_MAX_LOADS = 2
+
+
+class AlhenaLoader(object):
+    """
+    Runs load commands on the loader host.
+
+    KwArgs:
+        host (str): ssh host of the loader
+        max_loads (int): loads run concurrently
+        vm_name (str): loader VM started on entry and stopped on exit
+        resource_group (str): resource group of the loader VM
+        control_persist (str): how long the idle control connection is kept open
+    """
+
+    def __init__(
+            self,
+            host=DEFAULT_HOST,
+            max_loads=DEFAULT_MAX_LOADS,
+            vm_name=None,
+            resource_group=None,
+            control_persist='10m',
+    ):
+        self.host = host
+        self.max_loads = max_loads
+        self.vm_name = vm_name
+        self.resource_group = resource_group
+        self.control_persist = control_persist
+        self.control_path = os.path.join(tempfile.gettempdir(), f'sisyphus-ssh-{os.getpid()}-%C')
+        self.results = []
+        self._semaphore = threading.Semaphore(max_loads)
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if self.vm_name is not None:
+            start_vm(self.vm_name, self.resource_group)
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def ssh_command(self, command):
+        return [
+            'ssh',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={self.control_path}',
+            '-o', f'ControlPersist={self.control_persist}',
+            self.host,
+            command,
+        ]
+
+    def run(self, name, command):
+        """
+        Run a command on the loader, waiting for a free load slot.
+
+        Args:
+            name (str): name of the load, for example the jira ticket
+            command (str): shell command run on the loader
+
+        Returns:
+            dict with name, returncode, seconds and output of the load
+        """
+        with self._semaphore:
+            log.info(f"loading {name}")
+            start = time.time()
+            process = subprocess.run(
+                self.ssh_command(command),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                universal_newlines=True,
+            )
+            seconds = time.time() - start
+
+        result = {
+            'name': name,
+            'returncode': process.returncode,
+            'seconds': seconds,
+            'output': process.stdout,
+        }
+
+        with self._lock:
+            self.results.append(result)
+
+        log.info(f"load of {name} exited with {process.returncode} after {seconds:.0f}s")
+        if process.returncode != 0:
+            log.error(process.stdout)
+
+        return result
+
+    def run_all(self, loads):
+        """
+        Run loads concurrently.
+
+        Args:
+            loads (list): (name, command) pairs
+
+        Returns:
+            list of load results in the order of loads
+        """
+        with ThreadPoolExecutor(max_workers=self.max_loads) as executor:
+            return list(executor.map(lambda load: self.run(*load), loads))
+
+    def close(self):
+        """
+        Close the control connection and stop the VM.
+        """
+        subprocess.call(
+            ['ssh', '-o', f'ControlPath={self.control_path}', '-O', 'exit', self.host],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        if self.vm_name is not None:
+            stop_vm(self.vm_name, self.resource_group)
+
+        if self.results:
+            total_seconds = sum(a['seconds'] for a in self.results)
+            num_failed = sum(a['returncode'] != 0 for a in self.results)
+            log.info(f"{len(self.results)} loads, {num_failed} failed, {total_seconds:.0f}s of loading")
@@ -0,0 +1,156 @@
+"""
+Local snapshot of recent Colossus analysis information, kept up to date
+with delta syncs.
+
+A sync only requests analyses whose run was updated since the high water
+mark of the previous sync, the first sync requests the whole window.  The
+snapshot is saved between runs so periodic jobs such as run_qc download
+only what changed since their last run.  Analyses pending loading for
+visualization are always listed from Colossus, their loading status
+changes without updating the run.
+"""
+import os
+import json
+import logging
+from datetime import timedelta
+from dateutil import parser
+
+from common_utils.utils import get_last_n_days
+
+log = logging.getLogger('sisyphus')
+
+DEFAULT_WINDOW_DAYS = 200
+
+# Resync slightly before the high water mark, covering updates committed out of order
+SYNC_OVERLAP = timedelta(minutes=10)
+
+
+def default_snapshot_filename():
+    return os.environ.get(
+        'SISYPHUS_ANALYSIS_SNAPSHOT',
+        os.path.join(os.path.expanduser('~'), '.sisyphus', 'analysis_snapshot.json'),
+    )
+
+
+def get_last_updated(analysis):
+    # parse off ending time range
+    return parser.parse(analysis["analysis_run"]["last_updated"][:-6])
+
+
+class AnalysisSnapshot(object):
+    """
+    Analysis information updated within a window of days, keyed by id.
+
+    KwArgs:
+        filename (str): json file the snapshot is saved to, not saved if None
+        window_days (int): drop analyses whose run was last updated before this many days ago
+    """
+
+    def __init__(self, filename=None, window_days=DEFAULT_WINDOW_DAYS):
+        self.filename = filename
+        self.window_days = window_days
+        self.analyses = {}
+        self.high_water_mark = None
+
+        if filename is not None and os.path.exists(filename):
+            with open(filename) as f:
+                data = json.load(f)
+            if data.get('window_days') == window_days:
+                self.analyses = {int(a): analysis for a, analysis in data['analyses'].items()}
+                self.high_water_mark = parser.parse(data['high_water_mark']) if data['high_water_mark'] else None
+
+    def save(self):
+        if self.filename is None:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump({
+                'window_days': self.window_days,
+                'high_water_mark': self.high_water_mark.isoformat() if self.high_water_mark else None,
+                'analyses': self.analyses,
+            }, f)
+        os.replace(temp_filename, self.filename)
+
+    def sync(self, colossus_api, full=False):
+        """
+        Fetch analyses updated since the last sync, or the whole window if
+        full or there is no previous sync.
+
+        Returns:
+            number of analyses fetched
+        """
+        window_start = get_last_n_days(self.window_days)
+
+        if full or self.high_water_mark is None:
+            since = window_start
+            self.analyses = {}
+        else:
+            since = max(self.high_water_mark - SYNC_OVERLAP, window_start)
+
+        log.info(f"syncing analyses updated since {since.isoformat()}")
+
+        num_fetched = 0
+        for analysis in colossus_api.list(
+            "analysis_information",
+            analysis_run__last_updated__gte=since.isoformat(),
+        ):
+            self.analyses[analysis["id"]] = analysis
+            num_fetched += 1
+
+        self.analyses = {
+            analysis_id: analysis for analysis_id, analysis in self.analyses.items()
+            if get_last_updated(analysis) >= window_start
+        }
+
+        if self.analyses:
+            self.high_water_mark = max(get_last_updated(a) for a in self.analyses.values())
+
+        log.info(f"fetched {num_fetched} analyses, {len(self.analyses)} in snapshot")
+
+        self.save()
+
+        return num_fetched
+
+    def update(self, analysis):
+        """
+        Replace an analysis with a more recent copy.
+        """
+        self.analyses[analysis["id"]] = analysis
+        self.save()
+
+    def qc_candidates(self, aligner):
+        """
+        Analyses with the given aligner whose run is not complete.
+        """
+        return [
+            analysis for analysis in self.analyses.values()
+            if analysis["analysis_run"]["run_status"] != "complete" and analysis["aligner"] == aligner
+        ]
+
+    def viz_candidates(self, colossus_api):
+        """
+        Analyses with a complete run pending loading for visualization.
+
+        The montage_status changes without updating the run, so a delta
+        sync misses analyses that become pending.  Candidates are instead
+        listed from Colossus, which returns only the few pending analyses,
+        and replace their copies in the snapshot.
+        """
+        window_start = get_last_n_days(self.window_days)
+
+        analyses = []
+        for analysis in colossus_api.list(
+            "analysis_information",
+            montage_status="Pending",
+            analysis_run__run_status="complete",
+        ):
+            if get_last_updated(analysis) < window_start:
+                continue
+            self.analyses[analysis["id"]] = analysis
+            analyses.append(analysis)
+
+        self.save()
+
+        return analyses
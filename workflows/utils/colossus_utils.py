@@ -1,10 +1,11 @@
 import os
+import copy
 import logging
 
 from dbclients.colossus import ColossusApi
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 
-colossus_api = ColossusApi()
+colossus_api = LazyClient(ColossusApi)
 
 log = logging.getLogger('sisyphus')
 log.setLevel(logging.DEBUG)
@@ -24,9 +25,7 @@ def get_sublibraries_from_library_id(library_id):
     Return:
         sublibraries: list of dict {'id': project_id, 'name': project_name}
     """
-    sublibraries = colossus_api.list('sublibraries', library__pool_id=library_id)
-
-    return sublibraries
+    return copy.deepcopy(colossus_api.get_sublibrary_index(library_id).sublibraries)
 
 def get_projects_from_library_id(library_id):
     """
@@ -99,10 +98,8 @@ def get_lanes_from_sequencings(sequencing_id_list):
     Given list of sequencing ids, return list of all unique lanes
     """
     lanes = set()
-    for sequencing_id in sequencing_id_list:
-        sequencing = colossus_api.get('sequencing', id=sequencing_id)
-        for lane in sequencing['dlplane_set']:
-            lanes.add(lane['id'])
+    for lane_ids in colossus_api.get_lanes_by_sequencing(sequencing_id_list).values():
+        lanes.update(lane_ids)
 
     return list(lanes)
 
@@ -0,0 +1,340 @@
+"""
+Launching pipeline commands in docker containers.
+
+Images are pulled and their digests verified once per version, runs use the
+image by digest so the tag is not resolved again.  Runs either start a
+fresh container, or are exec'd into a warm container per version and mount
+set on the host, which saves container startup on every run after the
+first, including runs by later processes.  Warm containers record when they
+were last used, and those idle for longer than their TTL and not running a
+command are reaped whenever a warm container is used, or by the reap
+command, for example from cron.
+Each launch records the time to the pipeline's first write to its temp
+directory, which covers image resolution, container startup and pipeline
+imports.
+"""
+import os
+import json
+import time
+import click
+import hashlib
+import logging
+import threading
+import subprocess
+
+log = logging.getLogger('sisyphus')
+
+WARM_CONTAINER_PREFIX = 'sisyphus-warm'
+WARM_CONTAINER_LABEL = 'sisyphus.warm'
+
+# Seconds a warm container is kept without runs
+WARM_CONTAINER_IDLE_TTL = 3600
+
+
+def default_warm_container_dir():
+    return os.environ.get(
+        'SISYPHUS_WARM_CONTAINER_DIR',
+        os.path.join(os.path.expanduser('~'), '.sisyphus', 'warm_containers'),
+    )
+
+
+# image tag -> image reference by digest, shared by launchers in the process
+_image_refs = {}
+_image_refs_lock = threading.Lock()
+
+
+def _docker_output(*args):
+    return subprocess.check_output(('docker',) + args, universal_newlines=True).strip()
+
+
+def _first_write(path, since, done, poll_interval):
+    """
+    Wait for a file under path modified after since, returns its modification
+    time, or None if there is none when done is set.
+    """
+    while True:
+        finished = done.is_set()
+        for root, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    mtime = os.path.getmtime(os.path.join(root, filename))
+                except OSError:
+                    continue
+                if mtime >= since:
+                    return mtime
+        if finished:
+            return None
+        done.wait(poll_interval)
+
+
+def _touch(name):
+    """
+    Record that a warm container is in use.
+    """
+    dirname = default_warm_container_dir()
+    os.makedirs(dirname, exist_ok=True)
+    filename = os.path.join(dirname, name)
+    with open(filename, 'a'):
+        os.utime(filename)
+
+
+def _last_used(name):
+    try:
+        return os.path.getmtime(os.path.join(default_warm_container_dir(), name))
+    except OSError:
+        return None
+
+
+def _is_busy(name):
+    """
+    Whether a container runs anything besides its sleep entrypoint.
+    """
+    try:
+        processes = _docker_output('top', name, '-eo', 'pid').splitlines()
+    except subprocess.CalledProcessError:
+        return False
+    # header and the sleep entrypoint
+    return len(processes) > 2
+
+
+def reap_warm_containers(idle_ttl=WARM_CONTAINER_IDLE_TTL):
+    """
+    Remove warm containers unused for idle_ttl seconds and not running a command.
+
+    Returns:
+        names of the removed containers
+    """
+    names = _docker_output('ps', '--all', '--filter', f'label={WARM_CONTAINER_LABEL}', '--format', '{{.Names}}')
+
+    reaped = []
+    for name in names.split():
+        last_used = _last_used(name)
+        if last_used is not None and time.time() - last_used < idle_ttl:
+            continue
+        if _is_busy(name):
+            continue
+
+        log.info(f'removing idle warm container {name}')
+        subprocess.call(['docker', 'rm', '--force', name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            os.remove(os.path.join(default_warm_container_dir(), name))
+        except OSError:
+            pass
+        reaped.append(name)
+
+    return reaped
+
+
+class ContainerLauncher(object):
+    """
+    Runs shell commands in containers of one docker image.
+
+    Args:
+        docker_server (str): image repository, runs are given the version tag
+        docker_args (list): mounts and environment options for docker run,
+                            may use shell variables such as $PWD
+
+    KwArgs:
+        warm (bool): exec runs into a warm container per version
+        idle_ttl (float): seconds before an unused warm container is reaped
+        digests (dict): expected image digest by version, verified after pulling
+        stats_filename (str): append launch stats as json lines
+        poll_interval (float): seconds between checks for the first write
+    """
+
+    def __init__(
+            self, docker_server, docker_args, warm=False, idle_ttl=WARM_CONTAINER_IDLE_TTL, digests=None,
+            stats_filename=None, poll_interval=1.):
+        self.docker_server = docker_server
+        self.docker_args = list(docker_args)
+        self.warm = warm
+        self.idle_ttl = idle_ttl
+        self.digests = digests or {}
+        self.stats_filename = stats_filename
+        self.poll_interval = poll_interval
+
+    def _inspect_digests(self, image):
+        try:
+            return json.loads(_docker_output('image', 'inspect', '--format', '{{json .RepoDigests}}', image)) or []
+        except subprocess.CalledProcessError:
+            return None
+
+    def image(self, version):
+        """
+        Pull the image for a version if needed and verify its digest.
+
+        Returns:
+            image reference by digest, or by tag for images without a registry digest
+        """
+        image = f'{self.docker_server}:{version}'
+        expected = self.digests.get(version)
+
+        with _image_refs_lock:
+            if image in _image_refs:
+                return _image_refs[image]
+
+            repo_digests = self._inspect_digests(image)
+
+            if repo_digests is None or (expected and not any(a.endswith(expected) for a in repo_digests)):
+                log.info(f'pulling {image}')
+                subprocess.check_call(['docker', 'pull', image])
+                repo_digests = self._inspect_digests(image) or []
+
+            if expected and not any(a.endswith(expected) for a in repo_digests):
+                raise Exception(f'digest of {image} is {repo_digests}, expected {expected}')
+
+            image_ref = repo_digests[0] if repo_digests else image
+            _image_refs[image] = image_ref
+
+        return image_ref
+
+    def container_name(self, version):
+        """
+        Name of the warm container for a version, keyed on the image and
+        the mounts and options irrespective of their order.
+        """
+        args = [os.path.expandvars(a) for a in self.docker_args]
+        options = sorted(zip(args[::2], args[1::2])) + args[len(args) - len(args) % 2:]
+        mounts_hash = hashlib.md5(json.dumps(options).encode()).hexdigest()[:8]
+        return f'{WARM_CONTAINER_PREFIX}-{os.path.basename(self.docker_server)}-{version}-{mounts_hash}'
+
+    def container(self, version):
+        """
+        Start the warm container for a version unless it is already running.
+
+        Returns:
+            container name
+        """
+        name = self.container_name(version)
+
+        # Marked as used before checking, so it is not reaped in between
+        _touch(name)
+        reap_warm_containers(self.idle_ttl)
+
+        if _docker_output('ps', '--quiet', '--filter', f'name=^{name}$'):
+            return name
+
+        # Remove a stopped container left with the same name
+        subprocess.call(['docker', 'rm', '--force', name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        cmd = ['docker', 'run', '--detach', '--name', name, '--label', WARM_CONTAINER_LABEL]
+        cmd += self.docker_args
+        cmd += ['--entrypoint', 'sleep', self.image(version), 'infinity']
+        cmd_string = ' '.join(cmd)
+        log.info(f'starting warm container {name}')
+        log.debug(cmd_string)
+        subprocess.check_call(cmd_string, shell=True, stdout=subprocess.DEVNULL)
+
+        return name
+
+    def stop(self, version):
+        """
+        Remove the warm container for a version.
+        """
+        subprocess.call(['docker', 'rm', '--force', self.container_name(version)])
+
+    def command(self, version, run_cmd):
+        """
+        Shell command running run_cmd for a version, starting the warm container if needed.
+        """
+        if self.warm:
+            docker_cmd = ['docker', 'exec', '-w', '$PWD', self.container(version)]
+        else:
+            docker_cmd = ['docker', 'run', '-w', '$PWD'] + self.docker_args + ['--rm', self.image(version)]
+
+        return ' '.join(docker_cmd + list(run_cmd))
+
+    def run(self, version, run_cmd, ready_path=None):
+        """
+        Run a command in a container, recording launch latency.
+
+        Args:
+            version (str): image tag
+            run_cmd (list): command and arguments, joined into a shell string
+
+        KwArgs:
+            ready_path (str): directory the command writes to once it starts work
+
+        Returns:
+            dict of launch stats
+        """
+        start = time.time()
+
+        cmd_string = self.command(version, run_cmd)
+        ready = time.time()
+
+        log.debug(cmd_string)
+
+        done = threading.Event()
+        first_write = []
+        if ready_path is not None:
+            watcher = threading.Thread(
+                target=lambda: first_write.append(_first_write(ready_path, start, done, self.poll_interval)),
+                daemon=True,
+            )
+            watcher.start()
+
+        try:
+            subprocess.check_call(cmd_string, shell=True)
+        finally:
+            if self.warm:
+                _touch(self.container_name(version))
+            done.set()
+            if ready_path is not None:
+                watcher.join()
+            end = time.time()
+
+        first_write_time = first_write[0] if first_write else None
+
+        stats = {
+            'image': f'{self.docker_server}:{version}',
+            'mode': 'warm' if self.warm else 'cold',
+            'start': start,
+            'prepare_seconds': ready - start,
+            'first_job_seconds': first_write_time - start if first_write_time is not None else None,
+            'total_seconds': end - start,
+        }
+        self.record(stats)
+
+        return stats
+
+    def record(self, stats):
+        first_job = f"{stats['first_job_seconds']:.1f}s" if stats['first_job_seconds'] is not None else 'unknown'
+        log.info(f"{stats['mode']} launch of {stats['image']}: prepared in {stats['prepare_seconds']:.1f}s, "
+                 f"first job after {first_job}, finished after {stats['total_seconds']:.1f}s")
+
+        if self.stats_filename is not None:
+            with open(self.stats_filename, 'a') as f:
+                f.write(json.dumps(stats) + '\n')
+
+
+def run_in_container(docker_server, version, docker_args, run_cmd, run_options, ready_path=None):
+    """
+    Run a pipeline command with the launcher options in run_options.
+
+    Recognized run_options are warm_container, warm_container_ttl, image_digests
+    and launch_stats_file.
+    """
+    launcher = ContainerLauncher(
+        docker_server,
+        docker_args,
+        warm=run_options.get('warm_container', False),
+        idle_ttl=run_options.get('warm_container_ttl') or WARM_CONTAINER_IDLE_TTL,
+        digests=run_options.get('image_digests'),
+        stats_filename=run_options.get('launch_stats_file'),
+    )
+    return launcher.run(version, run_cmd, ready_path=ready_path)
+
+
+@click.command()
+@click.option('--idle_ttl', type=float, default=WARM_CONTAINER_IDLE_TTL, help='Seconds a warm container is kept without runs')
+def reap(idle_ttl):
+    """
+    Remove idle warm containers.
+    """
+    for name in reap_warm_containers(idle_ttl):
+        print(name)
+
+
+if __name__ == '__main__':
+    reap()
@@ -3,12 +3,12 @@ import os
 import logging
 
 import dbclients.tantalus
-from dbclients.basicclient import NotFoundError
+from dbclients.basicclient import NotFoundError, LazyClient
 
 from workflows.utils import log_utils, saltant_utils
 from workflows.utils.log_utils import sentinel
 
-tantalus_api = dbclients.tantalus.TantalusApi()
+tantalus_api = LazyClient(dbclients.tantalus.TantalusApi)
 
 log = logging.getLogger('sisyphus')
 
@@ -1,6 +1,8 @@
 import os
 import json
-import yaml
+
+from datamanagement.utils import yaml_utils
+
 
 def load_json(path):
     with open(path) as infile:
@@ -8,8 +10,7 @@ def load_json(path):
 
 
 def load_yaml(path):
-    with open(path) as infile:
-        return yaml.load(infile)
+    return yaml_utils.load_file(path)
 
 
 def walk_dir(path):
@@ -1,10 +1,13 @@
 import os
 import settings
 import logging
-from jira import JIRA, JIRAError
+import functools
+from jira import JIRAError
 
 from dbclients.colossus import ColossusApi
 from dbclients.tantalus import TantalusApi
+from dbclients.basicclient import LazyClient
+from dbclients.jira_client import get_jira_client
 from workflows.utils import saltant_utils, file_utils, tantalus_utils, colossus_utils
 from dbclients.utils.dbclients_utils import (
     get_tantalus_base_url,
@@ -17,14 +20,21 @@ from constants.url_constants import (
 COLOSSUS_BASE_URL = get_colossus_base_url()
 TANTALUS_BASE_URL = get_tantalus_base_url()
 
-colossus_api = ColossusApi()
-tantalus_api = TantalusApi()
+colossus_api = LazyClient(ColossusApi)
+tantalus_api = LazyClient(TantalusApi)
 
 log = logging.getLogger('sisyphus')
 
-jira_user = os.environ['JIRA_USERNAME']
-jira_password = os.environ['JIRA_PASSWORD']
-jira_api = JIRA('https://www.bcgsc.ca/jira/', basic_auth=(jira_user, jira_password))
+jira_user = os.environ.get('JIRA_USERNAME')
+jira_api = get_jira_client()
+
+
+@functools.lru_cache(maxsize=None)
+def get_analysis_information(jira_id):
+    """
+    Colossus analysis information for a Jira ticket, cached for the run
+    """
+    return colossus_api.get("analysis_information", analysis_jira_ticket=jira_id)
 
 
 def get_parent_issue(jira_id):
@@ -39,7 +49,7 @@ def get_parent_issue(jira_id):
 
     """
 
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['parent'])
 
     try:
         parent_ticket = issue.fields.parent.key
@@ -60,7 +70,7 @@ def is_child(jira_id):
     Return:
         True if is a subtask, False otherwise
     """
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['parent'])
 
     # raise exception if issue doesn't have fields property
     if not hasattr(issue, 'fields'):
@@ -85,9 +95,10 @@ def delete_ticket(jira_id):
 
     log.info(f"deleting {jira_id}")
 
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['summary'])
 
     issue.delete()
+    jira_api.invalidate(jira_id)
 
 
 def close_ticket(jira_id):
@@ -98,11 +109,12 @@ def close_ticket(jira_id):
         jira_id {str} -- jira ticket id
     """
     # get jira issue
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['status'])
     # check if ticket isn't closed
     if issue.fields.status.name != "Closed":
         # close ticket
         jira_api.transition_issue(issue, '2')
+        jira_api.invalidate(jira_id)
 
 
 def update_jira_dlp(jira_id, aligner):
@@ -116,13 +128,14 @@ def update_jira_dlp(jira_id, aligner):
         '{noformat}Container: singlecellresults\nresults/' + jira_id + '{noformat}',
     ]
 
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['status', 'parent'])
 
     if issue.fields.status.name != "Closed":
         # assign parent ticket to justina
         parent_jira_id = get_parent_issue(jira_id)
-        parent_issue = jira_api.issue(parent_jira_id)
+        parent_issue = jira_api.issue(parent_jira_id, fields=['assignee'])
         parent_issue.update(assignee={"name": "mvanvliet"})
+        jira_api.invalidate(parent_jira_id)
 
         update_description(jira_id, description, jira_user, remove_watcher=True)
         close_ticket(jira_id)
@@ -164,11 +177,12 @@ def update_jira_tenx(jira_id, library_pk):
 
     # assign parent ticket
     parent_jira_id = get_parent_issue(jira_id)
-    issue = jira_api.issue(parent_jira_id)
+    issue = jira_api.issue(parent_jira_id, fields=['assignee'])
     if library['sample']['sample_id'].startswith("TFRI"):
         issue.update(assignee={"name": "shwu"})
     else:
         issue.update(assignee={"name": "jbwang"})
+    jira_api.invalidate(parent_jira_id)
 
     update_description(jira_id, description, jira_user, remove_watcher=True)
     close_ticket(jira_id)
@@ -177,9 +191,10 @@ def update_jira_tenx(jira_id, library_pk):
 def update_description(jira_id, description, assignee, remove_watcher=False):
 
     description = '\n\n'.join(description)
-    issue = jira_api.issue(jira_id)
+    issue = jira_api.issue(jira_id, fields=['assignee', 'description'])
 
     issue.update(assignee={"name": assignee}, description=description)
+    jira_api.invalidate(jira_id)
 
 
 def add_attachment(jira_id, attachment_file_path, attachment_filename='', update=False):
@@ -187,8 +202,9 @@ def add_attachment(jira_id, attachment_file_path, attachment_filename='', update
     Checks if file is already added to jira ticket; attaches if not. 
     """
 
-    issue = jira_api.issue(jira_id)
-    current_attachments = [a.filename for a in issue.fields.attachment]
+    issue = jira_api.issue(jira_id, fields=['attachment'])
+    # attachments are queued, those not sent yet count as added
+    current_attachments = [a.filename for a in issue.fields.attachment] + jira_api.pending_attachments(jira_id)
 
     if (attachment_filename in current_attachments and not update):
         log.info("{} already added to {}".format(attachment_filename, jira_id))
@@ -248,7 +264,7 @@ def create_jira_ticket_from_library(library_id):
     sample_id = library['sample']['sample_id']
 
     library_jira_ticket = library['jira_ticket']
-    issue = jira_api.issue(library_jira_ticket)
+    issue = jira_api.issue(library_jira_ticket, fields=['summary'])
 
     log.info('Creating analysis JIRA ticket as sub task for {}'.format(library_jira_ticket))
 
@@ -274,8 +290,9 @@ def create_jira_ticket_from_library(library_id):
     jira_api.add_watcher(analysis_jira_ticket, jira_user)
 
     # Assign task to myself
-    analysis_issue = jira_api.issue(analysis_jira_ticket)
+    analysis_issue = jira_api.issue(analysis_jira_ticket, fields=['assignee'])
     analysis_issue.update(assignee={'name': jira_user})
+    jira_api.invalidate(analysis_jira_ticket)
 
     log.info('Created analysis ticket {} for library {}'.format(analysis_jira_ticket, library_id))
 
@@ -293,7 +310,7 @@ def get_description_from_jira_id(jira_id):
         description: description associated with the JIRA ticket in Colossus
     """
     
-    analysis_info = colossus_api.get("analysis_information", analysis_jira_ticket=jira_id)
+    analysis_info = get_analysis_information(jira_id)
     description = analysis_info["library"]["description"]
     
     return description
@@ -309,7 +326,7 @@ def get_title_from_jira_id(jira_id):
     Returns:
         title: title associated with the JIRA ticket in Colossus
     """
-    analysis_info = colossus_api.get("analysis_information", analysis_jira_ticket=jira_id)
+    analysis_info = get_analysis_information(jira_id)
     sample_id = analysis_info["library"]["sample"]["sample_id"]
     library_id = analysis_info["library"]["pool_id"]
 
@@ -330,7 +347,7 @@ def create_alhena_description(jira_id):
 
     alhena_link = f'Link to Alhena: {ALHENA_BASE_URL}/alhena/dashboards/{jira_id}'
 
-    analysis_info = colossus_api.get("analysis_information", analysis_jira_ticket=jira_id)
+    analysis_info = get_analysis_information(jira_id)
 
     date = analysis_info["analysis_run"]["last_updated"].split("T")[0]
     aligner = "MEM" if analysis_info["aligner"] == "M" else "ALN"
@@ -360,7 +377,7 @@ def update_jira_alhena(jira_id):
     else:
         parent_id = jira_id
 
-    parent = jira_api.issue(parent_id)
+    parent = jira_api.issue(parent_id, fields=['description'])
 
     # Retrieve description if it already exists, and remove duplicate viz server link
     if (hasattr(parent.fields, 'description') and parent.fields.description):
@@ -374,4 +391,5 @@ def update_jira_alhena(jira_id):
     description_list.append(create_alhena_description(jira_id))
 
     parent.update(description="\n".join(description_list))
+    jira_api.invalidate(parent_id)
 
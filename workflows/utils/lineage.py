@@ -0,0 +1,199 @@
+"""
+Lineage of Tantalus results through the analyses that produced and consumed them.
+"""
+import json
+
+from dbclients.basicclient import NotFoundError
+
+
+class Lineage(object):
+    """
+    Memoized results to analysis graph, expanded a level at a time with
+    batched id__in queries.
+
+    Nodes fetched by one query are kept for later queries, so repeated
+    lookups over overlapping ancestry only fetch what has not been seen.
+    The graph can be saved to and loaded from a json file, an offline
+    lineage answers queries from the file without the api.
+
+    Args:
+        tantalus_api (TantalusApi): None for an offline lineage
+
+    KwArgs:
+        batch_size (int): ids per id__in query
+    """
+
+    def __init__(self, tantalus_api, batch_size=100):
+        self.tantalus_api = tantalus_api
+        self.batch_size = batch_size
+
+        # results id -> id of the analysis that produced it, or None
+        self.results = {}
+        # analysis id -> {'input_datasets': [...], 'input_results': [...]}
+        self.analyses = {}
+        # results id -> ids of analyses that take it as input
+        self.consumers = {}
+        # analysis id -> ids of results it produced
+        self.outputs = {}
+
+    @property
+    def offline(self):
+        return self.tantalus_api is None
+
+    def clear(self):
+        self.results = {}
+        self.analyses = {}
+        self.consumers = {}
+        self.outputs = {}
+
+    def _list_batched(self, table_name, filter_name, ids):
+        return self.tantalus_api.list_batched(table_name, filter_name, ids, batch_size=self.batch_size)
+
+    def _missing(self, cache, ids, table_name):
+        missing = set(ids) - set(cache)
+        if missing and self.offline:
+            raise NotFoundError("no {} {} in offline lineage".format(table_name, sorted(missing)))
+        return missing
+
+    def _load_results(self, results_ids):
+        missing = self._missing(self.results, results_ids, "resultsdataset")
+        if not missing:
+            return
+
+        for results in self._list_batched("resultsdataset", "id__in", missing):
+            self.results[results["id"]] = results["analysis"]
+
+        not_found = missing - set(self.results)
+        if not_found:
+            raise NotFoundError("no resultsdataset for ids {}".format(sorted(not_found)))
+
+    def _load_analyses(self, analysis_ids):
+        missing = self._missing(self.analyses, analysis_ids, "analysis")
+        if not missing:
+            return
+
+        for analysis in self._list_batched("analysis", "id__in", missing):
+            self.analyses[analysis["id"]] = {
+                "input_datasets": analysis["input_datasets"],
+                "input_results": analysis["input_results"],
+            }
+
+        not_found = missing - set(self.analyses)
+        if not_found:
+            raise NotFoundError("no analysis for ids {}".format(sorted(not_found)))
+
+    def _load_consumers(self, results_ids):
+        missing = self._missing(self.consumers, results_ids, "analysis consumers of results")
+        if not missing:
+            return
+
+        consumers = {a: [] for a in missing}
+        for analysis in self._list_batched("analysis", "input_results__id__in", missing):
+            self.analyses[analysis["id"]] = {
+                "input_datasets": analysis["input_datasets"],
+                "input_results": analysis["input_results"],
+            }
+            for results_id in analysis["input_results"]:
+                if results_id in consumers:
+                    consumers[results_id].append(analysis["id"])
+        self.consumers.update(consumers)
+
+    def _load_outputs(self, analysis_ids):
+        missing = self._missing(self.outputs, analysis_ids, "results outputs of analysis")
+        if not missing:
+            return
+
+        outputs = {a: [] for a in missing}
+        for results in self._list_batched("resultsdataset", "analysis__id__in", missing):
+            self.results[results["id"]] = results["analysis"]
+            outputs[results["analysis"]].append(results["id"])
+        self.outputs.update(outputs)
+
+    def upstream(self, results_ids):
+        """
+        Datasets and results upstream of a set of results.
+
+        Args:
+            results_ids (list): results primary keys
+
+        Returns:
+            dataset_ids (set), results_ids (set) excluding the given results
+        """
+        frontier = set(results_ids)
+        visited = set()
+        dataset_ids = set()
+
+        while frontier:
+            self._load_results(frontier)
+            visited.update(frontier)
+
+            analysis_ids = set(self.results[a] for a in frontier if self.results[a])
+            self._load_analyses(analysis_ids)
+
+            frontier = set()
+            for analysis_id in analysis_ids:
+                dataset_ids.update(self.analyses[analysis_id]["input_datasets"])
+                frontier.update(self.analyses[analysis_id]["input_results"])
+            frontier -= visited
+
+        return dataset_ids, visited - set(results_ids)
+
+    def downstream(self, results_ids):
+        """
+        Analyses and results downstream of a set of results.
+
+        Args:
+            results_ids (list): results primary keys
+
+        Returns:
+            analysis_ids (set), results_ids (set) excluding the given results
+        """
+        frontier = set(results_ids)
+        visited = set()
+        analysis_ids = set()
+
+        while frontier:
+            self._load_consumers(frontier)
+            visited.update(frontier)
+
+            level_analysis_ids = set()
+            for results_id in frontier:
+                level_analysis_ids.update(self.consumers[results_id])
+            level_analysis_ids -= analysis_ids
+            analysis_ids.update(level_analysis_ids)
+
+            self._load_outputs(level_analysis_ids)
+
+            frontier = set()
+            for analysis_id in level_analysis_ids:
+                frontier.update(self.outputs[analysis_id])
+            frontier -= visited
+
+        return analysis_ids, visited - set(results_ids)
+
+    def save(self, filename):
+        """
+        Write the fetched graph to a json file.
+        """
+        data = {
+            "results": self.results,
+            "analyses": self.analyses,
+            "consumers": self.consumers,
+            "outputs": self.outputs,
+        }
+        with open(filename, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, filename, tantalus_api=None, **kwargs):
+        """
+        Read a graph written by save, offline unless a tantalus_api is given.
+        """
+        with open(filename) as f:
+            data = json.load(f)
+
+        lineage = cls(tantalus_api, **kwargs)
+        for name in ("results", "analyses", "consumers", "outputs"):
+            setattr(lineage, name, {int(k): v for k, v in data[name].items()})
+
+        return lineage
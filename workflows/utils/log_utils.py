@@ -9,8 +9,8 @@ from datetime import datetime
 import pytz
 import re
 import shutil
-import yaml
-import hashlib
+
+from datamanagement.utils import yaml_utils
 
 log = logging.getLogger('sisyphus')
 
@@ -134,8 +134,7 @@ def sentinel(filename, function, *args, **kwargs):
 
     log.debug(filename)
 
-    hash_args = yaml.dump(args) + yaml.dump(kwargs)
-    hash_args = hashlib.md5(hash_args.encode('utf-8')).hexdigest()[:8]
+    hash_args = yaml_utils.hash_args(*args, **kwargs)[:8]
     filename = spaces_to_underscores(filename) + '_' + hash_args
 
     # Append the calling function onto the filename.
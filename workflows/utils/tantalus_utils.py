@@ -2,6 +2,7 @@ import os
 import datamanagement.templates as templates
 import dbclients.tantalus
 import dbclients.colossus
+from dbclients.basicclient import LazyClient
 
 # Analysis imports
 from workflows.analysis.dlp.alignment import AlignmentAnalysis
@@ -11,9 +12,10 @@ from workflows.tenx.models import TenXAnalysis
 
 from workflows.utils.colossus_utils import get_ref_genome
 from workflows.utils import file_utils
+from workflows.utils.lineage import Lineage
 
-tantalus_api = dbclients.tantalus.TantalusApi()
-colossus_api = dbclients.colossus.ColossusApi()
+tantalus_api = LazyClient(dbclients.tantalus.TantalusApi)
+colossus_api = LazyClient(dbclients.colossus.ColossusApi)
 
 
 def sequence_dataset_match_lanes(dataset, lane_ids):
@@ -45,33 +47,23 @@ def get_storage_type(storage_name):
     return storage['storage_type']
 
 
-def get_upstream_datasets(results_ids):
+def get_upstream_datasets(results_ids, lineage=None):
     """
     Get all datasets upstream of a set of results.
     Args:
         results_ids (list): list of results primary keys
+    KwArgs:
+        lineage (Lineage): lineage shared by the lookups of one operation,
+            a new lineage is used if None
     Returns:
         dataset_ids (list): list of dataset ids
     """
-    results_ids = set(results_ids)
+    if lineage is None:
+        lineage = Lineage(tantalus_api)
 
-    upstream_datasets = set()
-    visited_results_ids = set()
+    dataset_ids, _ = lineage.upstream(results_ids)
 
-    while len(results_ids) > 0:
-        results_id = results_ids.pop()
-
-        if results_id in visited_results_ids:
-            raise Exception('cycle in search for upstream datasets')
-
-        results = tantalus_api.get('resultsdataset', id=results_id)
-
-        if results['analysis']:
-            analysis = tantalus_api.get('analysis', id=results['analysis'])
-            upstream_datasets.update(analysis['input_datasets'])
-            results_ids.update(analysis['input_results'])
-
-    return list(upstream_datasets)
+    return list(dataset_ids)
 
 
 def create_qc_analyses_from_library(library_id, jira_ticket, version, analysis_type, aligner="M"):